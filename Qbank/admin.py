@@ -1,6 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
 
+from jobs import queue
+from surveys.admin import SurveyVersionListFilter
+
 from .models import Questions, MatrixItem, MatrixItemGroup, QuestionStaging
 
 
@@ -17,6 +20,27 @@ class SurveyQuestionAdmin(admin.ModelAdmin):
     search_fields = ("text_en", "text_ar")
     inlines = [ResponseGroupInline]
     exclude = ("response_groups",)
+    # These rebuild the whole bank, whichever questions are selected.
+    actions = ["queue_search_index_rebuild", "queue_translation_memory_rebuild", "queue_dedupe_report"]
+
+    def has_queue_jobs_permission(self, request):
+        return request.user.has_perm("jobs.add_job")
+
+    def _queue(self, request, task):
+        queue.enqueue(task, user=request.user)
+        self.message_user(request, _("أُضيفت المهمة إلى قائمة الانتظار."), messages.SUCCESS)
+
+    @admin.action(description=_("إعادة بناء فهرس البحث لكل الأسئلة في الخلفية"), permissions=["queue_jobs"])
+    def queue_search_index_rebuild(self, request, queryset):
+        self._queue(request, "qbank.rebuild_search_index")
+
+    @admin.action(description=_("إعادة بناء ذاكرة الترجمة في الخلفية"), permissions=["queue_jobs"])
+    def queue_translation_memory_rebuild(self, request, queryset):
+        self._queue(request, "qbank.rebuild_translation_memory")
+
+    @admin.action(description=_("البحث عن الأسئلة المكررة في الخلفية"), permissions=["queue_jobs"])
+    def queue_dedupe_report(self, request, queryset):
+        self._queue(request, "qbank.dedupe_report")
 
     def display_text(self, obj):
         return obj.display_text
@@ -54,4 +78,7 @@ class MatrixItemGroupAdmin(admin.ModelAdmin):
 class QuestionStagingAdmin(admin.ModelAdmin):
     list_display = ("__str__", "survey", "survey_version", "created_at")
     search_fields = ("text_ar", "text_en", "survey__name_ar", "survey__name_en")
-    list_filter = ("survey", "survey_version")
+    list_filter = ("survey", ("survey_version", SurveyVersionListFilter))
+    list_select_related = ("survey", "survey_version__survey")
+    show_full_result_count = False
+    raw_id_fields = ("survey_question",)
@@ -6,3 +6,6 @@ class QbankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Qbank'
     verbose_name = _('بنك الأسئلة')
+
+    def ready(self):
+        import Qbank.signals
@@ -0,0 +1,282 @@
+"""
+Near-duplicate detection for bank questions with MinHash and LSH banding.
+
+Each question's Arabic and English texts are normalized with the search
+tokenizer, cut into character shingles and reduced to one MinHash signature
+of ``NUM_PERM`` values per language. Each signature is split into ``BANDS``
+bands of ``ROWS`` values; every band is hashed into a ``QuestionBucket`` row.
+Two questions become candidates when they share at least one bucket, which is
+an indexed lookup instead of a scan over the bank; candidates are then ranked
+by the best estimated Jaccard similarity of their signatures.
+
+With 16 bands of 4 rows, pairs around 0.5 similarity are found with high
+probability while pairs below 0.3 rarely collide.
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import QuestionBucket, QuestionSignature, Questions
+from .search import tokenize
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_BUCKET_MASK = (1 << 63) - 1  # keep bucket hashes inside a signed BIGINT
+
+# Fixed seed: signatures stored in the database must stay comparable across processes and deploys.
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+LANGUAGES = ("ar", "en")
+
+Signatures = Dict[str, List[int]]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Character shingles of the normalized text (token boundaries kept as spaces)."""
+    normalized = " ".join(tokenize(text))
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of ``text``; empty when the text has no shingles."""
+    hashes = [_shingle_hash(shingle) for shingle in shingles(text)]
+    if not hashes:
+        return []
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def question_signatures(text_ar: Optional[str], text_en: Optional[str]) -> Signatures:
+    """Per-language signatures; languages without text are omitted."""
+    signatures = {"ar": minhash(text_ar or ""), "en": minhash(text_en or "")}
+    return {language: signature for language, signature in signatures.items() if signature}
+
+
+def band_buckets(signature: Sequence[int]) -> List[Tuple[int, int]]:
+    """``(band, bucket)`` pairs for a signature."""
+    if len(signature) != NUM_PERM:
+        return []
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big") & _BUCKET_MASK))
+    return buckets
+
+
+def estimate_similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    if not left or len(left) != len(right):
+        return 0.0
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def best_similarity(signature: Sequence[int], signatures: Signatures) -> float:
+    """Similarity of ``signature`` to the closest language of ``signatures``."""
+    return max((estimate_similarity(signature, other) for other in signatures.values()), default=0.0)
+
+
+def pair_similarity(left: Signatures, right: Signatures) -> float:
+    """Best same-language similarity between two questions."""
+    return max(
+        (estimate_similarity(left[language], right[language]) for language in LANGUAGES
+         if language in left and language in right),
+        default=0.0,
+    )
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+
+
+def _buckets_for(question_id: int, signatures: Signatures) -> List[QuestionBucket]:
+    return [
+        QuestionBucket(question_id=question_id, language=language, band=band, bucket=bucket)
+        for language, signature in signatures.items()
+        for band, bucket in band_buckets(signature)
+    ]
+
+
+def index_question(question: Questions) -> Signatures:
+    """Store the signatures and band buckets of ``question``."""
+    signatures = question_signatures(question.text_ar, question.text_en)
+    with transaction.atomic():
+        QuestionSignature.objects.update_or_create(question=question, defaults={"signature": signatures})
+        QuestionBucket.objects.filter(question=question).delete()
+        QuestionBucket.objects.bulk_create(_buckets_for(question.pk, signatures))
+    return signatures
+
+
+def _signature_rows(rows: Sequence[Tuple[int, str, str]]) -> List[Tuple[int, Signatures]]:
+    """Worker entry point: compute signatures for ``(id, text_ar, text_en)`` rows."""
+    return [(pk, question_signatures(text_ar, text_en)) for pk, text_ar, text_en in rows]
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def compute_signatures(
+        rows: Sequence[Tuple[int, str, str]],
+        processes: int = 1,
+        chunk_size: int = 500,
+) -> Dict[int, Signatures]:
+    """Signatures for many questions, spread over a process pool when ``processes > 1``."""
+    chunks = list(_chunks(list(rows), chunk_size))
+    if processes <= 1 or len(chunks) <= 1:
+        results = map(_signature_rows, chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_signature_rows, chunks))
+    return {pk: signature for chunk in results for pk, signature in chunk}
+
+
+def rebuild_index(processes: int = 1, batch_size: int = 1000) -> int:
+    """Recompute every stored signature and bucket. Returns the number of questions indexed."""
+    rows = list(Questions.objects.order_by("id").values_list("id", "text_ar", "text_en"))
+    signatures = compute_signatures(rows, processes=processes)
+    with transaction.atomic():
+        QuestionBucket.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+        QuestionSignature.objects.bulk_create(
+            [QuestionSignature(question_id=pk, signature=signature) for pk, signature in signatures.items()],
+            batch_size=batch_size,
+        )
+        QuestionBucket.objects.bulk_create(
+            [bucket for pk, signature in signatures.items() for bucket in _buckets_for(pk, signature)],
+            batch_size=batch_size,
+        )
+    return len(signatures)
+
+
+# ----------------------------------------------------------------------
+# Queries
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class SimilarQuestion:
+    question: Questions
+    similarity: float
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.question.id,
+            "label_ar": self.question.text_ar,
+            "label_en": self.question.text_en,
+            "similarity": round(self.similarity, 3),
+        }
+
+
+def similar_questions(
+        text: str,
+        threshold: float = DEFAULT_THRESHOLD,
+        limit: int = 5,
+        exclude_id: Optional[int] = None,
+) -> List[SimilarQuestion]:
+    """Existing bank questions whose estimated similarity to ``text`` reaches ``threshold``."""
+    signature = minhash(text)
+    buckets = band_buckets(signature)
+    if not buckets:
+        return []
+
+    match = Q()
+    for band, bucket in buckets:
+        match |= Q(band=band, bucket=bucket)
+    candidate_ids = set(QuestionBucket.objects.filter(match).values_list("question_id", flat=True))
+    candidate_ids.discard(exclude_id)
+    if not candidate_ids:
+        return []
+
+    scored = []
+    for stored in QuestionSignature.objects.filter(question_id__in=candidate_ids).select_related("question"):
+        similarity = best_similarity(signature, stored.signature)
+        if similarity >= threshold:
+            scored.append(SimilarQuestion(stored.question, similarity))
+    scored.sort(key=lambda item: (-item.similarity, item.question.id))
+    return scored[:limit]
+
+
+@dataclass
+class DuplicateCluster:
+    question_ids: List[int]
+    pairs: List[Tuple[int, int, float]] = field(default_factory=list)
+
+
+def dedupe_report(
+        threshold: float = DEFAULT_THRESHOLD,
+        processes: int = 1,
+        chunk_size: int = 500,
+) -> List[DuplicateCluster]:
+    """Group the whole bank into clusters of near-duplicate questions.
+
+    Signatures are computed in a process pool; banding and verification run
+    in memory, so the database is only read once.
+    """
+    rows = list(Questions.objects.order_by("id").values_list("id", "text_ar", "text_en"))
+    signatures = compute_signatures(rows, processes=processes, chunk_size=chunk_size)
+
+    buckets: Dict[Tuple[str, int, int], List[int]] = {}
+    for pk, by_language in signatures.items():
+        for language, signature in by_language.items():
+            for band, bucket in band_buckets(signature):
+                buckets.setdefault((language, band, bucket), []).append(pk)
+
+    candidates = set()
+    for members in buckets.values():
+        for i, left in enumerate(members):
+            for right in members[i + 1:]:
+                candidates.add((left, right) if left < right else (right, left))
+
+    parent = {pk: pk for pk in signatures}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    pairs = []
+    for left, right in sorted(candidates):
+        similarity = pair_similarity(signatures[left], signatures[right])
+        if similarity >= threshold:
+            pairs.append((left, right, similarity))
+            parent[find(right)] = find(left)
+
+    clusters: Dict[int, DuplicateCluster] = {}
+    for left, right, similarity in pairs:
+        cluster = clusters.setdefault(find(left), DuplicateCluster(question_ids=[]))
+        cluster.pairs.append((left, right, similarity))
+    for cluster in clusters.values():
+        cluster.question_ids = sorted({pk for pair in cluster.pairs for pk in pair[:2]})
+    return sorted(clusters.values(), key=lambda cluster: cluster.question_ids)
@@ -0,0 +1,55 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from Qbank import dedupe
+from Qbank.models import Questions
+
+
+class Command(BaseCommand):
+    help = 'Reports clusters of near-duplicate questions in the bank using MinHash/LSH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=dedupe.DEFAULT_THRESHOLD,
+                            help='Minimum estimated Jaccard similarity for a pair to be reported.')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes used to compute signatures.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--json', action='store_true', help='Emit the report as JSON.')
+        parser.add_argument('--rebuild-index', action='store_true',
+                            help='Also recompute the stored signatures and LSH buckets.')
+
+    def handle(self, *args, **options):
+        if options['rebuild_index']:
+            indexed = dedupe.rebuild_index(processes=options['processes'])
+            self.stderr.write(f'Indexed {indexed} questions.')
+
+        clusters = dedupe.dedupe_report(
+            threshold=options['threshold'],
+            processes=options['processes'],
+            chunk_size=options['chunk_size'],
+        )
+        texts = Questions.objects.in_bulk([pk for cluster in clusters for pk in cluster.question_ids])
+
+        if options['json']:
+            payload = [
+                {
+                    'question_ids': cluster.question_ids,
+                    'pairs': [
+                        {'left': left, 'right': right, 'similarity': round(similarity, 3)}
+                        for left, right, similarity in cluster.pairs
+                    ],
+                }
+                for cluster in clusters
+            ]
+            self.stdout.write(json.dumps(payload, ensure_ascii=False, indent=2))
+            return
+
+        for number, cluster in enumerate(clusters, start=1):
+            self.stdout.write(f'Cluster {number}:')
+            for pk in cluster.question_ids:
+                question = texts.get(pk)
+                label = (question.text_ar or question.text_en) if question else ''
+                self.stdout.write(f'  #{pk} {label}')
+        self.stdout.write(self.style.SUCCESS(f'Found {len(clusters)} near-duplicate clusters.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Qbank.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the question full-text search index from the bank, survey and assessment questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} questions.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Qbank.translation_memory import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the translation memory from translated bank, survey and staged questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recorded = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recorded {recorded} translation pairs.'))
@@ -0,0 +1,143 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:55
+
+import re
+
+from django.db import migrations, models
+
+FTS_TABLE = "qbank_search_fts"
+DOC_TABLE = "Qbank_searchdocument"
+BACKFILL_BATCH_SIZE = 1000
+
+# A copy of Qbank.search's normalization as of this migration.
+_TASHKEEL_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",
+    "ة": "ه",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+_ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def _tokenize(text):
+    if not text:
+        return []
+    text = _TASHKEEL_RE.sub("", text).translate(_CHAR_MAP).lower()
+    tokens = []
+    for token in _NON_WORD_RE.sub(" ", text).split():
+        for prefix in _ARTICLE_PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                token = token[len(prefix):]
+                break
+        tokens.append(token)
+    return tokens
+
+
+def backfill_search_documents(apps, schema_editor):
+    """Index the questions that existed before the search index; the FTS5 triggers pick the rows up."""
+    SearchDocument = apps.get_model('Qbank', 'SearchDocument')
+    sources = {
+        'bank': (apps.get_model('Qbank', 'Questions'), False),
+        'survey': (apps.get_model('surveys', 'SurveyQuestion'), True),
+        'assessment': (apps.get_model('assessment_flow', 'AssessmentQuestion'), False),
+    }
+    for source, (model, versioned) in sources.items():
+        fields = ['pk', 'text_ar', 'text_en'] + (['survey_version_id'] if versioned else [])
+        batch = []
+        for row in model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            pk, text_ar, text_en = row[:3]
+            text_ar, text_en = text_ar or '', text_en or ''
+            batch.append(SearchDocument(
+                source=source,
+                object_id=pk,
+                survey_version_id=row[3] if versioned else None,
+                text_ar=text_ar,
+                text_en=text_en,
+                normalized=' '.join(_tokenize(f'{text_ar} {text_en}')),
+            ))
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("PRAGMA compile_options")
+            if not any("FTS5" in row[0] for row in cursor.fetchall()):
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"normalized, content='{DOC_TABLE}', content_rowid='id', tokenize='unicode61')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOC_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, normalized) VALUES (new.id, new.normalized); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOC_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, normalized) VALUES ('delete', old.id, old.normalized); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOC_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, normalized) VALUES ('delete', old.id, old.normalized); "
+                f"INSERT INTO {FTS_TABLE}(rowid, normalized) VALUES (new.id, new.normalized); END"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS searchdocument_normalized_tsv ON "{DOC_TABLE}" '
+                "USING GIN (to_tsvector('simple', normalized))"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif connection.vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS searchdocument_normalized_tsv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Qbank', '0002_initial'),
+        ('assessment_flow', '0001_initial'),
+        ('surveys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('bank', 'بنك الأسئلة'), ('survey', 'أسئلة الاستبيان'), ('assessment', 'أسئلة التقييم')], max_length=20, verbose_name='المصدر')),
+                ('object_id', models.BigIntegerField(verbose_name='معرف السؤال')),
+                ('survey_version_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='إصدار الاستبيان')),
+                ('text_ar', models.TextField(blank=True, verbose_name='السؤال [عربية]')),
+                ('text_en', models.TextField(blank=True, verbose_name='السؤال [إنجليزية]')),
+                ('normalized', models.TextField(blank=True, verbose_name='النص الموحد')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'مستند بحث',
+                'verbose_name_plural': 'مستندات البحث',
+                'ordering': ['source', 'object_id'],
+                'unique_together': {('source', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
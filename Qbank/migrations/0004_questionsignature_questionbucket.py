@@ -0,0 +1,147 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:59
+
+import hashlib
+import random
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 500
+
+# A copy of Qbank.search's tokenizer and Qbank.dedupe's MinHash/LSH banding
+# as of this migration; the parameters must match the live ones.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_BUCKET_MASK = (1 << 63) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_TASHKEEL_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",
+    "ة": "ه",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+_ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def _tokenize(text):
+    if not text:
+        return []
+    text = _TASHKEEL_RE.sub("", text).translate(_CHAR_MAP).lower()
+    tokens = []
+    for token in _NON_WORD_RE.sub(" ", text).split():
+        for prefix in _ARTICLE_PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                token = token[len(prefix):]
+                break
+        tokens.append(token)
+    return tokens
+
+
+def _minhash(text):
+    normalized = " ".join(_tokenize(text))
+    if not normalized:
+        return []
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+        for shingle in shingles
+    ]
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def _band_buckets(signature):
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big") & _BUCKET_MASK))
+    return buckets
+
+
+def backfill_signatures(apps, schema_editor):
+    """Sign every existing bank question so similar_questions finds them right after deploy."""
+    Questions = apps.get_model('Qbank', 'Questions')
+    QuestionSignature = apps.get_model('Qbank', 'QuestionSignature')
+    QuestionBucket = apps.get_model('Qbank', 'QuestionBucket')
+
+    signatures, buckets = [], []
+    rows = Questions.objects.order_by('pk').values_list('pk', 'text_ar', 'text_en')
+    for pk, text_ar, text_en in rows.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        signature = {'ar': _minhash(text_ar or ''), 'en': _minhash(text_en or '')}
+        signature = {language: values for language, values in signature.items() if values}
+        signatures.append(QuestionSignature(question_id=pk, signature=signature))
+        buckets.extend(
+            QuestionBucket(question_id=pk, language=language, band=band, bucket=bucket)
+            for language, values in signature.items()
+            for band, bucket in _band_buckets(values)
+        )
+        if len(signatures) >= BACKFILL_BATCH_SIZE:
+            QuestionSignature.objects.bulk_create(signatures)
+            QuestionBucket.objects.bulk_create(buckets, batch_size=BACKFILL_BATCH_SIZE)
+            signatures, buckets = [], []
+    QuestionSignature.objects.bulk_create(signatures)
+    QuestionBucket.objects.bulk_create(buckets, batch_size=BACKFILL_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Qbank', '0003_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.JSONField(default=dict, verbose_name='بصمة MinHash')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='signature', to='Qbank.questions', verbose_name='السؤال')),
+            ],
+            options={
+                'verbose_name': 'بصمة سؤال',
+                'verbose_name_plural': 'بصمات الأسئلة',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=2, verbose_name='اللغة')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='الشريحة')),
+                ('bucket', models.BigIntegerField(verbose_name='قيمة التجزئة')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='Qbank.questions', verbose_name='السؤال')),
+            ],
+            options={
+                'verbose_name': 'دلو تجزئة',
+                'verbose_name_plural': 'دلاء التجزئة',
+                'indexes': [models.Index(fields=['band', 'bucket'], name='qbank_lsh_band_bucket')],
+                'unique_together': {('question', 'language', 'band')},
+            },
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:01
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+# A copy of Qbank.translation_memory.text_hash (and the search tokenizer it
+# uses) as of this migration.
+_TASHKEEL_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",
+    "ة": "ه",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+_ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def text_hash(text):
+    if not text:
+        return ""
+    text = _TASHKEEL_RE.sub("", text).translate(_CHAR_MAP).lower()
+    tokens = []
+    for token in _NON_WORD_RE.sub(" ", text).split():
+        for prefix in _ARTICLE_PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                token = token[len(prefix):]
+                break
+        tokens.append(token)
+    normalized = " ".join(tokens)
+    if not normalized:
+        return ""
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def backfill_translation_memory(apps, schema_editor):
+    QuestionStaging = apps.get_model('Qbank', 'QuestionStaging')
+    TranslationMemoryEntry = apps.get_model('Qbank', 'TranslationMemoryEntry')
+    sources = {
+        'bank': apps.get_model('Qbank', 'Questions'),
+        'survey': apps.get_model('surveys', 'SurveyQuestion'),
+        'staging': QuestionStaging,
+    }
+
+    staged = list(QuestionStaging.objects.all())
+    for question in staged:
+        question.text_ar_hash = text_hash(question.text_ar)
+    QuestionStaging.objects.bulk_update(staged, ['text_ar_hash'], batch_size=1000)
+
+    entries = []
+    for source, model in sources.items():
+        for pk, text_ar, text_en in model.objects.exclude(text_en='').values_list('pk', 'text_ar', 'text_en').iterator():
+            digest = text_hash(text_ar)
+            if digest and text_en.strip():
+                entries.append(TranslationMemoryEntry(
+                    source=source, object_id=pk, text_hash=digest,
+                    text_ar=text_ar.strip(), text_en=text_en.strip(),
+                ))
+    TranslationMemoryEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Qbank', '0004_questionsignature_questionbucket'),
+        ('surveys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstaging',
+            name='text_ar_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='بصمة النص العربي'),
+        ),
+        migrations.CreateModel(
+            name='TranslationMemoryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('bank', 'بنك الأسئلة'), ('survey', 'أسئلة الاستبيان'), ('staging', 'أسئلة قيد الإعداد')], max_length=20, verbose_name='المصدر')),
+                ('object_id', models.BigIntegerField(verbose_name='معرف السؤال')),
+                ('text_hash', models.CharField(db_index=True, max_length=64, verbose_name='بصمة النص العربي')),
+                ('text_ar', models.TextField(verbose_name='السؤال [عربية]')),
+                ('text_en', models.TextField(verbose_name='السؤال [إنجليزية]')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'مدخل ذاكرة الترجمة',
+                'verbose_name_plural': 'ذاكرة الترجمة',
+                'unique_together': {('source', 'object_id')},
+            },
+        ),
+        migrations.RunPython(backfill_translation_memory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_staged_questions(apps, schema_editor):
+    """Match each staged question to one survey question of its version, once, in bulk."""
+    QuestionStaging = apps.get_model('Qbank', 'QuestionStaging')
+    SurveyQuestion = apps.get_model('surveys', 'SurveyQuestion')
+
+    staged_by_version = {}
+    for staged in QuestionStaging.objects.filter(survey_question__isnull=True).order_by('id').iterator():
+        staged_by_version.setdefault(staged.survey_version_id, []).append(staged)
+
+    linked = []
+    for version_id, staged_questions in staged_by_version.items():
+        by_both, by_ar = {}, {}
+        for pk, text_ar, text_en in (
+            SurveyQuestion.objects.filter(survey_version_id=version_id)
+            .order_by('id').values_list('id', 'text_ar', 'text_en')
+        ):
+            by_both.setdefault((text_ar, text_en), []).append(pk)
+            by_ar.setdefault(text_ar, []).append(pk)
+
+        used = set()
+        for staged in staged_questions:
+            candidates = by_both.get((staged.text_ar, staged.text_en), []) + by_ar.get(staged.text_ar, [])
+            match = next((pk for pk in candidates if pk not in used), None)
+            if match is not None:
+                used.add(match)
+                staged.survey_question_id = match
+                linked.append(staged)
+
+    QuestionStaging.objects.bulk_update(linked, ['survey_question'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Qbank', '0005_translation_memory'),
+        ('surveys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstaging',
+            name='survey_question',
+            field=models.OneToOneField(blank=True, help_text='سؤال الإصدار الذي تنعكس عليه تعديلات المراجعة والترجمة.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='staged_question', to='surveys.surveyquestion', verbose_name='سؤال الاستبيان'),
+        ),
+        migrations.RunPython(link_staged_questions, migrations.RunPython.noop),
+    ]
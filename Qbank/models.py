@@ -3,7 +3,7 @@ from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
 from Rbank.models import ResponseGroup
-from surveys.models import Survey, SurveyVersion
+from surveys.models import Survey, SurveyQuestion, SurveyVersion
 
 
 class Questions(models.Model):
@@ -52,14 +52,39 @@ class QuestionStaging(models.Model):
         related_name="staged_questions",
         verbose_name=_("إصدار الاستبيان")
     )
+    survey_question = models.OneToOneField(
+        SurveyQuestion,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="staged_question",
+        verbose_name=_("سؤال الاستبيان"),
+        help_text=_("سؤال الإصدار الذي تنعكس عليه تعديلات المراجعة والترجمة."),
+    )
 
     is_sent_for_translation = models.BooleanField(default=False, verbose_name=_("مرسل للترجمة"))
+    text_ar_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_("بصمة النص العربي"),
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.text_ar or self.text_en} ({self.survey_version})"
 
+    def save(self, *args, **kwargs):
+        from .translation_memory import text_hash
+
+        self.text_ar_hash = text_hash(self.text_ar)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "text_ar" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "text_ar_hash"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _("سؤال قيد الإعداد")
         verbose_name_plural = _("أسئلة قيد الإعداد")
@@ -96,3 +121,105 @@ class MatrixItemGroup(models.Model):
     class Meta:
         verbose_name = _("مجموعة عناصر مصفوفة")
         verbose_name_plural = _("مجموعات عناصر المصفوفة")
+
+
+class SearchDocument(models.Model):
+    """Normalized text of a searchable question, indexed for full-text search.
+
+    One row per question from the bank, survey versions or the assessment
+    flow. ``normalized`` holds the Arabic-normalized text fed to the SQLite
+    FTS5 table (or PostgreSQL tsvector index) that backs ``Qbank.search``.
+    """
+
+    class Source(models.TextChoices):
+        BANK = "bank", _("بنك الأسئلة")
+        SURVEY = "survey", _("أسئلة الاستبيان")
+        ASSESSMENT = "assessment", _("أسئلة التقييم")
+
+    source = models.CharField(max_length=20, choices=Source.choices, verbose_name=_("المصدر"))
+    object_id = models.BigIntegerField(verbose_name=_("معرف السؤال"))
+    survey_version_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name=_("إصدار الاستبيان"))
+    text_ar = models.TextField(blank=True, verbose_name=_("السؤال [عربية]"))
+    text_en = models.TextField(blank=True, verbose_name=_("السؤال [إنجليزية]"))
+    normalized = models.TextField(blank=True, verbose_name=_("النص الموحد"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}:{self.object_id}"
+
+    class Meta:
+        verbose_name = _("مستند بحث")
+        verbose_name_plural = _("مستندات البحث")
+        ordering = ["source", "object_id"]
+        unique_together = ("source", "object_id")
+
+
+class QuestionSignature(models.Model):
+    """MinHash signatures of a bank question's normalized text per language, used for near-duplicate detection."""
+
+    question = models.OneToOneField(
+        Questions,
+        on_delete=models.CASCADE,
+        related_name="signature",
+        verbose_name=_("السؤال"),
+    )
+    signature = models.JSONField(default=dict, verbose_name=_("بصمة MinHash"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.question_id}"
+
+    class Meta:
+        verbose_name = _("بصمة سؤال")
+        verbose_name_plural = _("بصمات الأسئلة")
+
+
+class QuestionBucket(models.Model):
+    """One LSH band bucket of a question signature; questions sharing a bucket are candidates."""
+
+    question = models.ForeignKey(
+        Questions,
+        on_delete=models.CASCADE,
+        related_name="lsh_buckets",
+        verbose_name=_("السؤال"),
+    )
+    language = models.CharField(max_length=2, verbose_name=_("اللغة"))
+    band = models.PositiveSmallIntegerField(verbose_name=_("الشريحة"))
+    bucket = models.BigIntegerField(verbose_name=_("قيمة التجزئة"))
+
+    def __str__(self):
+        return f"{self.band}:{self.bucket}"
+
+    class Meta:
+        verbose_name = _("دلو تجزئة")
+        verbose_name_plural = _("دلاء التجزئة")
+        unique_together = ("question", "language", "band")
+        indexes = [models.Index(fields=["band", "bucket"], name="qbank_lsh_band_bucket")]
+
+
+class TranslationMemoryEntry(models.Model):
+    """An Arabic/English pair that can be reused to translate identical staged questions.
+
+    ``text_hash`` is the SHA-256 of the normalized Arabic text, computed when the
+    entry is written so lookups are a single indexed equality query.
+    """
+
+    class Source(models.TextChoices):
+        BANK = "bank", _("بنك الأسئلة")
+        SURVEY = "survey", _("أسئلة الاستبيان")
+        STAGING = "staging", _("أسئلة قيد الإعداد")
+
+    source = models.CharField(max_length=20, choices=Source.choices, verbose_name=_("المصدر"))
+    object_id = models.BigIntegerField(verbose_name=_("معرف السؤال"))
+    text_hash = models.CharField(max_length=64, db_index=True, verbose_name=_("بصمة النص العربي"))
+    text_ar = models.TextField(verbose_name=_("السؤال [عربية]"))
+    text_en = models.TextField(verbose_name=_("السؤال [إنجليزية]"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.text_ar} → {self.text_en}"
+
+    class Meta:
+        verbose_name = _("مدخل ذاكرة الترجمة")
+        verbose_name_plural = _("ذاكرة الترجمة")
+        unique_together = ("source", "object_id")
@@ -0,0 +1,154 @@
+"""
+Batch operations for the linguistic review and translation queues.
+
+Each function takes the decoded items of one batch request, applies all
+valid edits with ``bulk_update`` inside a single transaction and returns one
+status entry per item, so a client flushing a queue of edits learns exactly
+which ones were rejected without the rest of the batch being rolled back.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from surveys.models import SurveyQuestion
+from .models import QuestionStaging, SearchDocument, TranslationMemoryEntry
+from . import search as question_search
+from . import translation_memory
+
+MAX_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+
+
+class BatchError(Exception):
+    """The batch as a whole is malformed."""
+
+
+def _status(item_id, status: str = "ok", message: str = "") -> dict:
+    entry = {"id": item_id, "status": status}
+    if message:
+        entry["message"] = message
+    return entry
+
+
+def _parse_items(items, text_field: str) -> Tuple[Dict[int, str], List[dict]]:
+    """Validate ``[{id, <text_field>}]`` items; later edits of the same id win."""
+    if not isinstance(items, list):
+        raise BatchError("items must be a list")
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError(f"At most {MAX_BATCH_SIZE} items per batch")
+    edits: Dict[int, str] = {}
+    rejected = []
+    for item in items:
+        item_id = item.get("id") if isinstance(item, dict) else None
+        text = item.get(text_field) if isinstance(item, dict) else None
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            rejected.append(_status(item_id, "error", "Missing question ID"))
+            continue
+        if not isinstance(text, str):
+            rejected.append(_status(item_id, "error", f"Missing {text_field}"))
+            continue
+        edits[item_id] = text
+    return edits, rejected
+
+
+def _parse_ids(ids) -> List[int]:
+    if not isinstance(ids, list):
+        raise BatchError("ids must be a list")
+    if len(ids) > MAX_BATCH_SIZE:
+        raise BatchError(f"At most {MAX_BATCH_SIZE} items per batch")
+    parsed = []
+    for item_id in ids:
+        try:
+            parsed.append(int(item_id))
+        except (TypeError, ValueError):
+            raise BatchError("ids must be integers")
+    return parsed
+
+
+def _refresh_indexes(staged: Iterable[QuestionStaging], survey_question_ids: List[int]) -> None:
+    # bulk_update() skips post_save, so keep the search index and translation memory in step.
+    translation_memory.record_many(TranslationMemoryEntry.Source.STAGING, staged)
+    survey_questions = SurveyQuestion.objects.filter(id__in=survey_question_ids)
+    question_search.index_queryset(SearchDocument.Source.SURVEY, survey_questions)
+    translation_memory.record_queryset(TranslationMemoryEntry.Source.SURVEY, survey_questions)
+
+
+def _apply_text_edits(items, text_field: str) -> List[dict]:
+    edits, results = _parse_items(items, text_field)
+    if not edits:
+        return results
+
+    with transaction.atomic():
+        staged = QuestionStaging.objects.select_for_update().in_bulk(list(edits))
+        linked = SurveyQuestion.objects.in_bulk(
+            [question.survey_question_id for question in staged.values() if question.survey_question_id]
+        )
+        now = timezone.now()
+        changed_staged, changed_survey = [], []
+        for item_id, text in edits.items():
+            question = staged.get(item_id)
+            if question is None:
+                results.append(_status(item_id, "not_found", "Question not found"))
+                continue
+            setattr(question, text_field, text)
+            if text_field == "text_ar":
+                question.text_ar_hash = translation_memory.text_hash(text)
+            changed_staged.append(question)
+            survey_question = linked.get(question.survey_question_id)
+            if survey_question is not None:
+                setattr(survey_question, text_field, text)
+                survey_question.updated_at = now
+                changed_survey.append(survey_question)
+            results.append(_status(item_id))
+
+        staged_fields = [text_field] + (["text_ar_hash"] if text_field == "text_ar" else [])
+        QuestionStaging.objects.bulk_update(changed_staged, staged_fields)
+        SurveyQuestion.objects.bulk_update(changed_survey, [text_field, "updated_at"])
+        _refresh_indexes(changed_staged, [question.id for question in changed_survey])
+    return results
+
+
+def update_staged_questions(items) -> List[dict]:
+    """Apply reviewed Arabic wording: ``[{"id": ..., "text_ar": ...}]``."""
+    return _apply_text_edits(items, "text_ar")
+
+
+def save_translations(items) -> List[dict]:
+    """Apply English translations: ``[{"id": ..., "text_en": ...}]``."""
+    return _apply_text_edits(items, "text_en")
+
+
+def send_to_translation(ids) -> List[dict]:
+    """Mark staged questions as sent for translation with one UPDATE."""
+    ids = _parse_ids(ids)
+    with transaction.atomic():
+        found = set(QuestionStaging.objects.filter(id__in=ids).values_list("id", flat=True))
+        QuestionStaging.objects.filter(id__in=found).update(is_sent_for_translation=True)
+    return [
+        _status(item_id) if item_id in found else _status(item_id, "not_found", "Question not found")
+        for item_id in dict.fromkeys(ids)
+    ]
+
+
+def keyset_page(queryset, after: Optional[str], page_size: int = DEFAULT_PAGE_SIZE):
+    """Newest-first page of ``queryset`` after the ``after`` cursor (the last id seen).
+
+    Returns ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+    The primary key follows insertion order, so ``-id`` matches the former
+    ``-created_at`` ordering while staying an index range scan at any depth.
+    """
+    queryset = queryset.order_by("-id")
+    if after:
+        try:
+            queryset = queryset.filter(id__lt=int(after))
+        except ValueError:
+            pass
+    items = list(queryset[:page_size + 1])
+    if len(items) > page_size:
+        return items[:page_size], str(items[page_size - 1].id)
+    return items, None
@@ -0,0 +1,293 @@
+"""
+Full-text search over the question bank, survey questions and assessment questions.
+
+Text is normalized with :func:`normalize_arabic` before indexing and before
+querying, so spelling variants of hamza/alef, taa marbuta, alef maqsura and
+diacritics all match, and :func:`tokenize` drops the definite article. The index lives in ``SearchDocument`` and is backed by:
+
+* SQLite: an external-content FTS5 table kept in sync by triggers, ranked with bm25;
+* PostgreSQL: a GIN index on ``to_tsvector('simple', normalized)``, ranked with ts_rank;
+* anything else: ``icontains`` over the normalized column.
+
+Documents are maintained incrementally by the signals in ``Qbank.signals``.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import SearchDocument
+
+FTS_TABLE = "qbank_search_fts"
+
+# Harakat, Quranic annotation marks, superscript alef and tatweel.
+_TASHKEEL_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",
+    "ة": "ه",
+    # Arabic-Indic and Eastern Arabic-Indic digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+
+def normalize_arabic(text: Optional[str]) -> str:
+    """Normalize Arabic/English text for matching.
+
+    Strips tashkeel and tatweel, unifies alef/hamza forms, maps taa marbuta to
+    haa and alef maqsura to yaa, lowercases Latin text and collapses
+    punctuation to single spaces.
+    """
+    if not text:
+        return ""
+    text = _TASHKEEL_RE.sub("", text)
+    text = text.translate(_CHAR_MAP).lower()
+    text = _NON_WORD_RE.sub(" ", text)
+    return text.strip()
+
+
+# Definite article with its common attached conjunctions/prepositions, longest first.
+_ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def _strip_article(token: str) -> str:
+    for prefix in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Normalized tokens with the Arabic definite article removed, as stored in the index."""
+    return [_strip_article(token) for token in normalize_arabic(text).split()]
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+
+
+def _document_fields(source: str, obj) -> dict:
+    text_ar = getattr(obj, "text_ar", "") or ""
+    text_en = getattr(obj, "text_en", "") or ""
+    return {
+        "survey_version_id": getattr(obj, "survey_version_id", None),
+        "text_ar": text_ar,
+        "text_en": text_en,
+        "normalized": " ".join(tokenize(f"{text_ar} {text_en}")),
+    }
+
+
+def index_object(source: str, obj) -> SearchDocument:
+    document, _ = SearchDocument.objects.update_or_create(
+        source=source,
+        object_id=obj.pk,
+        defaults=_document_fields(source, obj),
+    )
+    return document
+
+
+def _upsert_documents(documents: List[SearchDocument]) -> None:
+    # The FTS triggers fire on the update branch of the upsert as well.
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["source", "object_id"],
+        update_fields=["survey_version_id", "text_ar", "text_en", "normalized", "updated_at"],
+    )
+
+
+def index_queryset(source: str, queryset, batch_size: int = 500) -> int:
+    """Re-index every object in ``queryset``; used after ``QuerySet.update()``, which skips signals."""
+    count = 0
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        batch.append(SearchDocument(source=source, object_id=obj.pk, **_document_fields(source, obj)))
+        if len(batch) >= batch_size:
+            _upsert_documents(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        _upsert_documents(batch)
+        count += len(batch)
+    return count
+
+
+def remove_object(source: str, object_id: int) -> None:
+    SearchDocument.objects.filter(source=source, object_id=object_id).delete()
+
+
+def remove_objects(source: str, object_ids: Iterable[int]) -> None:
+    """``remove_object`` for many objects in one delete."""
+    SearchDocument.objects.filter(source=source, object_id__in=list(object_ids)).delete()
+
+
+def source_querysets():
+    """Map each SearchDocument source to the queryset of objects it indexes."""
+    from assessment_flow.models import AssessmentQuestion
+    from surveys.models import SurveyQuestion
+    from .models import Questions
+
+    return {
+        SearchDocument.Source.BANK: Questions.objects.only("id", "text_ar", "text_en"),
+        SearchDocument.Source.SURVEY: SurveyQuestion.objects.only("id", "text_ar", "text_en", "survey_version_id"),
+        SearchDocument.Source.ASSESSMENT: AssessmentQuestion.objects.only("id", "text_ar", "text_en"),
+    }
+
+
+def rebuild_index(batch_size: int = 1000, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Rebuild every SearchDocument from the source tables; ``progress(done, total)`` follows each batch."""
+    with transaction.atomic():
+        return _rebuild_index(batch_size, progress)
+
+
+def _rebuild_index(batch_size: int, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    SearchDocument.objects.all().delete()
+    querysets = source_querysets()
+    expected = sum(queryset.count() for queryset in querysets.values()) if progress else 0
+    total = 0
+
+    def write(batch):
+        nonlocal total
+        SearchDocument.objects.bulk_create(batch)
+        total += len(batch)
+        if progress:
+            progress(total, expected)
+
+    for source, queryset in querysets.items():
+        batch = []
+        for obj in queryset.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(SearchDocument(source=source, object_id=obj.pk, **_document_fields(source, obj)))
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+    if fts5_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+    return total
+
+
+# ----------------------------------------------------------------------
+# Querying
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class SearchHit:
+    document: SearchDocument
+    score: float
+
+    def as_dict(self) -> dict:
+        doc = self.document
+        return {
+            "id": doc.object_id,
+            "source": doc.source,
+            "survey_version_id": doc.survey_version_id,
+            "label_ar": doc.text_ar,
+            "label_en": doc.text_en,
+            "score": self.score,
+        }
+
+
+# The FTS table only appears or disappears through migrations; look it up once per database.
+_fts5_tables: Dict[tuple, bool] = {}
+
+
+def fts5_enabled() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    key = (connection.alias, connection.settings_dict["NAME"])
+    if key not in _fts5_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts5_tables[key] = cursor.fetchone() is not None
+    return _fts5_tables[key]
+
+
+def _fetch_ranked(rows) -> List[SearchHit]:
+    ids = [row[0] for row in rows]
+    documents = SearchDocument.objects.in_bulk(ids)
+    return [SearchHit(documents[row[0]], float(row[1])) for row in rows if row[0] in documents]
+
+
+def _filters_sql(sources: Optional[Iterable[str]], survey_version_id: Optional[int]):
+    clauses, params = [], []
+    if sources:
+        sources = list(sources)
+        clauses.append(f"d.source IN ({', '.join(['%s'] * len(sources))})")
+        params.extend(sources)
+    if survey_version_id is not None:
+        clauses.append("d.survey_version_id = %s")
+        params.append(survey_version_id)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def search(
+        query: str,
+        sources: Optional[Iterable[str]] = None,
+        survey_version_id: Optional[int] = None,
+        limit: int = 20,
+        match_any: bool = False,
+) -> List[SearchHit]:
+    """Return the best matching documents for ``query``.
+
+    Tokens are prefix-matched; every token must match unless ``match_any`` is
+    set, in which case any token matches and ranking favours documents that
+    share more of them.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    table = SearchDocument._meta.db_table
+    extra_sql, extra_params = _filters_sql(sources, survey_version_id)
+
+    if fts5_enabled():
+        match = (" OR " if match_any else " ").join(f'"{token}"*' for token in tokens)
+        sql = (
+            f"SELECT d.id, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} "
+            f'JOIN "{table}" d ON d.id = {FTS_TABLE}.rowid '
+            f"WHERE {FTS_TABLE} MATCH %s{extra_sql} ORDER BY rank LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *extra_params, limit])
+            # bm25 is lower-is-better; expose a higher-is-better score.
+            return [SearchHit(hit.document, -hit.score) for hit in _fetch_ranked(cursor.fetchall())]
+
+    if connection.vendor == "postgresql":
+        tsquery = (" | " if match_any else " & ").join(f"{token}:*" for token in tokens)
+        sql = (
+            "SELECT d.id, ts_rank(to_tsvector('simple', d.normalized), q) AS rank "
+            f'FROM "{table}" d, to_tsquery(\'simple\', %s) q '
+            f"WHERE to_tsvector('simple', d.normalized) @@ q{extra_sql} ORDER BY rank DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [tsquery, *extra_params, limit])
+            return _fetch_ranked(cursor.fetchall())
+
+    queryset = SearchDocument.objects.all()
+    if match_any:
+        any_token = Q()
+        for token in tokens:
+            any_token |= Q(normalized__icontains=token)
+        queryset = queryset.filter(any_token)
+    else:
+        for token in tokens:
+            queryset = queryset.filter(normalized__icontains=token)
+    if sources:
+        queryset = queryset.filter(source__in=list(sources))
+    if survey_version_id is not None:
+        queryset = queryset.filter(survey_version_id=survey_version_id)
+    return [SearchHit(document, 0.0) for document in queryset.order_by("id")[:limit]]
@@ -0,0 +1,107 @@
+from contextvars import ContextVar
+from typing import Dict, FrozenSet
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from assessment_flow.models import AssessmentQuestion
+from surveys.models import SurveyQuestion, SurveyVersion
+from .models import Questions, QuestionStaging, SearchDocument, TranslationMemoryEntry
+from . import translation_memory
+from .dedupe import index_question
+from .search import index_object, remove_object, remove_objects
+
+# Survey version id -> {model: ids} of the questions its delete cascades to,
+# whose documents were already removed in bulk.
+_version_deletes: ContextVar[Dict[int, Dict[type, FrozenSet[int]]]] = ContextVar("version_deletes", default={})
+
+
+def _deleted_with_version(model, pk) -> bool:
+    return any(pk in deleted.get(model, ()) for deleted in _version_deletes.get().values())
+
+
+def forget_version_questions(sender, instance, **kwargs):
+    """Remove the indexed rows of a deleted version's questions in one delete each.
+
+    The cascade would otherwise send ``post_delete`` (and run a delete) for
+    every survey and staged question of the version.
+    """
+    survey_question_ids = frozenset(
+        SurveyQuestion.objects.filter(survey_version=instance).values_list("pk", flat=True)
+    )
+    staged_ids = frozenset(QuestionStaging.objects.filter(
+        Q(survey_version=instance) | Q(survey_question_id__in=survey_question_ids)
+    ).values_list("pk", flat=True))
+    remove_objects(SearchDocument.Source.SURVEY, survey_question_ids)
+    translation_memory.forget_many(TranslationMemoryEntry.Source.SURVEY, survey_question_ids)
+    translation_memory.forget_many(TranslationMemoryEntry.Source.STAGING, staged_ids)
+    _version_deletes.set({
+        **_version_deletes.get(),
+        instance.pk: {SurveyQuestion: survey_question_ids, QuestionStaging: staged_ids},
+    })
+
+
+def version_deleted(sender, instance, **kwargs):
+    deletes = dict(_version_deletes.get())
+    deletes.pop(instance.pk, None)
+    _version_deletes.set(deletes)
+
+
+pre_delete.connect(forget_version_questions, sender=SurveyVersion, dispatch_uid="forget_version_questions")
+post_delete.connect(version_deleted, sender=SurveyVersion, dispatch_uid="version_deleted")
+
+
+SEARCH_SOURCES = {
+    Questions: SearchDocument.Source.BANK,
+    SurveyQuestion: SearchDocument.Source.SURVEY,
+    AssessmentQuestion: SearchDocument.Source.ASSESSMENT,
+}
+
+
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_object(SEARCH_SOURCES[sender], instance)
+
+
+def remove_search_document(sender, instance, **kwargs):
+    if _deleted_with_version(sender, instance.pk):
+        return
+    remove_object(SEARCH_SOURCES[sender], instance.pk)
+
+
+for model in SEARCH_SOURCES:
+    post_save.connect(index_search_document, sender=model, dispatch_uid=f"search_index_{model.__name__}")
+    post_delete.connect(remove_search_document, sender=model, dispatch_uid=f"search_remove_{model.__name__}")
+
+
+def index_question_signature(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_question(instance)
+
+
+post_save.connect(index_question_signature, sender=Questions, dispatch_uid="dedupe_index_Questions")
+
+
+MEMORY_SOURCES = {
+    Questions: TranslationMemoryEntry.Source.BANK,
+    SurveyQuestion: TranslationMemoryEntry.Source.SURVEY,
+    QuestionStaging: TranslationMemoryEntry.Source.STAGING,
+}
+
+
+def record_translation(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    translation_memory.record(MEMORY_SOURCES[sender], instance)
+
+
+def forget_translation(sender, instance, **kwargs):
+    if _deleted_with_version(sender, instance.pk):
+        return
+    translation_memory.forget(MEMORY_SOURCES[sender], instance.pk)
+
+
+for model in MEMORY_SOURCES:
+    post_save.connect(record_translation, sender=model, dispatch_uid=f"memory_record_{model.__name__}")
+    post_delete.connect(forget_translation, sender=model, dispatch_uid=f"memory_forget_{model.__name__}")
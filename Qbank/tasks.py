@@ -0,0 +1,29 @@
+"""Background job types for the question bank (see ``jobs.queue``)."""
+from jobs.queue import task
+
+from . import dedupe
+from . import search as question_search
+from . import translation_memory
+
+
+@task("qbank.rebuild_search_index")
+def rebuild_search_index(context, batch_size=1000):
+    context.progress(0, message="Rebuilding the search index")
+    return {"indexed": question_search.rebuild_index(batch_size=batch_size, progress=context.progress)}
+
+
+@task("qbank.rebuild_translation_memory")
+def rebuild_translation_memory(context, batch_size=1000):
+    context.progress(0, message="Rebuilding the translation memory")
+    return {"recorded": translation_memory.rebuild(batch_size=batch_size)}
+
+
+@task("qbank.dedupe_report")
+def dedupe_report(context, threshold=dedupe.DEFAULT_THRESHOLD, rebuild_index=False, processes=1):
+    steps = 2 if rebuild_index else 1
+    if rebuild_index:
+        context.progress(0, total=steps, message="Indexing questions")
+        dedupe.rebuild_index(processes=processes)
+    context.progress(steps - 1, total=steps, message="Comparing questions")
+    clusters = dedupe.dedupe_report(threshold=threshold, processes=processes)
+    return {"clusters": [cluster.question_ids for cluster in clusters]}
@@ -1,12 +1,21 @@
-from django.db import IntegrityError, transaction
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.translation import gettext as _, override
 
-from .models import ResponseGroup, QuestionStaging
+from .models import ResponseGroup, QuestionStaging, Questions, SearchDocument
+from .search import normalize_arabic, rebuild_index, search
+from . import dedupe, review, translation_memory
+from .models import TranslationMemoryEntry
 from surveys.models import Survey, SurveyVersion, SurveyQuestion
 from assessment_runs.models import AssessmentRun, AssessmentResult
+from jobs.models import Job
 import datetime
+import importlib
+
+from django.apps import apps
 
 
 class ResponseGroupConstraintTests(TestCase):
@@ -83,3 +92,399 @@ class PipelineViewTests(TestCase):
         self.assertContains(response, "Accreditation pipeline")
         self.assertContains(response, "Survey creation")
         self.assertContains(response, "Linguistic review")
+
+
+class QuestionSearchTests(TestCase):
+    def setUp(self):
+        self.family = Questions.objects.create(text_ar="كم عدد أفراد الأسرة؟", text_en="How many family members?")
+        self.income = Questions.objects.create(text_ar="ما هو دخل الأسرة الشهري؟", text_en="What is the monthly household income?")
+        Questions.objects.create(text_ar="هل تملك سيارة؟", text_en="Do you own a car?")
+
+    def test_normalize_arabic_unifies_letter_forms(self):
+        self.assertEqual(normalize_arabic("إِسْتِشَارَةٌ"), "استشاره")
+        self.assertEqual(normalize_arabic("مستشفى"), "مستشفي")
+        self.assertEqual(normalize_arabic("مـــدرسة"), "مدرسه")
+        self.assertEqual(normalize_arabic("سؤال ٣"), "سوال 3")
+        self.assertEqual(normalize_arabic("Hello, World!"), "hello world")
+
+    def test_search_matches_spelling_variants(self):
+        hits = search("اسرة")
+
+        self.assertEqual({hit.document.object_id for hit in hits}, {self.family.id, self.income.id})
+
+    def test_search_matches_prefix_and_english(self):
+        hits = search("house")
+
+        self.assertEqual([hit.document.object_id for hit in hits], [self.income.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.family.text_ar = "كم عدد الغرف؟"
+        self.family.save()
+        self.assertEqual([hit.document.object_id for hit in search("الغرف")], [self.family.id])
+        self.assertNotIn(self.family.id, [hit.document.object_id for hit in search("الأسرة")])
+
+        self.family.delete()
+        self.assertEqual(search("الغرف"), [])
+
+    def test_deleting_a_version_removes_its_documents_at_once(self):
+        survey = Survey.objects.create(name_ar="مسح", name_en="Survey", code="DEL")
+        version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+        questions = [
+            SurveyQuestion.objects.create(survey_version=version, text_ar=f"دخل الأسرة {index}") for index in range(20)
+        ]
+        questions[0].delete()
+        self.assertEqual(SearchDocument.objects.filter(source=SearchDocument.Source.SURVEY).count(), 19)
+
+        with CaptureQueriesContext(connection) as queries:
+            version.delete()
+
+        self.assertFalse(SearchDocument.objects.filter(source=SearchDocument.Source.SURVEY).exists())
+        deletes = [query for query in queries if query["sql"].startswith('DELETE FROM "Qbank_searchdocument"')]
+        self.assertEqual(len(deletes), 1)
+
+    def test_search_filters_by_source_and_version(self):
+        survey = Survey.objects.create(name_ar="مسح", name_en="Survey", code="SRCH")
+        version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+        survey_question = SurveyQuestion.objects.create(survey_version=version, text_ar="دخل الأسرة", text_en="Household income")
+
+        hits = search("دخل", sources=[SearchDocument.Source.SURVEY], survey_version_id=version.id)
+
+        self.assertEqual([hit.document.object_id for hit in hits], [survey_question.id])
+
+    def test_rebuild_index_restores_documents(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(search("سيارة"), [])
+
+        rebuild_index()
+
+        self.assertEqual(len(search("سيارة")), 1)
+
+    def test_admin_action_queues_an_index_rebuild(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "secret"))
+        response = self.client.post(reverse("admin:Qbank_questions_changelist"), {
+            "action": "queue_search_index_rebuild", "_selected_action": [self.family.pk],
+        }, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Job.objects.values_list("task", flat=True)), ["qbank.rebuild_search_index"])
+
+    def test_search_endpoint_returns_ranked_results(self):
+        response = Client().get(reverse('search_questions'), {'q': 'الاسره', 'source': 'bank', 'limit': 1})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertIn(results[0]['id'], {self.family.id, self.income.id})
+        self.assertEqual(results[0]['source'], 'bank')
+
+
+class NearDuplicateTests(TestCase):
+    def setUp(self):
+        self.original = Questions.objects.create(
+            text_ar="كم عدد أفراد الأسرة المقيمين في المسكن؟",
+            text_en="How many household members live in the dwelling?",
+        )
+        self.variant = Questions.objects.create(
+            text_ar="كم عدد افراد الاسرة المقيمين فى المسكن",
+            text_en="How many household members live in the dwelling",
+        )
+        self.unrelated = Questions.objects.create(
+            text_ar="هل تملك سيارة خاصة؟",
+            text_en="Do you own a private car?",
+        )
+
+    def test_signature_similarity_tracks_wording(self):
+        base = dedupe.minhash("كم عدد أفراد الأسرة المقيمين في المسكن؟")
+
+        self.assertEqual(len(base), dedupe.NUM_PERM)
+        self.assertEqual(dedupe.estimate_similarity(base, dedupe.minhash("كم عدد افراد الاسره المقيمين في المسكن")), 1.0)
+        self.assertLess(dedupe.estimate_similarity(base, dedupe.minhash("هل تملك سيارة خاصة؟")), 0.3)
+        self.assertEqual(dedupe.minhash("؟!"), [])
+
+    def test_saved_questions_are_bucketed(self):
+        self.assertEqual(self.original.lsh_buckets.count(), 2 * dedupe.BANDS)
+        self.assertEqual(len(self.original.signature.signature["ar"]), dedupe.NUM_PERM)
+
+    def test_similar_questions_finds_variants_only(self):
+        matches = dedupe.similar_questions("How many household members live in the dwelling?")
+
+        self.assertEqual({match.question.id for match in matches}, {self.original.id, self.variant.id})
+        self.assertEqual(dedupe.similar_questions("ما هو مستوى التعليم؟"), [])
+
+    def test_dedupe_report_clusters_variants(self):
+        for processes in (1, 2):
+            clusters = dedupe.dedupe_report(processes=processes, chunk_size=1)
+
+            self.assertEqual([cluster.question_ids for cluster in clusters], [[self.original.id, self.variant.id]])
+
+    def test_manual_initial_question_reports_possible_duplicates(self):
+        survey = Survey.objects.create(name_ar="مسح الأسر", name_en="Household survey", code="DUP")
+        version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+
+        with override("ar"):
+            response = Client().post(
+                reverse('submit_initial_questions'),
+                data={
+                    'version_id': version.id,
+                    'questions': [{'source': 'manual', 'label': "كم عدد أفراد الأسرة المقيمين في المسكن"}],
+                },
+                content_type='application/json',
+                HTTP_ACCEPT_LANGUAGE='ar',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        duplicates = response.json()['possible_duplicates']
+        self.assertEqual(len(duplicates), 1)
+        self.assertIn(self.original.id, [match['id'] for match in duplicates[0]['matches']])
+
+
+class TranslationMemoryTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(name_ar="مسح العمل", name_en="Labour survey", code="TM")
+        self.version = SurveyVersion.objects.create(survey=self.survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+        self.bank = Questions.objects.create(
+            text_ar="ما هي الحالة العملية للفرد؟",
+            text_en="What is the person's employment status?",
+        )
+
+    def stage(self, text_ar):
+        survey_question = SurveyQuestion.objects.create(survey_version=self.version, text_ar=text_ar, text_en="")
+        return QuestionStaging.objects.create(
+            text_ar=text_ar,
+            survey=self.survey,
+            survey_version=self.version,
+            survey_question=survey_question,
+            is_sent_for_translation=True,
+        )
+
+    def test_hash_is_computed_on_write_and_ignores_spelling_variants(self):
+        staged = self.stage("ما هى الحالة العمليّة للفرد")
+
+        self.assertEqual(staged.text_ar_hash, translation_memory.text_hash(self.bank.text_ar))
+        self.assertTrue(TranslationMemoryEntry.objects.filter(text_hash=staged.text_ar_hash, source="bank").exists())
+        self.assertFalse(TranslationMemoryEntry.objects.filter(source="staging").exists())
+
+    def test_suggestions_prefer_exact_then_fuzzy(self):
+        exact = self.stage("ما هي الحالة العملية للفرد")
+        fuzzy = self.stage("ما هي الحالة العملية لكل فرد؟")
+        unknown = self.stage("هل لديك حساب مصرفي؟")
+
+        suggestions = translation_memory.suggestions_for([exact, fuzzy, unknown])
+
+        self.assertEqual(suggestions[exact.id].kind, "exact")
+        self.assertEqual(suggestions[exact.id].text_en, self.bank.text_en)
+        self.assertEqual(suggestions[fuzzy.id].kind, "fuzzy")
+        self.assertNotIn(unknown.id, suggestions)
+
+    def test_translation_queue_prefills_suggestions(self):
+        staged = self.stage("ما هي الحالة العملية للفرد")
+
+        response = Client().get(reverse('translation_queue'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['exact_match_count'], 1)
+        self.assertContains(response, 'apply-memory-btn')
+        self.assertEqual(response.context['questions'][0].suggestion.text_en, self.bank.text_en)
+        self.assertEqual(response.context['questions'][0].id, staged.id)
+
+    def test_apply_exact_matches_updates_staging_and_survey_questions(self):
+        staged = self.stage("ما هي الحالة العملية للفرد")
+        untouched = self.stage("هل لديك حساب مصرفي؟")
+
+        response = Client().post(reverse('apply_translation_memory'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['applied_count'], 1)
+        staged.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(staged.text_en, self.bank.text_en)
+        self.assertEqual(untouched.text_en, "")
+        survey_question = SurveyQuestion.objects.get(survey_version=self.version, text_ar=staged.text_ar)
+        self.assertEqual(survey_question.text_en, self.bank.text_en)
+        self.assertTrue(TranslationMemoryEntry.objects.filter(source="staging", object_id=staged.id).exists())
+        self.assertTrue(TranslationMemoryEntry.objects.filter(source="survey", object_id=survey_question.id).exists())
+
+    def test_apply_exact_matches_does_not_query_per_question(self):
+        staged = [self.stage(f"ما هي الحالة العملية للفرد {index}") for index in range(10)]
+        for question in staged:
+            Questions.objects.create(text_ar=question.text_ar, text_en=f"Employment status {question.id}")
+
+        with self.assertNumQueries(11):
+            applied = translation_memory.apply_exact_matches(QuestionStaging.objects.all())
+
+        self.assertEqual(len(applied), 10)
+        self.assertEqual(TranslationMemoryEntry.objects.filter(source="survey").count(), 10)
+        self.assertEqual(SearchDocument.objects.filter(source="survey", text_en__startswith="Employment").count(), 10)
+
+    def test_deleting_a_version_forgets_its_questions_at_once(self):
+        for index in range(50):
+            staged = self.stage(f"سؤال رقم {index}")
+            staged.text_en = f"Question {index}"
+            staged.save()
+            SurveyQuestion.objects.filter(pk=staged.survey_question_id).update(text_en=staged.text_en)
+        translation_memory.record_queryset(TranslationMemoryEntry.Source.SURVEY, SurveyQuestion.objects.all())
+        self.assertEqual(TranslationMemoryEntry.objects.exclude(source="bank").count(), 100)
+
+        # Not one delete per cascaded question.
+        with self.assertNumQueries(21):
+            self.version.delete()
+
+        self.assertFalse(TranslationMemoryEntry.objects.exclude(source="bank").exists())
+        self.assertFalse(SearchDocument.objects.filter(source="survey").exists())
+
+    def test_saved_translation_is_remembered_for_later_questions(self):
+        first = self.stage("هل لديك حساب مصرفي؟")
+        Client().post(
+            reverse('save_translation'),
+            data={'id': first.id, 'text_en': "Do you have a bank account?"},
+            content_type='application/json',
+        )
+
+        later = self.stage("هل لديك حساب مصرفى")
+
+        suggestion = translation_memory.suggestions_for([later])[later.id]
+        self.assertEqual((suggestion.kind, suggestion.text_en), ("exact", "Do you have a bank account?"))
+
+    def test_rebuild_recreates_entries(self):
+        TranslationMemoryEntry.objects.all().delete()
+
+        self.assertEqual(translation_memory.rebuild(), 1)
+        self.assertEqual(TranslationMemoryEntry.objects.get().object_id, self.bank.id)
+
+
+class StagedQuestionLinkTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(name_ar="مسح الدخل", name_en="Income survey", code="LNK")
+        self.version = SurveyVersion.objects.create(survey=self.survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+        # Two identical wordings: text matching cannot tell them apart.
+        self.first = SurveyQuestion.objects.create(survey_version=self.version, text_ar="ما هو الدخل؟")
+        self.second = SurveyQuestion.objects.create(survey_version=self.version, text_ar="ما هو الدخل؟")
+        self.staged = QuestionStaging.objects.create(
+            text_ar="ما هو الدخل؟",
+            survey=self.survey,
+            survey_version=self.version,
+            survey_question=self.second,
+        )
+
+    def test_review_edit_updates_only_the_linked_question(self):
+        response = Client().post(
+            reverse('update_staged_question'),
+            data={'id': self.staged.id, 'text_ar': "ما هو الدخل الشهري؟"},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.json()['updated_count'], 1)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.text_ar, "ما هو الدخل؟")
+        self.assertEqual(self.second.text_ar, "ما هو الدخل الشهري؟")
+
+    def test_translation_updates_only_the_linked_question(self):
+        Client().post(
+            reverse('save_translation'),
+            data={'id': self.staged.id, 'text_en': "What is the income?"},
+            content_type='application/json',
+        )
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.text_en, "")
+        self.assertEqual(self.second.text_en, "What is the income?")
+
+    def test_deleting_survey_question_cascades_to_staging(self):
+        self.first.delete()
+        self.assertTrue(QuestionStaging.objects.filter(pk=self.staged.pk).exists())
+
+        self.second.delete()
+        self.assertFalse(QuestionStaging.objects.filter(pk=self.staged.pk).exists())
+
+    def test_backfill_links_each_survey_question_once(self):
+        QuestionStaging.objects.update(survey_question=None)
+        other = QuestionStaging.objects.create(text_ar="ما هو الدخل؟", survey=self.survey, survey_version=self.version)
+        migration = importlib.import_module('Qbank.migrations.0006_questionstaging_survey_question')
+
+        migration.link_staged_questions(apps, None)
+
+        self.staged.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            {self.staged.survey_question_id, other.survey_question_id},
+            {self.first.id, self.second.id},
+        )
+
+
+class BatchReviewTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(name_ar="مسح السكان", name_en="Population survey", code="BAT")
+        self.version = SurveyVersion.objects.create(survey=self.survey, interval=SurveyVersion.SurveyInterval.MONTHLY)
+        self.staged = []
+        for index in range(3):
+            survey_question = SurveyQuestion.objects.create(survey_version=self.version, text_ar=f"سؤال {index}")
+            self.staged.append(QuestionStaging.objects.create(
+                text_ar=f"سؤال {index}",
+                survey=self.survey,
+                survey_version=self.version,
+                survey_question=survey_question,
+            ))
+
+    def post(self, name, payload):
+        return Client().post(reverse(name), data=payload, content_type='application/json')
+
+    def test_batch_review_updates_all_items_and_reports_per_item_status(self):
+        items = [{'id': staged.id, 'text_ar': f"صياغة {staged.id}"} for staged in self.staged[:2]]
+        items.append({'id': 999999, 'text_ar': "مفقود"})
+        items.append({'text_ar': "بلا معرف"})
+
+        response = self.post('batch_update_staged_questions', {'items': items})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['updated_count'], 2)
+        statuses = {item['id']: item['status'] for item in data['results']}
+        self.assertEqual(statuses[999999], 'not_found')
+        self.assertEqual(statuses[None], 'error')
+        for staged in self.staged[:2]:
+            staged.refresh_from_db()
+            self.assertEqual(staged.text_ar, f"صياغة {staged.id}")
+            self.assertEqual(staged.text_ar_hash, translation_memory.text_hash(staged.text_ar))
+            self.assertEqual(SurveyQuestion.objects.get(pk=staged.survey_question_id).text_ar, staged.text_ar)
+        self.assertEqual(search("صياغة")[0].document.source, SearchDocument.Source.SURVEY)
+
+    def test_batch_send_to_translation_uses_single_update(self):
+        ids = [staged.id for staged in self.staged]
+
+        response = self.post('batch_send_to_translation', {'ids': ids + [999999]})
+
+        self.assertEqual(response.json()['updated_count'], 3)
+        self.assertEqual(QuestionStaging.objects.filter(is_sent_for_translation=True).count(), 3)
+        self.assertEqual(response.json()['results'][-1]['status'], 'not_found')
+
+    def test_batch_translations_feed_translation_memory(self):
+        items = [{'id': staged.id, 'text_en': f"Question {staged.id}"} for staged in self.staged]
+
+        response = self.post('batch_save_translations', {'items': items})
+
+        self.assertEqual(response.json()['updated_count'], 3)
+        for staged in self.staged:
+            self.assertEqual(SurveyQuestion.objects.get(pk=staged.survey_question_id).text_en, f"Question {staged.id}")
+        self.assertEqual(TranslationMemoryEntry.objects.filter(source="staging").count(), 3)
+        self.assertEqual(TranslationMemoryEntry.objects.filter(source="survey").count(), 3)
+
+    def test_malformed_batch_is_rejected(self):
+        self.assertEqual(self.post('batch_update_staged_questions', {'items': 'nope'}).status_code, 400)
+        too_many = [{'id': 1, 'text_ar': 'x'}] * (review.MAX_BATCH_SIZE + 1)
+        self.assertEqual(self.post('batch_save_translations', {'items': too_many}).status_code, 400)
+
+    def test_review_list_uses_keyset_pagination(self):
+        client = Client()
+        first = client.get(reverse('linguistic_review'))
+        self.assertIsNone(first.context['next_cursor'])
+
+        items, cursor = review.keyset_page(QuestionStaging.objects.all(), None, page_size=2)
+        self.assertEqual([item.id for item in items], [self.staged[2].id, self.staged[1].id])
+        rest, last_cursor = review.keyset_page(QuestionStaging.objects.all(), cursor, page_size=2)
+        self.assertEqual([item.id for item in rest], [self.staged[0].id])
+        self.assertIsNone(last_cursor)
+
+        response = client.get(reverse('linguistic_review'), {'after': cursor})
+        self.assertEqual([q.id for q in response.context['staged_questions']], [self.staged[0].id])
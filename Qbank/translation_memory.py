@@ -0,0 +1,295 @@
+"""
+Translation memory for the staging/translation queue.
+
+Every Arabic/English pair known to the system (bank questions, survey
+questions and translated staged questions) is kept as a
+``TranslationMemoryEntry`` keyed by the SHA-256 of its normalized Arabic
+text. The hash is computed on write, so an exact lookup for a whole page of
+the queue is one indexed ``IN`` query. Fuzzy suggestions reuse the full-text
+search index to find candidates and rank them by character similarity.
+"""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QuestionStaging, SearchDocument, TranslationMemoryEntry
+from .search import index_queryset, search, tokenize
+
+FUZZY_THRESHOLD = 0.8
+FUZZY_CANDIDATES = 20
+MAX_FUZZY_POOL = 500
+
+# Preferred origin when several entries share a hash: curated bank wording first.
+SOURCE_PRIORITY = {
+    TranslationMemoryEntry.Source.BANK: 0,
+    TranslationMemoryEntry.Source.SURVEY: 1,
+    TranslationMemoryEntry.Source.STAGING: 2,
+}
+
+
+def normalized_text(text: Optional[str]) -> str:
+    return " ".join(tokenize(text))
+
+
+def text_hash(text: Optional[str]) -> str:
+    """Hash of the normalized text; empty for text without any words."""
+    normalized = normalized_text(text)
+    if not normalized:
+        return ""
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+
+
+def record(source: str, obj) -> Optional[TranslationMemoryEntry]:
+    """Store ``obj`` as a translation pair, or drop its entry when it is not fully translated."""
+    text_ar = (obj.text_ar or "").strip()
+    text_en = (obj.text_en or "").strip()
+    digest = text_hash(text_ar)
+    if not digest or not text_en:
+        forget(source, obj.pk)
+        return None
+    entry, _ = TranslationMemoryEntry.objects.update_or_create(
+        source=source,
+        object_id=obj.pk,
+        defaults={"text_hash": digest, "text_ar": text_ar, "text_en": text_en},
+    )
+    return entry
+
+
+def record_many(source: str, objects: Iterable) -> None:
+    """``record`` for many objects: one upsert for the translated ones and one delete for the rest."""
+    entries, untranslated = [], []
+    for obj in objects:
+        text_ar = (obj.text_ar or "").strip()
+        text_en = (obj.text_en or "").strip()
+        digest = text_hash(text_ar)
+        if digest and text_en:
+            entries.append(TranslationMemoryEntry(
+                source=source, object_id=obj.pk, text_hash=digest, text_ar=text_ar, text_en=text_en,
+            ))
+        else:
+            untranslated.append(obj.pk)
+    if untranslated:
+        forget_many(source, untranslated)
+    if entries:
+        TranslationMemoryEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["source", "object_id"],
+            update_fields=["text_hash", "text_ar", "text_en", "updated_at"],
+        )
+
+
+def record_queryset(source: str, queryset, batch_size: int = 500) -> None:
+    """Re-record every object in ``queryset``; used after ``QuerySet.update()``, which skips signals."""
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            record_many(source, batch)
+            batch = []
+    if batch:
+        record_many(source, batch)
+
+
+def forget(source: str, object_id: int) -> None:
+    TranslationMemoryEntry.objects.filter(source=source, object_id=object_id).delete()
+
+
+def forget_many(source: str, object_ids: Iterable[int]) -> None:
+    """``forget`` for many objects in one delete."""
+    TranslationMemoryEntry.objects.filter(source=source, object_id__in=list(object_ids)).delete()
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Rebuild the memory from bank, survey and staged questions."""
+    from surveys.models import SurveyQuestion
+    from .models import Questions
+
+    sources = {
+        TranslationMemoryEntry.Source.BANK: Questions.objects.all(),
+        TranslationMemoryEntry.Source.SURVEY: SurveyQuestion.objects.all(),
+        TranslationMemoryEntry.Source.STAGING: QuestionStaging.objects.all(),
+    }
+    total = 0
+    with transaction.atomic():
+        TranslationMemoryEntry.objects.all().delete()
+        for source, queryset in sources.items():
+            entries = []
+            for text_ar, text_en, pk in queryset.exclude(text_en="").values_list("text_ar", "text_en", "pk").iterator():
+                digest = text_hash(text_ar)
+                if digest and text_en.strip():
+                    entries.append(TranslationMemoryEntry(
+                        source=source,
+                        object_id=pk,
+                        text_hash=digest,
+                        text_ar=text_ar.strip(),
+                        text_en=text_en.strip(),
+                    ))
+            TranslationMemoryEntry.objects.bulk_create(entries, batch_size=batch_size)
+            total += len(entries)
+    return total
+
+
+# ----------------------------------------------------------------------
+# Lookups
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class Suggestion:
+    text_ar: str
+    text_en: str
+    kind: str  # "exact" or "fuzzy"
+    score: float
+    source: str
+
+    def as_dict(self) -> dict:
+        return {
+            "text_ar": self.text_ar,
+            "text_en": self.text_en,
+            "kind": self.kind,
+            "score": round(self.score, 3),
+            "source": self.source,
+        }
+
+
+def exact_matches(hashes: Iterable[str]) -> Dict[str, TranslationMemoryEntry]:
+    """Best entry per hash, in one indexed query."""
+    hashes = {digest for digest in hashes if digest}
+    if not hashes:
+        return {}
+    best: Dict[str, TranslationMemoryEntry] = {}
+    for entry in TranslationMemoryEntry.objects.filter(text_hash__in=hashes).order_by("-updated_at"):
+        current = best.get(entry.text_hash)
+        if current is None or SOURCE_PRIORITY[entry.source] < SOURCE_PRIORITY[current.source]:
+            best[entry.text_hash] = entry
+    return best
+
+
+def fuzzy_matches_many(
+        texts: Iterable[str],
+        limit: int = 3,
+        threshold: float = FUZZY_THRESHOLD,
+) -> List[List[Suggestion]]:
+    """Fuzzy suggestions for each of ``texts``, from one search over all of them.
+
+    Candidates come from a single any-token search; each text then only scores
+    the ``FUZZY_CANDIDATES`` candidates sharing the most tokens with it.
+    """
+    texts = list(texts)
+    targets = [normalized_text(text) for text in texts]
+    tokens = sorted({token for target in targets for token in target.split()})
+    if not tokens:
+        return [[] for _ in texts]
+    hits = search(
+        " ".join(tokens),
+        sources=[SearchDocument.Source.BANK, SearchDocument.Source.SURVEY],
+        limit=min(FUZZY_CANDIDATES * len(texts), MAX_FUZZY_POOL),
+        match_any=True,
+    )
+    pool = []
+    for hit in hits:
+        document = hit.document
+        if document.text_en.strip():
+            normalized = normalized_text(document.text_ar)
+            pool.append((document, normalized, set(normalized.split())))
+
+    results = []
+    for target in targets:
+        target_tokens = set(target.split())
+        overlapping = [
+            (len(target_tokens & candidate_tokens), document, normalized)
+            for document, normalized, candidate_tokens in pool
+            if target_tokens & candidate_tokens
+        ]
+        overlapping.sort(key=lambda item: -item[0])
+        suggestions, seen = [], set()
+        for _, document, normalized in overlapping[:FUZZY_CANDIDATES]:
+            text_en = document.text_en.strip()
+            if text_en in seen:
+                continue
+            score = SequenceMatcher(None, target, normalized).ratio()
+            if score >= threshold:
+                seen.add(text_en)
+                suggestions.append(Suggestion(document.text_ar, text_en, "fuzzy", score, document.source))
+        suggestions.sort(key=lambda suggestion: -suggestion.score)
+        results.append(suggestions[:limit])
+    return results
+
+
+def fuzzy_matches(
+        text_ar: str,
+        limit: int = 3,
+        threshold: float = FUZZY_THRESHOLD,
+) -> List[Suggestion]:
+    """Translated questions whose Arabic wording is close to ``text_ar``."""
+    return fuzzy_matches_many([text_ar], limit=limit, threshold=threshold)[0]
+
+
+def suggestions_for(staged_questions: Iterable[QuestionStaging], fuzzy: bool = True) -> Dict[int, Suggestion]:
+    """Best suggestion per staged question id: an exact match if one exists, otherwise a fuzzy one."""
+    staged_questions = list(staged_questions)
+    exact = exact_matches(question.text_ar_hash for question in staged_questions)
+    suggestions, unmatched = {}, []
+    for question in staged_questions:
+        entry = exact.get(question.text_ar_hash)
+        if entry is not None:
+            suggestions[question.id] = Suggestion(entry.text_ar, entry.text_en, "exact", 1.0, entry.source)
+        elif fuzzy and question.text_ar:
+            unmatched.append(question)
+    if unmatched:
+        matches = fuzzy_matches_many((question.text_ar for question in unmatched), limit=1)
+        for question, found in zip(unmatched, matches):
+            if found:
+                suggestions[question.id] = found[0]
+    return suggestions
+
+
+def apply_exact_matches(queryset) -> List[QuestionStaging]:
+    """Fill in the English text of untranslated staged questions that have an exact match.
+
+    Staged questions and their linked survey questions are updated in one
+    transaction. Returns the updated staged questions.
+    """
+    from surveys.models import SurveyQuestion
+
+    with transaction.atomic():
+        pending = list(queryset.filter(text_en="").exclude(text_ar_hash="").select_for_update())
+        exact = exact_matches(question.text_ar_hash for question in pending)
+        applied = []
+        for question in pending:
+            entry = exact.get(question.text_ar_hash)
+            if entry is None:
+                continue
+            question.text_en = entry.text_en
+            applied.append(question)
+        linked = SurveyQuestion.objects.select_for_update().in_bulk(
+            [question.survey_question_id for question in applied if question.survey_question_id]
+        )
+        now = timezone.now()
+        survey_questions = []
+        for question in applied:
+            survey_question = linked.get(question.survey_question_id)
+            if survey_question is not None:
+                survey_question.text_en = question.text_en
+                survey_question.updated_at = now
+                survey_questions.append(survey_question)
+        QuestionStaging.objects.bulk_update(applied, ["text_en"])
+        SurveyQuestion.objects.bulk_update(survey_questions, ["text_en", "updated_at"])
+
+        # bulk_update() skips post_save; keep both indexes in step.
+        record_many(TranslationMemoryEntry.Source.STAGING, applied)
+        record_many(TranslationMemoryEntry.Source.SURVEY, survey_questions)
+        index_queryset(SearchDocument.Source.SURVEY, SurveyQuestion.objects.filter(id__in=linked))
+    return applied
@@ -5,7 +5,13 @@ urlpatterns = [
     path('linguistic-review/', views.linguistic_review, name='linguistic_review'),
     path('linguistic-review/update/', views.update_staged_question, name='update_staged_question'),
     path('linguistic-review/send-translation/', views.send_to_translation, name='send_to_translation'),
+    path('linguistic-review/batch/update/', views.batch_update_staged_questions, name='batch_update_staged_questions'),
+    path('linguistic-review/batch/send-translation/', views.batch_send_to_translation, name='batch_send_to_translation'),
     path('translation-queue/', views.translation_queue, name='translation_queue'),
     path('translation-queue/save/', views.save_translation, name='save_translation'),
+    path('translation-queue/batch/save/', views.batch_save_translations, name='batch_save_translations'),
+    path('translation-queue/apply-memory/', views.apply_translation_memory, name='apply_translation_memory'),
+    path('search/', views.search_questions, name='search_questions'),
+    path('similar/', views.similar_questions, name='similar_questions'),
     path('pipeline/', views.pipeline_overview, name='pipeline_overview'),
 ]
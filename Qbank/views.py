@@ -1,10 +1,14 @@
 import json
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.utils.translation import get_language, gettext_lazy as _
 
-from .models import QuestionStaging
+from .models import QuestionStaging, SearchDocument, TranslationMemoryEntry
+from . import dedupe, review
+from . import search as question_search
+from . import translation_memory
+from QuestionsBank.routers import read_only
 from surveys.models import SurveyQuestion, SurveyVersion
 from assessment_runs.models import AssessmentRun
 
@@ -14,12 +18,43 @@ def home(request):
 
 def linguistic_review(request):
     # Filter out questions that are already sent for translation
-    staged_questions = QuestionStaging.objects.filter(is_sent_for_translation=False).select_related('survey', 'survey_version').all().order_by('-created_at')
-    return render(request, 'Qbank/linguistic_review.html', {'staged_questions': staged_questions})
+    staged_questions, next_cursor = review.keyset_page(
+        QuestionStaging.objects.filter(is_sent_for_translation=False).select_related('survey', 'survey_version'),
+        request.GET.get('after'),
+    )
+    return render(request, 'Qbank/linguistic_review.html', {
+        'staged_questions': staged_questions,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+    })
+
+def _update_linked_survey_question(staged_question, **fields):
+    """Mirror a staged edit onto its survey question with a keyed UPDATE."""
+    if not staged_question.survey_question_id:
+        return 0
+    survey_questions = SurveyQuestion.objects.filter(pk=staged_question.survey_question_id)
+    count = survey_questions.update(**fields)
+    # update() skips post_save, so refresh the indexes for the edited row.
+    question_search.index_queryset(SearchDocument.Source.SURVEY, survey_questions)
+    translation_memory.record_queryset(TranslationMemoryEntry.Source.SURVEY, survey_questions)
+    return count
+
 
 def translation_queue(request):
-    questions_for_translation = QuestionStaging.objects.filter(is_sent_for_translation=True).select_related('survey', 'survey_version').order_by('-created_at')
-    return render(request, 'Qbank/translation_queue.html', {'questions': questions_for_translation})
+    questions_for_translation, next_cursor = review.keyset_page(
+        QuestionStaging.objects.filter(is_sent_for_translation=True).select_related('survey', 'survey_version'),
+        request.GET.get('after'),
+    )
+    # Pre-fill suggestions from the translation memory for questions still missing English text
+    suggestions = translation_memory.suggestions_for(q for q in questions_for_translation if not q.text_en)
+    for question in questions_for_translation:
+        question.suggestion = suggestions.get(question.id)
+    return render(request, 'Qbank/translation_queue.html', {
+        'questions': questions_for_translation,
+        'exact_match_count': sum(1 for s in suggestions.values() if s.kind == 'exact'),
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+    })
 
 @require_POST
 def update_staged_question(request):
@@ -33,34 +68,12 @@ def update_staged_question(request):
             
         staged_question = get_object_or_404(QuestionStaging, pk=question_id)
         
-        # Store old text to find the matching SurveyQuestion
-        old_text_ar = staged_question.text_ar
-        old_text_en = staged_question.text_en
-        
         # 1. Update Question Staging
         staged_question.text_ar = text_ar
         staged_question.save()
         
-        # 2. Update Survey Question in the survey version
-        # We try to find the SurveyQuestion that matches the OLD state of the staged question
-        # We filter by survey_version AND the old text to ensure we target the correct question instance
-        
-        # Try exact match first
-        survey_questions = SurveyQuestion.objects.filter(
-            survey_version=staged_question.survey_version,
-            text_ar=old_text_ar,
-            text_en=old_text_en
-        )
-        
-        count = survey_questions.update(text_ar=text_ar)
-        
-        # Fallback: If no exact match (maybe text_en was None vs empty string), try matching just text_ar
-        if count == 0:
-             survey_questions = SurveyQuestion.objects.filter(
-                survey_version=staged_question.survey_version,
-                text_ar=old_text_ar
-            )
-             count = survey_questions.update(text_ar=text_ar)
+        # 2. Update the linked Survey Question through its key
+        count = _update_linked_survey_question(staged_question, text_ar=text_ar)
 
         return JsonResponse({'status': 'success', 'updated_count': count})
         
@@ -97,31 +110,12 @@ def save_translation(request):
             
         staged_question = get_object_or_404(QuestionStaging, pk=question_id)
         
-        # Store old text to find the matching SurveyQuestion
-        old_text_ar = staged_question.text_ar
-        old_text_en = staged_question.text_en
-        
         # 1. Update Question Staging
         staged_question.text_en = text_en
         staged_question.save()
         
-        # 2. Update Survey Question in the survey version
-        # Try exact match first
-        survey_questions = SurveyQuestion.objects.filter(
-            survey_version=staged_question.survey_version,
-            text_ar=old_text_ar,
-            text_en=old_text_en
-        )
-        
-        count = survey_questions.update(text_en=text_en)
-        
-        # Fallback: If no exact match, try matching just text_ar (assuming AR is correct/unique enough in context)
-        if count == 0:
-             survey_questions = SurveyQuestion.objects.filter(
-                survey_version=staged_question.survey_version,
-                text_ar=old_text_ar
-            )
-             count = survey_questions.update(text_en=text_en)
+        # 2. Update the linked Survey Question through its key
+        count = _update_linked_survey_question(staged_question, text_en=text_en)
 
         return JsonResponse({'status': 'success', 'updated_count': count})
         
@@ -129,6 +123,87 @@ def save_translation(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
+def _batch_response(handler, payload_key, request):
+    try:
+        data = json.loads(request.body)
+        results = handler(data.get(payload_key))
+    except (ValueError, AttributeError, review.BatchError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    return JsonResponse({
+        'status': 'success',
+        'updated_count': sum(1 for item in results if item['status'] == 'ok'),
+        'results': results,
+    })
+
+
+@require_POST
+def batch_update_staged_questions(request):
+    """Apply many review edits (``{"items": [{"id", "text_ar"}]}``) in one transaction."""
+    return _batch_response(review.update_staged_questions, 'items', request)
+
+
+@require_POST
+def batch_send_to_translation(request):
+    """Send many staged questions (``{"ids": [...]}``) to translation in one UPDATE."""
+    return _batch_response(review.send_to_translation, 'ids', request)
+
+
+@require_POST
+def batch_save_translations(request):
+    """Apply many translations (``{"items": [{"id", "text_en"}]}``) in one transaction."""
+    return _batch_response(review.save_translations, 'items', request)
+
+
+@require_POST
+def apply_translation_memory(request):
+    """Apply every exact translation-memory match in the queue in one transaction."""
+    try:
+        applied = translation_memory.apply_exact_matches(
+            QuestionStaging.objects.filter(is_sent_for_translation=True)
+        )
+        return JsonResponse({
+            'status': 'success',
+            'applied_count': len(applied),
+            'items': [{'id': question.id, 'text_en': question.text_en} for question in applied],
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+SEARCH_MAX_LIMIT = 100
+
+
+@require_GET
+def search_questions(request):
+    """Ranked full-text search across the bank, survey and assessment questions."""
+    query = request.GET.get('q', '').strip()
+    sources = [s for s in request.GET.getlist('source') if s in SearchDocument.Source.values]
+    try:
+        limit = min(int(request.GET.get('limit', 20)), SEARCH_MAX_LIMIT)
+        version_id = int(request.GET['version_id']) if request.GET.get('version_id') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid limit or version_id'}, status=400)
+
+    hits = question_search.search(query, sources=sources, survey_version_id=version_id, limit=max(limit, 1))
+    return JsonResponse({'status': 'success', 'results': [hit.as_dict() for hit in hits]})
+
+
+@require_GET
+def similar_questions(request):
+    """Existing bank questions that look like a near-duplicate of ``text``."""
+    text = request.GET.get('text', '').strip()
+    try:
+        threshold = float(request.GET.get('threshold', dedupe.DEFAULT_THRESHOLD))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid threshold'}, status=400)
+
+    matches = dedupe.similar_questions(text, threshold=threshold) if text else []
+    return JsonResponse({'status': 'success', 'results': [match.as_dict() for match in matches]})
+
+
+@read_only
 def pipeline_overview(request):
     """Render the pipeline overview page describing the survey processing paths."""
 
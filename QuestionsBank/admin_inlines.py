@@ -0,0 +1,32 @@
+"""
+Inlines that show one page of related rows.
+
+A change page with an ordinary inline renders every related row; for an
+assessment run or a survey version that is thousands of rows, each with
+its own form. ``PaginatedInlineMixin`` limits the inline to ``per_page``
+rows and adds previous/next links driven by a ``<prefix>_page`` query
+parameter. Saving posts back to the same URL, so the formset is rebuilt
+from the same page.
+"""
+from django.core.paginator import Paginator
+
+
+class PaginatedInlineMixin:
+    per_page = 25
+    template = "admin/edit_inline/tabular_paginated.html"
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        per_page = self.per_page
+        page_param = f"{formset.get_default_prefix()}_page"
+        page_number = request.GET.get(page_param, 1)
+
+        class PaginatedFormSet(formset):
+            def get_queryset(self):
+                if not hasattr(self, "page"):
+                    self.page = Paginator(super().get_queryset(), per_page).get_page(page_number)
+                return self.page.object_list
+
+        PaginatedFormSet.page_param = page_param
+        PaginatedFormSet.__name__ = formset.__name__
+        return PaginatedFormSet
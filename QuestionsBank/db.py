@@ -0,0 +1,142 @@
+"""
+Environment-driven database profiles.
+
+``DJANGO_DB_PROFILE`` picks one of:
+
+``sqlite`` (default)
+    The project database file, tuned for concurrent assessors: WAL so
+    readers never wait for the writer, ``synchronous=NORMAL`` (durable at
+    every checkpoint, no fsync per commit), a busy timeout instead of
+    immediate "database is locked" errors, memory-mapped reads and a larger
+    page cache. Transactions start ``IMMEDIATE`` so a transaction that will
+    write takes the write lock up front instead of failing on the upgrade
+    from a read lock, which the busy timeout cannot retry.
+``sqlite-default``
+    The same file with SQLite's defaults, kept as a benchmark baseline.
+``postgres``
+    PostgreSQL through psycopg 3. With ``DJANGO_DB_POOL`` (default on) each
+    worker keeps a psycopg connection pool; without it connections persist
+    for ``DJANGO_DB_CONN_MAX_AGE`` seconds with health checks. Django does not
+    allow both at once.
+
+The pragmas are applied by Django's ``init_command`` option, which runs on
+every new SQLite connection.
+
+``DJANGO_DB_REPLICA_NAME`` adds a ``replica`` alias of the same profile for
+read-only pages (see ``QuestionsBank/routers.py``): a second SQLite file,
+kept current by ``sync_replica``, or a PostgreSQL standby. The other
+``DJANGO_DB_REPLICA_*`` variables override the primary's host, port, user and
+password for it.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Mapping, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+PROFILES = ("sqlite", "sqlite-default", "postgres")
+
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+# Negative cache_size is in KiB: 64 MiB instead of SQLite's 2 MiB default.
+SQLITE_CACHE_KIB = 64 * 1024
+
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    return value.lower() in {"1", "true", "yes", "on"}
+
+
+def _int(environ: Mapping[str, str], key: str, default: int) -> int:
+    value = environ.get(key)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ImproperlyConfigured(f"{key} must be an integer, got {value!r}") from exc
+
+
+def sqlite_pragmas(busy_timeout_ms: int, mmap_size: int, cache_kib: int) -> str:
+    return ";".join([
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={busy_timeout_ms}",
+        f"PRAGMA mmap_size={mmap_size}",
+        f"PRAGMA cache_size=-{cache_kib}",
+        "PRAGMA temp_store=MEMORY",
+    ])
+
+
+def sqlite_database(name, tuned: bool = True, environ: Mapping[str, str] = os.environ) -> dict:
+    database = {"ENGINE": "django.db.backends.sqlite3", "NAME": name}
+    if tuned:
+        busy_timeout_ms = _int(environ, "DJANGO_SQLITE_BUSY_TIMEOUT_MS", SQLITE_BUSY_TIMEOUT_MS)
+        database["OPTIONS"] = {
+            "init_command": sqlite_pragmas(
+                busy_timeout_ms,
+                _int(environ, "DJANGO_SQLITE_MMAP_SIZE", SQLITE_MMAP_SIZE),
+                _int(environ, "DJANGO_SQLITE_CACHE_KIB", SQLITE_CACHE_KIB),
+            ),
+            "transaction_mode": "IMMEDIATE",
+            # The sqlite3 module's own busy handler, in seconds.
+            "timeout": busy_timeout_ms / 1000,
+        }
+    return database
+
+
+def postgres_database(environ: Mapping[str, str] = os.environ) -> dict:
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": environ.get("DJANGO_DB_NAME", "questionsbank"),
+        "USER": environ.get("DJANGO_DB_USER", ""),
+        "PASSWORD": environ.get("DJANGO_DB_PASSWORD", ""),
+        "HOST": environ.get("DJANGO_DB_HOST", ""),
+        "PORT": environ.get("DJANGO_DB_PORT", ""),
+        "OPTIONS": {},
+    }
+    if _flag(environ.get("DJANGO_DB_POOL"), True):
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"]["pool"] = {
+            "min_size": _int(environ, "DJANGO_DB_POOL_MIN_SIZE", 2),
+            "max_size": _int(environ, "DJANGO_DB_POOL_MAX_SIZE", 10),
+            "timeout": _int(environ, "DJANGO_DB_POOL_TIMEOUT", 10),
+        }
+    else:
+        database["CONN_MAX_AGE"] = _int(environ, "DJANGO_DB_CONN_MAX_AGE", 60)
+        database["CONN_HEALTH_CHECKS"] = True
+    return database
+
+
+def replica_from_env(base_dir: Path, environ: Mapping[str, str] = os.environ) -> Optional[dict]:
+    """The ``replica`` database, or ``None`` when ``DJANGO_DB_REPLICA_NAME`` is unset."""
+    name = environ.get("DJANGO_DB_REPLICA_NAME")
+    if not name:
+        return None
+    overrides = {"DJANGO_DB_NAME": name}
+    for key in ("HOST", "PORT", "USER", "PASSWORD"):
+        if environ.get(f"DJANGO_DB_REPLICA_{key}"):
+            overrides[f"DJANGO_DB_{key}"] = environ[f"DJANGO_DB_REPLICA_{key}"]
+    database = database_from_env(base_dir, {**environ, **overrides})
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        # Only sync_replica writes to the copy.
+        options = database.setdefault("OPTIONS", {})
+        options["init_command"] = ";".join(filter(None, [options.get("init_command"), "PRAGMA query_only=ON"]))
+    # Tests run against the primary's test database through this alias.
+    database["TEST"] = {"MIRROR": DEFAULT_DB_ALIAS}
+    return database
+
+
+def database_from_env(base_dir: Path, environ: Mapping[str, str] = os.environ) -> dict:
+    """The ``default`` database for ``DJANGO_DB_PROFILE``."""
+    profile = environ.get("DJANGO_DB_PROFILE", "sqlite")
+    if profile == "postgres":
+        return postgres_database(environ)
+    if profile in ("sqlite", "sqlite-default"):
+        name = environ.get("DJANGO_DB_NAME") or base_dir / "db.sqlite3"
+        return sqlite_database(name, tuned=profile == "sqlite", environ=environ)
+    raise ImproperlyConfigured(f"DJANGO_DB_PROFILE must be one of {', '.join(PROFILES)}, got {profile!r}")
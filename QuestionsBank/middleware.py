@@ -0,0 +1,65 @@
+import logging
+
+from django.conf import settings
+
+from . import routers
+from .query_budget import record_queries
+
+log = logging.getLogger("QuestionsBank.queries")
+
+
+class QueryInstrumentationMiddleware:
+    """Record the queries of each request and report them.
+
+    Enabled by ``QUERY_INSTRUMENTATION`` (defaults to ``DEBUG``). The report
+    is attached as ``request.query_report``; N+1 patterns are logged, and in
+    debug the totals are exposed through a ``Server-Timing`` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", settings.DEBUG):
+            return self.get_response(request)
+
+        with record_queries() as report:
+            response = self.get_response(request)
+        request.query_report = report
+
+        patterns = report.n_plus_one()
+        if patterns:
+            log.warning(
+                "N+1 query pattern on %s %s: %s",
+                request.method, request.path, report.describe(),
+            )
+        if settings.DEBUG:
+            existing = response.get("Server-Timing")
+            timing = report.server_timing()
+            response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """Keep a client on the primary database for a while after it writes.
+
+    Installed when a replica is configured (see ``QuestionsBank/routers.py``).
+    Unsafe methods and requests that wrote set a short-lived cookie; while it
+    is present, ``read_only`` views read from the primary too, so a client
+    always sees its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in routers.SAFE_METHODS
+        with routers.request_state(pinned=unsafe or routers.PIN_COOKIE in request.COOKIES) as state:
+            response = self.get_response(request)
+        if unsafe or state.wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE, "1",
+                max_age=getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10),
+                httponly=True, samesite="Lax",
+            )
+        return response
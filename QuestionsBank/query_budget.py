@@ -0,0 +1,169 @@
+"""
+Per-request query instrumentation.
+
+``QueryRecorder`` is a database execute wrapper that keeps the SQL and
+duration of every query run while it is installed. ``QueryReport`` summarizes
+a recording: the query count, total and write database time, lock errors,
+queries repeated with the same parameters (duplicates) and query shapes
+repeated many times with different parameters, which is how an N+1 loop
+shows up.
+
+``QueryInstrumentationMiddleware`` (``QuestionsBank.middleware``) records
+every request with it; ``QueryBudgetMixin`` gives tests an
+``assertQueryBudget`` context manager that fails with the same report.
+"""
+from __future__ import annotations
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Tuple
+
+from django.db import connections
+
+# A query shape repeated this many times within one request is reported as N+1.
+N_PLUS_ONE_THRESHOLD = 5
+
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def query_signature(sql: str) -> str:
+    """The shape of ``sql``: literals and ``IN`` lists collapsed, whitespace normalized."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@dataclass
+class QueryRecord:
+    alias: str
+    sql: str
+    params: tuple
+    duration: float
+    error: str = ""
+
+    @property
+    def signature(self) -> str:
+        return query_signature(self.sql)
+
+    @property
+    def is_write(self) -> bool:
+        return self.sql.lstrip().upper().startswith(_WRITE_PREFIXES)
+
+    @property
+    def is_lock_error(self) -> bool:
+        # SQLite reports a busy timeout as "database is locked" / "database table is locked".
+        return "is locked" in self.error
+
+
+class QueryRecorder:
+    """Execute wrapper collecting a ``QueryRecord`` per query."""
+
+    def __init__(self, alias: str = "default", queries: List[QueryRecord] = None):
+        self.alias = alias
+        self.queries = queries if queries is not None else []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        error = ""
+        try:
+            return execute(sql, params, many, context)
+        except Exception as exc:
+            error = str(exc)
+            raise
+        finally:
+            try:
+                frozen = tuple(params) if params is not None and not many else ()
+                hash(frozen)
+            except TypeError:
+                frozen = (repr(params),)
+            self.queries.append(QueryRecord(self.alias, sql, frozen, time.perf_counter() - start, error))
+
+
+@dataclass
+class QueryReport:
+    queries: List[QueryRecord] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        """Total database time in seconds."""
+        return sum(query.duration for query in self.queries)
+
+    @property
+    def write_time(self) -> float:
+        """Seconds spent in INSERT/UPDATE/DELETE; on SQLite this includes waiting for the write lock."""
+        return sum(query.duration for query in self.queries if query.is_write)
+
+    @property
+    def lock_errors(self) -> int:
+        return sum(1 for query in self.queries if query.is_lock_error)
+
+    def duplicates(self) -> List[Tuple[str, int]]:
+        """``(sql, count)`` for statements run more than once with identical parameters."""
+        counts = Counter((query.sql, query.params) for query in self.queries)
+        return [(sql, count) for (sql, _), count in counts.most_common() if count > 1]
+
+    def n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """``(signature, count)`` for query shapes repeated at least ``threshold`` times."""
+        counts = Counter(query.signature for query in self.queries)
+        return [(signature, count) for signature, count in counts.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        """Value for a ``Server-Timing`` header."""
+        metrics = [f'db;dur={self.total_time * 1000:.2f};desc="{self.count} queries"']
+        if any(query.is_write for query in self.queries):
+            metrics.append(f"db-write;dur={self.write_time * 1000:.2f}")
+        if self.lock_errors:
+            metrics.append(f'db-lock;desc="{self.lock_errors} locked"')
+        duplicates = sum(count - 1 for _, count in self.duplicates())
+        if duplicates:
+            metrics.append(f'db-dup;desc="{duplicates} duplicate"')
+        patterns = self.n_plus_one()
+        if patterns:
+            metrics.append(f'db-n1;desc="{len(patterns)} repeated shapes"')
+        return ", ".join(metrics)
+
+    def describe(self, limit: int = 5) -> str:
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f} ms"]
+        for signature, count in self.n_plus_one()[:limit]:
+            lines.append(f"  N+1 x{count}: {signature[:200]}")
+        for sql, count in self.duplicates()[:limit]:
+            lines.append(f"  duplicate x{count}: {sql[:200]}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def record_queries(using=None) -> Iterator[QueryReport]:
+    """Record the queries run on every connection (or only ``using``) inside the block."""
+    report = QueryReport()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(QueryRecorder(alias, report.queries)))
+        yield report
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for pinning how many queries a block of code may run."""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries: int, allow_n_plus_one: bool = False):
+        with record_queries() as report:
+            yield report
+        if report.count > max_queries:
+            self.fail(f"Query budget of {max_queries} exceeded: {report.describe()}")
+        if not allow_n_plus_one and report.n_plus_one():
+            self.fail(f"N+1 query pattern detected: {report.describe()}")
@@ -0,0 +1,200 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary (``default``). Reads go to the replica
+alias (``DATABASE_REPLICA_ALIAS``) only where it is safe to serve slightly
+stale data: inside a view decorated with ``read_only`` or a ``use_replica()``
+block. Everything else, including every read in the assessment flow, stays
+on the primary, and so do the builders of ``TieredCache`` entries, which
+``use_primary()`` takes back out of a read-only block: an entry outlives the
+request, so a lagging replica's data would be served for its whole timeout.
+
+Two guards keep read-your-writes consistency:
+
+* ``ReplicaPinningMiddleware`` pins a browser to the primary for
+  ``DATABASE_REPLICA_PIN_SECONDS`` after a request that wrote, so the page
+  shown after a save never comes from a replica that has not caught up.
+* Before routing a read to the replica, its lag is checked (at most every
+  ``DATABASE_REPLICA_LAG_CHECK_SECONDS`` per process). A replica more than
+  ``DATABASE_REPLICA_MAX_LAG`` seconds behind, or whose lag cannot be
+  measured, is skipped.
+
+On PostgreSQL the lag is the age of the last replayed transaction. Two
+SQLite files work for local testing: ``sync_replica`` copies the primary
+into the replica file with SQLite's backup API and stamps the copy time
+into the replica's ``user_version``, which is read back as its lag.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Written on every request, so reading them from a replica would lose updates.
+PRIMARY_ONLY_APPS = frozenset({"sessions"})
+
+PIN_COOKIE = "db_pinned"
+
+
+class RequestState:
+    """Routing state of the current request, set by ``ReplicaPinningMiddleware``."""
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_request_state: ContextVar[Optional[RequestState]] = ContextVar("db_request_state", default=None)
+_read_only: ContextVar[bool] = ContextVar("db_read_only", default=False)
+
+
+@contextmanager
+def request_state(pinned: bool = False) -> Iterator[RequestState]:
+    state = RequestState(pinned=pinned)
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+@contextmanager
+def use_replica() -> Iterator[None]:
+    """Allow reads in this block to be served by the replica."""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Send reads in this block to the primary, even inside a ``use_replica()`` block."""
+    token = _read_only.set(False)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def read_only(view):
+    """Serve a view's reads from the replica when it is fresh and the client is not pinned."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def replica_lag(alias: str) -> Optional[float]:
+    """Seconds the replica is behind the primary, or ``None`` when it cannot be told."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+                lag = cursor.fetchone()[0]
+                return None if lag is None else max(float(lag), 0.0)
+            if connection.vendor == "sqlite":
+                cursor.execute("PRAGMA user_version")
+                synced_at = cursor.fetchone()[0]
+                return max(time.time() - synced_at, 0.0) if synced_at else None
+    except DatabaseError:
+        return None
+    return None
+
+
+class _LagCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked: Dict[str, Tuple[float, Optional[float]]] = {}
+
+    def get(self, alias: str, max_age: float) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._checked.get(alias)
+            if entry is not None and now - entry[0] < max_age:
+                return entry[1]
+        lag = replica_lag(alias)
+        with self._lock:
+            self._checked[alias] = (now, lag)
+        return lag
+
+    def clear(self) -> None:
+        with self._lock:
+            self._checked.clear()
+
+
+lag_cache = _LagCache()
+
+
+def replica_is_fresh(alias: str) -> bool:
+    lag = lag_cache.get(alias, getattr(settings, "DATABASE_REPLICA_LAG_CHECK_SECONDS", 1.0))
+    return lag is not None and lag <= getattr(settings, "DATABASE_REPLICA_MAX_LAG", 5.0)
+
+
+class PrimaryReplicaRouter:
+    """Route writes to the primary and read-only reads to a fresh replica."""
+
+    def __init__(self, primary: str = DEFAULT_DB_ALIAS, replica: Optional[str] = None):
+        self.primary = primary
+        self.replica = replica or getattr(settings, "DATABASE_REPLICA_ALIAS", None)
+
+    def db_for_read(self, model, **hints):
+        if not self.replica or model._meta.app_label in PRIMARY_ONLY_APPS or not _read_only.get():
+            return self.primary
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return self.primary
+        return self.replica if replica_is_fresh(self.replica) else self.primary
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            state.wrote = True
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        databases = {self.primary, self.replica}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == self.primary
+
+
+def sync_sqlite_replica(primary_path: str, replica_path: str) -> float:
+    """Copy a SQLite primary into its replica file and stamp the copy time; returns it."""
+    synced_at = int(time.time())
+    source = sqlite3.connect(primary_path)
+    try:
+        target = sqlite3.connect(replica_path)
+        try:
+            source.backup(target)
+            target.execute(f"PRAGMA user_version={synced_at}")
+            target.commit()
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return synced_at
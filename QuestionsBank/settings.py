@@ -15,6 +15,8 @@ from pathlib import Path
 
 from django.utils.translation import gettext_lazy as _
 
+from QuestionsBank.db import database_from_env, replica_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
     'assessment_runs.apps.AssessmentRunsConfig',
     'Qbank.apps.QbankConfig',
     'Rbank.apps.RbankConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -58,6 +61,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query counting, N+1 detection and Server-Timing (see QuestionsBank/middleware.py).
+QUERY_INSTRUMENTATION = os.environ.get("DJANGO_QUERY_INSTRUMENTATION", str(DEBUG)).lower() in {"1", "true", "yes"}
+if QUERY_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'QuestionsBank.middleware.QueryInstrumentationMiddleware')
+
 ROOT_URLCONF = 'QuestionsBank.urls'
 
 TEMPLATES = [
@@ -79,14 +87,32 @@ WSGI_APPLICATION = 'QuestionsBank.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DJANGO_DB_PROFILE selects tuned SQLite (default), untuned SQLite or PostgreSQL; see QuestionsBank/db.py.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
+# Optional read replica (DJANGO_DB_REPLICA_NAME): read_only views and exports read from it while it is
+# at most DATABASE_REPLICA_MAX_LAG seconds behind; clients stay on the primary for
+# DATABASE_REPLICA_PIN_SECONDS after a write. See QuestionsBank/routers.py.
+DATABASE_REPLICA = replica_from_env(BASE_DIR)
+DATABASE_REPLICA_ALIAS = 'replica' if DATABASE_REPLICA else None
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DJANGO_DB_REPLICA_MAX_LAG', '5'))
+DATABASE_REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('DJANGO_DB_REPLICA_LAG_CHECK_SECONDS', '1'))
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_DB_REPLICA_PIN_SECONDS', '10'))
+if DATABASE_REPLICA:
+    DATABASES[DATABASE_REPLICA_ALIAS] = DATABASE_REPLICA
+    DATABASE_ROUTERS = ['QuestionsBank.routers.PrimaryReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+        'QuestionsBank.middleware.ReplicaPinningMiddleware',
+    )
+
+# Sessions are written on every assessment step; a cache-backed engine such as
+# django.contrib.sessions.backends.cached_db saves the reads.
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,6 +155,62 @@ LOCALE_PATHS = [BASE_DIR / 'locale']
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Uploaded files (assessment evidence)
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Offload assessment file downloads to the web server: 'nginx' (X-Accel-Redirect),
+# 'apache' (X-Sendfile) or '' to stream from Django.
+ASSESSMENT_FILES_SENDFILE_BACKEND = os.environ.get('ASSESSMENT_FILES_SENDFILE_BACKEND', '')
+ASSESSMENT_FILES_SENDFILE_PREFIX = os.environ.get('ASSESSMENT_FILES_SENDFILE_PREFIX', '/protected/')
+
+# Resumable uploads: default and maximum chunk size, and maximum file size, in bytes.
+ASSESSMENT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+ASSESSMENT_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+ASSESSMENT_UPLOAD_MAX_SIZE = int(os.environ.get('ASSESSMENT_UPLOAD_MAX_SIZE', str(1024 * 1024 * 1024)))
+
+# Cache: per-process memory by default; point DJANGO_CACHE_BACKEND/LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Tiered cache (QuestionsBank/tiered_cache.py): a per-process LRU in front of the shared cache above.
+# For several workers point DJANGO_CACHE_BACKEND at django.core.cache.backends.filebased.FileBasedCache
+# (LOCATION: a directory) or a Redis-compatible server; locmem stands in for it in development and tests.
+TIERED_CACHE_ALIAS = 'default'
+TIERED_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('TIERED_CACHE_LOCAL_MAX_ENTRIES', '1024'))
+TIERED_CACHE_LOCAL_TIMEOUT = float(os.environ.get('TIERED_CACHE_LOCAL_TIMEOUT', '30'))
+# Seconds a process may reuse a namespace's version stamp; 0 checks the shared cache on every lookup.
+TIERED_CACHE_VERSION_TTL = float(os.environ.get('TIERED_CACHE_VERSION_TTL', '0'))
+# Longest a cold key is locked while one caller builds it.
+TIERED_CACHE_LOCK_TIMEOUT = 30
+
+# Seconds the serialized builder reference data stays cached; model signals invalidate it earlier.
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60 * 24
+# Seconds the compiled assessment flow graph stays cached; saving a question or rule invalidates it earlier.
+FLOW_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Engine metrics at /metrics (staff, or scrapers sending "Authorization: Bearer <METRICS_TOKEN>")
+# and JSON trace logs on the assessment_flow.trace logger for a sample of calls and slow calls.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+ENGINE_TRACE_SAMPLE_RATE = float(os.environ.get('ENGINE_TRACE_SAMPLE_RATE', '0'))
+ENGINE_TRACE_SLOW_MS = float(os.environ['ENGINE_TRACE_SLOW_MS']) if os.environ.get('ENGINE_TRACE_SLOW_MS') else None
+
+# Background jobs (jobs app, run by `manage.py run_jobs`): default attempts per job, retry backoff
+# (doubling from JOBS_RETRY_BACKOFF seconds up to JOBS_RETRY_BACKOFF_MAX), the heartbeat age after
+# which a running job is considered abandoned by its worker, and how often the worker sends a heartbeat
+# for each running job.
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_BACKOFF = 30
+JOBS_RETRY_BACKOFF_MAX = 60 * 60
+JOBS_STALE_AFTER = 10 * 60
+JOBS_HEARTBEAT_INTERVAL = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,237 @@
+"""
+Two-tier cache: a bounded in-process LRU in front of a shared Django cache.
+
+Each ``TieredCache`` is a namespace. Its keys carry the namespace's version
+stamp, kept in the shared cache, so ``invalidate()`` makes every entry of
+the namespace stale in every process at once, without deleting keys one by
+one. Lookups go:
+
+1. the local LRU (per process, ``TIERED_CACHE_LOCAL_MAX_ENTRIES`` entries,
+   each kept at most ``TIERED_CACHE_LOCAL_TIMEOUT`` seconds);
+2. the shared backend (``TIERED_CACHE_ALIAS``, e.g. a file-based or Redis
+   cache; the per-process locmem cache stands in for it in development
+   and tests);
+3. the builder, under single-flight locking: threads of one process wait on
+   a lock, other processes wait on a short-lived ``cache.add`` lock and pick
+   up the value the winner stored, so a cold key is built once instead of
+   by every concurrent request. Builders read from the primary database even
+   in a ``read_only`` view (see ``QuestionsBank.routers``).
+
+The version stamp itself is read from the shared cache on every lookup
+unless ``TIERED_CACHE_VERSION_TTL`` lets each process reuse it for a few
+seconds, trading that much cross-process staleness for one less round trip.
+
+Values returned from the local tier are shared between callers; treat them
+as read-only.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import REGISTRY
+from .routers import use_primary
+
+REQUESTS = REGISTRY.counter(
+    "tiered_cache_requests_total", "Tiered cache lookups by namespace and the tier that answered.",
+    ["namespace", "tier"],
+)
+
+MISSING = object()
+
+Timeout = Union[int, float, None, Callable[[], Optional[float]]]
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, timeout: float) -> None:
+        if timeout <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_local: Optional[LocalLRU] = None
+_local_lock = threading.Lock()
+
+
+def local_tier() -> LocalLRU:
+    global _local
+    with _local_lock:
+        if _local is None:
+            _local = LocalLRU(getattr(settings, "TIERED_CACHE_LOCAL_MAX_ENTRIES", 1024))
+        return _local
+
+
+def clear_local() -> None:
+    """Drop this process's local tier (e.g. between tests)."""
+    global _local
+    with _local_lock:
+        _local = None
+
+
+class TieredCache:
+    """A namespace in the tiered cache."""
+
+    def __init__(self, namespace: str, timeout: Timeout = None):
+        self.namespace = namespace
+        self._timeout = timeout
+        self._version: Optional[Tuple[float, int]] = None
+        self._flights: Dict[str, threading.Lock] = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, "TIERED_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return self._timeout() if callable(self._timeout) else self._timeout
+
+    @property
+    def _version_key(self) -> str:
+        return f"{self.namespace}:version"
+
+    def version(self) -> int:
+        """The namespace's current version stamp."""
+        version_ttl = getattr(settings, "TIERED_CACHE_VERSION_TTL", 0)
+        cached = self._version
+        if version_ttl and cached is not None and time.monotonic() - cached[0] < version_ttl:
+            return cached[1]
+        version = self.shared.get(self._version_key)
+        if version is None:
+            # Seed from the clock so a flushed cache never reuses an old stamp.
+            version = int(time.time() * 1000)
+            if not self.shared.add(self._version_key, version, timeout=None):
+                version = self.shared.get(self._version_key, version)
+        self._version = (time.monotonic(), version)
+        return version
+
+    def invalidate(self) -> None:
+        """Make every entry of the namespace stale, in every process."""
+        try:
+            self.shared.incr(self._version_key)
+        except ValueError:
+            self.shared.set(self._version_key, int(time.time() * 1000), timeout=None)
+        self._version = None
+        local_tier().delete_prefix(f"{self.namespace}:")
+
+    def make_key(self, key: Hashable, version: Optional[int] = None) -> str:
+        if version is None:
+            version = self.version()
+        return f"{self.namespace}:{version}:{key}"
+
+    def _local_timeout(self) -> float:
+        local_timeout = getattr(settings, "TIERED_CACHE_LOCAL_TIMEOUT", 30)
+        timeout = self.timeout
+        return local_timeout if timeout is None else min(local_timeout, timeout)
+
+    def _lookup(self, full_key: str) -> Any:
+        value = local_tier().get(full_key)
+        if value is not MISSING:
+            REQUESTS.inc(namespace=self.namespace, tier="local")
+            return value
+        value = self.shared.get(full_key, MISSING)
+        if value is not MISSING:
+            REQUESTS.inc(namespace=self.namespace, tier="shared")
+            local_tier().set(full_key, value, self._local_timeout())
+        return value
+
+    def get(self, key: Hashable, default: Any = None, version: Optional[int] = None) -> Any:
+        value = self._lookup(self.make_key(key, version))
+        if value is MISSING:
+            REQUESTS.inc(namespace=self.namespace, tier="miss")
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None) -> None:
+        full_key = self.make_key(key, version)
+        self.shared.set(full_key, value, timeout=self.timeout)
+        local_tier().set(full_key, value, self._local_timeout())
+
+    @contextmanager
+    def _flight(self, full_key: str) -> Iterator[None]:
+        with self._flights_lock:
+            lock = self._flights.setdefault(full_key, threading.Lock())
+        try:
+            with lock:
+                yield
+        finally:
+            with self._flights_lock:
+                if self._flights.get(full_key) is lock and not lock.locked():
+                    del self._flights[full_key]
+
+    def get_or_set(self, key: Hashable, builder: Callable[[], Any], version: Optional[int] = None) -> Any:
+        """The cached value for ``key``, built by ``builder`` once across concurrent callers."""
+        full_key = self.make_key(key, version)
+        value = self._lookup(full_key)
+        if value is not MISSING:
+            return value
+        with self._flight(full_key):
+            value = self._lookup(full_key)
+            if value is not MISSING:
+                return value
+            REQUESTS.inc(namespace=self.namespace, tier="miss")
+            return self._build(full_key, builder)
+
+    def _build(self, full_key: str, builder: Callable[[], Any]) -> Any:
+        lock_key = f"{full_key}:lock"
+        lock_timeout = getattr(settings, "TIERED_CACHE_LOCK_TIMEOUT", 30)
+        deadline = time.monotonic() + lock_timeout
+        acquired = self.shared.add(lock_key, 1, timeout=lock_timeout)
+        while not acquired and time.monotonic() < deadline:
+            # Another process is building it; wait for its value.
+            time.sleep(0.05)
+            value = self.shared.get(full_key, MISSING)
+            if value is not MISSING:
+                local_tier().set(full_key, value, self._local_timeout())
+                return value
+            acquired = self.shared.add(lock_key, 1, timeout=lock_timeout)
+        try:
+            with use_primary():
+                value = builder()
+            self.shared.set(full_key, value, timeout=self.timeout)
+            local_tier().set(full_key, value, self._local_timeout())
+            return value
+        finally:
+            if acquired:
+                self.shared.delete(lock_key)
@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 from Qbank import views as qnr_views
+from QuestionsBank.metrics import metrics_view
 from surveys import views as survey_views
 
 urlpatterns = [
@@ -31,4 +32,5 @@ urlpatterns = [
     path('initialbuilder/', survey_views.survey_builder_initial, name='survey_builder_initial_root'),
     path('pipeline/', qnr_views.pipeline_overview, name='pipeline_overview'),
     path('i18n/set-language/', set_language, name='set_language'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,9 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.db import models
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from . import graph as flow_graph
 from .models import AssessmentQuestion, AssessmentOption, AssessmentFlowRule, ReevaluationQuestion
 
 
@@ -79,6 +80,15 @@ class AssessmentQuestionAdmin(admin.ModelAdmin):
 
         return inlines
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Check the flow around this question now that its rules are saved.
+        # The cached graph is only invalidated once the admin's transaction
+        # commits, so compile the rules as they are now.
+        graph = flow_graph.compile_graph()
+        for message in flow_graph.analyze(graph).messages(graph, question_id=form.instance.pk):
+            self.message_user(request, _("تحذير مسار التقييم: %(message)s") % {"message": message}, messages.WARNING)
+
     # Ensure autocomplete works for the dynamically added field
     autocomplete_fields = ("dynamic_option_source_question", "indicator_source")
 
@@ -94,6 +104,7 @@ class AssessmentOptionAdmin(admin.ModelAdmin):
 @admin.register(ReevaluationQuestion)
 class ReevaluationQuestionAdmin(admin.ModelAdmin):
     list_display = ("display_text", "survey_version", "id")
+    list_select_related = ("survey_version__survey",)
     search_fields = (
         "text_ar",
         "text_en",
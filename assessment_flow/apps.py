@@ -6,3 +6,6 @@ class AssessmentFlowConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "assessment_flow"
     verbose_name = _("مسار التقييم")
+
+    def ready(self):
+        import assessment_flow.signals
@@ -7,7 +7,8 @@ from typing import Any, Dict, Iterable, List, Optional
 
 from django.db.models import QuerySet
 
-from .models import AssessmentQuestion, AssessmentFlowRule, AssessmentOption
+from .models import AssessmentQuestion, AssessmentFlowRule
+from .tracing import EngineTrace, OptionCache, trace_call
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +28,9 @@ class RoutingEngine:
     stored AssessmentFlowRule JSON and user responses.
     """
 
+    # Label of this engine in metrics and traces.
+    engine_name = "routing"
+
     def __init__(self, rules: Optional[Iterable[AssessmentFlowRule]] = None):
         """
         :param rules: Optional pre-fetched iterable of AssessmentFlowRule.
@@ -37,11 +41,28 @@ class RoutingEngine:
             # 'to_question' is the DESTINATION question.
             rules = AssessmentFlowRule.objects.select_related("to_question").all()
         self._rules: List[AssessmentFlowRule] = list(rules)
+        self._options = OptionCache()
+        self._trace = EngineTrace(self.engine_name)
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
+    def prime_options(self, options: Dict[int, List[tuple]]) -> None:
+        """
+        Preload the options translated answers are compared with, as
+        ``question_id -> [(id, text_ar, text_en), ...]``, so that evaluating
+        rules issues no queries. Questions left out are loaded on demand.
+        """
+        self._options.prime(options)
+
+    def condition_matches(self, condition: Dict[str, Any], responses: Dict[Any, Any]) -> bool:
+        """
+        Evaluate one condition against ``responses`` outside of routing;
+        nothing is recorded in the metrics.
+        """
+        return self._evaluate_condition(condition, responses)
+
     def get_next_question(
             self,
             responses: Dict[int, Any],
@@ -54,9 +75,36 @@ class RoutingEngine:
         :param used_rule_ids: Set of rule IDs that have already fired.
         :return: The next AssessmentQuestion to show, or None if no rule matches.
         """
+        with trace_call(self.engine_name) as trace:
+            return self._route(trace, responses, used_rule_ids)
+
+    def explain(
+            self,
+            responses: Dict[int, Any],
+            used_rule_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Route like get_next_question and return the evaluation trace: every
+        rule examined, its conditions with the answers they saw, and the
+        rule that fired.
+        """
+        with trace_call(self.engine_name, explain=True) as trace:
+            result = self._route(trace, responses, used_rule_ids)
+        data = trace.as_dict()
+        data["next_question_id"] = result.next_question.id if result.next_question else None
+        return data
+
+    def _route(
+            self,
+            trace: EngineTrace,
+            responses: Dict[int, Any],
+            used_rule_ids: Optional[Iterable[int]],
+    ) -> RoutingResult:
+        self._trace = trace
         matched_rule = self._find_matching_rule(responses, used_rule_ids)
 
         if matched_rule is not None:
+            trace.matched_rule_id = matched_rule.pk
             # The rule is attached to the question we want to show next.
             return RoutingResult(
                 next_question=matched_rule.to_question,
@@ -89,6 +137,7 @@ class RoutingEngine:
         available_rules.sort(key=lambda r: (r.priority, r.id))
 
         for rule in available_rules:
+            self._trace.rule(rule)
             raw = getattr(rule, "condition", None)
 
             # Parse the JSON condition
@@ -101,19 +150,25 @@ class RoutingEngine:
                     else:
                         # Empty string condition -> treat as fallback/always true?
                         # Or ignore? Let's assume empty = ignore for safety unless explicit fallback.
+                        self._trace.rule_done(False, "empty condition")
                         continue
                 elif isinstance(raw, dict):
                     rule_dict = raw
                 else:
+                    self._trace.rule_done(False, "no condition")
                     continue
 
-                if self._evaluate_rule_dict(rule_dict, responses):
+                matched = self._evaluate_rule_dict(rule_dict, responses)
+                self._trace.rule_done(matched)
+                if matched:
                     return rule
 
             except json.JSONDecodeError:
                 log.warning(f"Invalid JSON in rule {rule.id}")
+                self._trace.rule_done(False, "invalid JSON", error=True)
                 continue
             except Exception as exc:
+                self._trace.rule_done(False, f"error: {exc}", error=True)
                 log.warning(
                     "Error evaluating routing rule %s: %s",
                     getattr(rule, "pk", "<no-pk>"),
@@ -189,10 +244,12 @@ class RoutingEngine:
 
         if cond_type == "count":
             count = self._coerce_count(answer)
-            return self._compare_numeric(count, operator, expected)
-
-        # default: value condition
-        return self._evaluate_value_condition(answer, operator, expected, question_id=int(question_id))
+            result = self._compare_numeric(count, operator, expected)
+        else:
+            # default: value condition
+            result = self._evaluate_value_condition(answer, operator, expected, question_id=int(question_id))
+        self._trace.condition(cond, answer, result)
+        return result
 
     # ------------------------------------------------------------------
     # Helpers
@@ -212,34 +269,7 @@ class RoutingEngine:
         Check if answer and expected refer to the same AssessmentOption,
         matching by ID, Arabic text, or English text.
         """
-        s_answer = str(answer).strip()
-        s_expected = str(expected).strip()
-
-        # Optimization: If both are identical strings, we already checked that.
-        # But this method is called when direct equality failed.
-
-        # Fetch options for this question
-        options = AssessmentOption.objects.filter(question_id=question_id)
-
-        for opt in options:
-            # Check if this option matches 'expected'
-            matches_expected = (
-                str(opt.id) == s_expected or
-                (opt.text_ar and opt.text_ar.strip() == s_expected) or
-                (opt.text_en and opt.text_en.strip() == s_expected)
-            )
-
-            if matches_expected:
-                # If this is the expected option, check if 'answer' also matches it
-                matches_answer = (
-                    str(opt.id) == s_answer or
-                    (opt.text_ar and opt.text_ar.strip() == s_answer) or
-                    (opt.text_en and opt.text_en.strip() == s_answer)
-                )
-                if matches_answer:
-                    return True
-
-        return False
+        return self._options.same_option(question_id, answer, expected, self._trace)
 
     def _are_values_equal(self, answer: Any, expected: Any, question_id: Optional[int]) -> bool:
         # 1. Direct string comparison
@@ -0,0 +1,492 @@
+"""
+The assessment flow as a graph.
+
+Routing rules only name the question they lead to; the questions they lead
+from are implied by the answers their conditions read. ``compile_graph``
+materializes that graph: every question, every rule with its parsed
+condition, edges from the questions a rule reads to the question it leads
+to, and the entry points (questions no rule leads to). The compiled graph is
+kept in the ``flow_graph`` namespace of the tiered cache and recompiled after
+any question or rule changes (see ``signals``), so views get the entry
+point without the anti-join they used to run on every request.
+
+``analyze`` checks a compiled graph for authoring mistakes:
+
+- rules that can never fire: invalid JSON, no conditions, or conditions
+  that contradict each other (``== "Yes"`` and ``== "No"`` on one answer,
+  ``> 5`` and ``< 3``, a value excluded by a ``not in`` list, ...);
+- rules shadowed by an earlier rule (lower priority, then id) that matches
+  whenever they do, so they only fire once that rule has been used;
+- questions no route reaches from an entry point;
+- loops, where a route can lead back to a question it already showed.
+
+Values are compared the way ``RoutingEngine`` compares them: two values are
+the same answer when their text is equal or they name the same option by
+id, Arabic or English text. Conditions the analysis cannot reason about
+(``contains``, ``regex``) are assumed satisfiable.
+"""
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from QuestionsBank.tiered_cache import TieredCache
+from .models import AssessmentFlowRule, AssessmentOption, AssessmentQuestion
+
+NUMERIC_OPERATORS = {">", "<", ">=", "<="}
+VALUE_OPERATORS = NUMERIC_OPERATORS | {"==", "!=", "in", "not in", "contains", "regex"}
+COUNT_OPERATORS = NUMERIC_OPERATORS | {"==", "!="}
+
+
+def _timeout() -> int:
+    return getattr(settings, "FLOW_GRAPH_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+CACHE = TieredCache("flow_graph", timeout=_timeout)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+@dataclass(frozen=True)
+class Condition:
+    type: str
+    question_id: Optional[int]
+    operator: str
+    value: Any = None
+
+    @property
+    def requires_answer(self) -> bool:
+        """Whether the condition can only hold once its question has been answered."""
+        if self.type == "count":
+            # An unanswered question counts as zero answers.
+            return not _compare_numeric(0, self.operator, self.value)
+        return self.operator not in ("!=", "not in")
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: int
+    to_question_id: int
+    priority: int
+    fallback: bool = False
+    logic: str = "AND"
+    conditions: Tuple[Condition, ...] = ()
+    # Why the engine skips the rule before evaluating any condition.
+    error: str = ""
+
+    @property
+    def order(self) -> Tuple[int, int]:
+        return self.priority, self.id
+
+    @property
+    def sources(self) -> FrozenSet[int]:
+        """Questions whose answers the rule reads."""
+        return frozenset(c.question_id for c in self.conditions if c.question_id is not None)
+
+
+def parse_rule(rule_id: int, to_question_id: int, priority: int, raw: Any) -> Rule:
+    """Parse a stored condition the way ``RoutingEngine`` reads it."""
+    if isinstance(raw, str):
+        if not raw.strip():
+            return Rule(rule_id, to_question_id, priority, error="empty condition")
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            return Rule(rule_id, to_question_id, priority, error="invalid JSON")
+    if not isinstance(raw, dict):
+        return Rule(rule_id, to_question_id, priority, error="condition is not an object")
+    if raw.get("fallback") is True:
+        return Rule(rule_id, to_question_id, priority, fallback=True)
+    conditions = raw.get("conditions")
+    if not conditions or not isinstance(conditions, list):
+        return Rule(rule_id, to_question_id, priority, error="no conditions")
+    logic = "AND" if (raw.get("logic") or "AND").upper() == "AND" else "OR"
+    return Rule(rule_id, to_question_id, priority, logic=logic,
+                conditions=tuple(_parse_condition(cond) for cond in conditions))
+
+
+def _parse_condition(cond: Any) -> Condition:
+    if not isinstance(cond, dict):
+        return Condition("invalid", None, "")
+    question = cond.get("question")
+    try:
+        question_id = int(question) if question else None
+    except (TypeError, ValueError):
+        question_id = None
+    return Condition(
+        "count" if cond.get("type") == "count" else "value",
+        question_id,
+        cond.get("operator") or "",
+        _freeze(cond.get("value")),
+    )
+
+
+@dataclass
+class FlowGraph:
+    question_ids: List[int]
+    rules: List[Rule]
+    # Question -> questions a rule reading its answer leads to.
+    successors: Dict[int, Set[int]] = field(default_factory=dict)
+    entry_points: List[int] = field(default_factory=list)
+
+    @property
+    def entry_point(self) -> Optional[int]:
+        """Where an assessment starts: the first question no rule leads to."""
+        return self.entry_points[0] if self.entry_points else None
+
+
+def compile_graph() -> FlowGraph:
+    """Build the flow graph from the database (two queries)."""
+    question_ids = list(AssessmentQuestion.objects.order_by("id").values_list("id", flat=True))
+    rules = sorted(
+        (
+            parse_rule(rule_id, to_question_id, priority, condition)
+            for rule_id, to_question_id, priority, condition in AssessmentFlowRule.objects.values_list(
+                "id", "to_question_id", "priority", "condition",
+            )
+        ),
+        key=lambda rule: rule.order,
+    )
+    successors: Dict[int, Set[int]] = defaultdict(set)
+    for rule in rules:
+        for source in rule.sources:
+            successors[source].add(rule.to_question_id)
+    targets = {rule.to_question_id for rule in rules}
+    return FlowGraph(
+        question_ids=question_ids,
+        rules=rules,
+        successors=dict(successors),
+        entry_points=[question_id for question_id in question_ids if question_id not in targets],
+    )
+
+
+def get_graph() -> FlowGraph:
+    """The compiled flow graph, from the cache when nothing changed since it was built."""
+    return CACHE.get_or_set("graph", compile_graph)
+
+
+def invalidate() -> None:
+    CACHE.invalidate()
+
+
+# ----------------------------------------------------------------------
+# Analysis
+# ----------------------------------------------------------------------
+
+Options = Dict[int, List[Tuple[int, str, str]]]
+
+
+def load_options(question_ids: Optional[Iterable[int]] = None) -> Options:
+    options: Options = defaultdict(list)
+    queryset = AssessmentOption.objects.order_by("id")
+    if question_ids is not None:
+        queryset = queryset.filter(question_id__in=list(question_ids))
+    for option_id, question_id, text_ar, text_en in queryset.values_list("id", "question_id", "text_ar", "text_en"):
+        options[question_id].append((option_id, (text_ar or "").strip(), (text_en or "").strip()))
+    return options
+
+
+def _option_ids(options: Options, question_id: int, value: Any) -> Set[int]:
+    text = str(value).strip()
+    return {
+        option_id for option_id, text_ar, text_en in options.get(question_id, ())
+        if text in (str(option_id), text_ar, text_en) and text
+    }
+
+
+def _may_equal(options: Options, question_id: int, a: Any, b: Any) -> bool:
+    return str(a) == str(b) or bool(_option_ids(options, question_id, a) & _option_ids(options, question_id, b))
+
+
+def _compare_numeric(actual: Any, operator: str, expected: Any) -> bool:
+    a, b = _number(actual), _number(expected)
+    if a is None or b is None:
+        return False
+    return {
+        ">": a > b, "<": a < b, ">=": a >= b, "<=": a <= b, "==": a == b, "!=": a != b,
+    }.get(operator, False)
+
+
+def _impossible(condition: Condition) -> str:
+    """Why ``condition`` can never hold on its own, or ``""``."""
+    if condition.type == "invalid":
+        return "a condition is not an object"
+    if condition.question_id is None:
+        return "a condition names no question"
+    if condition.type == "count":
+        if condition.operator not in COUNT_OPERATORS:
+            return f"unknown count operator {condition.operator!r}"
+        if _number(condition.value) is None:
+            return f"count compared with non-number {condition.value!r}"
+        return "" if _Range(integer=True).narrow(condition.operator, condition.value) else (
+            f"no answer count is {condition.operator} {condition.value}"
+        )
+    if condition.operator not in VALUE_OPERATORS:
+        return f"unknown operator {condition.operator!r}"
+    if condition.operator in NUMERIC_OPERATORS and _number(condition.value) is None:
+        return f"{condition.operator!r} compares with non-number {condition.value!r}"
+    if condition.operator in ("in", "not in") and not isinstance(condition.value, tuple):
+        return f"{condition.operator!r} needs a list"
+    if condition.operator == "in" and not condition.value:
+        return "'in' an empty list"
+    if condition.operator == "regex":
+        try:
+            re.compile(str(condition.value))
+        except re.error:
+            return f"invalid regex {condition.value!r}"
+    return ""
+
+
+class _Range:
+    """The numbers still allowed after intersecting comparisons."""
+
+    def __init__(self, integer: bool = False):
+        self.integer = integer
+        self.low, self.low_open = (0.0, False) if integer else (-math.inf, True)
+        self.high, self.high_open = math.inf, True
+        self.exact: Optional[float] = None
+
+    def narrow(self, operator: str, value: Any) -> bool:
+        """Apply ``operator value``; False once no number is left."""
+        bound = _number(value)
+        if operator in (">", ">=") and (bound > self.low or (bound == self.low and operator == ">")):
+            self.low, self.low_open = bound, operator == ">"
+        elif operator in ("<", "<=") and (bound < self.high or (bound == self.high and operator == "<")):
+            self.high, self.high_open = bound, operator == "<"
+        elif operator == "==":
+            if self.exact is not None and self.exact != bound:
+                return False
+            self.exact = bound
+        return not self.empty
+
+    @property
+    def empty(self) -> bool:
+        low, high = self.low, self.high
+        if self.exact is not None:
+            if self.integer and self.exact != int(self.exact):
+                return True
+            return not (
+                (low < self.exact or (low == self.exact and not self.low_open))
+                and (self.exact < high or (self.exact == high and not self.high_open))
+            )
+        if self.integer:
+            if high == math.inf:
+                return False
+            low = math.floor(low) + 1 if self.low_open else math.ceil(low)
+            high = math.ceil(high) - 1 if self.high_open else math.floor(high)
+            return low > high
+        return low > high or (low == high and (self.low_open or self.high_open))
+
+
+def _contradiction(conditions: Iterable[Condition], options: Options) -> str:
+    """Why conditions that must all hold cannot, or ``""``."""
+    by_question: Dict[Tuple[str, int], List[Condition]] = defaultdict(list)
+    for condition in conditions:
+        by_question[(condition.type, condition.question_id)].append(condition)
+
+    for (kind, question_id), group in by_question.items():
+        values = _Range(integer=kind == "count")
+        for condition in group:
+            if (kind == "count" or condition.operator in NUMERIC_OPERATORS) and \
+                    not values.narrow(condition.operator, condition.value):
+                return f"no answer to question {question_id} satisfies every comparison"
+        if kind == "count":
+            continue
+
+        equal = [c.value for c in group if c.operator == "=="]
+        for index, a in enumerate(equal):
+            for b in equal[index + 1:]:
+                if not _may_equal(options, question_id, a, b):
+                    return f"question {question_id} cannot be both {a!r} and {b!r}"
+        for a in equal:
+            for condition in group:
+                if condition.operator == "!=" and str(a) == str(condition.value):
+                    return f"question {question_id} cannot be {a!r} and not {a!r}"
+                if condition.operator == "in" and isinstance(condition.value, tuple) and not any(
+                        _may_equal(options, question_id, a, b) for b in condition.value):
+                    return f"{a!r} is not among {list(condition.value)!r} for question {question_id}"
+                if condition.operator == "not in" and isinstance(condition.value, tuple) and any(
+                        str(a) == str(b) for b in condition.value):
+                    return f"{a!r} is excluded by 'not in' for question {question_id}"
+    return ""
+
+
+def never_fires(rule: Rule, options: Options) -> str:
+    """Why ``rule`` can never match, or ``""``."""
+    if rule.error:
+        return rule.error
+    if rule.fallback:
+        return ""
+    reasons = [_impossible(condition) for condition in rule.conditions]
+    if rule.logic == "OR":
+        return reasons[0] if all(reasons) else ""
+    return next((reason for reason in reasons if reason), "") or _contradiction(rule.conditions, options)
+
+
+def _implies(stronger: Rule, weaker: Rule) -> bool:
+    """Whether ``weaker`` matches every set of answers ``stronger`` matches."""
+    if weaker.fallback:
+        return True
+    if stronger.fallback or not stronger.conditions or not weaker.conditions:
+        return False
+    if stronger.logic == "OR" and len(stronger.conditions) > 1:
+        return all(
+            _implies(Rule(stronger.id, stronger.to_question_id, stronger.priority, conditions=(condition,)), weaker)
+            for condition in stronger.conditions
+        )
+    held = set(stronger.conditions)
+    if weaker.logic == "OR" and len(weaker.conditions) > 1:
+        return bool(held.intersection(weaker.conditions))
+    return held.issuperset(weaker.conditions)
+
+
+def _can_follow(rule: Rule, reached: Set[int]) -> bool:
+    """Whether ``rule`` can fire once the questions in ``reached`` may have been answered."""
+    if rule.fallback:
+        return True
+    ready = [not condition.requires_answer or condition.question_id in reached for condition in rule.conditions]
+    return any(ready) if rule.logic == "OR" else all(ready)
+
+
+def _cycles(successors: Dict[int, Set[int]]) -> List[List[int]]:
+    """Strongly connected components with a loop (Tarjan, iterative)."""
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    cycles: List[List[int]] = []
+    counter = 0
+    for root in sorted(successors):
+        if root in index:
+            continue
+        work = [(root, iter(sorted(successors.get(root, ()))))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(sorted(successors.get(child, ())))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in successors.get(node, ()):
+                        cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+@dataclass
+class FlowAnalysis:
+    # Rule id -> why it can never fire.
+    never_fires: Dict[int, str] = field(default_factory=dict)
+    # Rule id -> id of the earlier rule that matches whenever it does.
+    shadowed: Dict[int, int] = field(default_factory=dict)
+    unreachable: List[int] = field(default_factory=list)
+    cycles: List[List[int]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.never_fires or self.shadowed or self.unreachable or self.cycles)
+
+    def messages(self, graph: FlowGraph, question_id: Optional[int] = None) -> List[str]:
+        """One line per finding; with ``question_id`` only those involving that question."""
+        targets = {rule.id: rule.to_question_id for rule in graph.rules}
+
+        def involves(rule_id: int) -> bool:
+            return question_id is None or targets.get(rule_id) == question_id
+
+        lines = [
+            f"Rule {rule_id} can never fire: {reason}."
+            for rule_id, reason in sorted(self.never_fires.items()) if involves(rule_id)
+        ]
+        lines += [
+            f"Rule {rule_id} is shadowed by rule {earlier}: it only fires once rule {earlier} has been used."
+            for rule_id, earlier in sorted(self.shadowed.items()) if involves(rule_id) or involves(earlier)
+        ]
+        lines += [
+            f"Question {unreachable} cannot be reached from an entry point."
+            for unreachable in self.unreachable if question_id in (None, unreachable)
+        ]
+        lines += [
+            f"Questions {', '.join(map(str, cycle))} form a loop."
+            for cycle in self.cycles if question_id is None or question_id in cycle
+        ]
+        return lines
+
+
+def analyze(graph: Optional[FlowGraph] = None, options: Optional[Options] = None) -> FlowAnalysis:
+    """Check ``graph`` (the cached one by default) for rules and questions that cannot work."""
+    graph = graph or get_graph()
+    if options is None:
+        options = load_options()
+    analysis = FlowAnalysis()
+
+    live: List[Rule] = []
+    for rule in graph.rules:
+        reason = never_fires(rule, options)
+        if reason:
+            analysis.never_fires[rule.id] = reason
+        else:
+            live.append(rule)
+
+    for position, rule in enumerate(live):
+        earlier = next((other for other in live[:position] if _implies(rule, other)), None)
+        if earlier is not None:
+            analysis.shadowed[rule.id] = earlier.id
+
+    reached = set(graph.entry_points)
+    pending = [rule for rule in live if rule.to_question_id not in reached] if reached else []
+    progress = True
+    while progress:
+        progress = False
+        for rule in pending:
+            if rule.to_question_id not in reached and _can_follow(rule, reached):
+                reached.add(rule.to_question_id)
+                progress = True
+        pending = [rule for rule in pending if rule.to_question_id not in reached]
+    analysis.unreachable = [question_id for question_id in graph.question_ids if question_id not in reached]
+
+    successors: Dict[int, Set[int]] = defaultdict(set)
+    for rule in live:
+        for source in rule.sources:
+            successors[source].add(rule.to_question_id)
+    analysis.cycles = _cycles(successors)
+    return analysis
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
@@ -167,6 +168,17 @@ class AssessmentFlowRule(models.Model):
     def __str__(self):
         return self.description or f"Rule to Q{self.to_question_id}"
 
+    def clean(self):
+        from .graph import load_options, never_fires, parse_rule
+
+        # Blank conditions are allowed as drafts; the engine skips them.
+        rule = parse_rule(self.pk or 0, self.to_question_id, self.priority, self.condition)
+        if rule.error == "empty condition":
+            return
+        reason = never_fires(rule, load_options(rule.sources))
+        if reason:
+            raise ValidationError({"condition": _("لن تنطبق هذه القاعدة أبداً: %(reason)s") % {"reason": reason}})
+
 
 class ReevaluationQuestion(models.Model):
     """Questions used when reassessing future survey versions."""
@@ -0,0 +1,371 @@
+"""
+Every path through the assessment flow.
+
+A path is one sequence of answers from an entry point until
+``RoutingEngine`` finds no further question; its length is the number of
+questions shown and its terminal the last of them. ``enumerate_paths``
+counts the paths and reports their length distribution and terminal
+questions.
+
+Each question is answered with every value in its ``answer_domain``:
+
+- each predefined option, by id, as the assessment page stores it;
+- all predefined options at once on multiple-choice questions;
+- for questions that take free text, numbers or answers drawn from other
+  data, the values the rules compare them with (numbers also one either
+  side) and one value no rule mentions.
+
+Routing goes through the real ``RoutingEngine``, so a saved report
+(``enumerate_assessment_paths --output``) is a fixture for engine and rule
+changes: ``--compare`` lists every path count that moved.
+
+The exhaustive search is a depth-first walk memoized on the state that
+decides the rest of a path: the current question, the rules already used
+(rules fire once) and the answers the unused rules can still read. Past
+``max_states`` memoized states (per process) it gives up and the report is
+built from Monte-Carlo random walks instead. With ``processes`` > 1 the
+first answers of the entry points are explored in a process pool; the
+workers receive the flow as plain data and never touch the database.
+"""
+from __future__ import annotations
+
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from django.db import connections
+
+from . import graph as flow_graph
+from .engine import RoutingEngine
+from .models import AssessmentFlowRule, AssessmentOption, AssessmentQuestion
+
+# Answer that no rule mentions.
+OTHER_ANSWER = "__other__"
+
+DEFAULT_MAX_STATES = 20_000
+DEFAULT_SAMPLES = 5_000
+
+
+class PathExplosion(Exception):
+    pass
+
+
+@dataclass
+class PathStats:
+    paths: int = 0
+    lengths: Counter = field(default_factory=Counter)
+    terminals: Counter = field(default_factory=Counter)
+
+    def add(self, other: "PathStats", extra_length: int = 0, times: int = 1) -> None:
+        """Add ``other``'s paths ``times`` over, each ``extra_length`` questions longer."""
+        self.paths += other.paths * times
+        for length, count in other.lengths.items():
+            self.lengths[length + extra_length] += count * times
+        for question_id, count in other.terminals.items():
+            self.terminals[question_id] += count * times
+
+
+def _freeze(answer: Any) -> Any:
+    return tuple(answer) if isinstance(answer, list) else answer
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_answer(number: float) -> Any:
+    # The assessment page stores whole numbers as ints and anything else as text.
+    return int(number) if number.is_integer() else str(number)
+
+
+def answer_domain(options: Iterable[Tuple[int, str]], multiple: bool,
+                  conditions: Iterable[flow_graph.Condition]) -> List[Any]:
+    """The answers tried for a question with ``(option id, response type)`` options."""
+    options = list(options)
+    choices = [option_id for option_id, response_type in options
+               if response_type == AssessmentOption.ResponseType.PREDEFINED]
+    domain: List[Any] = list(choices)
+    if multiple and len(choices) > 1:
+        domain.append(list(choices))
+    if choices and len(choices) == len(options):
+        return domain
+
+    for condition in conditions:
+        if condition.type == "count":
+            continue
+        values = condition.value if isinstance(condition.value, tuple) else (condition.value,)
+        for value in values:
+            number = _number(value)
+            if condition.operator in flow_graph.NUMERIC_OPERATORS and number is not None:
+                domain.extend(_as_answer(number + step) for step in (-1, 0, 1))
+            elif value is not None and value != "":
+                domain.append(value)
+    domain.append(OTHER_ANSWER)
+
+    seen = set()
+    unique = []
+    for answer in domain:
+        key = (type(answer).__name__, _freeze(answer))
+        if key not in seen:
+            seen.add(key)
+            unique.append(answer)
+    return unique
+
+
+def partition(engine: RoutingEngine, question_id: int, answers: Iterable[Any],
+              conditions: Iterable[flow_graph.Condition]) -> List[Tuple[Any, int]]:
+    """Group answers that every condition on the question treats alike, as ``(representative, size)``.
+
+    A condition reads a single answer, so answers in one group route
+    identically forever after: the search follows the representative and
+    counts its paths ``size`` times.
+    """
+    checks = [
+        {"type": condition.type, "question": condition.question_id, "operator": condition.operator,
+         "value": condition.value}
+        for condition in dict.fromkeys(conditions)
+    ]
+    groups: Dict[tuple, List[Any]] = {}
+    for answer in answers:
+        responses = {str(question_id): answer}
+        signature = tuple(engine.condition_matches(check, responses) for check in checks)
+        group = groups.setdefault(signature, [answer, 0])
+        group[1] += 1
+    return [(answer, size) for answer, size in groups.values()]
+
+
+@dataclass
+class Flow:
+    """The flow as plain data: enough to route without the database."""
+    entry_points: List[int]
+    # (id, to_question_id, priority, condition) per rule.
+    rules: List[Tuple[int, int, int, str]]
+    # Question -> [(option id, text_ar, text_en), ...] for translated comparisons.
+    options: Dict[int, List[Tuple[int, str, str]]]
+    # Question -> (answer, number of answers it stands for) to try.
+    domains: Dict[int, List[Tuple[Any, int]]]
+    # Rule id -> questions its conditions read.
+    reads: Dict[int, FrozenSet[int]]
+
+    def domain(self, question_id: int) -> List[Tuple[Any, int]]:
+        return self.domains.get(question_id) or [(OTHER_ANSWER, 1)]
+
+    def engine(self) -> RoutingEngine:
+        engine = RoutingEngine([
+            AssessmentFlowRule(id=rule_id, to_question=AssessmentQuestion(id=to_question_id), priority=priority,
+                               condition=condition)
+            for rule_id, to_question_id, priority, condition in self.rules
+        ])
+        engine.prime_options({question_id: self.options.get(question_id, []) for question_id in self.domains})
+        return engine
+
+
+def load_flow() -> Flow:
+    """Read the flow from the database and the cached flow graph."""
+    graph = flow_graph.get_graph()
+    conditions: Dict[int, List[flow_graph.Condition]] = {}
+    for rule in graph.rules:
+        for condition in rule.conditions:
+            if condition.question_id is not None:
+                conditions.setdefault(condition.question_id, []).append(condition)
+
+    option_types: Dict[int, List[Tuple[int, str]]] = {}
+    texts: Dict[int, List[Tuple[int, str, str]]] = {}
+    for option_id, question_id, text_ar, text_en, response_type in AssessmentOption.objects.order_by("id").values_list(
+            "id", "question_id", "text_ar", "text_en", "response_type"):
+        option_types.setdefault(question_id, []).append((option_id, response_type))
+        texts.setdefault(question_id, []).append((option_id, text_ar, text_en))
+
+    multiple = dict(AssessmentQuestion.objects.values_list("id", "allow_multiple_choices"))
+    flow = Flow(
+        entry_points=list(graph.entry_points),
+        rules=list(AssessmentFlowRule.objects.order_by("priority", "id").values_list(
+            "id", "to_question_id", "priority", "condition",
+        )),
+        options=texts,
+        domains=dict.fromkeys(graph.question_ids, []),
+        reads={rule.id: rule.sources for rule in graph.rules},
+    )
+    engine = flow.engine()
+    flow.domains = {
+        question_id: partition(
+            engine, question_id,
+            answer_domain(option_types.get(question_id, ()), multiple.get(question_id, False),
+                          conditions.get(question_id, ())),
+            conditions.get(question_id, ()),
+        )
+        for question_id in graph.question_ids
+    }
+    return flow
+
+
+class PathSearch:
+    """Memoized depth-first enumeration of the paths from a question."""
+
+    def __init__(self, flow: Flow, max_states: int = DEFAULT_MAX_STATES):
+        self.flow = flow
+        self.max_states = max_states
+        self.engine = flow.engine()
+        self.memo: Dict[tuple, PathStats] = {}
+        self._readable: Dict[FrozenSet[int], FrozenSet[int]] = {}
+
+    def readable(self, used: FrozenSet[int]) -> FrozenSet[int]:
+        """Questions whose answers the rules not yet used can read."""
+        questions = self._readable.get(used)
+        if questions is None:
+            questions = frozenset().union(*(
+                reads for rule_id, reads in self.flow.reads.items() if rule_id not in used
+            ))
+            self._readable[used] = questions
+        return questions
+
+    def from_question(self, question_id: int, used: FrozenSet[int] = frozenset(),
+                      responses: Optional[Dict[int, Any]] = None) -> PathStats:
+        """Paths that start by showing ``question_id``."""
+        responses = responses or {}
+        readable = self.readable(used)
+        # The answer about to be given replaces any earlier answer to the same question.
+        key = (question_id, used, tuple(sorted(
+            (asked, _freeze(answer)) for asked, answer in responses.items()
+            if asked in readable and asked != question_id
+        )))
+        stats = self.memo.get(key)
+        if stats is None:
+            if len(self.memo) >= self.max_states:
+                raise PathExplosion(f"More than {self.max_states} distinct states")
+            stats = PathStats()
+            for answer, size in self.flow.domain(question_id):
+                stats.add(self.after_answer(question_id, answer, used, responses), times=size)
+            self.memo[key] = stats
+        return stats
+
+    def after_answer(self, question_id: int, answer: Any, used: FrozenSet[int],
+                     responses: Dict[int, Any]) -> PathStats:
+        """Paths that answer ``question_id`` with ``answer``, counting ``question_id`` in their length."""
+        responses = {**responses, question_id: answer}
+        result = self.engine.get_next_question({str(asked): value for asked, value in responses.items()}, used)
+        if result.next_question is None:
+            return PathStats(1, Counter({1: 1}), Counter({question_id: 1}))
+        stats = PathStats()
+        stats.add(self.from_question(result.next_question.id, used | {result.rule.id}, responses), 1)
+        return stats
+
+
+def sample_paths(flow: Flow, samples: int = DEFAULT_SAMPLES, seed: Optional[int] = None) -> Tuple[PathStats, int]:
+    """Random walks with uniformly chosen answers; returns their stats and how many were distinct.
+
+    Answers of one ``partition`` group route alike, so a walk picks a group
+    by its size and distinct walks are told apart by group.
+    """
+    rng = random.Random(seed)
+    engine = flow.engine()
+    stats = PathStats()
+    seen = set()
+    for _ in range(samples if flow.entry_points else 0):
+        question_id = rng.choice(flow.entry_points)
+        responses: Dict[str, Any] = {}
+        used: List[int] = []
+        path = []
+        while True:
+            domain = flow.domain(question_id)
+            [(answer, _)] = rng.choices(domain, weights=[size for _, size in domain])
+            responses[str(question_id)] = answer
+            path.append((question_id, _freeze(answer)))
+            result = engine.get_next_question(responses, used)
+            if result.next_question is None:
+                break
+            used.append(result.rule.id)
+            question_id = result.next_question.id
+        stats.add(PathStats(1, Counter({len(path): 1}), Counter({question_id: 1})))
+        seen.add(tuple(path))
+    return stats, len(seen)
+
+
+_worker_search: Optional[PathSearch] = None
+
+
+def _init_worker(flow: Flow, max_states: int) -> None:
+    import django
+
+    django.setup()
+    global _worker_search
+    _worker_search = PathSearch(flow, max_states)
+
+
+def _explore_branch(branch: Tuple[int, Any]) -> Tuple[PathStats, int]:
+    question_id, answer = branch
+    before = len(_worker_search.memo)
+    stats = _worker_search.after_answer(question_id, answer, frozenset(), {})
+    return stats, len(_worker_search.memo) - before
+
+
+def _exhaustive(flow: Flow, processes: int, max_states: int) -> Tuple[PathStats, int]:
+    branches = [(entry, answer, size) for entry in flow.entry_points for answer, size in flow.domain(entry)]
+    stats = PathStats()
+    if processes <= 1 or len(branches) < 2:
+        search = PathSearch(flow, max_states)
+        for entry in flow.entry_points:
+            stats.add(search.from_question(entry))
+        return stats, len(search.memo)
+
+    # Workers must not inherit the parent's open connections.
+    connections.close_all()
+    states = 0
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(flow, max_states))
+    try:
+        results = pool.map(_explore_branch, [(entry, answer) for entry, answer, _ in branches])
+        for (branch_stats, branch_states), (_, _, size) in zip(results, branches):
+            stats.add(branch_stats, times=size)
+            states += branch_states
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return stats, states
+
+
+def summarize(stats: PathStats) -> Dict[str, Any]:
+    lengths = sorted(stats.lengths)
+    total = sum(length * count for length, count in stats.lengths.items())
+    return {
+        "paths": stats.paths,
+        "lengths": {str(length): stats.lengths[length] for length in lengths},
+        "min_length": lengths[0] if lengths else 0,
+        "max_length": lengths[-1] if lengths else 0,
+        "mean_length": round(total / stats.paths, 3) if stats.paths else 0,
+        "terminals": {str(question_id): count for question_id, count in sorted(stats.terminals.items())},
+    }
+
+
+def enumerate_paths(flow: Optional[Flow] = None, *, processes: int = 1, max_states: int = DEFAULT_MAX_STATES,
+                    samples: int = DEFAULT_SAMPLES, seed: Optional[int] = None) -> Dict[str, Any]:
+    """Count the paths through the flow, sampling them when there are too many to enumerate."""
+    flow = flow or load_flow()
+    started = time.perf_counter()
+    try:
+        stats, states = _exhaustive(flow, processes, max_states)
+        report = {"method": "exhaustive", "states": states}
+    except (PathExplosion, RecursionError):
+        stats, distinct = sample_paths(flow, samples, seed)
+        report = {"method": "monte_carlo", "samples": samples, "distinct_paths": distinct}
+    report["entry_points"] = flow.entry_points
+    report.update(summarize(stats))
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Differences between two exhaustive reports, one line each."""
+    changes = []
+    if baseline["paths"] != current["paths"]:
+        changes.append(f"paths: {baseline['paths']} -> {current['paths']}")
+    for key, label in (("lengths", "paths of length"), ("terminals", "paths ending at question")):
+        for item in sorted(set(baseline[key]) | set(current[key]), key=int):
+            before, after = baseline[key].get(item, 0), current[key].get(item, 0)
+            if before != after:
+                changes.append(f"{label} {item}: {before} -> {after}")
+    return changes
@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import graph
+from .models import AssessmentFlowRule, AssessmentQuestion
+
+GRAPH_MODELS = (AssessmentQuestion, AssessmentFlowRule)
+
+
+def invalidate_flow_graph(sender, using=None, **kwargs):
+    # After the commit: a graph rebuilt before it would cache the old rules again.
+    transaction.on_commit(graph.invalidate, using=using)
+
+
+for model in GRAPH_MODELS:
+    post_save.connect(invalidate_flow_graph, sender=model, dispatch_uid=f"flow_graph_save_{model.__name__}")
+    post_delete.connect(invalidate_flow_graph, sender=model, dispatch_uid=f"flow_graph_delete_{model.__name__}")
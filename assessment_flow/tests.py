@@ -1,4 +1,15 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
 from django.utils import translation
 
 from surveys.models import Survey, SurveyVersion
@@ -9,6 +20,7 @@ from .models import (
     ReevaluationQuestion,
 )
 from .engine import RoutingEngine
+from . import graph, paths, tracing
 
 
 class RoutingEngineTestCase(TestCase):
@@ -183,3 +195,237 @@ class AssessmentFlowLocalizationTestCase(TestCase):
         self.assertEqual(
             AssessmentFlowRule._meta.verbose_name_plural, "قواعد مسار التقييم"
         )
+
+
+class EngineTracingTestCase(TestCase):
+    def setUp(self):
+        self.q1 = AssessmentQuestion.objects.create(text_en="Question 1")
+        self.q2 = AssessmentQuestion.objects.create(text_en="Question 2")
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_ar="نعم", text_en="Yes")
+        self.decoy = AssessmentFlowRule.objects.create(
+            to_question=self.q2,
+            condition=json.dumps({"conditions": [{"question": self.q1.id, "operator": "==", "value": "No"}]}),
+            priority=0,
+        )
+        self.rule = AssessmentFlowRule.objects.create(
+            to_question=self.q2,
+            condition=json.dumps({"conditions": [{"question": self.q1.id, "operator": "==", "value": "Yes"}]}),
+            priority=1,
+        )
+
+    def test_calls_feed_the_engine_metrics(self):
+        fired = tracing.RULE_FIRED.value(engine="routing", rule=self.rule.id)
+        examined = tracing.RULES_EXAMINED.value(engine="routing")
+        calls = tracing.DURATION.count(engine="routing")
+
+        result = RoutingEngine().get_next_question({str(self.q1.id): self.yes.id})
+
+        self.assertEqual(result.rule, self.rule)
+        self.assertEqual(tracing.RULE_FIRED.value(engine="routing", rule=self.rule.id), fired + 1)
+        self.assertEqual(tracing.RULES_EXAMINED.value(engine="routing"), examined + 2)
+        self.assertEqual(tracing.DURATION.count(engine="routing"), calls + 1)
+
+    def test_option_lookups_are_cached_per_engine(self):
+        engine = RoutingEngine()
+        trace = engine.explain({str(self.q1.id): self.yes.id})
+        # "No" and "Yes" are both compared through the question's options: one query, then a hit.
+        self.assertEqual(trace["db_queries"], 1)
+        self.assertEqual(trace["option_cache"], {"hits": 1, "misses": 1})
+        self.assertEqual(engine.explain({str(self.q1.id): self.yes.id})["db_queries"], 0)
+
+    def test_explain_lists_every_rule_and_condition(self):
+        examined = tracing.RULES_EXAMINED.value(engine="routing")
+        trace = RoutingEngine().explain({str(self.q1.id): "Yes"})
+
+        self.assertEqual(trace["matched_rule_id"], self.rule.id)
+        self.assertEqual(trace["next_question_id"], self.q2.id)
+        self.assertEqual([rule["rule_id"] for rule in trace["rules"]], [self.decoy.id, self.rule.id])
+        self.assertEqual([rule["matched"] for rule in trace["rules"]], [False, True])
+        self.assertEqual(trace["rules"][0]["conditions"][0]["answer"], "Yes")
+        self.assertFalse(trace["rules"][0]["conditions"][0]["result"])
+        # Explaining does not count as traffic.
+        self.assertEqual(tracing.RULES_EXAMINED.value(engine="routing"), examined)
+
+    @override_settings(ENGINE_TRACE_SAMPLE_RATE=1.0)
+    def test_sampled_calls_are_logged_as_json(self):
+        with self.assertLogs("assessment_flow.trace", level="INFO") as logs:
+            RoutingEngine().get_next_question({str(self.q1.id): "Yes"})
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data["matched_rule_id"], self.rule.id)
+        self.assertEqual(data["rules_examined"], 2)
+
+
+def condition(*conditions, logic="AND"):
+    return json.dumps({"logic": logic, "conditions": [
+        {"question": question.id, "operator": operator, "value": value} for question, operator, value in conditions
+    ]})
+
+
+class FlowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.q1, self.q2, self.q3, self.q4 = [
+            AssessmentQuestion.objects.create(text_en=f"Question {index}") for index in range(1, 5)
+        ]
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_ar="نعم", text_en="Yes")
+        self.to_q2 = AssessmentFlowRule.objects.create(
+            to_question=self.q2, condition=condition((self.q1, "==", "Yes")), priority=1,
+        )
+        self.to_q3 = AssessmentFlowRule.objects.create(
+            to_question=self.q3, condition=condition((self.q2, ">", 5)), priority=2,
+        )
+
+    def rule(self, to_question, raw, priority=5):
+        with self.captureOnCommitCallbacks(execute=True):
+            return AssessmentFlowRule.objects.create(to_question=to_question, condition=raw, priority=priority)
+
+    def test_entry_point_is_cached_until_the_flow_changes(self):
+        self.assertEqual(graph.get_graph().entry_points, [self.q1.id, self.q4.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.get_graph().entry_point, self.q1.id)
+        self.assertEqual(graph.get_graph().successors, {self.q1.id: {self.q2.id}, self.q2.id: {self.q3.id}})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            AssessmentFlowRule.objects.create(to_question=self.q1, condition=condition((self.q4, "==", "x")))
+            # Not before the commit, or a concurrent rebuild could cache the old rules again.
+            self.assertEqual(graph.get_graph().entry_points, [self.q1.id, self.q4.id])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(graph.get_graph().entry_points, [self.q4.id])
+
+    def test_clean_flow_has_no_findings(self):
+        self.rule(self.q4, json.dumps({"fallback": True}), priority=9)
+        analysis = graph.analyze()
+        self.assertTrue(analysis.ok, analysis.messages(graph.get_graph()))
+
+    def test_contradictory_and_broken_rules_never_fire(self):
+        same_option = self.rule(self.q4, condition((self.q1, "==", "Yes"), (self.q1, "==", str(self.yes.id))))
+        both = self.rule(self.q4, condition((self.q1, "==", "Yes"), (self.q1, "==", "No")))
+        ranges = self.rule(self.q4, condition((self.q2, ">", 5), (self.q2, "<=", 3)))
+        excluded = self.rule(self.q4, condition((self.q1, "==", "Yes"), (self.q1, "not in", ["Yes"])))
+        either = self.rule(self.q4, condition((self.q1, "==", "Yes"), (self.q1, "==", "No"), logic="OR"))
+        no_count = self.rule(self.q4, json.dumps({"conditions": [
+            {"type": "count", "question": self.q1.id, "operator": "<", "value": 0},
+        ]}))
+        broken = self.rule(self.q4, "{not json")
+
+        never_fires = graph.analyze().never_fires
+        self.assertNotIn(same_option.id, never_fires)
+        self.assertNotIn(either.id, never_fires)
+        self.assertEqual(set(never_fires), {both.id, ranges.id, excluded.id, no_count.id, broken.id})
+        self.assertEqual(never_fires[broken.id], "invalid JSON")
+
+    def test_shadowed_rules(self):
+        narrower = self.rule(self.q4, condition((self.q1, "==", "Yes"), (self.q2, ">", 5)), priority=3)
+        fallback = self.rule(self.q4, json.dumps({"fallback": True}), priority=4)
+        after_fallback = self.rule(self.q4, condition((self.q3, "==", "x")), priority=5)
+
+        shadowed = graph.analyze().shadowed
+        self.assertEqual(shadowed, {narrower.id: self.to_q2.id, after_fallback.id: fallback.id})
+
+    def test_unreachable_questions(self):
+        # q3's only rule cannot fire, and q4 needs q3's answer.
+        self.to_q3.condition = condition((self.q2, ">", 5), (self.q2, "<", 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.to_q3.save()
+        self.rule(self.q4, condition((self.q3, "==", "x")))
+        # A rule into q1 leaves the flow without an entry point.
+        self.rule(self.q1, condition((self.q3, "!=", "x")))
+
+        analysis = graph.analyze()
+        self.assertEqual(graph.get_graph().entry_points, [])
+        self.assertEqual(analysis.unreachable, [self.q1.id, self.q2.id, self.q3.id, self.q4.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AssessmentFlowRule.objects.filter(to_question=self.q1).delete()
+        self.assertEqual(graph.analyze().unreachable, [self.q3.id, self.q4.id])
+
+    def test_loops(self):
+        self.rule(self.q1, condition((self.q3, "==", "again")))
+        self.rule(self.q4, condition((self.q4, "!=", "done")))
+        self.assertEqual(graph.analyze().cycles, [[self.q1.id, self.q2.id, self.q3.id], [self.q4.id]])
+
+    def test_clean_rejects_rules_that_never_fire(self):
+        rule = AssessmentFlowRule(to_question=self.q4, condition=condition((self.q1, "==", "Yes"), (self.q1, "==", "No")))
+        with self.assertRaises(ValidationError):
+            rule.clean()
+        AssessmentFlowRule(to_question=self.q4, condition="").clean()
+        AssessmentFlowRule(to_question=self.q4, condition=condition((self.q1, "in", ["Yes", "No"]))).clean()
+
+    def test_admin_save_reports_findings(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+        graph.get_graph()
+        url = reverse("admin:assessment_flow_assessmentquestion_change", args=[self.q2.id])
+        # The rule is added in the same save, while the cached graph still
+        # holds the rules from before it.
+        response = self.client.post(url, {
+            "text_en": self.q2.text_en, "option_type": AssessmentQuestion.OptionType.STATIC,
+            "options-TOTAL_FORMS": 0, "options-INITIAL_FORMS": 0,
+            "incoming_rules-TOTAL_FORMS": 2, "incoming_rules-INITIAL_FORMS": 1,
+            "incoming_rules-0-id": self.to_q2.id, "incoming_rules-0-to_question": self.q2.id,
+            "incoming_rules-0-condition": self.to_q2.condition,
+            "incoming_rules-1-to_question": self.q2.id,
+            "incoming_rules-1-condition": condition((self.q1, "==", "Yes")),
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        added = AssessmentFlowRule.objects.filter(to_question=self.q2).latest("id")
+        messages = [str(message) for message in response.context["messages"]]
+        self.assertTrue(any(f"Rule {self.to_q2.id} is shadowed by rule {added.id}" in message
+                            for message in messages), messages)
+
+
+class PathEnumerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.q1, self.q2, self.q3 = [
+            AssessmentQuestion.objects.create(text_en=f"Question {index}") for index in range(1, 4)
+        ]
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_ar="نعم", text_en="Yes")
+        self.no = AssessmentOption.objects.create(question=self.q1, text_ar="لا", text_en="No")
+        AssessmentFlowRule.objects.create(to_question=self.q2, condition=condition((self.q1, "==", "Yes")), priority=1)
+        AssessmentFlowRule.objects.create(to_question=self.q3, condition=condition((self.q2, ">", 5)), priority=2)
+        AssessmentFlowRule.objects.create(to_question=self.q3, condition=condition((self.q1, "==", "No")), priority=3)
+
+    def test_answer_domains_group_equivalent_answers(self):
+        flow = paths.load_flow()
+        self.assertEqual(flow.entry_points, [self.q1.id])
+        self.assertEqual(flow.domain(self.q1.id), [(self.yes.id, 1), (self.no.id, 1)])
+        # q2 is free input: 4, 5 and an unmentioned value all fail "> 5".
+        self.assertEqual(flow.domain(self.q2.id), [(4, 3), (6, 1)])
+        self.assertEqual(flow.domain(self.q3.id), [(paths.OTHER_ANSWER, 1)])
+
+    def test_exhaustive_enumeration(self):
+        # Yes -> q2 (three answers end there, one goes on to q3); No -> q3.
+        expected = {
+            "method": "exhaustive",
+            "paths": 5,
+            "lengths": {"2": 4, "3": 1},
+            "terminals": {str(self.q2.id): 3, str(self.q3.id): 2},
+        }
+        report = paths.enumerate_paths()
+        self.assertEqual({key: report[key] for key in expected}, expected)
+        self.assertEqual((report["min_length"], report["max_length"], report["mean_length"]), (2, 3, 2.2))
+
+        parallel = paths.enumerate_paths(processes=2)
+        self.assertEqual({key: parallel[key] for key in expected}, expected)
+
+    def test_falls_back_to_sampling(self):
+        report = paths.enumerate_paths(max_states=1, samples=200, seed=1)
+        self.assertEqual((report["method"], report["paths"]), ("monte_carlo", 200))
+        self.assertEqual(sum(report["lengths"].values()), 200)
+        self.assertLessEqual(set(report["terminals"]), {str(self.q2.id), str(self.q3.id)})
+        self.assertLessEqual(report["distinct_paths"], 3)
+
+    def test_command_compares_with_a_saved_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "paths.json")
+            call_command("enumerate_assessment_paths", "--output", baseline, stdout=io.StringIO())
+            call_command("enumerate_assessment_paths", "--compare", baseline, stdout=io.StringIO())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                AssessmentFlowRule.objects.filter(to_question=self.q3, priority=2).delete()
+            out = io.StringIO()
+            with self.assertRaises(CommandError):
+                call_command("enumerate_assessment_paths", "--compare", baseline, stdout=out)
+        self.assertIn("paths: 5 -> 2", out.getvalue())
@@ -0,0 +1,218 @@
+"""
+Tracing and metrics for the rule engines.
+
+Every ``RoutingEngine``, ``SurveyRoutingEngine`` and ``ClassificationEngine``
+call runs inside ``trace_call``, which counts the rules examined, conditions
+evaluated, database queries issued during evaluation and option-cache hits,
+then feeds the totals, the call latency and the rule that fired into the
+metrics registry served at ``/metrics``.
+
+A sample of calls (``ENGINE_TRACE_SAMPLE_RATE``) and every call slower than
+``ENGINE_TRACE_SLOW_MS`` is also logged as one JSON line on the
+``assessment_flow.trace`` logger. ``explain`` calls keep the full
+rule-by-rule evaluation and are not counted in the metrics.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from django.conf import settings
+from django.db import connections
+
+from QuestionsBank.metrics import REGISTRY
+from .models import AssessmentOption
+
+log = logging.getLogger("assessment_flow.trace")
+
+CALLS = REGISTRY.counter("engine_calls_total", "Engine evaluations by outcome.", ["engine", "outcome"])
+DURATION = REGISTRY.histogram("engine_call_duration_seconds", "Engine evaluation latency.", ["engine"])
+RULES_EXAMINED = REGISTRY.counter("engine_rules_examined_total", "Rules examined by the engines.", ["engine"])
+CONDITIONS_EVALUATED = REGISTRY.counter(
+    "engine_conditions_evaluated_total", "Conditions evaluated by the engines.", ["engine"],
+)
+DB_QUERIES = REGISTRY.counter("engine_db_queries_total", "Database queries issued while evaluating rules.", ["engine"])
+OPTION_CACHE = REGISTRY.counter(
+    "engine_option_cache_requests_total", "Option lookups for translated answers, by cache result.",
+    ["engine", "result"],
+)
+RULE_FIRED = REGISTRY.counter("engine_rule_fired_total", "Times each rule matched.", ["engine", "rule"])
+RULE_ERRORS = REGISTRY.counter("engine_rule_errors_total", "Rules that failed to parse or evaluate.", ["engine"])
+
+
+class EngineTrace:
+    """Counters for one engine call; with ``explain`` also every rule and condition."""
+
+    def __init__(self, engine: str, explain: bool = False):
+        self.engine = engine
+        self.explain = explain
+        self.rules_examined = 0
+        self.conditions_evaluated = 0
+        self.db_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rule_errors = 0
+        self.matched_rule_id: Optional[int] = None
+        self.duration = 0.0
+        self.rules: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+
+    def rule(self, rule) -> None:
+        self.rules_examined += 1
+        if self.explain:
+            self._current = {
+                "rule_id": rule.pk,
+                "description": getattr(rule, "description", ""),
+                "priority": getattr(rule, "priority", None),
+                "conditions": [],
+                "matched": False,
+            }
+            self.rules.append(self._current)
+
+    def rule_done(self, matched: bool, note: str = "", error: bool = False) -> None:
+        if error:
+            self.rule_errors += 1
+        if self._current is not None:
+            self._current["matched"] = matched
+            if note:
+                self._current["note"] = note
+            self._current = None
+
+    def condition(self, condition: Dict[str, Any], answer: Any, result: bool) -> None:
+        self.conditions_evaluated += 1
+        if self._current is not None:
+            self._current["conditions"].append({
+                "type": condition.get("type") or "value",
+                "question": condition.get("question"),
+                "operator": condition.get("operator"),
+                "expected": condition.get("value"),
+                "answer": answer,
+                "result": result,
+            })
+
+    def cache_hit(self) -> None:
+        self.cache_hits += 1
+
+    def cache_miss(self) -> None:
+        self.cache_misses += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {
+            "engine": self.engine,
+            "matched_rule_id": self.matched_rule_id,
+            "duration_ms": round(self.duration * 1000, 3),
+            "rules_examined": self.rules_examined,
+            "conditions_evaluated": self.conditions_evaluated,
+            "db_queries": self.db_queries,
+            "option_cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+            "rule_errors": self.rule_errors,
+        }
+        if self.explain:
+            data["rules"] = self.rules
+        return data
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _record(trace: EngineTrace) -> None:
+    engine = trace.engine
+    CALLS.inc(engine=engine, outcome="matched" if trace.matched_rule_id is not None else "no_match")
+    DURATION.observe(trace.duration, engine=engine)
+    RULES_EXAMINED.inc(trace.rules_examined, engine=engine)
+    CONDITIONS_EVALUATED.inc(trace.conditions_evaluated, engine=engine)
+    DB_QUERIES.inc(trace.db_queries, engine=engine)
+    if trace.cache_hits:
+        OPTION_CACHE.inc(trace.cache_hits, engine=engine, result="hit")
+    if trace.cache_misses:
+        OPTION_CACHE.inc(trace.cache_misses, engine=engine, result="miss")
+    if trace.rule_errors:
+        RULE_ERRORS.inc(trace.rule_errors, engine=engine)
+    if trace.matched_rule_id is not None:
+        RULE_FIRED.inc(engine=engine, rule=trace.matched_rule_id)
+
+    slow_ms = getattr(settings, "ENGINE_TRACE_SLOW_MS", None)
+    is_slow = slow_ms is not None and trace.duration * 1000 >= slow_ms
+    sample_rate = getattr(settings, "ENGINE_TRACE_SAMPLE_RATE", 0.0)
+    if is_slow or (sample_rate and random.random() < sample_rate):
+        data = trace.as_dict()
+        data["slow"] = is_slow
+        log.info(json.dumps(data, default=str), extra={"engine_trace": data})
+
+
+@contextmanager
+def trace_call(engine: str, explain: bool = False) -> Iterator[EngineTrace]:
+    """Trace one engine call; explain traces are returned to the caller instead of recorded."""
+    trace = EngineTrace(engine, explain=explain)
+    counter = _QueryCounter()
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            yield trace
+    finally:
+        trace.duration = time.perf_counter() - start
+        trace.db_queries = counter.count
+        if not explain:
+            _record(trace)
+
+
+class OptionCache:
+    """Options per assessment question, loaded once per engine instance.
+
+    Translated equality checks compare answers with option ids and texts;
+    without the cache every comparison issued its own query. Each question's
+    options are also indexed by id and stripped text, so a comparison is two
+    lookups instead of a scan of every option.
+    """
+
+    def __init__(self):
+        self._options: Dict[int, List[tuple]] = {}
+        self._index: Dict[int, Dict[str, Set[int]]] = {}
+
+    def get(self, question_id: int, trace: EngineTrace) -> List[tuple]:
+        options = self._options.get(question_id)
+        if options is not None:
+            trace.cache_hit()
+            return options
+        trace.cache_miss()
+        options = list(
+            AssessmentOption.objects.filter(question_id=question_id).values_list("id", "text_ar", "text_en")
+        )
+        self._options[question_id] = options
+        return options
+
+    def prime(self, options: Dict[int, List[tuple]]) -> None:
+        """Preload ``question_id -> [(id, text_ar, text_en), ...]`` so lookups need no queries."""
+        self._options.update(options)
+        for question_id in options:
+            self._index.pop(question_id, None)
+
+    def _option_index(self, question_id: int, trace: EngineTrace) -> Dict[str, Set[int]]:
+        options = self.get(question_id, trace)
+        index = self._index.get(question_id)
+        if index is None:
+            index = {}
+            for option_id, text_ar, text_en in options:
+                keys = [str(option_id)] + [text.strip() for text in (text_ar, text_en) if text]
+                for key in keys:
+                    index.setdefault(key, set()).add(option_id)
+            self._index[question_id] = index
+        return index
+
+    def same_option(self, question_id: int, answer: Any, expected: Any, trace: EngineTrace) -> bool:
+        """Whether ``answer`` and ``expected`` name the same option by id, Arabic or English text."""
+        index = self._option_index(question_id, trace)
+        expected_ids = index.get(str(expected).strip())
+        return bool(expected_ids) and not expected_ids.isdisjoint(index.get(str(answer).strip(), ()))
@@ -1,5 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
+
+from QuestionsBank.admin_inlines import PaginatedInlineMixin
+from jobs import queue
+
 from .models import AssessmentRun, AssessmentResult, AssessmentFile, QuestionClassification, QuestionClassificationRule
 
 class AssessmentFileInline(admin.TabularInline):
@@ -7,13 +11,23 @@ class AssessmentFileInline(admin.TabularInline):
     extra = 0
     readonly_fields = ("uploaded_by", "uploaded_at")
 
-class AssessmentResultInline(admin.TabularInline):
+class AssessmentResultInline(PaginatedInlineMixin, admin.TabularInline):
     model = AssessmentResult
     extra = 0
-    fields = ("survey_question", "results", "get_uploads", "assessed_by", "assessed_at", "classification")
-    readonly_fields = ("survey_question", "results", "get_uploads", "assessed_by", "assessed_at", "classification")
+    fields = ("survey_question", "results", "get_uploads", "assessed_by", "assessed_at", "classification", "replay_status")
+    readonly_fields = (
+        "survey_question", "results", "get_uploads", "assessed_by", "assessed_at", "classification", "replay_status",
+    )
     can_delete = True
 
+    def get_queryset(self, request):
+        # The readonly columns render the question, assessor and files of every row.
+        return (
+            super().get_queryset(request)
+            .select_related("survey_question", "assessed_by")
+            .prefetch_related("files")
+        )
+
     def get_uploads(self, obj):
         files = obj.files.all()
         if not files:
@@ -25,7 +39,34 @@ class AssessmentResultInline(admin.TabularInline):
 class AssessmentRunAdmin(admin.ModelAdmin):
     list_display = ("survey_version", "created_at", "updated_at")
     search_fields = ("survey_version__version_label", "survey_version__survey__name_ar", "survey_version__survey__name_en")
+    list_select_related = ("survey_version__survey",)
+    # A select of every version labels each option with its survey: one query per version.
+    raw_id_fields = ("survey_version",)
     inlines = [AssessmentResultInline]
+    actions = ["queue_export", "queue_replay_verification", "queue_answer_fact_rebuild"]
+
+    def has_queue_jobs_permission(self, request):
+        return request.user.has_perm("jobs.add_job")
+
+    def _queue(self, request, queryset, task, payload):
+        for run in queryset:
+            queue.enqueue(task, payload(run), user=request.user)
+        self.message_user(request, _("أُضيفت %(count)d مهمة إلى قائمة الانتظار.") % {"count": len(queryset)},
+                          messages.SUCCESS)
+
+    @admin.action(description=_("تصدير نتائج الجولات المحددة في الخلفية"), permissions=["queue_jobs"])
+    def queue_export(self, request, queryset):
+        self._queue(request, queryset, "assessment_runs.export", lambda run: {"run_id": run.pk})
+
+    @admin.action(description=_("التحقق من مسارات الجولات المحددة في الخلفية"), permissions=["queue_jobs"])
+    def queue_replay_verification(self, request, queryset):
+        self._queue(request, queryset, "assessment_runs.verify_replays",
+                    lambda run: {"version_id": run.survey_version_id})
+
+    @admin.action(description=_("إعادة بناء فهرس إجابات الجولات المحددة في الخلفية"), permissions=["queue_jobs"])
+    def queue_answer_fact_rebuild(self, request, queryset):
+        self._queue(request, queryset, "assessment_runs.rebuild_answer_facts",
+                    lambda run: {"version_id": run.survey_version_id})
 
 class QuestionClassificationRuleInline(admin.TabularInline):
     model = QuestionClassificationRule
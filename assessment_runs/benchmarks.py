@@ -0,0 +1,321 @@
+"""
+Micro-benchmarks for the rule engines.
+
+Each case times one engine call over a rule set built for it:
+
+* ``routing`` — ``assessment_flow.engine.RoutingEngine.get_next_question``
+* ``classification`` — ``ClassificationEngine.classify_question``
+* ``survey_routing`` — ``surveys.engine.SurveyRoutingEngine.get_next_question``
+
+for every operator (``==``, ``in``, ``contains``, ``regex``, ``count``), rule
+count and answer cardinality. ``rules - 1`` decoy rules test questions that
+were not answered, so the engine has to scan and parse all of them before
+the single matching rule, which sorts last. ``cold`` builds a new engine
+(loading its rules from the database) for every call; ``warm`` reuses one.
+
+Fixtures are written inside a transaction that is rolled back, so the suite
+can run against any database; the routing and classification engines also
+load the rules already stored there, so only compare runs made on the same
+data. Results are plain JSON so a run can be kept as a baseline and
+compared with ``compare`` later.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import django
+from django.db import connection, transaction
+
+from assessment_flow.engine import RoutingEngine
+from assessment_flow.models import AssessmentFlowRule, AssessmentOption, AssessmentQuestion
+from surveys.engine import SurveyRoutingEngine
+from surveys.models import Survey, SurveyQuestion, SurveyRoutingRule, SurveyVersion
+from .engine import ClassificationEngine
+from .models import QuestionClassification, QuestionClassificationRule
+
+ENGINES = ("routing", "classification", "survey_routing")
+OPERATORS = ("==", "in", "contains", "regex", "count")
+DEFAULT_RULE_COUNTS = (10, 100, 1000, 10000)
+DEFAULT_CARDINALITIES = (1, 10, 100)
+# Operators whose cost depends on how many values the answer holds.
+LIST_OPERATORS = ("in", "contains", "count")
+
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_MAX_ROUNDS = 50
+DEFAULT_THRESHOLD = 0.25
+
+# Decoy conditions point at question ids far above anything real, so they are never answered.
+DECOY_QUESTION_BASE = 10 ** 9
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Case:
+    engine: str
+    operator: str
+    rules: int
+    answers: int
+    cache: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.engine}/{self.operator}/rules={self.rules}/answers={self.answers}/{self.cache}"
+
+
+@dataclass
+class Timing:
+    rounds: int
+    min_ms: float
+    median_ms: float
+    mean_ms: float
+    stddev_ms: float
+
+
+def build_cases(
+        engines: Iterable[str] = ENGINES,
+        operators: Iterable[str] = OPERATORS,
+        rule_counts: Iterable[int] = DEFAULT_RULE_COUNTS,
+        cardinalities: Iterable[int] = DEFAULT_CARDINALITIES,
+) -> List[Case]:
+    cases = []
+    for engine in engines:
+        for operator in operators:
+            for rules in rule_counts:
+                for answers in (cardinalities if operator in LIST_OPERATORS else (1,)):
+                    for cache in ("cold", "warm"):
+                        cases.append(Case(engine, operator, rules, answers, cache))
+    return cases
+
+
+def _values(count: int) -> List[str]:
+    return [f"v{index}" for index in range(count)]
+
+
+def _answer(operator: str, answers: int):
+    if operator in LIST_OPERATORS:
+        return _values(answers)
+    return "v0"
+
+
+def _condition(operator: str, question_id: int, answers: int) -> dict:
+    """A condition on ``question_id`` that the answer from ``_answer`` satisfies."""
+    last = f"v{answers - 1}"
+    if operator == "==":
+        return {"question": question_id, "operator": "==", "value": "v0"}
+    if operator == "in":
+        return {"question": question_id, "operator": "in", "value": [last]}
+    if operator == "contains":
+        return {"question": question_id, "operator": "contains", "value": last}
+    if operator == "regex":
+        return {"question": question_id, "operator": "regex", "value": r"^v\d+$"}
+    return {"type": "count", "question": question_id, "operator": ">=", "value": answers}
+
+
+def _conditions(case: Case, question_id: int) -> List[str]:
+    decoys = [
+        json.dumps({"conditions": [_condition(case.operator, DECOY_QUESTION_BASE + index, case.answers)]})
+        for index in range(case.rules - 1)
+    ]
+    return decoys + [json.dumps({"conditions": [_condition(case.operator, question_id, case.answers)]})]
+
+
+class _Fixture:
+    """Rules for one case plus the call that exercises them."""
+
+    def __init__(self, case: Case):
+        self.case = case
+        self.responses: Dict[str, object] = {}
+        self.expected = None
+
+    def make_engine(self):
+        raise NotImplementedError
+
+    def call(self, engine):
+        raise NotImplementedError
+
+    def check(self, outcome) -> None:
+        if outcome != self.expected:
+            raise BenchmarkError(f"{self.case.name}: expected {self.expected!r}, engine returned {outcome!r}")
+
+
+class _RoutingFixture(_Fixture):
+    def __init__(self, case: Case):
+        super().__init__(case)
+        source = AssessmentQuestion.objects.create(text_en="Benchmark source")
+        AssessmentOption.objects.bulk_create([
+            AssessmentOption(question=source, text_en=value) for value in _values(case.answers)
+        ])
+        target = AssessmentQuestion.objects.create(text_en="Benchmark target")
+        # Decoys get lower priorities, so the matching rule is evaluated last.
+        AssessmentFlowRule.objects.bulk_create([
+            AssessmentFlowRule(to_question=target, condition=condition, priority=-case.rules + index)
+            for index, condition in enumerate(_conditions(case, source.id))
+        ], batch_size=1000)
+        self.responses = {str(source.id): _answer(case.operator, case.answers)}
+        self.expected = AssessmentFlowRule.objects.filter(to_question=target).order_by("-priority", "-id")[0].id
+
+    def make_engine(self):
+        return RoutingEngine()
+
+    def call(self, engine):
+        result = engine.get_next_question(self.responses)
+        return result.rule.id if result.rule else None
+
+
+class _SurveyRoutingFixture(_Fixture):
+    def __init__(self, case: Case):
+        super().__init__(case)
+        survey = Survey.objects.create(name_ar="قياس الأداء", name_en="Benchmark", code="BENCHMARK")
+        self.version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        source = SurveyQuestion.objects.create(survey_version=self.version, code="SRC", text_en="Source")
+        target = SurveyQuestion.objects.create(survey_version=self.version, code="DST", text_en="Target")
+        SurveyRoutingRule.objects.bulk_create([
+            SurveyRoutingRule(to_question=target, condition=condition, priority=-case.rules + index)
+            for index, condition in enumerate(_conditions(case, source.id))
+        ], batch_size=1000)
+        self.responses = {str(source.id): _answer(case.operator, case.answers)}
+        self.expected = SurveyRoutingRule.objects.filter(to_question=target).order_by("-priority", "-id")[0].id
+
+    def make_engine(self):
+        return SurveyRoutingEngine(self.version)
+
+    def call(self, engine):
+        result = engine.get_next_question(self.responses)
+        return result.rule.id if result.rule else None
+
+
+class _ClassificationFixture(_Fixture):
+    def __init__(self, case: Case):
+        super().__init__(case)
+        self.question = AssessmentQuestion.objects.create(text_en="Benchmark question")
+        AssessmentOption.objects.bulk_create([
+            AssessmentOption(question=self.question, text_en=value) for value in _values(case.answers)
+        ])
+        classification = QuestionClassification.objects.create(name_ar="قياس", name_en="Benchmark")
+        QuestionClassificationRule.objects.bulk_create([
+            QuestionClassificationRule(classification=classification, condition=condition, priority=index)
+            for index, condition in enumerate(_conditions(case, self.question.id))
+        ], batch_size=1000)
+        self.responses = {str(self.question.id): _answer(case.operator, case.answers)}
+        self.expected = QuestionClassificationRule.objects.order_by("-priority", "-id")[0].id
+
+    def make_engine(self):
+        return ClassificationEngine()
+
+    def call(self, engine):
+        result = engine.classify_question(self.question, self.responses)
+        return result.rule.id if result.rule else None
+
+
+FIXTURES = {
+    "routing": _RoutingFixture,
+    "classification": _ClassificationFixture,
+    "survey_routing": _SurveyRoutingFixture,
+}
+
+
+def _time(function: Callable[[], object], min_time: float, max_rounds: int) -> Timing:
+    samples = []
+    started = time.perf_counter()
+    while not samples or (len(samples) < max_rounds and time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return Timing(
+        rounds=len(samples),
+        min_ms=round(min(samples), 4),
+        median_ms=round(statistics.median(samples), 4),
+        mean_ms=round(statistics.fmean(samples), 4),
+        stddev_ms=round(statistics.pstdev(samples), 4),
+    )
+
+
+def run_case(case: Case, min_time: float = DEFAULT_MIN_TIME, max_rounds: int = DEFAULT_MAX_ROUNDS) -> Timing:
+    with transaction.atomic():
+        fixture = FIXTURES[case.engine](case)
+        warm_engine = fixture.make_engine()
+        fixture.check(fixture.call(warm_engine))
+        if case.cache == "warm":
+            timing = _time(lambda: fixture.call(warm_engine), min_time, max_rounds)
+        else:
+            timing = _time(lambda: fixture.call(fixture.make_engine()), min_time, max_rounds)
+        transaction.set_rollback(True)
+    return timing
+
+
+def run_benchmarks(
+        cases: Sequence[Case],
+        min_time: float = DEFAULT_MIN_TIME,
+        max_rounds: int = DEFAULT_MAX_ROUNDS,
+        progress: Optional[Callable[[Case, Timing], None]] = None,
+) -> dict:
+    """Time every case and return a JSON-serializable report."""
+    results = {}
+    for case in cases:
+        timing = run_case(case, min_time=min_time, max_rounds=max_rounds)
+        results[case.name] = {**asdict(case), **asdict(timing)}
+        if progress:
+            progress(case, timing)
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "machine": platform.machine(),
+            "min_time": min_time,
+            "max_rounds": max_rounds,
+        },
+        "results": results,
+    }
+
+
+def save(report: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline_ms: float
+    current_ms: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current_ms / self.baseline_ms if self.baseline_ms else float("inf")
+
+    def status(self, threshold: float) -> str:
+        if self.ratio > 1 + threshold:
+            return "regression"
+        if self.ratio < 1 / (1 + threshold):
+            return "improvement"
+        return "unchanged"
+
+
+def compare(baseline: dict, current: dict, metric: str = "median_ms") -> List[Comparison]:
+    """Pair up the cases present in both reports, in baseline order."""
+    current_results = current["results"]
+    return [
+        Comparison(name, entry[metric], current_results[name][metric])
+        for name, entry in baseline["results"].items()
+        if name in current_results
+    ]
+
+
+def regressions(comparisons: Iterable[Comparison], threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    return [comparison for comparison in comparisons if comparison.status(threshold) == "regression"]
@@ -0,0 +1,124 @@
+"""
+Optimistic concurrency for assessment results.
+
+Every ``AssessmentResult`` carries a ``version`` that each write increments.
+A writer states the version and history it started from and the update only
+applies while the row is still at that version (``UPDATE ... WHERE version =
+n``), so two assessors or two tabs on the same survey question can no longer
+overwrite each other's history unnoticed, and nobody holds a row lock.
+
+When the update misses, the writer's changes are merged three ways against
+the stored history (see ``merge_histories``) and the write is retried against
+the new version. Only merges that keep a path the engine could have taken are
+made; anything else raises ``VersionConflict``, which the view turns into a
+``409`` carrying the stored version and history. A merge that keeps the other
+writer's steps needs the classification recomputed from the merged history,
+so it is only made when the caller passes ``classify``.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .facts import refresh_result_facts
+from .models import AssessmentResult, AssessmentRun
+
+History = List[Dict[str, Any]]
+
+# Merged writes retried before giving up on a hot row.
+MAX_MERGE_ATTEMPTS = 3
+
+
+class VersionConflict(Exception):
+    def __init__(self, current: AssessmentResult):
+        super().__init__(f"Assessment result {current.pk} changed concurrently (now version {current.version})")
+        self.current = current
+
+
+def merge_histories(base: History, ours: History, theirs: History) -> Optional[History]:
+    """Three-way merge of assessment histories; ``None`` when they cannot be merged.
+
+    Each step's question was routed from the answers before it, so steps are
+    never combined from both sides: that could build a path the engine would
+    never take. Either side unchanged from ``base`` yields the other, and
+    when one side only continued the other's path, the longer path wins.
+    Anything else, such as the same step answered differently, conflicts.
+    """
+    if ours == theirs or ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+
+    shorter, longer = sorted((ours, theirs), key=len)
+    if longer[:len(shorter)] == shorter:
+        return longer
+    return None
+
+
+def _compare_and_swap(result_filter: Dict[str, Any], version: int, fields: Dict[str, Any]) -> bool:
+    return bool(AssessmentResult.objects.filter(version=version, **result_filter).update(
+        version=F("version") + 1, assessed_at=timezone.now(), **fields,
+    ))
+
+
+def save_result(
+        assessment_run: AssessmentRun,
+        survey_question,
+        *,
+        base_version: Optional[int],
+        base_history: Optional[History],
+        history: History,
+        classification: str = "",
+        classify: Optional[Callable[[History], str]] = None,
+        user=None,
+) -> Tuple[AssessmentResult, bool]:
+    """Write ``history`` if the stored result is still at ``base_version``, merging otherwise.
+
+    ``base_version`` 0 means the writer started before any result existed;
+    ``None`` (a session from before versioning) writes unconditionally.
+    ``classification`` belongs to ``history``; ``classify(history)`` gives
+    the classification of a merged history, and without it only merges
+    that keep ``history`` are made. Returns the saved result and whether a
+    merge was needed.
+    """
+    result_filter = {"assessment_run": assessment_run, "survey_question": survey_question}
+    fields = {
+        "results": history, "classification": classification, "assessed_by": user,
+        # A new history has not been replayed yet.
+        "replay_status": AssessmentResult.ReplayStatus.UNCHECKED,
+    }
+
+    if not base_version:
+        try:
+            with transaction.atomic():
+                result = AssessmentResult.objects.create(version=1, **result_filter, **fields)
+            return result, False
+        except IntegrityError:
+            # Created concurrently; merge against it below.
+            pass
+
+    base = base_history or []
+    merged = False
+    for _ in range(MAX_MERGE_ATTEMPTS):
+        if base_version is None:
+            base_version = AssessmentResult.objects.filter(**result_filter).values_list("version", flat=True).get()
+        if _compare_and_swap(result_filter, base_version, fields):
+            break
+        current = AssessmentResult.objects.get(**result_filter)
+        merged_history = merge_histories(base, fields["results"], current.results)
+        if merged_history is None or (merged_history != history and classify is None):
+            raise VersionConflict(current)
+        fields["classification"] = classification if merged_history == history else classify(merged_history)
+        merged = True
+        base, base_version = current.results, current.version
+        fields["results"] = merged_history
+    else:
+        raise VersionConflict(AssessmentResult.objects.get(**result_filter))
+
+    # update() sends no post_save, so refresh the analytics facts here.
+    result = AssessmentResult.objects.get(**result_filter)
+    refresh_result_facts(result)
+    return result, merged
@@ -0,0 +1,128 @@
+"""
+Database write-contention benchmark.
+
+Threads replay the database work of ``get_next_question_view``: load the
+session, load the routing rules, append to the history, ``update_or_create``
+the assessment result and save the session. Rule evaluation itself is left
+out; it is CPU work measured by ``benchmark_engines``. Each thread has its
+own connection, like a server worker, so the numbers show how a database
+profile (see ``QuestionsBank.db``) copes with concurrent assessors: step
+latency, throughput and how many steps failed on a locked database.
+
+``benchmark_database`` runs the same workload once per profile on a fresh
+database and prints them side by side.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import OperationalError, connection, connections, transaction
+
+from assessment_flow.engine import RoutingEngine
+from .loadtest import PERCENTILES, percentile
+from .models import AssessmentResult, AssessmentRun
+from . import synthetic
+
+# History entries kept per result and session, so rows stay a realistic size.
+HISTORY_LIMIT = 20
+
+
+@dataclass
+class Workload:
+    run_id: int
+    survey_question_ids: List[int]
+
+
+@dataclass
+class WorkerStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    lock_errors: int = 0
+
+
+def prepare(seed: int = 0, prefix: str = "DBBENCH") -> Workload:
+    """A small synthetic survey whose questions the threads assess."""
+    spec = synthetic.SyntheticSpec(
+        surveys=1, versions_per_survey=1, sections_per_version=1, questions_per_version=200,
+        assessed_ratio=0.0, indicators=1, items_per_indicator=1,
+    )
+    synthetic.generate(scale=1, seed=seed, prefix=prefix, spec=spec)
+    run = AssessmentRun.objects.filter(survey_version__survey__code__startswith=prefix).order_by("-id").first()
+    return Workload(run.id, list(run.survey_version.questions.order_by("id").values_list("id", flat=True)))
+
+
+def assessment_step(workload: Workload, session: SessionStore, rng: random.Random) -> None:
+    """One answered question: the reads and writes of get_next_question_view."""
+    history = session.get("assessment_history", [])
+    RoutingEngine()  # loads every routing rule, as the view does
+    history.append({"question_id": rng.choice(workload.survey_question_ids), "rule_id": None,
+                    "answer": rng.randint(1, 5)})
+    history = history[-HISTORY_LIMIT:]
+    with transaction.atomic():
+        AssessmentResult.objects.update_or_create(
+            assessment_run_id=workload.run_id,
+            survey_question_id=rng.choice(workload.survey_question_ids),
+            defaults={"results": history, "classification": ""},
+        )
+    session["assessment_history"] = history
+    session.save()
+
+
+def _worker(workload: Workload, deadline: float, think_time: float, seed: int, stats: WorkerStats) -> None:
+    rng = random.Random(seed)
+    session = SessionStore()
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                assessment_step(workload, session, rng)
+                stats.latencies.append((time.perf_counter() - start) * 1000)
+            except OperationalError as exc:
+                stats.errors += 1
+                if "locked" in str(exc):
+                    stats.lock_errors += 1
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def run(workload: Workload, threads: int = 8, duration: float = 10.0, think_time: float = 0.0,
+        seed: int = 0) -> Dict[str, object]:
+    """Run ``threads`` concurrent assessors for ``duration`` seconds and summarize."""
+    stats = [WorkerStats() for _ in range(threads)]
+    started = time.perf_counter()
+    deadline = started + duration
+    if threads == 1:
+        _worker(workload, deadline, think_time, seed, stats[0])
+    else:
+        workers = [
+            threading.Thread(target=_worker, args=(workload, deadline, think_time, seed + index, stats[index]))
+            for index in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    wall_time = time.perf_counter() - started
+
+    latencies = [value for worker in stats for value in worker.latencies]
+    errors = sum(worker.errors for worker in stats)
+    attempts = len(latencies) + errors
+    return {
+        "vendor": connection.vendor,
+        "threads": threads,
+        "wall_time_s": round(wall_time, 3),
+        "steps": len(latencies),
+        "throughput_sps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "latency_ms": {f"p{pct}": round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+        "errors": errors,
+        "lock_errors": sum(worker.lock_errors for worker in stats),
+        "error_rate": round(errors / attempts, 4) if attempts else 0.0,
+    }
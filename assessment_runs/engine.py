@@ -6,12 +6,25 @@ import re
 from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional
 
-from assessment_flow.models import AssessmentQuestion, AssessmentOption
+from assessment_flow.models import AssessmentQuestion
+from assessment_flow.tracing import EngineTrace, OptionCache, trace_call
 from .models import QuestionClassification, QuestionClassificationRule
 
 log = logging.getLogger(__name__)
 
 
+def survey_question_responses(survey_question_id: int, history: Iterable[Any]) -> Dict[str, Any]:
+    """
+    The responses a survey question's result is classified with: the answer
+    of the last answered step of its history, keyed by the survey question id.
+    """
+    latest_answer = next(
+        (step["answer"] for step in reversed(list(history or [])) if isinstance(step, dict) and "answer" in step),
+        None,
+    )
+    return {str(survey_question_id): latest_answer}
+
+
 @dataclass
 class ClassificationResult:
     """
@@ -29,10 +42,21 @@ class ClassificationEngine:
     QuestionClassificationRule JSON conditions.
     """
 
+    engine_name = "classification"
+
     def __init__(self, rules: Optional[Iterable[QuestionClassificationRule]] = None):
         if rules is None:
             rules = QuestionClassificationRule.objects.select_related("classification")
         self._rules: List[QuestionClassificationRule] = list(rules)
+        self._options = OptionCache()
+        self._trace = EngineTrace(self.engine_name)
+
+    def prime_options(self, options: Dict[int, List[tuple]]) -> None:
+        """
+        Preload the options translated answers are compared with, as
+        ``question_id -> [(id, text_ar, text_en), ...]``; see RoutingEngine.prime_options.
+        """
+        self._options.prime(options)
 
     def classify_question(
             self,
@@ -42,12 +66,37 @@ class ClassificationEngine:
         """
         Return the classification for a single AssessmentQuestion.
         """
+        with trace_call(self.engine_name) as trace:
+            return self._classify(trace, question, responses)
+
+    def explain(
+            self,
+            question: AssessmentQuestion | int,
+            responses: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Classify like classify_question and return the evaluation trace.
+        """
+        with trace_call(self.engine_name, explain=True) as trace:
+            result = self._classify(trace, question, responses)
+        data = trace.as_dict()
+        data["classification_id"] = result.classification.pk if result.classification else None
+        return data
+
+    def _classify(
+            self,
+            trace: EngineTrace,
+            question: AssessmentQuestion | int,
+            responses: Dict[str, Any],
+    ) -> ClassificationResult:
+        self._trace = trace
         question_obj = self._resolve_question(question)
-        
+
         # Find a rule that applies to this question and evaluates to True
         matched_rule = self._find_matching_rule(question_obj.id, responses)
 
         if matched_rule is not None:
+            trace.matched_rule_id = matched_rule.pk
             return ClassificationResult(
                 question=question_obj,
                 classification=matched_rule.classification,
@@ -74,6 +123,7 @@ class ClassificationEngine:
         AND if the condition evaluates to True.
         """
         for rule in self._rules:
+            self._trace.rule(rule)
             raw = getattr(rule, "condition", None)
 
             try:
@@ -81,24 +131,31 @@ class ClassificationEngine:
                     if raw.strip():
                         rule_dict = json.loads(raw)
                     else:
+                        self._trace.rule_done(False, "empty condition")
                         continue
                 elif isinstance(raw, dict):
                     rule_dict = raw
                 else:
+                    self._trace.rule_done(False, "no condition")
                     continue
 
                 # Check if this rule is relevant for the current question
                 if not self._is_rule_relevant_for_question(rule_dict, question_id):
+                    self._trace.rule_done(False, "not about this question")
                     continue
 
                 # Evaluate the rule
-                if self._evaluate_rule_dict(rule_dict, responses):
+                matched = self._evaluate_rule_dict(rule_dict, responses)
+                self._trace.rule_done(matched)
+                if matched:
                     return rule
 
             except json.JSONDecodeError:
                 log.warning("Invalid JSON in classification rule %s", getattr(rule, "pk", "<no-pk>"))
+                self._trace.rule_done(False, "invalid JSON", error=True)
                 continue
             except Exception as exc:
+                self._trace.rule_done(False, f"error: {exc}", error=True)
                 log.warning(
                     "Error evaluating classification rule %s: %s",
                     getattr(rule, "pk", "<no-pk>"),
@@ -171,9 +228,11 @@ class ClassificationEngine:
 
         if cond_type == "count":
             count = self._coerce_count(answer)
-            return self._compare_numeric(count, operator, expected)
-
-        return self._evaluate_value_condition(answer, operator, expected, question_id=int(question_id))
+            result = self._compare_numeric(count, operator, expected)
+        else:
+            result = self._evaluate_value_condition(answer, operator, expected, question_id=int(question_id))
+        self._trace.condition(cond, answer, result)
+        return result
 
     # ------------------------------------------------------------------
     # Helpers
@@ -195,24 +254,7 @@ class ClassificationEngine:
             question_id: Optional[int] = None,
     ) -> bool:
         def check_translated_equality(qid: int, ans: Any, exp: Any) -> bool:
-            s_ans = str(ans).strip()
-            s_exp = str(exp).strip()
-            options = AssessmentOption.objects.filter(question_id=qid)
-            for opt in options:
-                matches_exp = (
-                    str(opt.id) == s_exp or
-                    (opt.text_ar and opt.text_ar.strip() == s_exp) or
-                    (opt.text_en and opt.text_en.strip() == s_exp)
-                )
-                if matches_exp:
-                    matches_ans = (
-                        str(opt.id) == s_ans or
-                        (opt.text_ar and opt.text_ar.strip() == s_ans) or
-                        (opt.text_en and opt.text_en.strip() == s_ans)
-                    )
-                    if matches_ans:
-                        return True
-            return False
+            return self._options.same_option(qid, ans, exp, self._trace)
 
         def are_values_equal(ans: Any, exp: Any, qid: Optional[int]) -> bool:
             if str(ans) == str(exp):
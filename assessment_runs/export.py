@@ -0,0 +1,307 @@
+"""
+Streaming export of AssessmentResult histories.
+
+Results are read with ``QuerySet.iterator(chunk_size=...)`` and flattened into
+one row per result. Answer IDs are resolved to labels through a per-chunk
+lookup so the export issues a bounded number of queries per chunk instead of
+one per answer.
+"""
+from __future__ import annotations
+
+import csv
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.db.models import QuerySet
+
+from assessment_flow.models import AssessmentOption, AssessmentQuestion
+from indicators.models import IndicatorListItem
+from .models import AssessmentResult
+
+DEFAULT_CHUNK_SIZE = 500
+
+EXPORT_COLUMNS = [
+    "result_id",
+    "assessment_run_id",
+    "survey",
+    "survey_version",
+    "survey_question_id",
+    "survey_question_code",
+    "survey_question_text",
+    "question_path",
+    "answers",
+    "classification",
+    "assessed_by",
+    "assessed_at",
+    "run_created_at",
+]
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+PATH_SEPARATOR = " > "
+ANSWER_SEPARATOR = " | "
+
+
+class ExportError(Exception):
+    """Raised when an export cannot be produced (e.g. missing optional dependency)."""
+
+
+def export_queryset(
+        survey_version_id: Optional[int] = None,
+        assessment_run_id: Optional[int] = None,
+) -> QuerySet:
+    """Return the AssessmentResult queryset backing an export."""
+    qs = AssessmentResult.objects.select_related(
+        "assessment_run",
+        "survey_question__survey_version__survey",
+        "assessed_by",
+    ).order_by("assessment_run_id", "id")
+    if survey_version_id:
+        qs = qs.filter(assessment_run__survey_version_id=survey_version_id)
+    if assessment_run_id:
+        qs = qs.filter(assessment_run_id=assessment_run_id)
+    return qs
+
+
+def _as_list(answer: Any) -> List[Any]:
+    if answer is None:
+        return []
+    if isinstance(answer, (list, tuple)):
+        return list(answer)
+    return [answer]
+
+
+class AnswerLabelResolver:
+    """
+    Resolve option IDs stored in assessment histories to display labels.
+
+    Lookups are cached for the lifetime of the resolver and missing IDs are
+    fetched in bulk via :meth:`prime`, so each chunk of results costs at most
+    three queries regardless of its size.
+    """
+
+    def __init__(self, using: Optional[str] = None):
+        self.using = using
+        self._questions: Dict[int, AssessmentQuestion] = {}
+        self._options: Dict[int, str] = {}
+        self._indicator_items: Dict[int, str] = {}
+
+    def prime(self, histories: Iterable[Sequence[Dict[str, Any]]]) -> None:
+        question_ids = set()
+        answer_ids = set()
+        for history in histories:
+            for step in history or []:
+                if not isinstance(step, dict):
+                    continue
+                q_id = step.get("question_id")
+                if q_id is not None:
+                    question_ids.add(q_id)
+                for ans in _as_list(step.get("answer")):
+                    if isinstance(ans, int):
+                        answer_ids.add(ans)
+
+        missing_questions = question_ids - self._questions.keys()
+        if missing_questions:
+            for question in AssessmentQuestion.objects.using(self.using).filter(id__in=missing_questions):
+                self._questions[question.id] = question
+
+        missing_options = answer_ids - self._options.keys()
+        if missing_options:
+            for option in AssessmentOption.objects.using(self.using).filter(id__in=missing_options):
+                self._options[option.id] = option.display_text
+
+        missing_items = answer_ids - self._indicator_items.keys()
+        if missing_items:
+            for item in IndicatorListItem.objects.using(self.using).filter(id__in=missing_items).only("id", "name"):
+                self._indicator_items[item.id] = item.name
+
+    def question_label(self, question_id: Any) -> str:
+        question = self._questions.get(question_id)
+        return question.display_text if question else str(question_id)
+
+    def answer_labels(self, question_id: Any, answer: Any) -> List[str]:
+        question = self._questions.get(question_id)
+        is_indicator = (
+            question is not None
+            and question.option_type == AssessmentQuestion.OptionType.INDICATOR_LIST
+        )
+        labels = []
+        for ans in _as_list(answer):
+            if isinstance(ans, int):
+                lookup = self._indicator_items if is_indicator else self._options
+                labels.append(lookup.get(ans, str(ans)))
+            else:
+                labels.append(str(ans))
+        return labels
+
+
+def flatten_result(result: AssessmentResult, resolver: AnswerLabelResolver) -> List[Any]:
+    """Flatten a single AssessmentResult into a row matching EXPORT_COLUMNS."""
+    path = []
+    answers = []
+    for step in result.results or []:
+        if not isinstance(step, dict):
+            continue
+        q_id = step.get("question_id")
+        q_label = resolver.question_label(q_id)
+        path.append(q_label)
+        if "answer" in step:
+            labels = resolver.answer_labels(q_id, step.get("answer"))
+            answers.append(f"{q_label}: {', '.join(labels)}")
+
+    survey_question = result.survey_question
+    version = survey_question.survey_version
+    return [
+        result.id,
+        result.assessment_run_id,
+        version.survey.display_name,
+        version.version_label,
+        survey_question.id,
+        survey_question.code,
+        survey_question.display_text,
+        PATH_SEPARATOR.join(path),
+        ANSWER_SEPARATOR.join(answers),
+        result.classification,
+        result.assessed_by.get_username() if result.assessed_by else "",
+        result.assessed_at.isoformat() if result.assessed_at else "",
+        result.assessment_run.created_at.isoformat() if result.assessment_run.created_at else "",
+    ]
+
+
+def iter_row_chunks(
+        queryset: QuerySet,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[List[Any]]]:
+    """Yield flattened rows in chunks of at most ``chunk_size`` results."""
+    resolver = AnswerLabelResolver(using=queryset.db)
+    buffer: List[AssessmentResult] = []
+
+    def flush():
+        resolver.prime(result.results for result in buffer)
+        rows = [flatten_result(result, resolver) for result in buffer]
+        buffer.clear()
+        return rows
+
+    for result in queryset.iterator(chunk_size=chunk_size):
+        buffer.append(result)
+        if len(buffer) >= chunk_size:
+            yield flush()
+    if buffer:
+        yield flush()
+
+
+def iter_rows(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Any]]:
+    for chunk in iter_row_chunks(queryset, chunk_size=chunk_size):
+        yield from chunk
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """Yield CSV text incrementally; the header is emitted first."""
+    writer = csv.writer(_Echo())
+    # BOM so spreadsheet applications detect UTF-8 Arabic text.
+    yield "\ufeff" + writer.writerow(EXPORT_COLUMNS)
+    for chunk in iter_row_chunks(queryset, chunk_size=chunk_size):
+        yield "".join(writer.writerow(row) for row in chunk)
+
+
+def write_csv(queryset: QuerySet, fileobj, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    for piece in iter_csv(queryset, chunk_size=chunk_size):
+        fileobj.write(piece)
+
+
+def write_xlsx(queryset: QuerySet, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """Write an XLSX file using openpyxl's write-only (streaming) mode."""
+    try:
+        from openpyxl import Workbook
+    except ImportError as exc:
+        raise ExportError("XLSX export requires the 'openpyxl' package.") from exc
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("results")
+    sheet.append(EXPORT_COLUMNS)
+    for row in iter_rows(queryset, chunk_size=chunk_size):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_parquet(queryset: QuerySet, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """Write a Parquet file with one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ExportError("Parquet export requires the 'pyarrow' package.") from exc
+
+    schema = pa.schema([
+        ("result_id", pa.int64()),
+        ("assessment_run_id", pa.int64()),
+        ("survey", pa.string()),
+        ("survey_version", pa.string()),
+        ("survey_question_id", pa.int64()),
+        ("survey_question_code", pa.string()),
+        ("survey_question_text", pa.string()),
+        ("question_path", pa.string()),
+        ("answers", pa.string()),
+        ("classification", pa.string()),
+        ("assessed_by", pa.string()),
+        ("assessed_at", pa.string()),
+        ("run_created_at", pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_row_chunks(queryset, chunk_size=chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+
+
+def export_to_path(
+        queryset: QuerySet,
+        export_format: str,
+        path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """Write an export of ``queryset`` in ``export_format`` to ``path``."""
+    if export_format == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as fh:
+            write_csv(queryset, fh, chunk_size=chunk_size)
+    elif export_format == "xlsx":
+        write_xlsx(queryset, path, chunk_size=chunk_size)
+    elif export_format == "parquet":
+        write_parquet(queryset, path, chunk_size=chunk_size)
+    else:
+        raise ExportError(f"Unsupported export format: {export_format}")
+
+
+def export_to_tempfile(
+        queryset: QuerySet,
+        export_format: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> str:
+    """
+    Export binary formats to a temporary file and return its path.
+
+    XLSX and Parquet need a seekable target, so they are spooled to disk
+    rather than held in memory. The caller is responsible for removing the file.
+    """
+    fd, path = tempfile.mkstemp(suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        export_to_path(queryset, export_format, path, chunk_size=chunk_size)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
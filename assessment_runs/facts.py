@@ -0,0 +1,152 @@
+"""
+Maintenance of the AssessmentAnswerFact analytics table.
+
+Each answered step of an AssessmentResult history becomes one or more fact
+rows (one per selected option or free-text value), so reports can aggregate
+with indexed GROUP BY queries instead of parsing every results JSON blob.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+from django.db import transaction
+from django.db.models import Count, QuerySet
+
+from assessment_flow.models import AssessmentQuestion
+from .models import AssessmentAnswerFact, AssessmentResult
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _answer_values(answer: Any) -> List[Any]:
+    if answer is None:
+        return []
+    if isinstance(answer, (list, tuple)):
+        return list(answer)
+    return [answer]
+
+
+def build_facts(
+        result: AssessmentResult,
+        known_question_ids: Optional[Set[int]] = None,
+) -> List[AssessmentAnswerFact]:
+    """Return unsaved fact rows for ``result``.
+
+    ``known_question_ids`` limits facts to assessment questions that still
+    exist; history steps pointing at deleted questions are skipped.
+    """
+    facts = []
+    survey_version_id = result.assessment_run.survey_version_id
+    for step_index, step in enumerate(result.results or []):
+        if not isinstance(step, dict) or "answer" not in step:
+            continue
+        question_id = step.get("question_id")
+        if question_id is None:
+            continue
+        if known_question_ids is not None and question_id not in known_question_ids:
+            continue
+        for value in _answer_values(step.get("answer")):
+            is_option = isinstance(value, int) and not isinstance(value, bool)
+            facts.append(AssessmentAnswerFact(
+                assessment_result_id=result.id,
+                assessment_run_id=result.assessment_run_id,
+                survey_version_id=survey_version_id,
+                survey_question_id=result.survey_question_id,
+                assessment_question_id=question_id,
+                step=step_index,
+                option_id=value if is_option else None,
+                value_text="" if is_option else str(value),
+                classification=result.classification or "",
+                assessed_at=result.assessed_at,
+            ))
+    return facts
+
+
+def _existing_question_ids(results: Iterable[AssessmentResult]) -> Set[int]:
+    referenced = {
+        step.get("question_id")
+        for result in results
+        for step in (result.results or [])
+        if isinstance(step, dict) and step.get("question_id") is not None
+    }
+    if not referenced:
+        return set()
+    return set(AssessmentQuestion.objects.filter(id__in=referenced).values_list("id", flat=True))
+
+
+def refresh_result_facts(result: AssessmentResult) -> int:
+    """Replace the fact rows of a single result. Returns the number of rows written."""
+    facts = build_facts(result, _existing_question_ids([result]))
+    with transaction.atomic():
+        AssessmentAnswerFact.objects.filter(assessment_result_id=result.id).delete()
+        AssessmentAnswerFact.objects.bulk_create(facts)
+    return len(facts)
+
+
+def rebuild_facts(
+        queryset: Optional[QuerySet] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Rebuild facts for ``queryset`` (all results by default), one chunk per transaction.
+
+    Each chunk's old rows are replaced in the same transaction, so readers
+    never see the table emptied by a rebuild. ``progress(done, total)`` is
+    called after each chunk.
+    """
+    if queryset is None:
+        queryset = AssessmentResult.objects.all()
+    queryset = queryset.select_related("assessment_run").order_by("id")
+    total = queryset.count() if progress else 0
+
+    written = 0
+    done = 0
+    buffer: List[AssessmentResult] = []
+
+    def flush():
+        nonlocal done
+        known = _existing_question_ids(buffer)
+        facts = [fact for result in buffer for fact in build_facts(result, known)]
+        with transaction.atomic():
+            AssessmentAnswerFact.objects.filter(
+                assessment_result_id__in=[result.id for result in buffer]
+            ).delete()
+            AssessmentAnswerFact.objects.bulk_create(facts, batch_size=chunk_size)
+        done += len(buffer)
+        buffer.clear()
+        if progress:
+            progress(done, total)
+        return len(facts)
+
+    for result in queryset.iterator(chunk_size=chunk_size):
+        buffer.append(result)
+        if len(buffer) >= chunk_size:
+            written += flush()
+    if buffer:
+        written += flush()
+    return written
+
+
+def option_counts(assessment_question_id: int, survey_version_id: Optional[int] = None) -> QuerySet:
+    """Count answers per option (or free-text value) on an assessment question."""
+    qs = AssessmentAnswerFact.objects.filter(assessment_question_id=assessment_question_id)
+    if survey_version_id is not None:
+        qs = qs.filter(survey_version_id=survey_version_id)
+    return (
+        qs.values("option_id", "value_text")
+        .annotate(
+            answers=Count("id"),
+            survey_questions=Count("survey_question_id", distinct=True),
+        )
+        .order_by("-answers")
+    )
+
+
+def classification_counts(survey_version_id: int) -> QuerySet:
+    """Count assessed survey questions per classification for a survey version."""
+    return (
+        AssessmentAnswerFact.objects.filter(survey_version_id=survey_version_id)
+        .values("classification")
+        .annotate(survey_questions=Count("survey_question_id", distinct=True))
+        .order_by("classification")
+    )
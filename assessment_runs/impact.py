@@ -0,0 +1,180 @@
+"""
+Which stored assessments a rule change would change.
+
+``routing_impact`` and ``classification_impact`` take an edited but unsaved
+``AssessmentFlowRule`` or ``QuestionClassificationRule`` (or a rule about to
+be deleted) and replay the affected ``AssessmentResult`` histories through
+the rules as stored and as they would be after the change, before anything
+is written.
+
+Only histories that answered a question a routing rule reads (before or
+after the edit) can see it decide differently, and ``AssessmentAnswerFact``
+indexes answers by question, so the candidates come from one indexed query
+instead of a scan of every results blob. Results without any facts (nothing
+answered yet, or facts not built) are replayed as well, so missing facts
+cannot hide a change. A routing rule that can match while none
+of its questions are answered (a fallback, ``!=`` or ``count == 0``) can
+change any history, and then every result is replayed. Classification
+rules read survey question ids, so only the results of the survey questions
+a classification rule reads are replayed.
+
+A routing replay feeds the stored answers back one step at a time and
+reports the first step where the two rule sets route to a different
+question or by a different rule. A classification replay classifies the
+result's survey question with its latest answer, as the assessment page
+does when it saves a result (see ``replay``). With ``processes`` > 1
+the histories are replayed in a process pool, in chunks; the workers
+receive both rule sets as plain data and never touch the database.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Exists, OuterRef, Q
+
+from assessment_flow import graph as flow_graph
+from assessment_flow.models import AssessmentFlowRule
+from .models import AssessmentAnswerFact, AssessmentResult, QuestionClassificationRule
+from .replay import (
+    CLASSIFICATION, DEFAULT_CHUNK_SIZE, ROUTING, HistoryRow, RuleRow, RuleSet, history_rows, load_options,
+    map_chunks, replay_classification, replay_routing,
+)
+
+
+def _outcome(engine_name: str, next_id: Optional[int], rule_id: Optional[int]) -> Dict[str, Optional[int]]:
+    key = "next_question_id" if engine_name == ROUTING else "classification_id"
+    return {key: next_id, "rule_id": rule_id}
+
+
+def diff_history(engine_name: str, before, after, survey_question_id: int,
+                 history: List[Any]) -> Optional[Dict[str, Any]]:
+    """The first step where the two engines disagree on ``history``, or ``None``."""
+    if engine_name == ROUTING:
+        pairs = zip(replay_routing(before, history), replay_routing(after, history))
+    else:
+        pairs = [(replay_classification(before, survey_question_id, history),
+                  replay_classification(after, survey_question_id, history))]
+    for old, new in pairs:
+        if old != new:
+            step_index, question_id = old[:2]
+            return {
+                "step": step_index,
+                "question_id": question_id,
+                "before": _outcome(engine_name, *old[2:]),
+                "after": _outcome(engine_name, *new[2:]),
+            }
+    return None
+
+
+def _diff_chunk(engine_name: str, before, after, chunk: List[HistoryRow]) -> List[Dict[str, Any]]:
+    changes = []
+    for result_id, survey_question_id, _, history in chunk:
+        change = diff_history(engine_name, before, after, survey_question_id, history)
+        if change is not None:
+            changes.append({"result_id": result_id, "survey_question_id": survey_question_id, **change})
+    return changes
+
+
+_worker_engines: Optional[Tuple[str, Any, Any]] = None
+
+
+def _init_worker(before: RuleSet, after: RuleSet) -> None:
+    import django
+
+    django.setup()
+    global _worker_engines
+    _worker_engines = (before.engine_name, before.engine(), after.engine())
+
+
+def _diff_worker_chunk(chunk: List[HistoryRow]) -> List[Dict[str, Any]]:
+    return _diff_chunk(*_worker_engines, chunk)
+
+
+def _rule_sets(engine_name: str, rows: List[RuleRow], rule_id: Optional[int],
+               changed: Optional[RuleRow]) -> Tuple[RuleSet, RuleSet]:
+    options = load_options()
+    after = [row for row in rows if row[0] != rule_id]
+    if changed is not None:
+        after.append(changed)
+    after.sort(key=lambda row: (row[2], row[0]))
+    return RuleSet(engine_name, rows, options), RuleSet(engine_name, after, options)
+
+
+def _matches_unanswered(rule: flow_graph.Rule) -> bool:
+    if rule.error:
+        return False
+    if rule.fallback:
+        return True
+    optional = [not condition.requires_answer for condition in rule.conditions]
+    return all(optional) if rule.logic == "AND" else any(optional)
+
+
+def analyze(engine_name: str, rows: List[RuleRow], rule_id: Optional[int], changed: Optional[RuleRow], *,
+            processes: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Replay the histories the change can affect; ``changed`` ``None`` deletes rule ``rule_id``."""
+    started = time.perf_counter()
+    stored = next((row for row in rows if row[0] == rule_id), None)
+    versions = [flow_graph.parse_rule(row[0], row[1], row[2], row[3]) for row in (stored, changed) if row]
+    dependencies = sorted(set().union(*(rule.sources for rule in versions)))
+
+    results = AssessmentResult.objects.all()
+    if engine_name == ROUTING and any(_matches_unanswered(rule) for rule in versions):
+        selection = "all"
+    elif engine_name == CLASSIFICATION:
+        # Classification rules only apply to the survey questions they read.
+        selection = "dependency_index"
+        results = results.filter(survey_question_id__in=dependencies)
+    else:
+        selection = "dependency_index"
+        results = results.filter(
+            Q(pk__in=AssessmentAnswerFact.objects.filter(
+                assessment_question_id__in=dependencies,
+            ).values("assessment_result_id"))
+            | ~Exists(AssessmentAnswerFact.objects.filter(assessment_result=OuterRef("pk")))
+        )
+
+    before, after = _rule_sets(engine_name, rows, rule_id, changed)
+    before_engine, after_engine = before.engine(), after.engine()
+    changes: List[Dict[str, Any]] = []
+    replayed = 0
+    for chunk, chunk_changes in map_chunks(
+            lambda chunk: _diff_chunk(engine_name, before_engine, after_engine, chunk), _diff_worker_chunk,
+            _init_worker, (before, after), history_rows(results, chunk_size),
+            processes=processes, chunk_size=chunk_size):
+        replayed += len(chunk)
+        changes.extend(chunk_changes)
+
+    return {
+        "engine": engine_name,
+        "rule_id": rule_id,
+        "deleted": changed is None,
+        "dependencies": dependencies,
+        "selection": selection,
+        "total_results": AssessmentResult.objects.count(),
+        "replayed": replayed,
+        "changed": len(changes),
+        "changes": changes,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def routing_impact(rule: AssessmentFlowRule, *, delete: bool = False, **kwargs) -> Dict[str, Any]:
+    """Impact of saving the edited ``rule`` (or deleting it) on stored routes."""
+    rows = list(AssessmentFlowRule.objects.order_by("priority", "id").values_list(
+        "id", "to_question_id", "priority", "condition",
+    ))
+    # A new rule sorts after every stored rule of the same priority.
+    rule_id = rule.pk if rule.pk is not None else max((row[0] for row in rows), default=0) + 1
+    changed = None if delete else (rule_id, rule.to_question_id, rule.priority, rule.condition)
+    return analyze(ROUTING, rows, rule_id, changed, **kwargs)
+
+
+def classification_impact(rule: QuestionClassificationRule, *, delete: bool = False, **kwargs) -> Dict[str, Any]:
+    """Impact of saving the edited ``rule`` (or deleting it) on stored classifications."""
+    rows = list(QuestionClassificationRule.objects.order_by("priority", "id").values_list(
+        "id", "classification_id", "priority", "condition",
+    ))
+    rule_id = rule.pk if rule.pk is not None else max((row[0] for row in rows), default=0) + 1
+    changed = None if delete else (rule_id, rule.classification_id, rule.priority, rule.condition)
+    return analyze(CLASSIFICATION, rows, rule_id, changed, **kwargs)
@@ -0,0 +1,393 @@
+"""
+Local load generator that simulates concurrent assessors.
+
+Each virtual user keeps its own cookie session and walks the assessment flow
+the way the browser does: it opens ``assessment_page`` for a survey question,
+answers the active question with one of the options rendered in the page,
+posts to ``get_next_question`` until the flow ends, occasionally rewinds to an
+earlier question, and finishes with ``assessment_complete``. A share of the
+iterations instead round-trips the routing builder (load, then save the same
+rules back). Users pause for a randomized think time between requests.
+
+Every response is timed per endpoint. When the server runs with query
+instrumentation in debug (``QuestionsBank.middleware``), the ``Server-Timing``
+header adds database time, write time (on SQLite this includes waiting for the
+write lock) and lock errors to the report.
+
+The harness only uses the standard library: virtual users are threads doing
+blocking HTTP against a dev or ASGI server on localhost.
+"""
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.cookiejar import CookieJar
+from typing import Dict, List, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.urls import reverse
+
+from assessment_flow import graph as flow_graph
+from surveys.models import SurveyQuestion, SurveyVersion
+
+PERCENTILES = (50, 90, 95, 99)
+DEFAULT_TIMEOUT = 30
+MAX_STEPS = 50
+
+_QUESTION_RE = re.compile(r'data-question-id="(\d+)"')
+_OPTION_RE = re.compile(r'data-option-id="(\d+)"')
+_TIMING_RE = re.compile(r'\s*([\w-]+)((?:\s*;\s*[\w-]+=(?:"[^"]*"|[^,;]*))*)')
+_PARAM_RE = re.compile(r'([\w-]+)=("[^"]*"|[^,;]*)')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, dict]:
+    """``{"db": {"dur": 1.2, "desc": "4 queries"}, ...}`` from a Server-Timing header."""
+    metrics = {}
+    for part in (header or "").split(","):
+        match = _TIMING_RE.match(part)
+        if not match or not match.group(1):
+            continue
+        params = {}
+        for key, value in _PARAM_RE.findall(match.group(2)):
+            value = value.strip().strip('"')
+            if key == "dur":
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+            params[key] = value
+        metrics[match.group(1)] = params
+    return metrics
+
+
+def rendered_options(html: str) -> Dict[int, List[str]]:
+    """Option ids of each question box in ``html``, in page order."""
+    boxes = list(_QUESTION_RE.finditer(html))
+    options = {}
+    for index, match in enumerate(boxes):
+        end = boxes[index + 1].start() if index + 1 < len(boxes) else len(html)
+        options[int(match.group(1))] = _OPTION_RE.findall(html, match.end(), end)
+    return options
+
+
+def _leading_int(text: str) -> int:
+    match = re.match(r"\s*(\d+)", text or "")
+    return int(match.group(1)) if match else 0
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int
+    latency: float
+    db_time: Optional[float] = None
+    write_time: Optional[float] = None
+    lock_errors: int = 0
+    error: str = ""
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error) or self.status >= 400 or self.status == 0
+
+
+@dataclass
+class EndpointStats:
+    samples: List[Sample] = field(default_factory=list)
+
+    def summary(self, wall_time: float) -> dict:
+        latencies = [sample.latency * 1000 for sample in self.samples]
+        db_times = [sample.db_time for sample in self.samples if sample.db_time is not None]
+        write_times = [sample.write_time for sample in self.samples if sample.write_time is not None]
+        errors = sum(1 for sample in self.samples if sample.failed)
+        count = len(self.samples)
+        return {
+            "requests": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / wall_time, 2) if wall_time else 0.0,
+            "latency_ms": {f"p{pct}": round(percentile(latencies, pct), 2) for pct in PERCENTILES},
+            "latency_ms_max": round(max(latencies, default=0.0), 2),
+            # Only known when the server sends Server-Timing (query instrumentation in debug).
+            "db_ms": _percentiles(db_times),
+            "write_ms": _percentiles(write_times),
+            "lock_errors": sum(sample.lock_errors for sample in self.samples),
+            "status_codes": _status_counts(self.samples),
+        }
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    return {f"p{pct}": round(percentile(values, pct), 2) for pct in PERCENTILES}
+
+
+def _status_counts(samples: List[Sample]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for sample in samples:
+        key = str(sample.status) if sample.status else "connection-error"
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class Recorder:
+    """Thread-safe collection of samples, grouped by endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints: Dict[str, EndpointStats] = {}
+
+    def add(self, sample: Sample) -> None:
+        with self._lock:
+            self.endpoints.setdefault(sample.endpoint, EndpointStats()).samples.append(sample)
+
+    def report(self, wall_time: float) -> dict:
+        with self._lock:
+            endpoints = {name: stats.summary(wall_time) for name, stats in sorted(self.endpoints.items())}
+            samples = [sample for stats in self.endpoints.values() for sample in stats.samples]
+        total = EndpointStats(samples).summary(wall_time)
+        write_times = [sample.write_time for sample in samples if sample.write_time is not None]
+        return {
+            "wall_time_s": round(wall_time, 2),
+            "total": total,
+            "endpoints": endpoints,
+            "sqlite_locks": {
+                "lock_errors": total["lock_errors"],
+                "locked_responses": sum(
+                    1 for sample in samples if sample.lock_errors or "database is locked" in sample.error
+                ),
+                "write_wait_ms": _percentiles(write_times),
+                "write_wait_ms_max": round(max(write_times), 2) if write_times else None,
+            },
+        }
+
+
+@dataclass
+class FlowPlan:
+    """What the virtual users need to know about the database before starting."""
+
+    entry_question_ids: List[int]
+    survey_question_ids: List[int]
+    routing_version_ids: List[int]
+
+
+def build_plan(version_id: Optional[int] = None, limit: int = 1000) -> FlowPlan:
+    """Entry points of the assessment flow and the survey questions to assess."""
+    entry_ids = list(flow_graph.get_graph().entry_points)
+    questions = SurveyQuestion.objects.order_by("id")
+    versions = SurveyVersion.objects.filter(questions__isnull=False).distinct().order_by("id")
+    if version_id:
+        questions = questions.filter(survey_version_id=version_id)
+        versions = versions.filter(pk=version_id)
+    return FlowPlan(
+        entry_question_ids=entry_ids,
+        survey_question_ids=list(questions.values_list("id", flat=True)[:limit]),
+        routing_version_ids=list(versions.values_list("id", flat=True)[:limit]),
+    )
+
+
+@dataclass
+class UserSettings:
+    think_time: float = 1.0
+    rewind_probability: float = 0.1
+    builder_ratio: float = 0.1
+    timeout: float = DEFAULT_TIMEOUT
+
+
+class VirtualUser:
+    """One assessor with its own session cookie."""
+
+    def __init__(self, base_url: str, plan: FlowPlan, recorder: Recorder, settings: UserSettings, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.plan = plan
+        self.recorder = recorder
+        self.settings = settings
+        self.rng = random.Random(seed)
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    # -- HTTP ------------------------------------------------------------
+
+    def _csrf_token(self) -> str:
+        return next((cookie.value for cookie in self.cookies if cookie.name == "csrftoken"), "")
+
+    def request(self, endpoint: str, path: str, payload=None, params=None) -> Tuple[int, str]:
+        url = self.base_url + path + (f"?{urlencode(params)}" if params else "")
+        headers = {"Accept-Language": "ar"}
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+            headers.update({
+                "Content-Type": "application/json",
+                "X-CSRFToken": self._csrf_token(),
+                "Referer": self.base_url + "/",
+            })
+        request = Request(url, data=data, headers=headers, method="POST" if payload is not None else "GET")
+
+        start = time.perf_counter()
+        status, body, timing, error = 0, "", "", ""
+        try:
+            with self.opener.open(request, timeout=self.settings.timeout) as response:
+                status = response.status
+                body = response.read().decode("utf-8", "replace")
+                timing = response.headers.get("Server-Timing", "")
+        except HTTPError as exc:
+            status = exc.code
+            body = exc.read().decode("utf-8", "replace")
+            timing = exc.headers.get("Server-Timing", "")
+            if "database is locked" in body:
+                error = "database is locked"
+        except (URLError, OSError) as exc:
+            error = str(getattr(exc, "reason", exc))
+        latency = time.perf_counter() - start
+
+        metrics = parse_server_timing(timing)
+        self.recorder.add(Sample(
+            endpoint=endpoint,
+            status=status,
+            latency=latency,
+            db_time=metrics.get("db", {}).get("dur"),
+            write_time=metrics.get("db-write", {}).get("dur"),
+            lock_errors=_leading_int(metrics.get("db-lock", {}).get("desc", "")),
+            error=error,
+        ))
+        return status, body
+
+    def think(self) -> None:
+        if self.settings.think_time > 0:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.settings.think_time)
+
+    # -- Scenarios -------------------------------------------------------
+
+    def _choose_answer(self, options: Dict[int, List[str]], question_id: int) -> List[str]:
+        """One of the options rendered for ``question_id``; free text when it has none."""
+        choices = options.get(question_id)
+        return [self.rng.choice(choices)] if choices else ["نعم"]
+
+    def run_assessment(self) -> None:
+        if not self.plan.entry_question_ids or not self.plan.survey_question_ids:
+            return
+        entry = self.rng.choice(self.plan.entry_question_ids)
+        survey_question_id = self.rng.choice(self.plan.survey_question_ids)
+        status, html = self.request(
+            "assessment_page",
+            reverse("assessment_page", args=[entry]),
+            params={"survey_question_id": survey_question_id},
+        )
+        if status != 200:
+            return
+        options = rendered_options(html)
+        path = list(options) or [entry]
+        current = path[-1]
+
+        for _ in range(MAX_STEPS):
+            self.think()
+            if len(path) > 1 and self.rng.random() < self.settings.rewind_probability:
+                current = self.rng.choice(path[:-1])
+                status, _ = self.request(
+                    "rewind_assessment", reverse("rewind_assessment"), payload={"question_id": current}
+                )
+                if status != 200:
+                    return
+                path = path[:path.index(current) + 1]
+                continue
+
+            status, fragment = self.request(
+                "get_next_question",
+                reverse("get_next_question"),
+                payload={"question_id": current, "option_ids": self._choose_answer(options, current)},
+            )
+            if status == 204 or status >= 400:
+                break
+            found = rendered_options(fragment)
+            if not found:
+                break
+            options.update(found)
+            current = next(iter(found))
+            path.append(current)
+
+        self.think()
+        self.request("assessment_complete", reverse("assessment_complete"))
+
+    def run_builder_save(self) -> None:
+        if not self.plan.routing_version_ids:
+            return
+        version_id = self.rng.choice(self.plan.routing_version_ids)
+        # The builder page sets the CSRF cookie, as it does for a real editor.
+        self.request("survey_builder_routing", reverse("survey_builder_routing"))
+        status, body = self.request(
+            "survey_routing_data", reverse("survey_routing_data"), params={"version_id": version_id}
+        )
+        if status != 200:
+            return
+        data = json.loads(body)
+        self.think()
+        self.request("survey_routing_save", reverse("survey_routing_save"), payload={
+            "version_id": version_id,
+            "rules": [
+                {key: rule[key] for key in ("to_question", "priority", "description", "condition")}
+                for rule in data.get("rules", [])
+            ],
+            "layout": data.get("layout") or {},
+        })
+
+    def run_iteration(self) -> None:
+        if self.rng.random() < self.settings.builder_ratio:
+            self.run_builder_save()
+        else:
+            self.run_assessment()
+
+
+def run_load_test(
+        base_url: str,
+        plan: FlowPlan,
+        users: int = 10,
+        duration: Optional[float] = None,
+        iterations: Optional[int] = None,
+        ramp_up: float = 0.0,
+        settings: Optional[UserSettings] = None,
+        seed: int = 0,
+) -> dict:
+    """Run ``users`` virtual users until ``duration`` seconds pass or each finished ``iterations``."""
+    if duration is None and iterations is None:
+        iterations = 1
+    settings = settings or UserSettings()
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+
+    def worker(index: int) -> None:
+        if ramp_up and users > 1:
+            time.sleep(ramp_up * index / users)
+        user = VirtualUser(base_url, plan, recorder, settings, seed=seed * 100003 + index)
+        completed = 0
+        while True:
+            if iterations is not None and completed >= iterations:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            user.run_iteration()
+            completed += 1
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        for future in [executor.submit(worker, index) for index in range(users)]:
+            future.result()
+
+    report = recorder.report(time.perf_counter() - started)
+    report["users"] = users
+    return report
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_runs import dbbench
+from QuestionsBank.db import PROFILES
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the same concurrent assessment write workload against each database profile and compares '
+        'step latency, throughput and lock errors. SQLite profiles get a fresh temporary file; the postgres '
+        'profile uses the DJANGO_DB_* settings, which must name a disposable database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=['sqlite-default', 'sqlite'])
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile.')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean pause in seconds between a thread\'s steps.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emit the reports as JSON.')
+        parser.add_argument('--in-process', action='store_true',
+                            help='Run once against the configured database (used for each profile).')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1.')
+        if options['in_process']:
+            call_command('migrate', verbosity=0, interactive=False)
+            workload = dbbench.prepare(seed=options['seed'])
+            report = dbbench.run(workload, threads=options['threads'], duration=options['duration'],
+                                 think_time=options['think_time'], seed=options['seed'])
+            self.stdout.write(json.dumps(report))
+            return
+
+        if 'postgres' in options['profiles'] and not os.environ.get('DJANGO_DB_NAME'):
+            raise CommandError('Set DJANGO_DB_NAME (and DJANGO_DB_USER/PASSWORD/HOST) to a disposable '
+                               'PostgreSQL database before benchmarking the postgres profile.')
+
+        reports = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                reports[profile] = self.run_profile(profile, directory, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2))
+            return
+        self.stdout.write(
+            f"{'profile':<16}{'steps':>8}{'steps/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'locked':>8}"
+        )
+        for profile, report in reports.items():
+            latency = report['latency_ms']
+            self.stdout.write(
+                f"{profile:<16}{report['steps']:>8}{report['throughput_sps']:>10.1f}{latency['p50']:>9.1f}"
+                f"{latency['p95']:>9.1f}{latency['p99']:>9.1f}{report['errors']:>8}{report['lock_errors']:>8}"
+            )
+
+    def run_profile(self, profile, directory, options):
+        env = dict(os.environ, DJANGO_DB_PROFILE=profile, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        if profile != 'postgres':
+            env['DJANGO_DB_NAME'] = os.path.join(directory, f'{profile}.sqlite3')
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_database', '--in-process',
+            '--threads', str(options['threads']), '--duration', str(options['duration']),
+            '--think-time', str(options['think_time']), '--seed', str(options['seed']),
+        ]
+        self.stderr.write(f'Benchmarking {profile}...')
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f'{profile} benchmark failed:\n{completed.stderr.strip()}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_runs import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the routing, classification and survey routing engines across operators, rule counts, '
+        'answer cardinalities and cold/warm engines, and optionally saves the results as a JSON baseline '
+        'or compares them with one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', action='append', choices=benchmarks.ENGINES, dest='engines',
+                            help='Engine to benchmark; repeat for several (default: all).')
+        parser.add_argument('--operator', action='append', choices=benchmarks.OPERATORS, dest='operators')
+        parser.add_argument('--rule-counts', type=int, nargs='+', default=list(benchmarks.DEFAULT_RULE_COUNTS))
+        parser.add_argument('--cardinalities', type=int, nargs='+', default=list(benchmarks.DEFAULT_CARDINALITIES),
+                            help='Answer sizes for the list operators (in, contains, count).')
+        parser.add_argument('--min-time', type=float, default=benchmarks.DEFAULT_MIN_TIME,
+                            help='Seconds to keep repeating each case.')
+        parser.add_argument('--max-rounds', type=int, default=benchmarks.DEFAULT_MAX_ROUNDS)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', metavar='BASELINE', help='Compare the results with a saved baseline.')
+        parser.add_argument('--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLD,
+                            help='Relative slowdown of the median that counts as a regression.')
+
+    def handle(self, *args, **options):
+        if min(options['rule_counts']) < 1 or min(options['cardinalities']) < 1:
+            raise CommandError('Rule counts and cardinalities must be at least 1.')
+        baseline = benchmarks.load(options['compare']) if options['compare'] else None
+
+        cases = benchmarks.build_cases(
+            engines=options['engines'] or benchmarks.ENGINES,
+            operators=options['operators'] or benchmarks.OPERATORS,
+            rule_counts=options['rule_counts'],
+            cardinalities=options['cardinalities'],
+        )
+        report = benchmarks.run_benchmarks(
+            cases,
+            min_time=options['min_time'],
+            max_rounds=options['max_rounds'],
+            progress=lambda case, timing: self.stdout.write(
+                f'{case.name:<60}{timing.median_ms:>12.3f} ms  (min {timing.min_ms:.3f}, {timing.rounds} rounds)'
+            ),
+        )
+        if options['output']:
+            benchmarks.save(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Saved {len(report['results'])} results to {options['output']}."))
+
+        if baseline is not None:
+            report_comparison(self, baseline, report, options['threshold'])
+
+
+def report_comparison(command, baseline, current, threshold):
+    """Print every changed case and fail when any regressed beyond ``threshold``."""
+    comparisons = benchmarks.compare(baseline, current)
+    for comparison in comparisons:
+        status = comparison.status(threshold)
+        if status == 'unchanged':
+            continue
+        style = command.style.ERROR if status == 'regression' else command.style.SUCCESS
+        command.stdout.write(style(
+            f'{status:<12}{comparison.name:<60}{comparison.baseline_ms:>10.3f} -> {comparison.current_ms:.3f} ms '
+            f'(x{comparison.ratio:.2f})'
+        ))
+    regressed = benchmarks.regressions(comparisons, threshold)
+    if regressed:
+        raise CommandError(f'{len(regressed)} of {len(comparisons)} cases regressed by more than {threshold:.0%}.')
+    command.stdout.write(command.style.SUCCESS(f'No regressions beyond {threshold:.0%} in {len(comparisons)} cases.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from assessment_runs import benchmarks
+from .benchmark_engines import report_comparison
+
+
+class Command(BaseCommand):
+    help = 'Compares two saved engine benchmark runs and fails if any case regressed beyond the threshold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLD,
+                            help='Relative slowdown of the median that counts as a regression.')
+
+    def handle(self, *args, **options):
+        report_comparison(self, benchmarks.load(options['baseline']), benchmarks.load(options['current']),
+                          options['threshold'])
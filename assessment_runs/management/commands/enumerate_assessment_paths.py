@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_flow import paths
+
+
+class Command(BaseCommand):
+    help = (
+        'Enumerates every path through the assessment flow (Monte-Carlo sampling when there are too many) '
+        'and reports path counts, path lengths and terminal questions; optionally saves the report or '
+        'compares it with a saved one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Explore the entry points\' first answers in this many processes.')
+        parser.add_argument('--max-states', type=int, default=paths.DEFAULT_MAX_STATES,
+                            help='Memoized states (per process) before falling back to sampling.')
+        parser.add_argument('--samples', type=int, default=paths.DEFAULT_SAMPLES,
+                            help='Random walks when sampling.')
+        parser.add_argument('--seed', type=int, help='Seed for the random walks.')
+        parser.add_argument('--output', help='Write the report to this JSON file.')
+        parser.add_argument('--compare', metavar='BASELINE', help='Compare the path counts with a saved report.')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['max_states'] < 1 or options['samples'] < 1:
+            raise CommandError('Processes, max states and samples must be at least 1.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fh:
+                baseline = json.load(fh)
+
+        report = paths.enumerate_paths(
+            processes=options['processes'],
+            max_states=options['max_states'],
+            samples=options['samples'],
+            seed=options['seed'],
+        )
+        if report['method'] == 'exhaustive':
+            self.stdout.write(f"{report['paths']} paths from {len(report['entry_points'])} entry points "
+                              f"({report['states']} states, {report['seconds']} s).")
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Too many states to enumerate; sampled {report['samples']} walks, "
+                f"{report['distinct_paths']} distinct ({report['seconds']} s)."
+            ))
+        self.stdout.write(f"Length: min {report['min_length']}, mean {report['mean_length']}, "
+                          f"max {report['max_length']}")
+        for length, count in report['lengths'].items():
+            self.stdout.write(f'  {length:>4} questions: {count}')
+        self.stdout.write('Terminal questions:')
+        for question_id, count in sorted(report['terminals'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  Q{question_id}: {count}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved the report to {options['output']}."))
+
+        if baseline is not None:
+            if baseline['method'] != 'exhaustive' or report['method'] != 'exhaustive':
+                raise CommandError('Only two exhaustive reports can be compared.')
+            changes = paths.compare(baseline, report)
+            for change in changes:
+                self.stdout.write(self.style.ERROR(change))
+            if changes:
+                raise CommandError(f'{len(changes)} path counts changed.')
+            self.stdout.write(self.style.SUCCESS('Path counts match the baseline.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from assessment_runs import export as result_export
+
+
+class Command(BaseCommand):
+    help = 'Exports assessment results as CSV, XLSX or Parquet without loading every result into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', default='csv',
+                            choices=sorted(result_export.EXPORT_FORMATS))
+        parser.add_argument('--output', '-o', default='-',
+                            help="Destination file path, or '-' for stdout (CSV only).")
+        parser.add_argument('--version-id', type=int, help='Only export results for this survey version.')
+        parser.add_argument('--run-id', type=int, help='Only export results for this assessment run.')
+        parser.add_argument('--chunk-size', type=int, default=result_export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help="Database alias to read from, e.g. 'replica'.")
+
+    def handle(self, *args, **options):
+        export_format = options['export_format']
+        output = options['output']
+        queryset = result_export.export_queryset(
+            survey_version_id=options['version_id'],
+            assessment_run_id=options['run_id'],
+        ).using(options['database'])
+
+        if output == '-':
+            if export_format != 'csv':
+                raise CommandError('Binary formats require --output.')
+            result_export.write_csv(queryset, self.stdout, chunk_size=options['chunk_size'])
+            return
+
+        try:
+            result_export.export_to_path(queryset, export_format, output, chunk_size=options['chunk_size'])
+        except result_export.ExportError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stderr.write(self.style.SUCCESS(f'Exported assessment results to {output}'))
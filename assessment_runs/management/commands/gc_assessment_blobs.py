@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from assessment_runs.storage import collect_garbage
+from assessment_runs.uploads import expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Deletes unreferenced assessment file blobs and abandoned chunked uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Only collect blobs unreferenced for at least this long.')
+        parser.add_argument('--upload-max-age-hours', type=int, default=24,
+                            help='Expire chunked uploads untouched for this long.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            expired = expire_stale_uploads(datetime.timedelta(hours=options['upload_max_age_hours']))
+            self.stdout.write(f'Expired {expired} abandoned uploads.')
+
+        removed = collect_garbage(
+            grace=datetime.timedelta(minutes=options['grace_minutes']),
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} unreferenced blobs.'))
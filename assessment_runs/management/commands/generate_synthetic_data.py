@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_runs import synthetic
+from surveys.models import Survey
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-inserts a seeded synthetic dataset for scale benchmarks: surveys, versions and questions, '
+        'copies of the assessment_flow.json flow graph, assessment result histories and indicators. '
+        'Scale 1 is about 2,400 survey questions; use 10 and 100 for the larger benchmark sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplier applied to the base dataset.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='SYN',
+                            help='Prefix of the generated survey and indicator names; must not be in use.')
+        parser.add_argument('--batch-size', type=int, default=synthetic.DEFAULT_BATCH_SIZE)
+        parser.add_argument('--flow', help='Flow shape to copy (defaults to assessment_flow.json).')
+        parser.add_argument('--answer-facts', action='store_true',
+                            help='Also build AssessmentAnswerFact rows for the generated results.')
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError('--scale must be positive.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if Survey.objects.filter(code__startswith=options['prefix']).exists():
+            raise CommandError(f"Surveys with prefix {options['prefix']!r} already exist; pick another --prefix.")
+
+        counts = synthetic.generate(
+            scale=options['scale'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            flow_shape=synthetic.load_flow_shape(options['flow']) if options['flow'] else None,
+            answer_facts=options['answer_facts'],
+            progress=self.stderr.write,
+        )
+        for model, count in counts.items():
+            self.stdout.write(f'{model}: {count}')
+        self.stdout.write(self.style.SUCCESS(f"Generated {sum(counts.values())} rows."))
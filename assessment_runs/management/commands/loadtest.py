@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_runs import loadtest
+
+
+def _ms(percentiles, key):
+    return '-' if percentiles is None else f'{percentiles[key]:.1f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates concurrent assessors against a running server on localhost and reports latency '
+        'percentiles, throughput, error rates and SQLite lock statistics per endpoint. '
+        'Assessments and builder saves write to the database: point it at a disposable copy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Server to load (runserver, or an ASGI server such as uvicorn).')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, help='Seconds to run; defaults to one iteration per user.')
+        parser.add_argument('--iterations', type=int, help='Iterations per user (ignored with --duration).')
+        parser.add_argument('--ramp-up', type=float, default=0.0, help='Seconds over which users start.')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Mean pause in seconds between a user\'s requests.')
+        parser.add_argument('--rewind-probability', type=float, default=0.1)
+        parser.add_argument('--builder-ratio', type=float, default=0.1,
+                            help='Share of iterations that round-trip the routing builder instead of assessing.')
+        parser.add_argument('--version-id', type=int, help='Only assess questions of this survey version.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emit the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        plan = loadtest.build_plan(version_id=options['version_id'])
+        if not plan.entry_question_ids or not plan.survey_question_ids:
+            raise CommandError('Nothing to assess: the flow has no entry question or there are no survey questions.')
+
+        report = loadtest.run_load_test(
+            options['base_url'],
+            plan,
+            users=options['users'],
+            duration=options['duration'],
+            iterations=None if options['duration'] else options['iterations'],
+            ramp_up=options['ramp_up'],
+            settings=loadtest.UserSettings(
+                think_time=options['think_time'],
+                rewind_probability=options['rewind_probability'],
+                builder_ratio=options['builder_ratio'],
+            ),
+            seed=options['seed'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['users']} users, {report['wall_time_s']}s, "
+            f"{report['total']['requests']} requests ({report['total']['throughput_rps']} req/s)"
+        )
+        header = f"{'endpoint':<26}{'reqs':>7}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'db p95':>9}{'rps':>8}"
+        self.stdout.write(header)
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<26}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%"
+                f"{stats['latency_ms']['p50']:>9.1f}{stats['latency_ms']['p95']:>9.1f}"
+                f"{stats['latency_ms']['p99']:>9.1f}{_ms(stats['db_ms'], 'p95'):>9}{stats['throughput_rps']:>8.1f}"
+            )
+        locks = report['sqlite_locks']
+        self.stdout.write(
+            f"SQLite: {locks['lock_errors']} lock errors, {locks['locked_responses']} locked responses, "
+            f"write wait p95 {_ms(locks['write_wait_ms'], 'p95')} ms"
+        )
+        if locks['write_wait_ms'] is None:
+            self.stdout.write('No Server-Timing headers: run the server with DEBUG and query instrumentation for DB times.')
+        style = self.style.ERROR if report['total']['errors'] else self.style.SUCCESS
+        self.stdout.write(style(f"Error rate {report['total']['error_rate'] * 100:.2f}%"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from assessment_runs.facts import DEFAULT_CHUNK_SIZE, rebuild_facts
+from assessment_runs.models import AssessmentResult
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the AssessmentAnswerFact analytics table from stored assessment results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--version-id', type=int, help='Only rebuild facts for this survey version.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = None
+        if options['version_id']:
+            queryset = AssessmentResult.objects.filter(
+                assessment_run__survey_version_id=options['version_id']
+            )
+
+        written = rebuild_facts(queryset, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} answer facts.'))
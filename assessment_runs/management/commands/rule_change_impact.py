@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_flow.models import AssessmentFlowRule
+from assessment_runs import impact
+from assessment_runs.models import QuestionClassificationRule
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays the stored assessment results a routing or classification rule change would affect, '
+        'through the current rules and the edited ones, and reports every result that would change. '
+        'Nothing is saved.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('engine', choices=[impact.ROUTING, impact.CLASSIFICATION])
+        parser.add_argument('--rule', type=int, help='The rule to edit or delete; leave out to add a rule.')
+        parser.add_argument('--condition', help='The new condition JSON.')
+        parser.add_argument('--priority', type=int, help='The new priority.')
+        parser.add_argument('--target', type=int,
+                            help='The new destination question (routing) or classification id.')
+        parser.add_argument('--delete', action='store_true', help='Report the impact of deleting the rule.')
+        parser.add_argument('--processes', type=int, default=1, help='Replay in this many processes.')
+        parser.add_argument('--chunk-size', type=int, default=impact.DEFAULT_CHUNK_SIZE,
+                            help='Histories per replay task.')
+        parser.add_argument('--output', help='Write the report to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('Processes and chunk size must be at least 1.')
+        routing = options['engine'] == impact.ROUTING
+        model = AssessmentFlowRule if routing else QuestionClassificationRule
+        if options['rule'] is not None:
+            try:
+                rule = model.objects.get(pk=options['rule'])
+            except model.DoesNotExist:
+                raise CommandError(f"Rule {options['rule']} does not exist.")
+        elif options['delete']:
+            raise CommandError('--delete needs --rule.')
+        elif options['target'] is None:
+            raise CommandError('A new rule needs --target.')
+        else:
+            rule = model(priority=0, condition='')
+
+        if options['condition'] is not None:
+            try:
+                json.loads(options['condition'])
+            except json.JSONDecodeError as exc:
+                raise CommandError(f'Invalid condition JSON: {exc}')
+            rule.condition = options['condition']
+        if options['priority'] is not None:
+            rule.priority = options['priority']
+        if options['target'] is not None:
+            setattr(rule, 'to_question_id' if routing else 'classification_id', options['target'])
+
+        analyze = impact.routing_impact if routing else impact.classification_impact
+        report = analyze(rule, delete=options['delete'], processes=options['processes'],
+                         chunk_size=options['chunk_size'])
+
+        if report['selection'] == 'all':
+            self.stdout.write(self.style.WARNING(
+                'The rule can match without any of its questions answered; replayed every result.'
+            ))
+        self.stdout.write(f"Replayed {report['replayed']} of {report['total_results']} results "
+                          f"reading questions {report['dependencies']} ({report['seconds']} s).")
+        outcome = 'next_question_id' if routing else 'classification_id'
+        for change in report['changes']:
+            self.stdout.write(
+                f"  result {change['result_id']} step {change['step']} (Q{change['question_id']}): "
+                f"{change['before'][outcome]} by rule {change['before']['rule_id']} -> "
+                f"{change['after'][outcome]} by rule {change['after']['rule_id']}"
+            )
+        style = self.style.WARNING if report['changed'] else self.style.SUCCESS
+        self.stdout.write(style(f"{report['changed']} results would change."))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved the report to {options['output']}."))
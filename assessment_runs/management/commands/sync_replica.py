@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from QuestionsBank.routers import sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies the SQLite primary database into the replica file configured by DJANGO_DB_REPLICA_NAME, '
+        'for testing the primary/replica router locally. PostgreSQL replicas are kept current by '
+        'streaming replication instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep copying every INTERVAL seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        replica_alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+        if not replica_alias:
+            raise CommandError('No replica is configured; set DJANGO_DB_REPLICA_NAME.')
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replica = settings.DATABASES[replica_alias]
+        sqlite = 'django.db.backends.sqlite3'
+        if primary['ENGINE'] != sqlite or replica['ENGINE'] != sqlite:
+            raise CommandError('sync_replica only copies SQLite databases.')
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError('The replica must be a different file from the primary.')
+
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive.')
+        while True:
+            started = time.perf_counter()
+            sync_sqlite_replica(str(primary['NAME']), str(replica['NAME']))
+            self.stderr.write(f"Synced {replica['NAME']} in {time.perf_counter() - started:.2f}s")
+            if interval is None:
+                return
+            time.sleep(interval)
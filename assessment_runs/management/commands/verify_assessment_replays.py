@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessment_runs import replay
+from assessment_runs.models import AssessmentResult
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays stored assessment histories through the current flow and reports the ones that diverge '
+        '(a different next question or rule, or a question, rule or option that no longer exists); '
+        'optionally records the outcome on each result.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--version-id', type=int, help='Only check results of this survey version.')
+        parser.add_argument('--status', choices=AssessmentResult.ReplayStatus.values,
+                            help='Only check results with this recorded replay status.')
+        parser.add_argument('--processes', type=int, default=1, help='Replay in this many processes.')
+        parser.add_argument('--chunk-size', type=int, default=replay.DEFAULT_CHUNK_SIZE,
+                            help='Histories per replay task.')
+        parser.add_argument('--record', action='store_true', help='Save the outcome as each result\'s replay status.')
+        parser.add_argument('--show', type=int, default=20, help='List at most this many diverging results.')
+        parser.add_argument('--output', help='Write the report to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('Processes and chunk size must be at least 1.')
+        queryset = AssessmentResult.objects.all()
+        if options['version_id']:
+            queryset = queryset.filter(assessment_run__survey_version_id=options['version_id'])
+        if options['status']:
+            queryset = queryset.filter(replay_status=options['status'])
+
+        report = replay.verify_results(queryset, processes=options['processes'], chunk_size=options['chunk_size'],
+                                       record=options['record'])
+
+        self.stdout.write(f"Replayed {report['checked']} results: {report['valid']} valid, "
+                          f"{report['diverged']} diverged ({report['seconds']} s).")
+        for kind, count in report['issues'].items():
+            self.stdout.write(f'  {kind}: {count}')
+        for result in report['results'][:options['show']]:
+            first = result['issues'][0]
+            self.stdout.write(self.style.WARNING(
+                f"  result {result['result_id']} (survey question {result['survey_question_id']}): "
+                f"{first['kind']} at step {first['step']}"
+                + (f" (+{len(result['issues']) - 1} more)" if len(result['issues']) > 1 else '')
+            ))
+        if options['record']:
+            self.stdout.write(self.style.SUCCESS('Recorded the replay status of every checked result.'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved the report to {options['output']}."))
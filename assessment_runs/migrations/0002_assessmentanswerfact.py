@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_answer_facts(apps, schema_editor):
+    """Flatten every stored result into facts; a copy of assessment_runs.facts.build_facts as of this migration."""
+    AssessmentResult = apps.get_model('assessment_runs', 'AssessmentResult')
+    AssessmentAnswerFact = apps.get_model('assessment_runs', 'AssessmentAnswerFact')
+    AssessmentQuestion = apps.get_model('assessment_flow', 'AssessmentQuestion')
+    known_question_ids = set(AssessmentQuestion.objects.values_list('id', flat=True))
+
+    facts = []
+    results = AssessmentResult.objects.select_related('assessment_run').order_by('id')
+    for result in results.iterator(chunk_size=BACKFILL_CHUNK_SIZE):
+        for step_index, step in enumerate(result.results or []):
+            if not isinstance(step, dict) or 'answer' not in step:
+                continue
+            question_id = step.get('question_id')
+            if question_id not in known_question_ids:
+                continue
+            answer = step.get('answer')
+            values = [] if answer is None else list(answer) if isinstance(answer, (list, tuple)) else [answer]
+            for value in values:
+                is_option = isinstance(value, int) and not isinstance(value, bool)
+                facts.append(AssessmentAnswerFact(
+                    assessment_result_id=result.id,
+                    assessment_run_id=result.assessment_run_id,
+                    survey_version_id=result.assessment_run.survey_version_id,
+                    survey_question_id=result.survey_question_id,
+                    assessment_question_id=question_id,
+                    step=step_index,
+                    option_id=value if is_option else None,
+                    value_text='' if is_option else str(value),
+                    classification=result.classification or '',
+                    assessed_at=result.assessed_at,
+                ))
+        if len(facts) >= BACKFILL_CHUNK_SIZE:
+            AssessmentAnswerFact.objects.bulk_create(facts, batch_size=BACKFILL_CHUNK_SIZE)
+            facts = []
+    AssessmentAnswerFact.objects.bulk_create(facts, batch_size=BACKFILL_CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_flow', '0001_initial'),
+        ('assessment_runs', '0001_initial'),
+        ('surveys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentAnswerFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.PositiveSmallIntegerField(default=0, verbose_name='الخطوة')),
+                ('option_id', models.BigIntegerField(blank=True, null=True, verbose_name='معرف الخيار')),
+                ('value_text', models.TextField(blank=True, verbose_name='القيمة النصية')),
+                ('classification', models.CharField(blank=True, max_length=100, verbose_name='التصنيف')),
+                ('assessed_at', models.DateTimeField(blank=True, null=True, verbose_name='في')),
+                ('assessment_question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_facts', to='assessment_flow.assessmentquestion', verbose_name='سؤال التقييم')),
+                ('assessment_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_facts', to='assessment_runs.assessmentresult', verbose_name='نتيجة التقييم')),
+                ('assessment_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_facts', to='assessment_runs.assessmentrun', verbose_name='عملية التقييم')),
+                ('survey_question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_facts', to='surveys.surveyquestion', verbose_name='سؤال الاستبيان')),
+                ('survey_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_facts', to='surveys.surveyversion', verbose_name='إصدار الاستبيان')),
+            ],
+            options={
+                'verbose_name': 'إجابة تقييم (تحليلات)',
+                'verbose_name_plural': 'إجابات التقييم (تحليلات)',
+                'ordering': ['assessment_result_id', 'step'],
+                'indexes': [models.Index(fields=['assessment_question', 'option_id'], name='answerfact_question_option'), models.Index(fields=['survey_version', 'assessment_question', 'option_id'], name='answerfact_version_option'), models.Index(fields=['survey_version', 'classification'], name='answerfact_version_class')],
+            },
+        ),
+        migrations.RunPython(backfill_answer_facts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:53
+
+import assessment_runs.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_runs', '0002_assessmentanswerfact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='بصمة SHA-256')),
+                ('size', models.BigIntegerField(default=0, verbose_name='الحجم')),
+                ('file', models.FileField(max_length=255, upload_to='', verbose_name='الملف')),
+                ('ref_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='عدد المراجع')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'محتوى ملف',
+                'verbose_name_plural': 'محتويات الملفات',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='assessmentfile',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=assessment_runs.models.get_assessment_file_path, verbose_name='الملف'),
+        ),
+        migrations.AddField(
+            model_name='assessmentfile',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assessment_files', to='assessment_runs.storedblob', verbose_name='المحتوى'),
+        ),
+    ]
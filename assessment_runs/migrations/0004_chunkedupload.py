@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:54
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_flow', '0001_initial'),
+        ('assessment_runs', '0003_storedblob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='اسم الملف الأصلي')),
+                ('total_size', models.BigIntegerField(verbose_name='الحجم الكلي')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='حجم الجزء')),
+                ('received_chunks', models.JSONField(blank=True, default=list, verbose_name='الأجزاء المستلمة')),
+                ('temp_path', models.CharField(blank=True, editable=False, max_length=500)),
+                ('status', models.CharField(choices=[('PENDING', 'قيد الرفع'), ('COMPLETE', 'مكتمل'), ('EXPIRED', 'منتهي')], db_index=True, default='PENDING', max_length=20, verbose_name='الحالة')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assessment_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='assessment_runs.assessmentfile', verbose_name='ملف التقييم')),
+                ('assessment_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to='assessment_runs.assessmentresult', verbose_name='نتيجة التقييم')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL, verbose_name='بواسطة')),
+                ('triggering_option', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_uploads', to='assessment_flow.assessmentoption', verbose_name='الخيار المحفز')),
+            ],
+            options={
+                'verbose_name': 'رفع مجزأ',
+                'verbose_name_plural': 'عمليات الرفع المجزأ',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_runs', '0004_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentresult',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='الإصدار'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_runs', '0005_assessmentresult_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentresult',
+            name='replay_status',
+            field=models.CharField(choices=[('unchecked', 'لم يُتحقق منه'), ('valid', 'يطابق المسار الحالي'), ('diverged', 'يخالف المسار الحالي')], db_index=True, default='unchecked', editable=False, max_length=20, verbose_name='التحقق من المسار'),
+        ),
+    ]
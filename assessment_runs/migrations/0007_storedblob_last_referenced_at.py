@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessment_runs', '0006_assessmentresult_replay_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='last_referenced_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='آخر استخدام'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import get_language
@@ -7,7 +8,7 @@ import os
 import uuid
 
 from surveys.models import SurveyQuestion, SurveyVersion
-from assessment_flow.models import AssessmentOption
+from assessment_flow.models import AssessmentOption, AssessmentQuestion
 
 User = get_user_model()
 
@@ -52,12 +53,24 @@ class AssessmentResult(models.Model):
         unique_together = ("assessment_run", "survey_question")
         ordering = ["assessment_run_id", "survey_question__code"]
 
+    class ReplayStatus(models.TextChoices):
+        UNCHECKED = "unchecked", _("لم يُتحقق منه")
+        VALID = "valid", _("يطابق المسار الحالي")
+        DIVERGED = "diverged", _("يخالف المسار الحالي")
+
     assessment_run = models.ForeignKey(AssessmentRun, on_delete=models.CASCADE, related_name="results", verbose_name=_("عملية التقييم"))
     survey_question = models.ForeignKey(SurveyQuestion, on_delete=models.CASCADE, related_name="assessment_results", verbose_name=_("السؤال"))
     results = models.JSONField(default=list, blank=True, verbose_name=_("النتائج"))
     assessed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="assessment_results", verbose_name=_("بواسطة"))
     assessed_at = models.DateTimeField(auto_now=True, verbose_name=_("في"))
     classification = models.CharField(max_length=100, blank=True, verbose_name=_("التصنيف"))
+    # Incremented by every write; see assessment_runs.concurrency.
+    version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("الإصدار"))
+    # Outcome of the last replay through the flow; see assessment_runs.replay.
+    replay_status = models.CharField(
+        max_length=20, choices=ReplayStatus.choices, default=ReplayStatus.UNCHECKED, editable=False,
+        db_index=True, verbose_name=_("التحقق من المسار"),
+    )
 
 
 class QuestionClassification(models.Model):
@@ -103,6 +116,32 @@ class QuestionClassificationRule(models.Model):
         return self.description or f"Rule for {self.classification}"
 
 
+class StoredBlob(models.Model):
+    """Content-addressed file body shared by every AssessmentFile with the same bytes.
+
+    Blobs are keyed by their SHA-256 digest and stored once; ``ref_count``
+    tracks how many AssessmentFile rows point at the blob so unreferenced
+    blobs can be garbage collected.
+    """
+
+    class Meta:
+        verbose_name = _("محتوى ملف")
+        verbose_name_plural = _("محتويات الملفات")
+        ordering = ["-created_at"]
+
+    digest = models.CharField(max_length=64, unique=True, verbose_name=_("بصمة SHA-256"))
+    size = models.BigIntegerField(default=0, verbose_name=_("الحجم"))
+    file = models.FileField(max_length=255, verbose_name=_("الملف"))
+    ref_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name=_("عدد المراجع"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last time an upload reused the blob or a file released it; garbage
+    # collection counts its grace period from here.
+    last_referenced_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_("آخر استخدام"))
+
+    def __str__(self):
+        return self.digest
+
+
 class AssessmentFile(models.Model):
     """File uploaded as part of an assessment result."""
 
@@ -113,7 +152,8 @@ class AssessmentFile(models.Model):
 
     assessment_result = models.ForeignKey(AssessmentResult, on_delete=models.CASCADE, related_name="files", verbose_name=_("نتيجة التقييم"))
     triggering_option = models.ForeignKey(AssessmentOption, on_delete=models.SET_NULL, null=True, blank=True, related_name="uploaded_files", verbose_name=_("الخيار المحفز"))
-    file = models.FileField(upload_to=get_assessment_file_path, verbose_name=_("الملف"))
+    file = models.FileField(upload_to=get_assessment_file_path, max_length=255, verbose_name=_("الملف"))
+    blob = models.ForeignKey(StoredBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="assessment_files", verbose_name=_("المحتوى"))
     original_filename = models.CharField(max_length=255, verbose_name=_("اسم الملف الأصلي"))
     description = models.TextField(blank=True, verbose_name=_("الوصف"))
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="uploaded_assessment_files", verbose_name=_("تم الرفع بواسطة"))
@@ -121,3 +161,89 @@ class AssessmentFile(models.Model):
 
     def __str__(self):
         return self.original_filename or os.path.basename(self.file.name)
+
+
+class AssessmentAnswerFact(models.Model):
+    """One answer given on one assessment question, flattened from AssessmentResult.results.
+
+    Rows are derived data: they are rewritten whenever the parent result is
+    saved and can be rebuilt with the ``rebuild_answer_facts`` command.
+    """
+
+    class Meta:
+        verbose_name = _("إجابة تقييم (تحليلات)")
+        verbose_name_plural = _("إجابات التقييم (تحليلات)")
+        ordering = ["assessment_result_id", "step"]
+        indexes = [
+            models.Index(fields=["assessment_question", "option_id"], name="answerfact_question_option"),
+            models.Index(
+                fields=["survey_version", "assessment_question", "option_id"],
+                name="answerfact_version_option",
+            ),
+            models.Index(fields=["survey_version", "classification"], name="answerfact_version_class"),
+        ]
+
+    assessment_result = models.ForeignKey(AssessmentResult, on_delete=models.CASCADE, related_name="answer_facts", verbose_name=_("نتيجة التقييم"))
+    assessment_run = models.ForeignKey(AssessmentRun, on_delete=models.CASCADE, related_name="answer_facts", verbose_name=_("عملية التقييم"))
+    survey_version = models.ForeignKey(SurveyVersion, on_delete=models.CASCADE, related_name="answer_facts", verbose_name=_("إصدار الاستبيان"))
+    survey_question = models.ForeignKey(SurveyQuestion, on_delete=models.CASCADE, related_name="answer_facts", verbose_name=_("سؤال الاستبيان"))
+    assessment_question = models.ForeignKey(AssessmentQuestion, on_delete=models.CASCADE, related_name="answer_facts", verbose_name=_("سؤال التقييم"))
+    step = models.PositiveSmallIntegerField(default=0, verbose_name=_("الخطوة"))
+    option_id = models.BigIntegerField(null=True, blank=True, verbose_name=_("معرف الخيار"))
+    value_text = models.TextField(blank=True, verbose_name=_("القيمة النصية"))
+    classification = models.CharField(max_length=100, blank=True, verbose_name=_("التصنيف"))
+    assessed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("في"))
+
+    def __str__(self):
+        value = self.option_id if self.option_id is not None else self.value_text
+        return f"Q{self.assessment_question_id} = {value}"
+
+
+class ChunkedUpload(models.Model):
+    """An in-progress resumable upload that is assembled chunk by chunk into a temporary file."""
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", _("قيد الرفع")
+        COMPLETE = "COMPLETE", _("مكتمل")
+        EXPIRED = "EXPIRED", _("منتهي")
+
+    class Meta:
+        verbose_name = _("رفع مجزأ")
+        verbose_name_plural = _("عمليات الرفع المجزأ")
+        ordering = ["-created_at"]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    assessment_result = models.ForeignKey(AssessmentResult, on_delete=models.CASCADE, related_name="chunked_uploads", verbose_name=_("نتيجة التقييم"))
+    triggering_option = models.ForeignKey(AssessmentOption, on_delete=models.SET_NULL, null=True, blank=True, related_name="chunked_uploads", verbose_name=_("الخيار المحفز"))
+    filename = models.CharField(max_length=255, verbose_name=_("اسم الملف الأصلي"))
+    total_size = models.BigIntegerField(verbose_name=_("الحجم الكلي"))
+    chunk_size = models.PositiveIntegerField(verbose_name=_("حجم الجزء"))
+    received_chunks = models.JSONField(default=list, blank=True, verbose_name=_("الأجزاء المستلمة"))
+    temp_path = models.CharField(max_length=500, blank=True, editable=False)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True, verbose_name=_("الحالة"))
+    assessment_file = models.ForeignKey(AssessmentFile, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name=_("ملف التقييم"))
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="chunked_uploads", verbose_name=_("بواسطة"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+    @property
+    def total_chunks(self) -> int:
+        if self.total_size == 0:
+            return 1
+        return (self.total_size + self.chunk_size - 1) // self.chunk_size
+
+    def expected_chunk_length(self, index: int) -> int:
+        start = index * self.chunk_size
+        return max(0, min(self.chunk_size, self.total_size - start))
+
+    @property
+    def acknowledged_offset(self) -> int:
+        """Bytes received contiguously from the start of the file; clients resume from here."""
+        received = set(self.received_chunks)
+        index = 0
+        while index in received:
+            index += 1
+        return min(index * self.chunk_size, self.total_size)
@@ -0,0 +1,333 @@
+"""
+Replaying stored assessment histories through the rule engines.
+
+An ``AssessmentResult.results`` history is the list of steps the assessment
+page recorded: each shown question, the rule that routed to it and, once
+answered, the answer. Feeding the answers back into a ``RoutingEngine``
+one step at a time reproduces the route; rules are handed to the engines
+as a ``RuleSet`` of plain rows, so a replay issues no queries and can run
+in worker processes.
+
+``verify_results`` checks every history against the current flow and
+reports the divergences:
+
+- ``missing_question`` / ``missing_rule`` / ``missing_option``: a step
+  points at a question, rule or (static) option that no longer exists;
+- ``next_question``: after an answer the flow now routes somewhere else
+  (or ends, or goes on where the history ended);
+- ``rule``: the same question is now reached by a different rule.
+
+Routing is only compared up to the first divergence; the stored answers
+after it belong to a path the flow no longer takes. With ``record`` the
+outcome is written to the indexed ``AssessmentResult.replay_status``, so
+stale results can be listed without replaying them again. A status holds
+until the result is written again (``concurrency.save_result`` resets it)
+or the next verification; rerun it after editing the flow. A result saved
+while it was being replayed keeps the status of its new version.
+"""
+from __future__ import annotations
+
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connections
+from django.db.models import QuerySet
+
+from assessment_flow.engine import RoutingEngine
+from assessment_flow.models import AssessmentFlowRule, AssessmentOption, AssessmentQuestion
+from .engine import ClassificationEngine, survey_question_responses
+from .models import AssessmentResult, QuestionClassification, QuestionClassificationRule
+
+ROUTING = "routing"
+CLASSIFICATION = "classification"
+
+DEFAULT_CHUNK_SIZE = 200
+
+# (id, to_question_id or classification_id, priority, condition) per rule.
+RuleRow = Tuple[int, int, int, Any]
+# (result id, survey question id, version, results) per history.
+HistoryRow = Tuple[int, int, int, List[Any]]
+# (result id, survey question id, version, issues) per verified history.
+Outcome = Tuple[int, int, int, List[Dict[str, Any]]]
+
+
+@dataclass
+class RuleSet:
+    """One version of the routing or classification rules as plain data."""
+    engine_name: str
+    rules: List[RuleRow]
+    # Question -> [(option id, text_ar, text_en), ...] for translated comparisons.
+    options: Dict[int, List[Tuple[int, str, str]]]
+
+    def engine(self) -> RoutingEngine | ClassificationEngine:
+        if self.engine_name == ROUTING:
+            engine = RoutingEngine([
+                AssessmentFlowRule(id=rule_id, to_question=AssessmentQuestion(id=target), priority=priority,
+                                   condition=condition)
+                for rule_id, target, priority, condition in self.rules
+            ])
+            engine.prime_options(self.options)
+            return engine
+        engine = ClassificationEngine([
+            QuestionClassificationRule(id=rule_id, classification=QuestionClassification(id=target),
+                                       priority=priority, condition=condition)
+            for rule_id, target, priority, condition in self.rules
+        ])
+        engine.prime_options(self.options)
+        return engine
+
+
+def load_options() -> Dict[int, List[Tuple[int, str, str]]]:
+    """The options of every assessment question (an empty list for questions without any)."""
+    options: Dict[int, List[Tuple[int, str, str]]] = {
+        question_id: [] for question_id in AssessmentQuestion.objects.values_list("id", flat=True)
+    }
+    for option_id, question_id, text_ar, text_en in AssessmentOption.objects.order_by("id").values_list(
+            "id", "question_id", "text_ar", "text_en"):
+        options.setdefault(question_id, []).append((option_id, text_ar, text_en))
+    return options
+
+
+def load_routing_rules(options: Optional[Dict[int, List[Tuple[int, str, str]]]] = None) -> RuleSet:
+    rows = list(AssessmentFlowRule.objects.order_by("priority", "id").values_list(
+        "id", "to_question_id", "priority", "condition",
+    ))
+    return RuleSet(ROUTING, rows, load_options() if options is None else options)
+
+
+def answered_steps(history: Iterable[Any]) -> Iterator[Tuple[int, int, Any]]:
+    """``(step, question_id, answer)`` for each answered step of ``history``."""
+    for step_index, step in enumerate(history or []):
+        if isinstance(step, dict) and "answer" in step and step.get("question_id") is not None:
+            yield step_index, step["question_id"], step["answer"]
+
+
+def replay_routing(engine: RoutingEngine,
+                   history: List[Any]) -> Iterator[Tuple[int, int, Optional[int], Optional[int]]]:
+    """``(step, question_id, next_question_id, rule_id)`` after each answered step of ``history``.
+
+    The rules fired during the replay count as used, not the stored ones.
+    """
+    responses: Dict[str, Any] = {}
+    used: List[int] = []
+    for step_index, question_id, answer in answered_steps(history):
+        responses[str(question_id)] = answer
+        result = engine.get_next_question(responses, used)
+        if result.rule is not None:
+            used.append(result.rule.id)
+        yield (step_index, question_id, result.next_question.id if result.next_question else None,
+               result.rule.id if result.rule else None)
+
+
+def replay_classification(engine: ClassificationEngine, survey_question_id: int,
+                          history: List[Any]) -> Tuple[Optional[int], int, Optional[int], Optional[int]]:
+    """``(step, survey_question_id, classification_id, rule_id)`` for the result of ``history``.
+
+    The survey question is classified with the same responses the assessment
+    page saves a result with (``survey_question_responses``); ``step`` is the
+    last answered step, ``None`` when nothing was answered.
+    """
+    step_index = next((index for index, step in reversed(list(enumerate(history or [])))
+                       if isinstance(step, dict) and "answer" in step), None)
+    responses = survey_question_responses(survey_question_id, history)
+    # The engine matches rules by question id, and rules read survey question ids.
+    rule = engine.classify_question(AssessmentQuestion(id=survey_question_id), responses).rule
+    return step_index, survey_question_id, rule.classification_id if rule else None, rule.id if rule else None
+
+
+@dataclass
+class CurrentFlow:
+    """What a stored history is checked against."""
+    rules: RuleSet
+    # Question -> option type, for every question that exists.
+    option_types: Dict[int, str]
+
+    def engine(self) -> RoutingEngine:
+        return self.rules.engine()
+
+
+def load_current_flow() -> CurrentFlow:
+    return CurrentFlow(
+        rules=load_routing_rules(),
+        option_types=dict(AssessmentQuestion.objects.values_list("id", "option_type")),
+    )
+
+
+def _option_ids(answer: Any) -> List[int]:
+    values = answer if isinstance(answer, (list, tuple)) else [answer]
+    return [value for value in values if isinstance(value, int) and not isinstance(value, bool)]
+
+
+def verify_history(engine: RoutingEngine, flow: CurrentFlow, history: List[Any]) -> List[Dict[str, Any]]:
+    """Every divergence between ``history`` and the current flow; empty when it still holds."""
+    issues: List[Dict[str, Any]] = []
+    rule_ids = {row[0] for row in flow.rules.rules}
+    steps = [(index, step) for index, step in enumerate(history or []) if isinstance(step, dict)]
+
+    for index, step in steps:
+        question_id, rule_id = step.get("question_id"), step.get("rule_id")
+        if question_id not in flow.option_types:
+            issues.append({"step": index, "kind": "missing_question", "question_id": question_id})
+        if rule_id and rule_id not in rule_ids:
+            issues.append({"step": index, "kind": "missing_rule", "rule_id": rule_id})
+        # Other option types store ids of indicators or survey questions.
+        if "answer" in step and flow.option_types.get(question_id) == AssessmentQuestion.OptionType.STATIC:
+            known = {option[0] for option in flow.rules.options.get(question_id, ())}
+            for option_id in _option_ids(step["answer"]):
+                if option_id not in known:
+                    issues.append({"step": index, "kind": "missing_option", "option_id": option_id})
+
+    # Route each answer the way the assessment page did: with every answer
+    # and rule recorded so far.
+    responses: Dict[str, Any] = {}
+    used: List[int] = []
+    for position, (index, step) in enumerate(steps):
+        if step.get("rule_id"):
+            used.append(step["rule_id"])
+        if "answer" not in step:
+            continue
+        responses[str(step.get("question_id"))] = step["answer"]
+        result = engine.get_next_question(responses, used)
+        stored = steps[position + 1][1] if position + 1 < len(steps) else {}
+        replayed_question = result.next_question.id if result.next_question else None
+        replayed_rule = result.rule.id if result.rule else None
+        if replayed_question != stored.get("question_id"):
+            kind = "next_question"
+        elif replayed_question is not None and replayed_rule != stored.get("rule_id"):
+            kind = "rule"
+        else:
+            continue
+        issues.append({
+            "step": index,
+            "kind": kind,
+            "stored": {"next_question_id": stored.get("question_id"), "rule_id": stored.get("rule_id")},
+            "replayed": {"next_question_id": replayed_question, "rule_id": replayed_rule},
+        })
+        break
+    return issues
+
+
+def _verify_chunk(engine: RoutingEngine, flow: CurrentFlow, chunk: List[HistoryRow]) -> List[Outcome]:
+    return [
+        (result_id, survey_question_id, version, verify_history(engine, flow, history))
+        for result_id, survey_question_id, version, history in chunk
+    ]
+
+
+_worker_flow: Optional[Tuple[RoutingEngine, CurrentFlow]] = None
+
+
+def _init_worker(flow: CurrentFlow) -> None:
+    import django
+
+    django.setup()
+    global _worker_flow
+    _worker_flow = (flow.engine(), flow)
+
+
+def _verify_worker_chunk(chunk: List[HistoryRow]) -> List[Outcome]:
+    return _verify_chunk(*_worker_flow, chunk)
+
+
+def chunked(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def history_rows(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[HistoryRow]:
+    return queryset.order_by("id").values_list("id", "survey_question_id", "version", "results").iterator(
+        chunk_size=chunk_size,
+    )
+
+
+def map_chunks(function, worker_function, initializer, initargs: tuple, rows: Iterable[HistoryRow], *,
+               processes: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[List[HistoryRow], Any]]:
+    """Yield each chunk of ``rows`` with its result, computed here or in a process pool.
+
+    ``function`` runs the chunks in this process; with ``processes`` > 1
+    ``worker_function`` runs them in workers set up by ``initializer``. The
+    rows are read while the workers run, at most two chunks per worker ahead
+    of the results, so memory does not grow with the number of rows.
+    """
+    if processes <= 1:
+        for chunk in chunked(rows, chunk_size):
+            yield chunk, function(chunk)
+        return
+    # Workers must not inherit the parent's open connections, so they are
+    # started before the rows are read: a pool that forks starts every
+    # worker on its first task.
+    connections.close_all()
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=initializer, initargs=initargs)
+    pending: deque = deque()
+    try:
+        pool.submit(int).result()
+        for chunk in chunked(rows, chunk_size):
+            pending.append((chunk, pool.submit(worker_function, chunk)))
+            if len(pending) >= processes * 2:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _record(outcomes: List[Outcome]) -> None:
+    Status = AssessmentResult.ReplayStatus
+    # Only the version that was replayed: a newer one has not been checked.
+    replayed: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+    for result_id, _, version, issues in outcomes:
+        replayed[Status.DIVERGED if issues else Status.VALID, version].append(result_id)
+    for (status, version), ids in replayed.items():
+        AssessmentResult.objects.filter(version=version, pk__in=ids).update(replay_status=status)
+
+
+def verify_results(queryset: Optional[QuerySet] = None, *, processes: int = 1,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, record: bool = False,
+                   progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Replay the histories of ``queryset`` (every result by default) through the current flow.
+
+    ``progress(checked, total)`` is called after each chunk.
+    """
+    started = time.perf_counter()
+    flow = load_current_flow()
+    engine = flow.engine()
+    if queryset is None:
+        queryset = AssessmentResult.objects.all()
+    total = queryset.count() if progress else 0
+
+    checked = 0
+    kinds: Counter = Counter()
+    diverged: List[Dict[str, Any]] = []
+    for chunk, outcomes in map_chunks(
+            lambda chunk: _verify_chunk(engine, flow, chunk), _verify_worker_chunk, _init_worker, (flow,),
+            history_rows(queryset, chunk_size), processes=processes, chunk_size=chunk_size):
+        checked += len(chunk)
+        for result_id, survey_question_id, _, issues in outcomes:
+            if issues:
+                kinds.update(issue["kind"] for issue in issues)
+                diverged.append({"result_id": result_id, "survey_question_id": survey_question_id, "issues": issues})
+        if record:
+            _record(outcomes)
+        if progress:
+            progress(checked, total)
+
+    return {
+        "checked": checked,
+        "valid": checked - len(diverged),
+        "diverged": len(diverged),
+        "issues": dict(sorted(kinds.items())),
+        "results": diverged,
+        "recorded": record,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
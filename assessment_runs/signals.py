@@ -1,9 +1,30 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from surveys.models import SurveyVersion
-from .models import AssessmentRun
+from .models import AssessmentRun, AssessmentResult, AssessmentFile
+from .facts import refresh_result_facts
+from .storage import decrement_ref, increment_ref
 
 @receiver(post_save, sender=SurveyVersion)
 def create_assessment_run(sender, instance, created, **kwargs):
     if created:
         AssessmentRun.objects.create(survey_version=instance)
+
+
+@receiver(post_save, sender=AssessmentResult)
+def refresh_answer_facts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_result_facts(instance)
+
+
+@receiver(post_save, sender=AssessmentFile)
+def count_blob_reference(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.blob_id:
+        increment_ref(instance.blob_id)
+
+
+@receiver(post_delete, sender=AssessmentFile)
+def release_blob_reference(sender, instance, **kwargs):
+    if instance.blob_id:
+        decrement_ref(instance.blob_id)
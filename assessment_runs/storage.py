@@ -0,0 +1,274 @@
+"""
+Content-addressed storage for assessment evidence files.
+
+Uploads are streamed through a SHA-256 hasher in fixed-size chunks into a
+temporary file next to the final location, then committed under a path
+derived from the digest. Identical uploads therefore share one StoredBlob
+and one file on disk; AssessmentFile rows reference blobs and keep
+``StoredBlob.ref_count`` up to date through signals.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F, ProtectedError
+from django.utils import timezone
+
+from .models import AssessmentFile, StoredBlob
+
+CHUNK_SIZE = 64 * 1024
+BLOB_ROOT = "assessment_blobs"
+
+
+def blob_name(digest: str) -> str:
+    """Storage name for a digest, fanned out over two directory levels."""
+    return f"{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def _temp_dir() -> str:
+    """Temporary directory on the same filesystem as the blob store, so commits are renames."""
+    if isinstance(default_storage, FileSystemStorage):
+        path = default_storage.path(f"{BLOB_ROOT}/tmp")
+    else:
+        path = os.path.join(tempfile.gettempdir(), BLOB_ROOT)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hash_file(path: str, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """Return the SHA-256 hex digest and size of the file at ``path``."""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def spool_upload(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Tuple[str, str, int]:
+    """Copy ``fileobj`` to a temporary file while hashing it.
+
+    Returns ``(temp_path, digest, size)``. Django ``UploadedFile`` objects are
+    read through ``chunks()`` so only one chunk is in memory at a time.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=_temp_dir(), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            chunks = (
+                fileobj.chunks(chunk_size)
+                if hasattr(fileobj, "chunks")
+                else iter(lambda: fileobj.read(chunk_size), b"")
+            )
+            for chunk in chunks:
+                hasher.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest(), size
+
+
+def commit_temp_file(temp_path: str, digest: str, size: int) -> StoredBlob:
+    """Move an already hashed temporary file into the blob store.
+
+    On a filesystem storage the file is renamed into place rather than
+    copied. If a blob with the same digest already exists the temporary file
+    is discarded and the existing blob is returned.
+    """
+    # Reusing a blob restarts its garbage-collection grace period. A blob
+    # deleted by the collector meanwhile updates no row and is stored anew.
+    touched = StoredBlob.objects.filter(digest=digest).update(last_referenced_at=timezone.now())
+    existing = StoredBlob.objects.filter(digest=digest).first() if touched else None
+    if existing is not None:
+        os.remove(temp_path)
+        return existing
+
+    name = blob_name(digest)
+    if isinstance(default_storage, FileSystemStorage):
+        final_path = default_storage.path(name)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)
+    else:
+        with open(temp_path, "rb") as fh:
+            name = default_storage.save(name, File(fh))
+        os.remove(temp_path)
+
+    try:
+        with transaction.atomic():
+            return StoredBlob.objects.create(digest=digest, size=size, file=name)
+    except IntegrityError:
+        # A concurrent upload of the same content won the race; both wrote identical bytes.
+        return StoredBlob.objects.get(digest=digest)
+
+
+def store_blob(fileobj: BinaryIO) -> StoredBlob:
+    """Hash and store ``fileobj``, returning the (possibly pre-existing) blob."""
+    temp_path, digest, size = spool_upload(fileobj)
+    return commit_temp_file(temp_path, digest, size)
+
+
+def create_assessment_file(
+        assessment_result,
+        fileobj: BinaryIO,
+        original_filename: str,
+        triggering_option=None,
+        uploaded_by=None,
+        description: str = "",
+) -> AssessmentFile:
+    """Store an upload and attach it to ``assessment_result``."""
+    blob = store_blob(fileobj)
+    return attach_blob(
+        assessment_result,
+        blob,
+        original_filename,
+        triggering_option=triggering_option,
+        uploaded_by=uploaded_by,
+        description=description,
+    )
+
+
+def attach_blob(
+        assessment_result,
+        blob: StoredBlob,
+        original_filename: str,
+        triggering_option=None,
+        uploaded_by=None,
+        description: str = "",
+) -> AssessmentFile:
+    return AssessmentFile.objects.create(
+        assessment_result=assessment_result,
+        blob=blob,
+        file=blob.file.name,
+        original_filename=os.path.basename(original_filename or "")[:255],
+        triggering_option=triggering_option,
+        uploaded_by=uploaded_by,
+        description=description,
+    )
+
+
+def increment_ref(blob_id: int) -> None:
+    StoredBlob.objects.filter(pk=blob_id).update(ref_count=F("ref_count") + 1)
+
+
+def decrement_ref(blob_id: int) -> None:
+    StoredBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1, last_referenced_at=timezone.now(),
+    )
+
+
+def collect_garbage(grace: Optional[datetime.timedelta] = None, dry_run: bool = False) -> int:
+    """Delete blobs unreferenced for longer than ``grace`` together with their files.
+
+    The grace period protects blobs that were just stored or reused but
+    whose AssessmentFile row has not been created yet. Each blob is locked
+    and checked again before it is deleted, so a blob reused or attached
+    since it was selected is kept.
+    """
+    if grace is None:
+        grace = datetime.timedelta(hours=1)
+    cutoff = timezone.now() - grace
+    unreferenced = StoredBlob.objects.filter(ref_count=0, last_referenced_at__lt=cutoff)
+    candidates = list(unreferenced.exclude(assessment_files__isnull=False).values_list("pk", flat=True))
+    if dry_run:
+        return len(candidates)
+
+    removed = 0
+    for blob_id in candidates:
+        with transaction.atomic():
+            blob = unreferenced.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                continue
+            try:
+                blob.delete()
+            except ProtectedError:
+                continue
+            # Removed while the row is locked, so a concurrent upload of the
+            # same content waits and then writes a fresh file.
+            name = blob.file.name
+            if name and default_storage.exists(name):
+                default_storage.delete(name)
+        removed += 1
+    return removed
+
+
+# ----------------------------------------------------------------------
+# Download helpers
+# ----------------------------------------------------------------------
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@dataclass
+class ByteRange:
+    start: int
+    end: int  # inclusive
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[ByteRange]:
+    """Parse a single-range ``Range`` header.
+
+    Returns None when the header is absent or uses a form we do not serve
+    (e.g. multiple ranges), in which case the full body is returned.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start_raw, end_raw = match.groups()
+    if not start_raw and not end_raw:
+        return None
+    if not start_raw:
+        suffix = int(end_raw)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return ByteRange(max(size - suffix, 0), size - 1)
+    start = int(start_raw)
+    end = int(end_raw) if end_raw else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return ByteRange(start, min(end, size - 1))
+
+
+def iter_file_range(fh, byte_range: Optional[ByteRange], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    try:
+        remaining = None
+        if byte_range is not None:
+            fh.seek(byte_range.start)
+            remaining = byte_range.length
+        while remaining is None or remaining > 0:
+            block = fh.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+    finally:
+        fh.close()
+
+
+def sendfile_backend() -> str:
+    """Configured offload backend: ``"nginx"``, ``"apache"`` or ``""`` (serve from Django)."""
+    return (getattr(settings, "ASSESSMENT_FILES_SENDFILE_BACKEND", "") or "").lower()
@@ -0,0 +1,341 @@
+"""
+Seeded synthetic datasets for scale benchmarks.
+
+``generate`` bulk-inserts a dataset proportional to a scale factor so
+performance work can be measured at 1x, 10x and 100x:
+
+* surveys, each with several versions (and their assessment runs), sections
+  and survey questions;
+* copies of the assessment flow in ``assessment_flow.json``: every copy has
+  the same questions, option counts, option types and branches, with one
+  ``AssessmentFlowRule`` per (question, destination) edge;
+* one ``AssessmentResult`` per assessed survey question whose history is a
+  valid walk through one flow copy, i.e. what the routing engine would have
+  recorded;
+* indicators with long item lists.
+
+All choices come from ``random.Random(seed)``, so the same seed and scale
+produce the same dataset shape. Rows are written with ``bulk_create`` in
+batches; since that skips signals, assessment runs and version labels are
+filled in here and answer facts are only built when asked for.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import random
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from assessment_flow.models import AssessmentFlowRule, AssessmentOption, AssessmentQuestion
+from indicators.models import Indicator, IndicatorListItem
+from surveys.models import Survey, SurveyQuestion, SurveySection, SurveyVersion
+from .facts import rebuild_facts
+from .models import AssessmentResult, AssessmentRun
+
+DEFAULT_BATCH_SIZE = 2000
+
+OptionType = AssessmentQuestion.OptionType
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """Row counts of one scale unit; ``scaled`` multiplies the scalable ones."""
+
+    surveys: int = 20
+    versions_per_survey: int = 4
+    sections_per_version: int = 3
+    questions_per_version: int = 30
+    assessed_ratio: float = 0.9
+    flow_copies: int = 1
+    indicators: int = 5
+    items_per_indicator: int = 500
+
+    def scaled(self, scale: float) -> "SyntheticSpec":
+        def times(count: int) -> int:
+            return max(1, round(count * scale))
+
+        return SyntheticSpec(
+            surveys=times(self.surveys),
+            versions_per_survey=self.versions_per_survey,
+            sections_per_version=self.sections_per_version,
+            questions_per_version=self.questions_per_version,
+            assessed_ratio=self.assessed_ratio,
+            flow_copies=times(self.flow_copies),
+            indicators=times(self.indicators),
+            items_per_indicator=self.items_per_indicator,
+        )
+
+
+def default_flow_path() -> Path:
+    return Path(settings.BASE_DIR) / "assessment_flow.json"
+
+
+def load_flow_shape(path: Optional[Path] = None) -> List[dict]:
+    with open(path or default_flow_path(), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _batched(items: Sequence, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert(model, objects: Sequence, batch_size: int, counts: Counter) -> list:
+    created = []
+    for batch in _batched(objects, batch_size):
+        created.extend(model.objects.bulk_create(batch, batch_size=batch_size))
+    counts[model.__name__] += len(objects)
+    return created
+
+
+@dataclass
+class _FlowNode:
+    question_id: int
+    option_type: str
+    # option id -> (destination node index or None, rule id or None)
+    branches: Dict[Optional[int], Tuple[Optional[int], Optional[int]]]
+    source_index: Optional[int] = None
+
+
+class _FlowCopy:
+    """One materialized copy of the flow shape, indexed by position in the JSON."""
+
+    def __init__(self, nodes: List[_FlowNode], entry: int):
+        self.nodes = nodes
+        self.entry = entry
+
+    def walk(self, rng: random.Random, survey_question_ids: Sequence[int]) -> List[dict]:
+        """A history the routing engine would accept: entry to an end option."""
+        history = []
+        answers: Dict[int, object] = {}
+        index, rule_id = self.entry, None
+        while index is not None:
+            node = self.nodes[index]
+            if node.option_type == OptionType.DYNAMIC_SURVEY_QUESTIONS:
+                answer = rng.sample(list(survey_question_ids), min(len(survey_question_ids), rng.randint(1, 3)))
+                branch = None
+            elif node.option_type == OptionType.DYNAMIC_FROM_PREVIOUS_MULTI_SELECT:
+                previous = answers.get(node.source_index) or []
+                answer = rng.sample(previous, rng.randint(1, len(previous))) if previous else []
+                branch = None
+            else:
+                branch = rng.choice(list(node.branches))
+                answer = branch
+            history.append({"question_id": node.question_id, "rule_id": rule_id, "answer": answer})
+            answers[index] = answer
+            index, rule_id = node.branches.get(branch, (None, None))
+        return history
+
+
+def _build_flow_copy(shape: List[dict], copy_number: int, batch_size: int, counts: Counter) -> _FlowCopy:
+    position = {entry["id"]: index for index, entry in enumerate(shape)}
+    questions = _insert(AssessmentQuestion, [
+        AssessmentQuestion(
+            text_ar=f"{entry['text']} ({copy_number})",
+            text_en=f"Synthetic flow question {entry['id']} ({copy_number})",
+            option_type=entry.get("option_type") or OptionType.STATIC,
+            allow_multiple_choices=entry.get("option_type") != OptionType.STATIC,
+            use_searchable_dropdown=len(entry["responses"]) > 20,
+        )
+        for entry in shape
+    ], batch_size, counts)
+
+    # A multi-select fed by a previous answer takes its options from the
+    # nearest dynamic survey-question picker before it.
+    sources = {}
+    last_picker = None
+    for index, entry in enumerate(shape):
+        if entry.get("option_type") == OptionType.DYNAMIC_SURVEY_QUESTIONS:
+            last_picker = index
+        elif entry.get("option_type") == OptionType.DYNAMIC_FROM_PREVIOUS_MULTI_SELECT and last_picker is not None:
+            sources[index] = last_picker
+            questions[index].dynamic_option_source_question = questions[last_picker]
+    if sources:
+        AssessmentQuestion.objects.bulk_update(
+            [questions[index] for index in sources], ["dynamic_option_source_question"], batch_size=batch_size,
+        )
+
+    pending_options = []
+    for index, entry in enumerate(shape):
+        for response in entry["responses"]:
+            if response.get("id") is not None:
+                pending_options.append((index, response))
+    options = _insert(AssessmentOption, [
+        AssessmentOption(question=questions[index], text_ar=response["text"], text_en=response["text"])
+        for index, response in pending_options
+    ], batch_size, counts)
+
+    # option ids per (question index, destination index)
+    edges: Dict[Tuple[int, Optional[int]], List[Optional[int]]] = defaultdict(list)
+    for (index, response), option in zip(pending_options, options):
+        edges[(index, position.get(response["next_question_id"]))].append(option.id)
+    for index, entry in enumerate(shape):
+        for response in entry["responses"]:
+            if response.get("id") is None:
+                edges[(index, position.get(response["next_question_id"]))].append(None)
+
+    rule_edges = [(index, target, option_ids) for (index, target), option_ids in edges.items() if target is not None]
+    rules = _insert(AssessmentFlowRule, [
+        AssessmentFlowRule(
+            to_question=questions[target],
+            condition=json.dumps({"conditions": [_condition(questions[index].id, option_ids)]}),
+            priority=0,
+            description=f"Synthetic {shape[index]['id']} -> {shape[target]['id']} ({copy_number})",
+        )
+        for index, target, option_ids in rule_edges
+    ], batch_size, counts)
+    rule_ids = {(index, target): rule.id for (index, target, _), rule in zip(rule_edges, rules)}
+
+    nodes = []
+    for index, entry in enumerate(shape):
+        nodes.append(_FlowNode(
+            question_id=questions[index].id,
+            option_type=entry.get("option_type") or OptionType.STATIC,
+            branches={},
+            source_index=sources.get(index),
+        ))
+    for (index, target), option_ids in edges.items():
+        for option_id in option_ids:
+            nodes[index].branches[option_id] = (target, rule_ids.get((index, target)))
+
+    incoming = {target for (_, target) in edges if target is not None}
+    entry = next(index for index in range(len(shape)) if index not in incoming)
+    return _FlowCopy(nodes, entry)
+
+
+def _condition(question_id: int, option_ids: List[Optional[int]]) -> dict:
+    if None in option_ids:
+        # Dynamic pickers have no stored options: any selection moves on.
+        return {"type": "count", "question": question_id, "operator": ">=", "value": 1}
+    if len(option_ids) == 1:
+        return {"question": question_id, "operator": "==", "value": option_ids[0]}
+    return {"question": question_id, "operator": "in", "value": option_ids}
+
+
+def _build_indicators(spec: SyntheticSpec, prefix: str, batch_size: int, counts: Counter) -> None:
+    indicators = _insert(Indicator, [
+        Indicator(
+            name_ar=f"مؤشر {prefix} {number}",
+            name_en=f"{prefix} indicator {number}",
+            code=f"{prefix}-I{number}",
+        )
+        for number in range(1, spec.indicators + 1)
+    ], batch_size, counts)
+    for indicator in indicators:
+        _insert(IndicatorListItem, [
+            IndicatorListItem(
+                indicator=indicator,
+                name=f"{indicator.name_en} item {number}",
+                code=f"{indicator.code}-{number}",
+            )
+            for number in range(1, spec.items_per_indicator + 1)
+        ], batch_size, counts)
+
+
+def generate(
+        scale: float = 1.0,
+        seed: int = 0,
+        prefix: str = "SYN",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        spec: Optional[SyntheticSpec] = None,
+        flow_shape: Optional[List[dict]] = None,
+        answer_facts: bool = False,
+        progress: Optional[Callable[[str], None]] = None,
+) -> Counter:
+    """Insert a synthetic dataset and return the number of rows per model.
+
+    ``prefix`` namespaces the unique survey and indicator names, so several
+    datasets can live in one database.
+    """
+    spec = (spec or SyntheticSpec()).scaled(scale)
+    shape = flow_shape if flow_shape is not None else load_flow_shape()
+    rng = random.Random(seed)
+    counts: Counter = Counter()
+    report = progress or (lambda message: None)
+
+    with transaction.atomic():
+        flows = [_build_flow_copy(shape, number, batch_size, counts) for number in range(1, spec.flow_copies + 1)]
+        _build_indicators(spec, prefix, batch_size, counts)
+    report(f"{len(flows)} flow copies and {spec.indicators} indicators")
+
+    intervals = list(SurveyVersion.SurveyInterval.values)
+    with transaction.atomic():
+        surveys = _insert(Survey, [
+            Survey(
+                name_ar=f"استبيان {prefix} {number}",
+                name_en=f"{prefix} survey {number}",
+                code=f"{prefix}{number:05d}",
+            )
+            for number in range(1, spec.surveys + 1)
+        ], batch_size, counts)
+
+    # Versions are written survey by survey in chunks so memory stays flat at 100x.
+    surveys_per_chunk = max(1, batch_size // max(1, spec.versions_per_survey * spec.questions_per_version))
+    for chunk in _batched(surveys, surveys_per_chunk):
+        with transaction.atomic():
+            _build_versions(chunk, spec, rng, intervals, flows, batch_size, counts)
+        report(f"{counts['SurveyVersion']} versions, {counts['AssessmentResult']} results")
+
+    if answer_facts:
+        counts["AssessmentAnswerFact"] = rebuild_facts(
+            AssessmentResult.objects.filter(assessment_run__survey_version__survey__code__startswith=prefix)
+        )
+    return counts
+
+
+def _build_versions(surveys, spec, rng, intervals, flows, batch_size, counts) -> None:
+    versions = []
+    for survey in surveys:
+        interval = rng.choice(intervals)
+        for number in range(spec.versions_per_survey):
+            version_date = datetime.date(2020 + number // 12, number % 12 + 1, 1)
+            version = SurveyVersion(survey=survey, interval=interval, version_date=version_date)
+            version.version_label = version._generate_version_label()
+            versions.append(version)
+    versions = _insert(SurveyVersion, versions, batch_size, counts)
+    runs = _insert(AssessmentRun, [AssessmentRun(survey_version=version) for version in versions], batch_size, counts)
+
+    sections = _insert(SurveySection, [
+        SurveySection(survey_version=version, title_ar=f"قسم {number}", title_en=f"Section {number}", order=number)
+        for version in versions
+        for number in range(1, spec.sections_per_version + 1)
+    ], batch_size, counts)
+    sections_by_version = defaultdict(list)
+    for section in sections:
+        sections_by_version[section.survey_version_id].append(section)
+
+    questions = _insert(SurveyQuestion, [
+        SurveyQuestion(
+            survey_version=version,
+            section=rng.choice(sections_by_version[version.id]) if sections_by_version[version.id] else None,
+            code=f"Q{number}",
+            text_ar=f"سؤال {version.survey.code} {number}",
+            text_en=f"{version.survey.code} question {number}",
+            is_required=rng.random() < 0.7,
+        )
+        for version in versions
+        for number in range(1, spec.questions_per_version + 1)
+    ], batch_size, counts)
+    questions_by_version = defaultdict(list)
+    for question in questions:
+        questions_by_version[question.survey_version_id].append(question.id)
+
+    results = []
+    for run in runs:
+        version_questions = questions_by_version[run.survey_version_id]
+        for question_id in version_questions:
+            if rng.random() >= spec.assessed_ratio:
+                continue
+            flow = rng.choice(flows)
+            results.append(AssessmentResult(
+                assessment_run=run,
+                survey_question_id=question_id,
+                results=flow.walk(rng, version_questions),
+            ))
+    _insert(AssessmentResult, results, batch_size, counts)
@@ -0,0 +1,49 @@
+"""Background job types for assessment results (see ``jobs.queue``)."""
+import os
+
+from django.conf import settings
+from django.db import router
+
+from jobs.queue import task
+from . import export as result_export
+from .facts import rebuild_facts
+from .models import AssessmentResult
+from .replay import verify_results
+
+EXPORT_DIR = "exports"
+
+
+@task("assessment_runs.export")
+def export_results(context, export_format="csv", version_id=None, run_id=None):
+    """Write an export under ``MEDIA_ROOT/exports`` and return its path."""
+    queryset = result_export.export_queryset(survey_version_id=version_id, assessment_run_id=run_id)
+    queryset = queryset.using(router.db_for_read(AssessmentResult))
+    total = queryset.count()
+    context.progress(0, total=total, message=f"Exporting {total} results")
+
+    relative_path = os.path.join(EXPORT_DIR, f"assessment_results_{context.job.pk}.{export_format}")
+    path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    result_export.export_to_path(queryset, export_format, path)
+    context.progress(total, total=total)
+    return {"path": relative_path, "rows": total}
+
+
+@task("assessment_runs.rebuild_answer_facts")
+def rebuild_answer_facts(context, version_id=None):
+    queryset = None
+    if version_id:
+        queryset = AssessmentResult.objects.filter(assessment_run__survey_version_id=version_id)
+    context.progress(0, message="Rebuilding answer facts")
+    return {"written": rebuild_facts(queryset, progress=context.progress)}
+
+
+@task("assessment_runs.verify_replays")
+def verify_replays(context, version_id=None):
+    """Replay stored histories through the current flow and record which still hold."""
+    queryset = None
+    if version_id:
+        queryset = AssessmentResult.objects.filter(assessment_run__survey_version_id=version_id)
+    context.progress(0, message="Replaying assessment histories")
+    report = verify_results(queryset, record=True, progress=context.progress)
+    return {key: report[key] for key in ("checked", "valid", "diverged", "issues")}
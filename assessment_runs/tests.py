@@ -1,13 +1,30 @@
+import datetime
+import hashlib
+import io
 import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client, LiveServerTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import override
 
 from assessment_flow.models import AssessmentQuestion, AssessmentFlowRule, AssessmentOption
+from assessment_flow.engine import RoutingEngine
+from assessment_runs import benchmarks, concurrency, dbbench, impact, loadtest, replay, synthetic
 from assessment_runs.engine import ClassificationEngine
-from assessment_runs.models import QuestionClassificationRule, AssessmentResult, AssessmentRun
+from jobs import queue
+from jobs.models import Job
+from jobs.queue import JobCancelled
+from assessment_runs.models import (
+    QuestionClassification, QuestionClassificationRule, AssessmentResult, AssessmentRun, AssessmentFile,
+)
 from surveys.models import Survey, SurveyVersion, SurveyQuestion
 
 User = get_user_model()
@@ -289,3 +306,843 @@ class DashboardViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.survey.display_name)
         self.assertContains(response, self.version.version_label)
+
+
+class AssessmentResultExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.survey = Survey.objects.create(name_ar="استبيان تصدير", name_en="Export Survey", code="EXP")
+        self.version = SurveyVersion.objects.create(
+            survey=self.survey,
+            interval=SurveyVersion.SurveyInterval.ANNUALLY,
+        )
+        self.q1 = AssessmentQuestion.objects.create(text_en="First", text_ar="الأول")
+        self.q2 = AssessmentQuestion.objects.create(text_en="Second", text_ar="الثاني")
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_en="Yes", text_ar="نعم")
+        run = self.version.assessment_run
+        for idx in range(3):
+            survey_question = SurveyQuestion.objects.create(
+                survey_version=self.version,
+                text_en=f"Survey question {idx}",
+                text_ar=f"سؤال {idx}",
+            )
+            AssessmentResult.objects.create(
+                assessment_run=run,
+                survey_question=survey_question,
+                classification="LOW",
+                results=[
+                    {"question_id": self.q1.id, "rule_id": None, "answer": self.yes.id},
+                    {"question_id": self.q2.id, "rule_id": 1, "answer": "free text"},
+                ],
+            )
+
+    def test_csv_export_streams_flattened_rows(self):
+        with override("en"):
+            response = self.client.get(
+                reverse("export_assessment_results"), {"format": "csv"}, HTTP_ACCEPT_LANGUAGE="en"
+            )
+            content = b"".join(response.streaming_content).decode("utf-8-sig")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = content.strip().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn("question_path", lines[0])
+        self.assertIn("First > Second", lines[1])
+        self.assertIn("First: Yes | Second: free text", lines[1])
+
+    def test_label_lookups_do_not_grow_with_results(self):
+        from assessment_runs import export as result_export
+
+        queryset = result_export.export_queryset(survey_version_id=self.version.id)
+        # One query for the results plus one each for questions, options and indicator items.
+        with self.assertNumQueries(4):
+            rows = list(result_export.iter_rows(queryset, chunk_size=10))
+        self.assertEqual(len(rows), 3)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse("export_assessment_results"), {"format": "pdf"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AssessmentAnswerFactTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(name_ar="استبيان تحليلات", name_en="Analytics Survey", code="FACT")
+        self.version = SurveyVersion.objects.create(
+            survey=self.survey,
+            interval=SurveyVersion.SurveyInterval.ANNUALLY,
+        )
+        self.question = AssessmentQuestion.objects.create(text_en="Pick", text_ar="اختر")
+        self.yes = AssessmentOption.objects.create(question=self.question, text_en="Yes", text_ar="نعم")
+        self.no = AssessmentOption.objects.create(question=self.question, text_en="No", text_ar="لا")
+        self.sq1 = SurveyQuestion.objects.create(survey_version=self.version, text_ar="س1", text_en="Q1")
+        self.sq2 = SurveyQuestion.objects.create(survey_version=self.version, text_ar="س2", text_en="Q2")
+
+    def _result(self, survey_question, answer):
+        return AssessmentResult.objects.create(
+            assessment_run=self.version.assessment_run,
+            survey_question=survey_question,
+            classification="LOW",
+            results=[{"question_id": self.question.id, "rule_id": None, "answer": answer}],
+        )
+
+    def test_facts_follow_result_saves(self):
+        from assessment_runs.facts import option_counts
+        from assessment_runs.models import AssessmentAnswerFact
+
+        result = self._result(self.sq1, [self.yes.id, "other"])
+        self._result(self.sq2, self.yes.id)
+
+        facts = AssessmentAnswerFact.objects.filter(assessment_result=result)
+        self.assertEqual(facts.count(), 2)
+        self.assertEqual(set(facts.values_list("option_id", flat=True)), {self.yes.id, None})
+
+        counts = {row["option_id"]: row["answers"] for row in option_counts(self.question.id, self.version.id)}
+        self.assertEqual(counts[self.yes.id], 2)
+
+        result.results = [{"question_id": self.question.id, "rule_id": None, "answer": self.no.id}]
+        result.save()
+        self.assertEqual(list(facts.values_list("option_id", flat=True)), [self.no.id])
+
+    def test_rebuild_command_recreates_facts(self):
+        from django.core.management import call_command
+        from assessment_runs.models import AssessmentAnswerFact
+
+        self._result(self.sq1, self.yes.id)
+        AssessmentAnswerFact.objects.all().delete()
+
+        call_command("rebuild_answer_facts", stdout=open(os.devnull, "w"))
+
+        fact = AssessmentAnswerFact.objects.get()
+        self.assertEqual(fact.survey_version, self.version)
+        self.assertEqual(fact.option_id, self.yes.id)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        survey = Survey.objects.create(name_ar="استبيان ملفات", name_en="Files Survey", code="FILES")
+        self.version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        self.results = [
+            AssessmentResult.objects.create(
+                assessment_run=self.version.assessment_run,
+                survey_question=SurveyQuestion.objects.create(
+                    survey_version=self.version, text_ar=f"س{idx}", text_en=f"Q{idx}"
+                ),
+            )
+            for idx in range(2)
+        ]
+
+    def test_identical_uploads_share_one_blob(self):
+        from assessment_runs.models import StoredBlob
+        from assessment_runs.storage import collect_garbage, create_assessment_file
+
+        first = create_assessment_file(self.results[0], io.BytesIO(b"evidence"), "a.pdf")
+        second = create_assessment_file(self.results[1], io.BytesIO(b"evidence"), "b.pdf")
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.digest, hashlib.sha256(b"evidence").hexdigest())
+
+        first.delete()
+        second.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+
+        self.assertEqual(collect_garbage(grace=datetime.timedelta(0)), 1)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, blob.file.name)))
+
+    def test_reused_blob_survives_garbage_collection(self):
+        from assessment_runs.models import StoredBlob
+        from assessment_runs.storage import attach_blob, collect_garbage, store_blob
+
+        blob = store_blob(io.BytesIO(b"reused"))
+        StoredBlob.objects.filter(pk=blob.pk).update(last_referenced_at=timezone.now() - datetime.timedelta(days=1))
+        # Stored again but not attached yet: the reuse restarts the grace period.
+        self.assertEqual(store_blob(io.BytesIO(b"reused")).pk, blob.pk)
+        self.assertEqual(collect_garbage(grace=datetime.timedelta(hours=1)), 0)
+
+        attach_blob(self.results[0], blob, "kept.pdf")
+        self.assertEqual(collect_garbage(grace=datetime.timedelta(0)), 0)
+        self.assertTrue(StoredBlob.objects.filter(pk=blob.pk).exists())
+
+    def test_download_supports_ranges(self):
+        from assessment_runs.storage import create_assessment_file
+
+        stored = create_assessment_file(self.results[0], io.BytesIO(b"0123456789"), "digits.txt")
+        url = reverse("download_assessment_file", args=[stored.id])
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(ASSESSMENT_FILES_SENDFILE_BACKEND="nginx", ASSESSMENT_FILES_SENDFILE_PREFIX="/protected/")
+    def test_download_offloads_to_web_server(self):
+        from assessment_runs.storage import create_assessment_file
+
+        stored = create_assessment_file(self.results[0], io.BytesIO(b"offload"), "doc.pdf")
+        response = self.client.get(reverse("download_assessment_file", args=[stored.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected/{stored.blob.file.name}")
+        self.assertEqual(response.content, b"")
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        survey = Survey.objects.create(name_ar="استبيان رفع", name_en="Upload Survey", code="UPL")
+        version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        self.result = AssessmentResult.objects.create(
+            assessment_run=version.assessment_run,
+            survey_question=SurveyQuestion.objects.create(survey_version=version, text_ar="س", text_en="Q"),
+        )
+        self.content = b"abcdefghij" * 3 + b"xyz"
+
+    def _send(self, payload, index, checksum=None, data=None):
+        chunk_url = payload["chunk_url"]
+        chunk = self.content[index * 8:(index + 1) * 8]
+        return self.client.post(
+            f"{chunk_url}?index={index}",
+            data=chunk if data is None else data,
+            content_type="application/octet-stream",
+            HTTP_X_CHUNK_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_out_of_order_chunks_resume_and_complete(self):
+        response = self.client.post(
+            reverse("chunked_upload_init"),
+            data=json.dumps({
+                "assessment_result_id": self.result.id,
+                "filename": "scan.pdf",
+                "total_size": len(self.content),
+                "chunk_size": 8,
+            }),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        payload = response.json()
+        self.assertEqual(payload["total_chunks"], 5)
+
+        self.assertEqual(self._send(payload, 3).status_code, 200)
+        self.assertEqual(self._send(payload, 0).status_code, 200)
+        self.assertEqual(self._send(payload, 1, checksum="0" * 64).status_code, 422)
+        # A corrupt retry of an acknowledged chunk leaves its bytes alone.
+        self.assertEqual(self._send(payload, 0, checksum="0" * 64, data=b"X" * 8).status_code, 422)
+
+        status = self.client.get(payload["status_url"]).json()
+        self.assertEqual(status["received_chunks"], [0, 3])
+        self.assertEqual(status["offset"], 8)
+
+        response = self.client.post(payload["complete_url"])
+        self.assertEqual(response.status_code, 409)
+
+        for index in (1, 2, 4):
+            self.assertEqual(self._send(payload, index).status_code, 200)
+
+        response = self.client.post(
+            payload["complete_url"],
+            data=json.dumps({"checksum": hashlib.sha256(self.content).hexdigest()}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        stored = AssessmentFile.objects.get(pk=response.json()["file_id"])
+        self.assertEqual(stored.assessment_result, self.result)
+        self.assertEqual(stored.original_filename, "scan.pdf")
+        with stored.blob.file.open("rb") as fh:
+            self.assertEqual(fh.read(), self.content)
+
+
+    @override_settings(ASSESSMENT_UPLOAD_MAX_SIZE=16)
+    def test_init_rejects_files_over_the_maximum_size(self):
+        response = self.client.post(
+            reverse("chunked_upload_init"),
+            data=json.dumps({"assessment_result_id": self.result.id, "filename": "big.pdf", "total_size": 17}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 413)
+
+
+class LoadTestHarnessTests(LiveServerTestCase):
+    def setUp(self):
+        self.q1 = AssessmentQuestion.objects.create(text_ar="سؤال 1", text_en="Question 1")
+        self.q2 = AssessmentQuestion.objects.create(text_ar="سؤال 2", text_en="Question 2")
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_ar="نعم", text_en="Yes")
+        AssessmentOption.objects.create(question=self.q2, text_ar="نعم", text_en="Yes")
+        AssessmentFlowRule.objects.create(
+            to_question=self.q2,
+            condition=json.dumps({"conditions": [{"question": self.q1.id, "operator": "==", "value": self.yes.id}]}),
+        )
+        survey = Survey.objects.create(name_ar="استبيان حمل", name_en="Load Survey", code="LOAD")
+        self.version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        SurveyQuestion.objects.create(survey_version=self.version, text_ar="سؤال", text_en="Question")
+
+    def test_parse_server_timing(self):
+        metrics = loadtest.parse_server_timing('db;dur=12.50;desc="4 queries", db-write;dur=3.1, db-lock;desc="2 locked"')
+        self.assertEqual(metrics["db"], {"dur": 12.5, "desc": "4 queries"})
+        self.assertEqual(metrics["db-write"]["dur"], 3.1)
+        self.assertEqual(metrics["db-lock"]["desc"], "2 locked")
+        self.assertEqual(loadtest.percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(loadtest.percentile([5, 1, 4, 2, 3], 99), 5)
+
+    @override_settings(DEBUG=True)
+    def test_virtual_users_walk_the_flow_and_save_the_builder(self):
+        plan = loadtest.build_plan()
+        self.assertEqual(plan.entry_question_ids, [self.q1.id])
+
+        # Classification is exercised by its own tests; here only the HTTP flow matters.
+        with mock.patch.object(ClassificationEngine, "classify_question", return_value=mock.Mock(classification="")):
+            report = loadtest.run_load_test(
+                self.live_server_url,
+                plan,
+                users=1,
+                iterations=4,
+                settings=loadtest.UserSettings(think_time=0, rewind_probability=0.3, builder_ratio=0.3),
+                seed=1,
+            )
+
+        self.assertEqual(report["total"]["errors"], 0, report["endpoints"])
+        # Server-Timing from the query instrumentation middleware feeds the DB columns.
+        self.assertIsNotNone(report["total"]["db_ms"])
+        self.assertIsNotNone(report["sqlite_locks"]["write_wait_ms"])
+        for endpoint in ("assessment_page", "get_next_question", "assessment_complete", "survey_routing_save"):
+            self.assertIn(endpoint, report["endpoints"])
+        self.assertTrue(AssessmentResult.objects.filter(assessment_run__survey_version=self.version).exists())
+
+
+class SyntheticDataTests(TestCase):
+    SPEC = synthetic.SyntheticSpec(
+        surveys=2, versions_per_survey=2, sections_per_version=1, questions_per_version=4,
+        assessed_ratio=1.0, indicators=1, items_per_indicator=10,
+    )
+    SHAPE = [
+        {"id": 1, "text": "هل ينطبق؟", "option_type": "STATIC", "responses": [
+            {"id": 1, "text": "نعم", "next_question_id": None},
+            {"id": 2, "text": "لا", "next_question_id": 2},
+            {"id": 3, "text": "جزئياً", "next_question_id": 2},
+        ]},
+        {"id": 2, "text": "اختر الأسئلة", "option_type": "DYNAMIC_SURVEY_QUESTIONS", "responses": [
+            {"id": None, "text": "[Dynamic/Searchable Dropdown]", "next_question_id": 3},
+        ]},
+        {"id": 3, "text": "أهمها", "option_type": "DYNAMIC_FROM_PREVIOUS_MULTI_SELECT", "responses": [
+            {"id": None, "text": "[Dynamic/Searchable Dropdown]", "next_question_id": None},
+        ]},
+    ]
+
+    def generate(self, prefix, seed=7):
+        return synthetic.generate(scale=1, seed=seed, prefix=prefix, batch_size=3, spec=self.SPEC, flow_shape=self.SHAPE)
+
+    def test_generates_scaled_rows_with_runs_and_labels(self):
+        counts = synthetic.generate(
+            scale=2, seed=1, prefix="A", batch_size=50, spec=self.SPEC, flow_shape=self.SHAPE, answer_facts=True,
+        )
+        self.assertEqual(counts["Survey"], 4)
+        self.assertEqual(counts["SurveyVersion"], 8)
+        self.assertEqual(counts["AssessmentRun"], 8)
+        self.assertEqual(counts["SurveyQuestion"], 32)
+        self.assertEqual(counts["AssessmentResult"], 32)
+        self.assertEqual(counts["IndicatorListItem"], 20)
+        self.assertEqual(counts["AssessmentFlowRule"], 4)
+        self.assertGreater(counts["AssessmentAnswerFact"], 0)
+        labels = list(SurveyVersion.objects.values_list("version_label", flat=True))
+        self.assertEqual(len(set(labels)), 8)
+        self.assertNotIn("", labels)
+
+    def test_histories_replay_through_the_routing_engine(self):
+        self.generate("R")
+        engine = RoutingEngine()
+        for result in AssessmentResult.objects.all():
+            history = result.results
+            responses = {}
+            for index, step in enumerate(history):
+                responses[str(step["question_id"])] = step["answer"]
+                used = [item["rule_id"] for item in history[:index + 1] if item["rule_id"]]
+                routed = engine.get_next_question(responses, used_rule_ids=used)
+                if index + 1 < len(history):
+                    self.assertEqual(routed.next_question.id, history[index + 1]["question_id"])
+                    self.assertEqual(routed.rule.id, history[index + 1]["rule_id"])
+                else:
+                    self.assertIsNone(routed.next_question)
+
+    def test_same_seed_gives_the_same_dataset_shape(self):
+        def shape(prefix):
+            option_text = dict(AssessmentOption.objects.values_list("id", "text_ar"))
+            return [
+                [
+                    option_text[step["answer"]] if isinstance(step["answer"], int) else len(step["answer"])
+                    for step in result.results
+                ]
+                for result in AssessmentResult.objects.filter(
+                    assessment_run__survey_version__survey__code__startswith=prefix
+                ).order_by("id")
+            ]
+
+        self.generate("X")
+        self.generate("Y")
+        self.assertEqual(shape("X"), shape("Y"))
+
+    def test_flow_copy_follows_assessment_flow_json(self):
+        flow = synthetic.load_flow_shape()
+        spec = synthetic.SyntheticSpec(surveys=1, versions_per_survey=1, questions_per_version=1, indicators=1,
+                                       items_per_indicator=1)
+        counts = synthetic.generate(scale=1, prefix="F", spec=spec, flow_shape=flow)
+        self.assertEqual(counts["AssessmentQuestion"], len(flow))
+        self.assertEqual(
+            counts["AssessmentOption"],
+            sum(1 for entry in flow for response in entry["responses"] if response["id"] is not None),
+        )
+        entries = AssessmentQuestion.objects.filter(incoming_rules__isnull=True)
+        self.assertEqual(entries.count(), 1)
+
+
+class EngineBenchmarkTests(TestCase):
+    def test_every_case_reaches_its_matching_rule(self):
+        cases = benchmarks.build_cases(rule_counts=[3], cardinalities=[1, 2])
+        report = benchmarks.run_benchmarks(cases, min_time=0, max_rounds=1)
+        self.assertEqual(len(report["results"]), len(cases))
+        self.assertEqual(report["results"][cases[0].name]["rounds"], 1)
+        # Fixtures are rolled back.
+        self.assertFalse(AssessmentFlowRule.objects.exists())
+        self.assertFalse(QuestionClassificationRule.objects.exists())
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        def report(**medians):
+            return {"results": {name: {"median_ms": value} for name, value in medians.items()}}
+
+        comparisons = benchmarks.compare(report(a=1.0, b=1.0, c=1.0), report(a=1.2, b=2.0, c=0.5))
+        self.assertEqual([c.status(0.25) for c in comparisons], ["unchanged", "regression", "improvement"])
+        self.assertEqual([c.name for c in benchmarks.regressions(comparisons, 0.25)], ["b"])
+
+    def test_command_saves_and_compares_baselines(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "baseline.json")
+        args = ["benchmark_engines", "--engine", "survey_routing", "--operator", "==", "--rule-counts", "2",
+                "--min-time", "0", "--max-rounds", "1"]
+        call_command(*args, "--output", path, stdout=io.StringIO())
+
+        baseline = benchmarks.load(path)
+        for entry in baseline["results"].values():
+            entry["median_ms"] = 1e-9
+        benchmarks.save(baseline, path)
+        with self.assertRaisesMessage(CommandError, "2 of 2 cases regressed"):
+            call_command(*args, "--compare", path, stdout=io.StringIO())
+
+
+class EngineExplainViewTests(TestCase):
+    def setUp(self):
+        self.q1 = AssessmentQuestion.objects.create(text_en="Question 1")
+        self.q2 = AssessmentQuestion.objects.create(text_en="Question 2")
+        self.rule = AssessmentFlowRule.objects.create(
+            to_question=self.q2,
+            condition=json.dumps({"conditions": [{"question": self.q1.id, "operator": "==", "value": "Yes"}]}),
+        )
+        self.url = reverse("explain_engine")
+
+    def post(self, payload):
+        return self.client.post(self.url, data=json.dumps(payload), content_type="application/json")
+
+    def test_staff_only(self):
+        self.assertEqual(self.post({"responses": {}}).status_code, 403)
+
+    def test_returns_the_routing_trace(self):
+        self.client.force_login(User.objects.create_user("staff", password="secret", is_staff=True))
+        response = self.post({"engine": "routing", "responses": {str(self.q1.id): "Yes"}})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["matched_rule_id"], self.rule.id)
+        self.assertEqual(data["next_question_id"], self.q2.id)
+        self.assertEqual(data["rules"][0]["conditions"][0]["result"], True)
+
+        response = self.post({"engine": "routing", "responses": {str(self.q1.id): "Yes"}, "used_rule_ids": [self.rule.id]})
+        self.assertIsNone(response.json()["matched_rule_id"])
+        self.assertEqual(self.post({"engine": "unknown"}).status_code, 400)
+
+
+class DatabaseBenchmarkTests(TestCase):
+    def test_workload_writes_results_and_reports(self):
+        workload = dbbench.prepare(seed=3)
+        report = dbbench.run(workload, threads=1, duration=0.2, seed=3)
+        self.assertGreater(report["steps"], 0)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(set(report["latency_ms"]), {"p50", "p90", "p95", "p99"})
+        self.assertTrue(AssessmentResult.objects.filter(assessment_run_id=workload.run_id).exists())
+
+
+class OptimisticConcurrencyTests(TestCase):
+    def setUp(self):
+        survey = Survey.objects.create(name_ar="استبيان", name_en="Survey", code="OCC")
+        self.version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        self.survey_question = SurveyQuestion.objects.create(
+            survey_version=self.version, text_en="Survey Question", text_ar="سؤال استبيان",
+        )
+        self.run = self.version.assessment_run
+        self.q1 = AssessmentQuestion.objects.create(text_en="Q1", text_ar="س1")
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_en="Yes", text_ar="نعم")
+        self.no = AssessmentOption.objects.create(question=self.q1, text_en="No", text_ar="لا")
+
+    def save(self, base_version, base_history, history):
+        return concurrency.save_result(self.run, self.survey_question, base_version=base_version,
+                                       base_history=base_history, history=history)
+
+    def test_merge_histories(self):
+        base = [{"question_id": 1, "answer": 1}, {"question_id": 2, "answer": 5}]
+        ours = [{"question_id": 1, "answer": 2}, {"question_id": 2, "answer": 5}]
+        theirs = [{"question_id": 1, "answer": 1}, {"question_id": 2, "answer": 6}]
+        merge = concurrency.merge_histories
+        self.assertEqual(merge(base, ours, base), ours)
+        self.assertEqual(merge(base, base, theirs), theirs)
+        # Steps are never combined from both sides: q2 was reached from q1's old answer.
+        self.assertIsNone(merge(base, ours, theirs))
+        self.assertIsNone(merge(base, ours, [{"question_id": 1, "answer": 3}, {"question_id": 2, "answer": 5}]))
+
+        extended = base + [{"question_id": 3, "answer": 7}]
+        self.assertEqual(merge(base[:1], base, extended), extended)
+        self.assertIsNone(merge(base, [base[0], {"question_id": 4}], extended))
+        self.assertIsNone(merge(base, ours, extended))
+
+    def test_compare_and_swap_increments_the_version(self):
+        history = [{"question_id": self.q1.id, "answer": self.yes.id}]
+        result, merged = self.save(0, [], history)
+        self.assertEqual((result.version, merged), (1, False))
+
+        longer = history + [{"question_id": 99, "rule_id": None}]
+        result, merged = self.save(1, history, longer)
+        self.assertEqual((result.version, result.results, merged), (2, longer, False))
+
+    def test_stale_writer_merges_or_conflicts(self):
+        base = [{"question_id": 1, "answer": 1}, {"question_id": 2, "answer": 5}]
+        self.save(0, [], base)
+        self.save(1, base, [{"question_id": 1, "answer": 1}, {"question_id": 2, "answer": 6}])
+
+        # The other writer only continued our path.
+        longer = [{"question_id": 1, "answer": 1}, {"question_id": 2, "answer": 6}, {"question_id": 3, "answer": 7}]
+        result, merged = self.save(1, base, longer)
+        self.assertTrue(merged)
+        self.assertEqual((result.version, result.results), (3, longer))
+
+        with self.assertRaises(concurrency.VersionConflict) as raised:
+            self.save(1, base, [{"question_id": 1, "answer": 2}, {"question_id": 2, "answer": 5}])
+        self.assertEqual(raised.exception.current.version, 3)
+
+    def test_merged_history_is_classified_again(self):
+        first = [{"question_id": self.q1.id, "rule_id": None, "answer": self.yes.id}]
+        longer = first + [{"question_id": 2, "rule_id": None, "answer": self.no.id}]
+        self.save(0, [], first)
+        concurrency.save_result(self.run, self.survey_question, base_version=1, base_history=first,
+                                history=longer, classification=f"after {self.no.id}")
+
+        # A stale tab saving its unchanged history keeps the other tab's longer path.
+        with self.assertRaises(concurrency.VersionConflict):
+            concurrency.save_result(self.run, self.survey_question, base_version=1, base_history=first,
+                                    history=first, classification=f"after {self.yes.id}")
+        result, merged = concurrency.save_result(
+            self.run, self.survey_question, base_version=1, base_history=first, history=first,
+            classification=f"after {self.yes.id}", classify=lambda history: f"after {history[-1]['answer']}",
+        )
+        self.assertTrue(merged)
+        self.assertEqual((result.results, result.classification), (longer, f"after {self.no.id}"))
+
+    @mock.patch.object(ClassificationEngine, "classify_question", return_value=mock.Mock(classification=""))
+    def test_second_tab_gets_a_conflict_response(self, classify):
+        start_url = f"{reverse('assessment_page', args=[self.q1.id])}?survey_question_id={self.survey_question.id}"
+        first, second = Client(), Client()
+        first.get(start_url)
+        second.get(start_url)
+
+        def answer(client, option):
+            return client.post(reverse('get_next_question'), content_type='application/json',
+                               data=json.dumps({'question_id': self.q1.id, 'option_ids': [option.id]}))
+
+        self.assertEqual(answer(first, self.yes).status_code, 204)
+        response = answer(second, self.no)
+        self.assertEqual(response.status_code, 409)
+        conflict = response.json()
+        self.assertEqual(conflict["version"], 1)
+        self.assertEqual(conflict["results"][0]["answer"], self.yes.id)
+        self.assertEqual(conflict["reload_url"], start_url)
+
+        second.get(conflict["reload_url"])
+        self.assertEqual(answer(second, self.no).status_code, 204)
+        result = AssessmentResult.objects.get(assessment_run=self.run, survey_question=self.survey_question)
+        self.assertEqual((result.version, result.results[0]["answer"]), (2, self.no.id))
+
+
+class RuleChangeImpactTests(TestCase):
+    def setUp(self):
+        survey = Survey.objects.create(name_ar="استبيان", name_en="Survey", code="IMP")
+        version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        self.q1, self.q2, self.q3, self.q4 = [
+            AssessmentQuestion.objects.create(text_en=f"Q{index}", text_ar=f"س{index}") for index in range(1, 5)
+        ]
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_en="Yes", text_ar="نعم")
+        self.no = AssessmentOption.objects.create(question=self.q1, text_en="No", text_ar="لا")
+        self.to_q2 = AssessmentFlowRule.objects.create(to_question=self.q2, priority=1, condition=self.condition("==", "Yes"))
+        self.to_q3 = AssessmentFlowRule.objects.create(to_question=self.q3, priority=2, condition=self.condition("==", "No"))
+        self.version = version
+
+        def result(code, history):
+            survey_question = SurveyQuestion.objects.create(survey_version=version, code=code, text_en=code, text_ar=code)
+            return AssessmentResult.objects.create(assessment_run=version.assessment_run,
+                                                   survey_question=survey_question, results=history)
+
+        self.answered_yes = result("A", [{"question_id": self.q1.id, "rule_id": None, "answer": self.yes.id},
+                                         {"question_id": self.q2.id, "rule_id": self.to_q2.id}])
+        self.answered_no = result("B", [{"question_id": self.q1.id, "rule_id": None, "answer": self.no.id},
+                                        {"question_id": self.q3.id, "rule_id": self.to_q3.id}])
+        self.unrelated = result("C", [{"question_id": self.q4.id, "rule_id": None, "answer": "free text"}])
+        self.high = QuestionClassification.objects.create(name_ar="مرتفع", name_en="High")
+        self.high_rule = QuestionClassificationRule.objects.create(
+            classification=self.high, priority=1, condition=self.classified_as_high(self.yes),
+        )
+
+    def condition(self, operator, value):
+        return json.dumps({"conditions": [{"question": self.q1.id, "operator": operator, "value": value}]})
+
+    def classified_as_high(self, option, *survey_question_ids):
+        # Classification rules read the survey question's latest answer.
+        survey_question_ids = survey_question_ids or (self.answered_yes.survey_question_id,
+                                                      self.answered_no.survey_question_id)
+        return json.dumps({"logic": "OR", "conditions": [
+            {"question": survey_question_id, "operator": "==", "value": option.id}
+            for survey_question_id in survey_question_ids
+        ]})
+
+    def changes(self, report):
+        return {change["result_id"]: (change["before"], change["after"]) for change in report["changes"]}
+
+    def test_routing_change_replays_only_dependent_histories(self):
+        self.to_q2.condition = self.condition("==", "No")
+        for processes in (1, 2):
+            report = impact.routing_impact(self.to_q2, processes=processes, chunk_size=1)
+            self.assertEqual((report["selection"], report["dependencies"]), ("dependency_index", [self.q1.id]))
+            self.assertEqual((report["total_results"], report["replayed"], report["changed"]), (3, 2, 2))
+            self.assertEqual(self.changes(report), {
+                self.answered_yes.id: ({"next_question_id": self.q2.id, "rule_id": self.to_q2.id},
+                                       {"next_question_id": None, "rule_id": None}),
+                self.answered_no.id: ({"next_question_id": self.q3.id, "rule_id": self.to_q3.id},
+                                      {"next_question_id": self.q2.id, "rule_id": self.to_q2.id}),
+            })
+        # Nothing was saved.
+        self.to_q2.refresh_from_db()
+        self.assertEqual(self.to_q2.condition, self.condition("==", "Yes"))
+
+    def test_results_without_facts_are_replayed(self):
+        from assessment_runs.models import AssessmentAnswerFact
+
+        AssessmentAnswerFact.objects.filter(assessment_result=self.answered_no).delete()
+        self.to_q2.condition = self.condition("==", "No")
+        report = impact.routing_impact(self.to_q2)
+        self.assertEqual((report["replayed"], report["changed"]), (2, 2))
+
+    def test_rules_matching_unanswered_questions_replay_everything(self):
+        new_rule = AssessmentFlowRule(to_question=self.q3, priority=0, condition=self.condition("!=", "Yes"))
+        report = impact.routing_impact(new_rule)
+        self.assertEqual((report["selection"], report["replayed"]), ("all", 3))
+        self.assertEqual(set(self.changes(report)), {self.answered_no.id, self.unrelated.id})
+
+        report = impact.routing_impact(self.to_q3, delete=True)
+        self.assertEqual(self.changes(report), {
+            self.answered_no.id: ({"next_question_id": self.q3.id, "rule_id": self.to_q3.id},
+                                  {"next_question_id": None, "rule_id": None}),
+        })
+
+    def test_classification_change(self):
+        self.high_rule.condition = self.classified_as_high(self.no)
+        report = impact.classification_impact(self.high_rule)
+        self.assertEqual((report["dependencies"], report["replayed"]),
+                         ([self.answered_yes.survey_question_id, self.answered_no.survey_question_id], 2))
+        self.assertEqual(self.changes(report), {
+            self.answered_yes.id: ({"classification_id": self.high.id, "rule_id": self.high_rule.id},
+                                   {"classification_id": None, "rule_id": None}),
+            self.answered_no.id: ({"classification_id": None, "rule_id": None},
+                                  {"classification_id": self.high.id, "rule_id": self.high_rule.id}),
+        })
+
+    def test_classification_replay_matches_the_assessment_page(self):
+        survey_question = SurveyQuestion.objects.create(survey_version=self.version, code="D", text_en="D", text_ar="D")
+        self.high_rule.condition = self.classified_as_high(self.yes, survey_question.id)
+        self.high_rule.save()
+        classify_question = ClassificationEngine.classify_question
+        classified = []
+
+        def classify_by_id(engine, question, responses):
+            # The page passes the SurveyQuestion itself, which the engine cannot resolve yet.
+            classified.append(classify_question(engine, AssessmentQuestion(id=question.id), responses))
+            return classified[-1]
+
+        client = Client()
+        client.get(f"{reverse('assessment_page', args=[self.q1.id])}?survey_question_id={survey_question.id}")
+        with mock.patch.object(ClassificationEngine, "classify_question", autospec=True, side_effect=classify_by_id):
+            response = client.post(reverse('get_next_question'), content_type='application/json',
+                                   data=json.dumps({'question_id': self.q1.id, 'option_ids': [self.yes.id]}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(classified[-1].rule, self.high_rule)
+
+        result = AssessmentResult.objects.get(survey_question=survey_question)
+        rows = list(QuestionClassificationRule.objects.values_list("id", "classification_id", "priority", "condition"))
+        engine = replay.RuleSet(replay.CLASSIFICATION, rows, replay.load_options()).engine()
+        self.assertEqual(replay.replay_classification(engine, survey_question.id, result.results)[2:],
+                         (self.high.id, self.high_rule.id))
+
+    def test_command_reports_changes(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "impact.json")
+            call_command("rule_change_impact", "routing", "--rule", str(self.to_q3.id), "--target", str(self.q4.id),
+                         "--output", output, stdout=out)
+            with open(output, encoding="utf-8") as fh:
+                report = json.load(fh)
+        self.assertIn("1 results would change.", out.getvalue())
+        self.assertEqual(report["changes"][0]["after"], {"next_question_id": self.q4.id, "rule_id": self.to_q3.id})
+
+        with self.assertRaises(CommandError):
+            call_command("rule_change_impact", "routing", "--delete", stdout=out)
+
+
+class ReplayVerificationTests(TestCase):
+    def setUp(self):
+        survey = Survey.objects.create(name_ar="استبيان", name_en="Survey", code="RPL")
+        self.version = SurveyVersion.objects.create(survey=survey, interval=SurveyVersion.SurveyInterval.ANNUALLY)
+        self.q1, self.q2, self.q3 = [
+            AssessmentQuestion.objects.create(text_en=f"Q{index}", text_ar=f"س{index}") for index in range(1, 4)
+        ]
+        self.yes = AssessmentOption.objects.create(question=self.q1, text_en="Yes", text_ar="نعم")
+        self.no = AssessmentOption.objects.create(question=self.q1, text_en="No", text_ar="لا")
+        self.to_q2 = AssessmentFlowRule.objects.create(to_question=self.q2, priority=1, condition=json.dumps(
+            {"conditions": [{"question": self.q1.id, "operator": "==", "value": "Yes"}]}))
+        self.to_q3 = AssessmentFlowRule.objects.create(to_question=self.q3, priority=2, condition=json.dumps(
+            {"conditions": [{"question": self.q1.id, "operator": "==", "value": "No"}]}))
+
+        self.valid = self.result("A", [{"question_id": self.q1.id, "rule_id": None, "answer": self.yes.id},
+                                       {"question_id": self.q2.id, "rule_id": self.to_q2.id}])
+        self.started = self.result("B", [{"question_id": self.q1.id, "rule_id": None}])
+        # The flow now sends "No" to q3.
+        self.stale = self.result("C", [{"question_id": self.q1.id, "rule_id": None, "answer": self.no.id},
+                                       {"question_id": self.q2.id, "rule_id": self.to_q2.id}])
+        self.dangling = self.result("D", [{"question_id": self.q1.id, "rule_id": None, "answer": 999999},
+                                          {"question_id": self.q3.id, "rule_id": 424242}])
+
+    def result(self, code, history):
+        survey_question = SurveyQuestion.objects.create(survey_version=self.version, code=code, text_en=code,
+                                                        text_ar=code)
+        return AssessmentResult.objects.create(assessment_run=self.version.assessment_run,
+                                               survey_question=survey_question, results=history)
+
+    def test_verify_flags_divergences(self):
+        for processes in (1, 2):
+            report = replay.verify_results(processes=processes, chunk_size=1)
+            self.assertEqual((report["checked"], report["valid"], report["diverged"]), (4, 2, 2))
+            self.assertEqual(report["issues"], {"missing_option": 1, "missing_rule": 1, "next_question": 2})
+            issues = {result["result_id"]: result["issues"] for result in report["results"]}
+            self.assertEqual(issues[self.stale.id], [{
+                "step": 0,
+                "kind": "next_question",
+                "stored": {"next_question_id": self.q2.id, "rule_id": self.to_q2.id},
+                "replayed": {"next_question_id": self.q3.id, "rule_id": self.to_q3.id},
+            }])
+            self.assertEqual([issue["kind"] for issue in issues[self.dangling.id]],
+                             ["missing_option", "missing_rule", "next_question"])
+        self.assertEqual(AssessmentResult.objects.filter(replay_status="unchecked").count(), 4)
+
+    def test_verify_reports_progress_and_stops_when_cancelled(self):
+        seen = []
+
+        def progress(done, total):
+            seen.append((done, total))
+            if done == 2:
+                raise JobCancelled("stop")
+
+        with self.assertRaises(JobCancelled):
+            replay.verify_results(chunk_size=1, record=True, progress=progress)
+        self.assertEqual(seen, [(1, 4), (2, 4)])
+        self.assertEqual(AssessmentResult.objects.exclude(replay_status="unchecked").count(), 2)
+
+    def test_recorded_status_is_reset_by_new_writes(self):
+        Status = AssessmentResult.ReplayStatus
+        out = io.StringIO()
+        call_command("verify_assessment_replays", "--record", "--status", Status.UNCHECKED, stdout=out)
+        self.assertIn("2 valid, 2 diverged", out.getvalue())
+        self.assertEqual(
+            set(AssessmentResult.objects.filter(replay_status=Status.DIVERGED).values_list("id", flat=True)),
+            {self.stale.id, self.dangling.id},
+        )
+
+        history = [{"question_id": self.q1.id, "rule_id": None, "answer": self.no.id},
+                   {"question_id": self.q3.id, "rule_id": self.to_q3.id}]
+        result, _ = concurrency.save_result(self.stale.assessment_run, self.stale.survey_question,
+                                            base_version=None, base_history=None, history=history)
+        self.assertEqual(result.replay_status, Status.UNCHECKED)
+
+        report = replay.verify_results(AssessmentResult.objects.filter(replay_status=Status.UNCHECKED), record=True)
+        self.assertEqual((report["checked"], report["valid"]), (1, 1))
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.replay_status, Status.VALID)
+
+    def test_records_chunks_larger_than_the_sqlite_expression_limit(self):
+        questions = SurveyQuestion.objects.bulk_create([
+            SurveyQuestion(survey_version=self.version, code=f"B{index}", text_en="B", text_ar="B") for index in range(1200)
+        ])
+        history = [{"question_id": self.q1.id, "rule_id": None, "answer": self.yes.id},
+                   {"question_id": self.q2.id, "rule_id": self.to_q2.id}]
+        AssessmentResult.objects.bulk_create([
+            AssessmentResult(assessment_run=self.version.assessment_run, survey_question=question, results=history,
+                             version=1 + index % 3)
+            for index, question in enumerate(questions)
+        ])
+
+        report = replay.verify_results(chunk_size=1300, record=True)
+
+        self.assertEqual(report["checked"], 1204)
+        self.assertFalse(AssessmentResult.objects.filter(replay_status="unchecked").exists())
+
+    def test_admin_actions_queue_replay_and_export_jobs(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+        url = reverse("admin:assessment_runs_assessmentrun_changelist")
+        run = self.version.assessment_run
+        for action in ("queue_replay_verification", "queue_export"):
+            response = self.client.post(url, {"action": action, "_selected_action": [run.pk]}, follow=True)
+            self.assertEqual(response.status_code, 200)
+
+        replay_job, export_job = Job.objects.order_by("id")
+        self.assertEqual((replay_job.task, replay_job.payload, replay_job.created_by),
+                         ("assessment_runs.verify_replays", {"version_id": self.version.id}, admin))
+        self.assertEqual((export_job.task, export_job.payload), ("assessment_runs.export", {"run_id": run.pk}))
+        queue.run(queue.claim("admin-test", tasks=["assessment_runs.verify_replays"])[0])
+        replay_job.refresh_from_db()
+        self.assertEqual((replay_job.status, replay_job.result["checked"]), (Job.Status.SUCCEEDED, 4))
+        self.assertFalse(AssessmentResult.objects.filter(replay_status="unchecked").exists())
+
+    def test_results_saved_during_the_replay_keep_their_status(self):
+        rows = list(replay.history_rows(AssessmentResult.objects.filter(pk=self.stale.pk)))
+        self.assertEqual(rows[0][2], self.stale.version)
+        # Another tab saves the result after its history was read.
+        history = [{"question_id": self.q1.id, "rule_id": None, "answer": self.no.id},
+                   {"question_id": self.q3.id, "rule_id": self.to_q3.id}]
+        concurrency.save_result(self.stale.assessment_run, self.stale.survey_question,
+                                base_version=None, base_history=None, history=history)
+
+        with mock.patch.object(replay, "history_rows", return_value=rows):
+            report = replay.verify_results(record=True)
+        self.assertEqual(report["diverged"], 1)
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.replay_status, AssessmentResult.ReplayStatus.UNCHECKED)
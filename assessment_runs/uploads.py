@@ -0,0 +1,179 @@
+"""
+Resumable chunked uploads for assessment evidence files.
+
+Protocol:
+
+1. ``init`` creates a ChunkedUpload and pre-allocates a temporary file in the
+   blob store's temp directory.
+2. ``chunk`` requests carry one chunk each (any order) with its SHA-256 in
+   ``X-Chunk-Checksum``; the body is streamed into a spooled buffer while
+   it is hashed and only copied to its offset in the temporary file once
+   the checksum matches, so a corrupt retry never overwrites good bytes.
+3. ``status`` reports received chunks and the acknowledged offset so an
+   interrupted client can resume.
+4. ``complete`` hashes the assembled file and renames it into the
+   content-addressed store (no second copy) before attaching it to the result.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import storage as blob_storage
+from .models import AssessmentFile, ChunkedUpload
+
+READ_BLOCK_SIZE = 64 * 1024
+# Chunks up to this size are verified in memory, larger ones in a temporary file.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Protocol error with the HTTP status the view should return."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def default_chunk_size() -> int:
+    return int(getattr(settings, "ASSESSMENT_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+def max_chunk_size() -> int:
+    return int(getattr(settings, "ASSESSMENT_UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 * 1024))
+
+
+def max_upload_size() -> int:
+    return int(getattr(settings, "ASSESSMENT_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024))
+
+
+def init_upload(
+        assessment_result,
+        filename: str,
+        total_size: int,
+        chunk_size: Optional[int] = None,
+        triggering_option=None,
+        created_by=None,
+) -> ChunkedUpload:
+    if total_size < 0:
+        raise UploadError("total_size must not be negative")
+    if total_size > max_upload_size():
+        raise UploadError("File is too large", status=413)
+    chunk_size = chunk_size or default_chunk_size()
+    if chunk_size <= 0 or chunk_size > max_chunk_size():
+        raise UploadError("Invalid chunk_size")
+
+    fd, temp_path = tempfile.mkstemp(dir=blob_storage._temp_dir(), suffix=".upload")
+    with os.fdopen(fd, "wb") as fh:
+        fh.truncate(total_size)
+
+    return ChunkedUpload.objects.create(
+        assessment_result=assessment_result,
+        triggering_option=triggering_option,
+        filename=os.path.basename(filename or "")[:255] or "upload",
+        total_size=total_size,
+        chunk_size=chunk_size,
+        temp_path=temp_path,
+        created_by=created_by,
+    )
+
+
+def write_chunk(upload: ChunkedUpload, index: int, stream, checksum: str) -> ChunkedUpload:
+    """Verify one chunk from ``stream``, then copy it into place and record it."""
+    if upload.status != ChunkedUpload.Status.PENDING:
+        raise UploadError("Upload is not accepting chunks", status=409)
+    if index < 0 or index >= upload.total_chunks:
+        raise UploadError("Chunk index out of range")
+    if not checksum:
+        raise UploadError("Missing chunk checksum")
+
+    expected_length = upload.expected_chunk_length(index)
+    hasher = hashlib.sha256()
+    written = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, dir=blob_storage._temp_dir()) as buffer:
+        while written <= expected_length:
+            block = stream.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if written > expected_length:
+                break
+            hasher.update(block)
+            buffer.write(block)
+
+        if written != expected_length:
+            raise UploadError("Chunk has the wrong length")
+        if hasher.hexdigest() != checksum.strip().lower():
+            raise UploadError("Chunk checksum mismatch", status=422)
+
+        buffer.seek(0)
+        with open(upload.temp_path, "r+b") as fh:
+            fh.seek(index * upload.chunk_size)
+            for block in iter(lambda: buffer.read(READ_BLOCK_SIZE), b""):
+                fh.write(block)
+
+    with transaction.atomic():
+        locked = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if index not in locked.received_chunks:
+            locked.received_chunks = sorted(locked.received_chunks + [index])
+            locked.save(update_fields=["received_chunks", "updated_at"])
+    return locked
+
+
+def complete_upload(upload: ChunkedUpload, checksum: Optional[str] = None) -> AssessmentFile:
+    """Verify the assembled file and move it into the content-addressed store."""
+    if upload.status == ChunkedUpload.Status.COMPLETE and upload.assessment_file_id:
+        return upload.assessment_file
+    if upload.status != ChunkedUpload.Status.PENDING:
+        raise UploadError("Upload is not pending", status=409)
+
+    missing = sorted(set(range(upload.total_chunks)) - set(upload.received_chunks))
+    if missing:
+        raise UploadError(f"Missing chunks: {missing[:20]}", status=409)
+
+    digest, size = blob_storage.hash_file(upload.temp_path)
+    if size != upload.total_size:
+        raise UploadError("Assembled file has the wrong size", status=409)
+    if checksum and checksum.strip().lower() != digest:
+        raise UploadError("File checksum mismatch", status=422)
+
+    blob = blob_storage.commit_temp_file(upload.temp_path, digest, size)
+    with transaction.atomic():
+        assessment_file = blob_storage.attach_blob(
+            upload.assessment_result,
+            blob,
+            upload.filename,
+            triggering_option=upload.triggering_option,
+            uploaded_by=upload.created_by,
+        )
+        upload.assessment_file = assessment_file
+        upload.status = ChunkedUpload.Status.COMPLETE
+        upload.temp_path = ""
+        upload.save(update_fields=["assessment_file", "status", "temp_path", "updated_at"])
+    return assessment_file
+
+
+def expire_stale_uploads(max_age: Optional[datetime.timedelta] = None) -> int:
+    """Discard pending uploads untouched for ``max_age`` and delete their temporary files."""
+    if max_age is None:
+        max_age = datetime.timedelta(days=1)
+    stale = ChunkedUpload.objects.filter(
+        status=ChunkedUpload.Status.PENDING,
+        updated_at__lt=timezone.now() - max_age,
+    )
+    expired = 0
+    for upload in stale.iterator():
+        if upload.temp_path and os.path.exists(upload.temp_path):
+            os.remove(upload.temp_path)
+        upload.status = ChunkedUpload.Status.EXPIRED
+        upload.temp_path = ""
+        upload.save(update_fields=["status", "temp_path", "updated_at"])
+        expired += 1
+    return expired
@@ -10,5 +10,12 @@ urlpatterns = [
     path('question/<int:question_id>/', views.assessment_page, name='assessment_page'),
     path('next_question/', views.get_next_question_view, name='get_next_question'),
     path('rewind/', views.rewind_assessment, name='rewind_assessment'),
+    path('engine/explain/', views.explain_engine, name='explain_engine'),
     path('complete/', views.assessment_complete, name='assessment_complete'),
+    path('export/', views.export_assessment_results, name='export_assessment_results'),
+    path('files/<int:file_id>/download/', views.download_assessment_file, name='download_assessment_file'),
+    path('uploads/init/', views.chunked_upload_init, name='chunked_upload_init'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload_status, name='chunked_upload_status'),
+    path('uploads/<uuid:upload_id>/chunk/', views.chunked_upload_chunk, name='chunked_upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
 ]
@@ -1,27 +1,42 @@
 import json
 import logging
+import os
 from datetime import datetime
+from django.conf import settings
+from django.db import router
 from django.db.models import Count, Prefetch
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.http import Http404, JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET, require_POST
 from django.utils import timezone
+from django.utils.translation import gettext
 from surveys.models import Survey, SurveyVersion, SurveyQuestion
 from assessment_flow.models import AssessmentQuestion, AssessmentOption
 from indicators.models import Indicator
+from assessment_flow import graph as flow_graph
 from assessment_flow.engine import RoutingEngine
-from .models import AssessmentRun, AssessmentResult
-from .engine import ClassificationEngine
+from surveys.engine import SurveyRoutingEngine
+from QuestionsBank.routers import read_only
+from .models import AssessmentRun, AssessmentResult, AssessmentFile, ChunkedUpload
+from .engine import ClassificationEngine, survey_question_responses
+from . import concurrency as result_concurrency
+from . import export as result_export
+from . import storage as blob_storage
+from . import uploads as chunked_uploads
 
 log = logging.getLogger(__name__)
 
 
+@read_only
 def survey_list(request):
     # Only show surveys that have at least one version with questions
     surveys = Survey.objects.filter(versions__questions__isnull=False).distinct()
     return render(request, 'assessment_runs/survey_list.html', {'surveys': surveys})
 
 
+@read_only
 def survey_version_list(request, survey_id):
     survey = get_object_or_404(Survey, pk=survey_id)
     # Only show versions that have questions
@@ -29,13 +44,13 @@ def survey_version_list(request, survey_id):
     return render(request, 'assessment_runs/survey_version_list.html', {'survey': survey, 'versions': versions})
 
 
+@read_only
 def survey_question_list(request, version_id):
-    version = get_object_or_404(SurveyVersion, pk=version_id)
-    questions = version.questions.all()
-    total_questions = questions.count()
+    version = get_object_or_404(SurveyVersion.objects.select_related('survey'), pk=version_id)
+    questions = list(version.questions.all())
+    total_questions = len(questions)
 
-    # Entry points have no incoming routing rules.
-    first_assessment_question = AssessmentQuestion.objects.filter(incoming_rules__isnull=True).first()
+    first_assessment_question_id = flow_graph.get_graph().entry_point
     
     assessment_run = getattr(version, 'assessment_run', None)
     completed_question_ids = set()
@@ -64,7 +79,7 @@ def survey_question_list(request, version_id):
     return render(request, 'assessment_runs/survey_question_list.html', {
         'version': version,
         'question_list_data': question_list_data,
-        'first_assessment_question': first_assessment_question,
+        'first_assessment_question_id': first_assessment_question_id,
         'progress_percentage': progress_percentage,
         'completed_count': completed_count,
         'total_questions': total_questions,
@@ -108,7 +123,7 @@ def assessment_page(request, question_id):
     try:
         survey_question_id = int(survey_question_id) if survey_question_id else None
         if survey_question_id:
-            survey_question = SurveyQuestion.objects.filter(pk=survey_question_id).first()
+            survey_question = SurveyQuestion.objects.select_related('survey_version').filter(pk=survey_question_id).first()
     except (TypeError, ValueError):
         survey_question_id = None
         survey_question = None
@@ -130,6 +145,13 @@ def assessment_page(request, question_id):
                 survey_question=survey_question
             ).first()
             
+            if target_result:
+                # The base for the optimistic write in get_next_question_view.
+                assessment_metadata['result_version'] = target_result.version
+                assessment_metadata['result_base'] = target_result.results
+            else:
+                assessment_metadata['result_version'] = 0
+                assessment_metadata['result_base'] = []
             if target_result and target_result.results:
                 history = target_result.results
                 request.session['assessment_history'] = history
@@ -160,38 +182,48 @@ def assessment_page(request, question_id):
          # If we jump to Q1, and history has [Q1, Q2], it's in history.
          pass
 
-    # Bulk fetch questions
-    questions_map = {q.id: q for q in AssessmentQuestion.objects.filter(id__in=history_q_ids)}
-    
+    # Bulk fetch questions with their options, and every answered option/indicator in one query each
+    questions_map = {
+        q.id: q
+        for q in AssessmentQuestion.objects.filter(id__in=history_q_ids)
+        .select_related('indicator_source')
+        .prefetch_related('options')
+    }
+
+    indicator_ids, option_ids = set(), set()
+    for item in history:
+        q_obj = questions_map.get(item['question_id'])
+        answer = item.get('answer')
+        if not q_obj or not answer:
+            continue
+        ids = {ans for ans in (answer if isinstance(answer, list) else [answer]) if isinstance(ans, int)}
+        if q_obj.option_type == AssessmentQuestion.OptionType.INDICATOR_LIST:
+            indicator_ids |= ids
+        else:
+            option_ids |= ids
+    indicator_names = dict(Indicator.objects.filter(id__in=indicator_ids).values_list('id', 'name_ar')) if indicator_ids else {}
+    options_map = AssessmentOption.objects.in_bulk(option_ids) if option_ids else {}
+
     for item in history:
         q_id = item['question_id']
         q_obj = questions_map.get(q_id)
         if q_obj:
-            # Resolve answer text if needed
+            # Resolve stored option/indicator IDs to text for the collapsed answer box
             answer = item.get('answer')
-            # If answer is IDs, we might want to resolve to text for display?
-            # The template _question_box.html expects 'answer' to be displayed.
-            # If 'answer' is [1, 2], we need to show "Option 1", "Option 2".
-            
-            # We need to resolve IDs to text for display in collapsed box.
-            # This logic was previously in get_next_question_view but now we store IDs.
-            
             display_answer = []
             if answer:
                 answer_list = answer if isinstance(answer, list) else [answer]
                 for ans in answer_list:
                     # Check if it's an ID (int) or text
                     if isinstance(ans, int):
-                        # Try to find option
                         if q_obj.option_type == AssessmentQuestion.OptionType.INDICATOR_LIST:
-                             opt = Indicator.objects.filter(id=ans).first()
-                             if opt: display_answer.append(opt.name_ar)
+                            if ans in indicator_names: display_answer.append(indicator_names[ans])
                         else:
-                             opt = AssessmentOption.objects.filter(id=ans).first()
-                             if opt: display_answer.append(opt.display_text)
+                            opt = options_map.get(ans)
+                            if opt: display_answer.append(opt.display_text)
                     else:
                         display_answer.append(ans)
-            
+
             questions_to_render.append({
                 'question': q_obj,
                 'answer': display_answer,
@@ -267,36 +299,44 @@ def get_next_question_view(request):
         if survey_version and survey_question:
             assessment_run, _ = AssessmentRun.objects.get_or_create(survey_version=survey_version)
 
-            responses = {}
-            # Use survey question id to align with classification rules
-            if survey_question_id:
-                latest_answer = next(
-                    (
-                        item.get('answer')
-                        for item in reversed(history)
-                        if item.get('question_id') == question_id and 'answer' in item
-                    ),
-                    None,
-                )
-                responses[str(survey_question_id)] = latest_answer
-
             classification_engine = ClassificationEngine()
-            classification_result = classification_engine.classify_question(survey_question, responses)
-
-            if not classification_result.classification:
-                log.debug("No classification resolved for survey question %s", survey_question_id)
-
-            classification_str = classification_result.classification or ""
 
-            AssessmentResult.objects.update_or_create(
-                assessment_run=assessment_run,
-                survey_question=survey_question,
-                defaults={
-                    'assessed_by': request.user if request.user.is_authenticated else None,
-                    'results': history,
-                    'classification': classification_str,
-                },
-            )
+            def classify(steps):
+                # Use survey question id to align with classification rules
+                responses = survey_question_responses(survey_question.id, steps)
+                classification_result = classification_engine.classify_question(survey_question, responses)
+                if not classification_result.classification:
+                    log.debug("No classification resolved for survey question %s", survey_question_id)
+                return classification_result.classification or ""
+
+            try:
+                saved, merged = result_concurrency.save_result(
+                    assessment_run,
+                    survey_question,
+                    base_version=metadata.get('result_version'),
+                    base_history=metadata.get('result_base'),
+                    history=history,
+                    classification=classify(history),
+                    # A merged history is classified again.
+                    classify=classify,
+                    user=request.user if request.user.is_authenticated else None,
+                )
+            except result_concurrency.VersionConflict as conflict:
+                stored = conflict.current.results
+                first_question_id = stored[0]['question_id'] if stored else question_id
+                return JsonResponse({
+                    'status': 'conflict',
+                    'message': gettext("عدّل مستخدم آخر هذا التقييم. أعد تحميل الصفحة لمتابعة أحدث نسخة."),
+                    'version': conflict.current.version,
+                    'results': stored,
+                    'reload_url': f"{reverse('assessment_page', args=[first_question_id])}"
+                                  f"?survey_question_id={survey_question.id}",
+                }, status=409)
+            if merged:
+                history = saved.results
+            metadata['result_version'] = saved.version
+            metadata['result_base'] = saved.results
+            request.session['assessment_metadata'] = metadata
 
     # Routing logic
     responses = {str(item['question_id']): item.get('answer') for item in history if 'answer' in item}
@@ -356,3 +396,223 @@ def assessment_complete(request):
         "assessment_runs/assessment_complete.html",
         {"survey_version": survey_version},
     )
+
+
+def _iter_file_and_remove(path, block_size=64 * 1024):
+    try:
+        with open(path, "rb") as fh:
+            while True:
+                block = fh.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+@require_GET
+@read_only
+def export_assessment_results(request):
+    """Stream AssessmentResult rows as CSV, XLSX or Parquet.
+
+    Optional filters: ``version_id`` and ``run_id``. CSV is generated
+    incrementally; XLSX and Parquet are spooled to a temporary file chunk by
+    chunk and then streamed back.
+    """
+    export_format = (request.GET.get("format") or "csv").lower()
+    if export_format not in result_export.EXPORT_FORMATS:
+        return JsonResponse({"status": "error", "message": "Unsupported export format"}, status=400)
+
+    try:
+        version_id = int(request.GET["version_id"]) if request.GET.get("version_id") else None
+        run_id = int(request.GET["run_id"]) if request.GET.get("run_id") else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid filter"}, status=400)
+
+    # Pin the database now: CSV rows are produced after the view, outside read_only.
+    queryset = result_export.export_queryset(survey_version_id=version_id, assessment_run_id=run_id)
+    queryset = queryset.using(router.db_for_read(AssessmentResult))
+    filename = f"assessment_results_{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+    content_type = result_export.EXPORT_FORMATS[export_format]
+
+    if export_format == "csv":
+        response = StreamingHttpResponse(
+            result_export.iter_csv(queryset),
+            content_type=f"{content_type}; charset=utf-8",
+        )
+    else:
+        try:
+            path = result_export.export_to_tempfile(queryset, export_format)
+        except result_export.ExportError as exc:
+            return JsonResponse({"status": "error", "message": str(exc)}, status=501)
+        response = StreamingHttpResponse(_iter_file_and_remove(path), content_type=content_type)
+        response["Content-Length"] = str(os.path.getsize(path))
+
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_GET
+def download_assessment_file(request, file_id):
+    """Serve an assessment file, offloading the transfer to the web server when configured.
+
+    With ``ASSESSMENT_FILES_SENDFILE_BACKEND = "nginx"`` the response carries an
+    ``X-Accel-Redirect`` to ``ASSESSMENT_FILES_SENDFILE_PREFIX``; with
+    ``"apache"`` an ``X-Sendfile`` header with the absolute path. Otherwise
+    the file is streamed by Django with single-range support.
+    """
+    assessment_file = get_object_or_404(AssessmentFile.objects.select_related("blob"), pk=file_id)
+    blob = assessment_file.blob
+    stored = blob.file if blob else assessment_file.file
+    if not stored or not stored.name or not stored.storage.exists(stored.name):
+        raise Http404("File not found")
+
+    etag = f'"{blob.digest}"' if blob else None
+    if etag and request.headers.get("If-None-Match") == etag:
+        return HttpResponseNotModified()
+
+    filename = assessment_file.original_filename or os.path.basename(stored.name)
+    backend = blob_storage.sendfile_backend()
+
+    if backend == "nginx":
+        prefix = getattr(settings, "ASSESSMENT_FILES_SENDFILE_PREFIX", "/protected/")
+        response = HttpResponse(content_type="application/octet-stream")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + stored.name
+    elif backend == "apache":
+        response = HttpResponse(content_type="application/octet-stream")
+        response["X-Sendfile"] = stored.path
+    else:
+        size = stored.size
+        try:
+            byte_range = blob_storage.parse_range_header(request.headers.get("Range"), size)
+        except blob_storage.RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        response = StreamingHttpResponse(
+            blob_storage.iter_file_range(stored.open("rb"), byte_range),
+            content_type="application/octet-stream",
+        )
+        response["Accept-Ranges"] = "bytes"
+        if byte_range is not None:
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {byte_range.start}-{byte_range.end}/{size}"
+            response["Content-Length"] = str(byte_range.length)
+        else:
+            response["Content-Length"] = str(size)
+
+    if etag:
+        response["ETag"] = etag
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+def _upload_payload(upload):
+    return {
+        "upload_id": str(upload.id),
+        "status": upload.status,
+        "chunk_size": upload.chunk_size,
+        "total_size": upload.total_size,
+        "total_chunks": upload.total_chunks,
+        "received_chunks": upload.received_chunks,
+        "offset": upload.acknowledged_offset,
+        "status_url": reverse("chunked_upload_status", args=[upload.id]),
+        "chunk_url": reverse("chunked_upload_chunk", args=[upload.id]),
+        "complete_url": reverse("chunked_upload_complete", args=[upload.id]),
+    }
+
+
+@require_POST
+def chunked_upload_init(request):
+    try:
+        data = json.loads(request.body)
+        result_id = int(data.get("assessment_result_id"))
+        total_size = int(data.get("total_size"))
+        chunk_size = int(data["chunk_size"]) if data.get("chunk_size") else None
+        option_id = int(data["triggering_option_id"]) if data.get("triggering_option_id") else None
+    except (TypeError, ValueError, KeyError, json.JSONDecodeError):
+        return JsonResponse({"status": "error", "message": "Invalid upload request"}, status=400)
+
+    assessment_result = get_object_or_404(AssessmentResult, pk=result_id)
+    option = AssessmentOption.objects.filter(pk=option_id).first() if option_id else None
+    try:
+        upload = chunked_uploads.init_upload(
+            assessment_result,
+            data.get("filename") or "",
+            total_size,
+            chunk_size=chunk_size,
+            triggering_option=option,
+            created_by=request.user if request.user.is_authenticated else None,
+        )
+    except chunked_uploads.UploadError as exc:
+        return JsonResponse({"status": "error", "message": str(exc)}, status=exc.status)
+    return JsonResponse(_upload_payload(upload), status=201)
+
+
+@require_GET
+def chunked_upload_status(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id)
+    return JsonResponse(_upload_payload(upload))
+
+
+@require_POST
+def chunked_upload_chunk(request, upload_id):
+    """Receive one chunk as the raw request body; ``index`` is a query parameter."""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id)
+    try:
+        index = int(request.GET.get("index", ""))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Missing chunk index"}, status=400)
+
+    try:
+        upload = chunked_uploads.write_chunk(
+            upload, index, request, request.headers.get("X-Chunk-Checksum", "")
+        )
+    except chunked_uploads.UploadError as exc:
+        return JsonResponse({"status": "error", "message": str(exc)}, status=exc.status)
+    return JsonResponse(_upload_payload(upload))
+
+
+@require_POST
+def chunked_upload_complete(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload.objects.select_related("assessment_result"), pk=upload_id)
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        data = {}
+    try:
+        assessment_file = chunked_uploads.complete_upload(upload, checksum=data.get("checksum"))
+    except chunked_uploads.UploadError as exc:
+        return JsonResponse({"status": "error", "message": str(exc)}, status=exc.status)
+    return JsonResponse({
+        "status": "ok",
+        "file_id": assessment_file.id,
+        "download_url": reverse("download_assessment_file", args=[assessment_file.id]),
+    })
+
+
+@require_POST
+def explain_engine(request):
+    """Staff-only: the evaluation trace of an engine for a posted response set."""
+    if not (request.user.is_active and request.user.is_staff):
+        return JsonResponse({"status": "error", "message": "Staff only"}, status=403)
+    try:
+        data = json.loads(request.body)
+        engine_name = data.get("engine", "routing")
+        responses = {str(key): value for key, value in (data.get("responses") or {}).items()}
+        used_rule_ids = [int(rule_id) for rule_id in data.get("used_rule_ids") or []]
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({"status": "error", "message": "Invalid explain request"}, status=400)
+
+    if engine_name == "routing":
+        trace = RoutingEngine().explain(responses, used_rule_ids=used_rule_ids)
+    elif engine_name == "survey_routing":
+        version = get_object_or_404(SurveyVersion, pk=data.get("survey_version_id"))
+        trace = SurveyRoutingEngine(version).explain(responses, used_rule_ids=used_rule_ids)
+    elif engine_name == "classification":
+        question = get_object_or_404(AssessmentQuestion, pk=data.get("question_id"))
+        trace = ClassificationEngine().explain(question, responses)
+    else:
+        return JsonResponse({"status": "error", "message": "Unknown engine"}, status=400)
+    return JsonResponse(trace)
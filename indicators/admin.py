@@ -19,6 +19,7 @@ class IndicatorAdmin(admin.ModelAdmin):
 @admin.register(IndicatorTracking)
 class IndicatorTrackingAdmin(admin.ModelAdmin):
     list_display = ("indicator_list_item", "status")
+    list_select_related = ("indicator_list_item__indicator",)
     list_filter = ("status",)
     search_fields = ("indicator_list_item__name",)
     autocomplete_fields = ("indicator_list_item",)
@@ -27,6 +28,7 @@ class IndicatorTrackingAdmin(admin.ModelAdmin):
 @admin.register(IndicatorListItem)
 class IndicatorListItemAdmin(admin.ModelAdmin):
     list_display = ("name", "indicator", "code")
+    list_select_related = ("indicator",)
     search_fields = ("name", "indicator__name_ar", "indicator__name_en", "code")
     autocomplete_fields = ("indicator",)
     readonly_fields = ("indicator", "name")
@@ -0,0 +1,45 @@
+from django.contrib import admin, messages
+from django.utils.translation import gettext_lazy as _
+
+from . import queue
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "progress_display", "attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "progress_message")
+    list_select_related = ("created_by",)
+    date_hierarchy = "created_at"
+    actions = ["cancel_jobs", "retry_jobs"]
+    readonly_fields = [field.name for field in Job._meta.fields]
+
+    def has_add_permission(self, request):
+        # Jobs are queued from the admin actions of the features that run them
+        # (assessment runs and the question bank).
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_manage_permission(self, request):
+        # Cancelling and retrying are the only changes made from the admin.
+        return request.user.has_perm("jobs.change_job")
+
+    def progress_display(self, obj):
+        if obj.progress_total:
+            return f"{obj.progress}/{obj.progress_total} ({obj.progress_percent}%)"
+        return str(obj.progress) if obj.progress else "-"
+
+    progress_display.short_description = _("التقدم")
+
+    @admin.action(description=_("إلغاء المهام المحددة"), permissions=["manage"])
+    def cancel_jobs(self, request, queryset):
+        cancelled = sum(queue.cancel(job) for job in queryset)
+        self.message_user(request, _("طُلب إلغاء %(count)d مهمة.") % {"count": cancelled}, messages.SUCCESS)
+
+    @admin.action(description=_("إعادة تشغيل المهام المحددة"), permissions=["manage"])
+    def retry_jobs(self, request, queryset):
+        retried = sum(queue.retry(job) for job in queryset)
+        self.message_user(request, _("أُعيدت %(count)d مهمة إلى قائمة الانتظار.") % {"count": retried}, messages.SUCCESS)
@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs import queue
+from jobs.worker import Worker, run_processes
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs with a pool of threads, or of processes each with its own threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help='Jobs run at once per process.')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes; use more than one for CPU-bound job types.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when no job is due.')
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Only run this job type (repeatable).')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['processes'] < 1:
+            raise CommandError('--threads and --processes must be at least 1.')
+        for name in options['tasks'] or []:
+            try:
+                queue.get_task(name)
+            except queue.UnknownTask as exc:
+                raise CommandError(str(exc)) from exc
+
+        if options['processes'] > 1:
+            run_processes(options['processes'], threads=options['threads'], poll_interval=options['poll_interval'],
+                          tasks=options['tasks'], once=options['once'])
+            return
+
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'], tasks=options['tasks'])
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        processed = worker.run(once=options['once'])
+        self.stderr.write(self.style.SUCCESS(f'Ran {processed} jobs.'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='النوع')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='المعطيات')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('succeeded', 'نجحت'), ('failed', 'فشلت'), ('cancelled', 'أُلغيت')], default='queued', max_length=20, verbose_name='الحالة')),
+                ('priority', models.IntegerField(default=0, verbose_name='الأولوية')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='التشغيل بعد')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='المحاولات')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='أقصى عدد للمحاولات')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='المنجز')),
+                ('progress_total', models.PositiveIntegerField(blank=True, null=True, verbose_name='الإجمالي')),
+                ('progress_message', models.CharField(blank=True, max_length=255, verbose_name='رسالة التقدم')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='النتيجة')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='طُلب الإلغاء')),
+                ('worker', models.CharField(blank=True, max_length=255, verbose_name='العامل')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='أُنشئت في')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدأت في')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر نبضة')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهت في')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='بواسطة')),
+            ],
+            options={
+                'verbose_name': 'مهمة',
+                'verbose_name_plural': 'المهام',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after', 'priority'], name='jobs_job_claim_idx')],
+            },
+        ),
+    ]
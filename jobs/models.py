@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by the ``run_jobs`` worker."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("في الانتظار")
+        RUNNING = "running", _("قيد التنفيذ")
+        SUCCEEDED = "succeeded", _("نجحت")
+        FAILED = "failed", _("فشلت")
+        CANCELLED = "cancelled", _("أُلغيت")
+
+    class Meta:
+        verbose_name = _("مهمة")
+        verbose_name_plural = _("المهام")
+        ordering = ["-created_at"]
+        indexes = [
+            # The worker's claim query: queued jobs that are due, by priority.
+            models.Index(fields=["status", "run_after", "priority"], name="jobs_job_claim_idx"),
+        ]
+
+    task = models.CharField(max_length=100, verbose_name=_("النوع"))
+    payload = models.JSONField(default=dict, blank=True, verbose_name=_("المعطيات"))
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED,
+                              verbose_name=_("الحالة"))
+    priority = models.IntegerField(default=0, verbose_name=_("الأولوية"))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_("التشغيل بعد"))
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("المحاولات"))
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name=_("أقصى عدد للمحاولات"))
+    progress = models.PositiveIntegerField(default=0, verbose_name=_("المنجز"))
+    progress_total = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("الإجمالي"))
+    progress_message = models.CharField(max_length=255, blank=True, verbose_name=_("رسالة التقدم"))
+    result = models.JSONField(null=True, blank=True, verbose_name=_("النتيجة"))
+    last_error = models.TextField(blank=True, verbose_name=_("آخر خطأ"))
+    cancel_requested = models.BooleanField(default=False, verbose_name=_("طُلب الإلغاء"))
+    worker = models.CharField(max_length=255, blank=True, verbose_name=_("العامل"))
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs",
+                                   verbose_name=_("بواسطة"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("أُنشئت في"))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_("بدأت في"))
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name=_("آخر نبضة"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("انتهت في"))
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED, self.Status.CANCELLED)
+
+    @property
+    def progress_percent(self):
+        if not self.progress_total:
+            return None
+        return min(100, round(100 * self.progress / self.progress_total))
@@ -0,0 +1,239 @@
+"""
+A job queue stored in the database.
+
+Apps register job types with ``@task("name")`` in their ``tasks`` module
+(discovered by ``JobsConfig.ready``) and call ``enqueue`` from views or
+commands instead of doing heavy work on the request thread. The
+``run_jobs`` worker claims due jobs, runs them and records the outcome; no
+broker is needed.
+
+Claiming locks the candidate rows with ``select_for_update(skip_locked=True)``
+where the database supports it, so concurrent workers pass over each other's
+rows instead of queueing behind them. Each job then moves from ``queued`` to
+``running`` with a compare-and-set update, which keeps claims exclusive on
+SQLite too (no row locks there; its writers are serialized instead).
+
+A task receives a ``JobContext`` and the job's payload as keyword
+arguments. ``context.progress()`` records progress and a heartbeat, and
+raises ``JobCancelled`` once cancellation was requested; long loops should
+call it between batches so a running job can be cancelled. The worker also
+sends a heartbeat for each running job every ``JOBS_HEARTBEAT_INTERVAL``
+seconds. A task that raises is retried with exponential backoff until
+``max_attempts``; running jobs whose heartbeat is older than
+``JOBS_STALE_AFTER`` seconds (a worker that died) are put back in the queue
+the same way.
+
+Every write about a running job is scoped to its claim (the worker and the
+attempt that claimed it), so a run that was given up on as stale and
+claimed again cannot overwrite the newer run's outcome.
+"""
+from __future__ import annotations
+
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+class JobError(Exception):
+    pass
+
+
+class UnknownTask(JobError):
+    pass
+
+
+class JobCancelled(JobError):
+    pass
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: Callable[..., Any]
+    max_attempts: Optional[int] = None
+
+
+_TASKS: Dict[str, Task] = {}
+
+
+def task(name: str, max_attempts: Optional[int] = None):
+    """Register ``func(context, **payload)`` as the job type ``name``."""
+
+    def decorator(func):
+        _TASKS[name] = Task(name, func, max_attempts)
+        return func
+
+    return decorator
+
+
+def registered_tasks() -> Dict[str, Task]:
+    return dict(_TASKS)
+
+
+def get_task(name: str) -> Task:
+    try:
+        return _TASKS[name]
+    except KeyError:
+        raise UnknownTask(f"No job type is registered as {name!r}") from None
+
+
+def _max_attempts(task_: Task, max_attempts: Optional[int]) -> int:
+    if max_attempts is not None:
+        return max_attempts
+    if task_.max_attempts is not None:
+        return task_.max_attempts
+    return getattr(settings, "JOBS_MAX_ATTEMPTS", 3)
+
+
+def enqueue(name: str, payload: Optional[dict] = None, *, priority: int = 0, delay: float = 0,
+            max_attempts: Optional[int] = None, user=None) -> Job:
+    """Queue a job of type ``name``; higher ``priority`` runs first."""
+    task_ = get_task(name)
+    return Job.objects.create(
+        task=name,
+        payload=payload or {},
+        priority=priority,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=_max_attempts(task_, max_attempts),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retrying a job that has failed ``attempts`` times."""
+    base = getattr(settings, "JOBS_RETRY_BACKOFF", 30)
+    cap = getattr(settings, "JOBS_RETRY_BACKOFF_MAX", 60 * 60)
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+
+def _claimed_by(job_id: int, worker: str, attempts: int):
+    """The job while it is still running under the claim of ``worker``'s attempt ``attempts``."""
+    return Job.objects.filter(pk=job_id, status=Job.Status.RUNNING, worker=worker, attempts=attempts)
+
+
+def _claim_of(job: Job):
+    return _claimed_by(job.pk, job.worker, job.attempts)
+
+
+def _fail_or_retry(claimed, attempts: int, max_attempts: int, error: str) -> int:
+    now = timezone.now()
+    if attempts < max_attempts:
+        return claimed.update(
+            status=Job.Status.QUEUED, run_after=now + timedelta(seconds=retry_delay(attempts)),
+            last_error=error, worker="", heartbeat_at=None,
+        )
+    return claimed.update(
+        status=Job.Status.FAILED, last_error=error, finished_at=now, heartbeat_at=None,
+    )
+
+
+def requeue_stale(stale_after: Optional[float] = None) -> int:
+    """Retry or fail running jobs whose worker stopped sending heartbeats."""
+    if stale_after is None:
+        stale_after = getattr(settings, "JOBS_STALE_AFTER", 10 * 60)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status=Job.Status.RUNNING, heartbeat_at__lt=cutoff)
+    count = 0
+    for job_id, attempts, max_attempts, worker in stale.values_list("id", "attempts", "max_attempts", "worker"):
+        # A heartbeat that arrived since the query keeps the job.
+        claimed = _claimed_by(job_id, worker, attempts).filter(heartbeat_at__lt=cutoff)
+        count += _fail_or_retry(claimed, attempts, max_attempts, f"Worker {worker or '?'} stopped responding.")
+    return count
+
+
+def claim(worker: str, limit: int = 1, tasks: Optional[Iterable[str]] = None) -> List[Job]:
+    """Mark up to ``limit`` due jobs as running on ``worker`` and return them."""
+    now = timezone.now()
+    queued = Job.objects.filter(status=Job.Status.QUEUED, run_after__lte=now, cancel_requested=False)
+    if tasks:
+        queued = queued.filter(task__in=list(tasks))
+    queued = queued.order_by("-priority", "run_after", "id")
+    features = connections[router.db_for_write(Job)].features
+
+    claimed = []
+    with transaction.atomic():
+        if features.has_select_for_update:
+            queued = queued.select_for_update(skip_locked=features.has_select_for_update_skip_locked)
+        for job_id in list(queued.values_list("id", flat=True)[:limit]):
+            updated = Job.objects.filter(pk=job_id, status=Job.Status.QUEUED).update(
+                status=Job.Status.RUNNING, worker=worker, attempts=F("attempts") + 1,
+                started_at=now, heartbeat_at=now,
+            )
+            if updated:
+                claimed.append(job_id)
+    return list(Job.objects.filter(pk__in=claimed).order_by("-priority", "run_after", "id"))
+
+
+class JobContext:
+    """Handed to a running task for progress reporting and cancellation checks."""
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def progress(self, done: int, total: Optional[int] = None, message: str = "") -> None:
+        """Record progress and a heartbeat; raises ``JobCancelled`` if cancellation was requested."""
+        fields = {"progress": done, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["progress_total"] = total
+        if message:
+            fields["progress_message"] = message[:255]
+        _claim_of(self.job).update(**fields)
+        self.check_cancelled()
+
+    def check_cancelled(self) -> None:
+        """Raise ``JobCancelled`` if cancellation was requested or the job is no longer this run's."""
+        if not _claim_of(self.job).filter(cancel_requested=False).exists():
+            raise JobCancelled(f"Job {self.job.pk} was cancelled")
+
+
+def heartbeat(job: Job) -> bool:
+    """Refresh a running job's heartbeat; ``False`` once the job is no longer this run's."""
+    return bool(_claim_of(job).update(heartbeat_at=timezone.now()))
+
+
+def heartbeat_interval() -> float:
+    return getattr(settings, "JOBS_HEARTBEAT_INTERVAL", 60)
+
+
+def run(job: Job) -> Job:
+    """Run a claimed job and record its outcome."""
+    context = JobContext(job)
+    claimed = _claim_of(job)
+    try:
+        context.check_cancelled()
+        result = get_task(job.task).func(context, **job.payload)
+    except JobCancelled:
+        claimed.update(status=Job.Status.CANCELLED, finished_at=timezone.now(), heartbeat_at=None)
+    except Exception:
+        _fail_or_retry(claimed, job.attempts, job.max_attempts, traceback.format_exc())
+    else:
+        claimed.update(
+            status=Job.Status.SUCCEEDED, result=result, finished_at=timezone.now(), heartbeat_at=None,
+            last_error="",
+        )
+    job.refresh_from_db()
+    return job
+
+
+def cancel(job: Job) -> bool:
+    """Cancel a queued job now, or ask its task to stop at its next progress report."""
+    if Job.objects.filter(pk=job.pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.CANCELLED, cancel_requested=True, finished_at=timezone.now()):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(cancel_requested=True))
+
+
+def retry(job: Job) -> bool:
+    """Queue a failed or cancelled job again with a fresh set of attempts."""
+    return bool(Job.objects.filter(pk=job.pk, status__in=[Job.Status.FAILED, Job.Status.CANCELLED]).update(
+        status=Job.Status.QUEUED, attempts=0, cancel_requested=False, run_after=timezone.now(),
+        finished_at=None, worker="", progress=0, progress_message="",
+    ))
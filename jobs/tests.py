@@ -0,0 +1,192 @@
+import io
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import queue, worker
+from .models import Job
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task("test.add")
+def add(context, a, b):
+    context.progress(1, total=2, message="adding")
+    calls.append((a, b))
+    return {"sum": a + b}
+
+
+@queue.task("test.flaky", max_attempts=2)
+def flaky(context):
+    raise RuntimeError("boom")
+
+
+@queue.task("test.cancel_midway")
+def cancel_midway(context):
+    Job.objects.filter(pk=context.job.pk).update(cancel_requested=True)
+    context.progress(1)
+    calls.append("not reached")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_claim_and_run(self):
+        job = queue.enqueue("test.add", {"a": 2, "b": 3})
+        self.assertEqual((job.status, job.max_attempts), (Job.Status.QUEUED, 3))
+
+        claimed = queue.claim("worker-1")
+        self.assertEqual([claimed_job.pk for claimed_job in claimed], [job.pk])
+        self.assertEqual((claimed[0].status, claimed[0].attempts, claimed[0].worker), (Job.Status.RUNNING, 1, "worker-1"))
+        self.assertEqual(queue.claim("worker-2"), [])
+
+        job = queue.run(claimed[0])
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {"sum": 5})
+        self.assertEqual((job.progress, job.progress_total, job.progress_message), (1, 2, "adding"))
+        self.assertEqual(job.progress_percent, 50)
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(queue.UnknownTask):
+            queue.enqueue("test.missing")
+
+    def test_claim_order_and_filters(self):
+        low = queue.enqueue("test.add", {"a": 1, "b": 1})
+        high = queue.enqueue("test.add", {"a": 1, "b": 1}, priority=5)
+        queue.enqueue("test.add", {"a": 1, "b": 1}, delay=60)
+        queue.enqueue("test.flaky")
+
+        claimed = queue.claim("worker", limit=10, tasks=["test.add"])
+        self.assertEqual([job.pk for job in claimed], [high.pk, low.pk])
+
+    @override_settings(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=15)
+    def test_failures_retry_with_backoff_then_fail(self):
+        self.assertEqual([queue.retry_delay(attempt) for attempt in (1, 2, 3)], [10, 15, 15])
+        job = queue.enqueue("test.flaky")
+        self.assertEqual(job.max_attempts, 2)
+
+        job = queue.run(queue.claim("worker")[0])
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn("RuntimeError: boom", job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(queue.claim("worker"), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = queue.run(queue.claim("worker")[0])
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+        self.assertTrue(queue.retry(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 0))
+
+    def test_cancel_queued_and_running_jobs(self):
+        queued = queue.enqueue("test.add", {"a": 1, "b": 2})
+        self.assertTrue(queue.cancel(queued))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.Status.CANCELLED)
+        self.assertEqual(queue.claim("worker"), [])
+
+        queue.enqueue("test.cancel_midway")
+        running = queue.run(queue.claim("worker")[0])
+        self.assertEqual(running.status, Job.Status.CANCELLED)
+        self.assertEqual(calls, [])
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = queue.enqueue("test.add", {"a": 1, "b": 2})
+        queue.claim("dead-worker")
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.requeue_stale(stale_after=60), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn("dead-worker", job.last_error)
+
+    def test_a_run_given_up_as_stale_cannot_overwrite_the_next_claim(self):
+        job = queue.enqueue("test.add", {"a": 1, "b": 2})
+        first = queue.claim("slow-worker")[0]
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.requeue_stale(stale_after=60), 1)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        second = queue.claim("worker")[0]
+        self.assertFalse(queue.heartbeat(first))
+        self.assertTrue(queue.heartbeat(second))
+
+        stale_run = queue.run(first)
+        self.assertEqual((stale_run.status, stale_run.worker, stale_run.attempts), (Job.Status.RUNNING, "worker", 2))
+        self.assertEqual(calls, [])
+        self.assertEqual(queue.run(second).status, Job.Status.SUCCEEDED)
+
+    def test_claim_skips_locked_rows_where_supported(self):
+        queue.enqueue("test.add", {"a": 1, "b": 2})
+        with mock.patch.object(connection.features, "has_select_for_update", True), \
+                mock.patch.object(connection.features, "has_select_for_update_skip_locked", True), \
+                mock.patch.object(QuerySet, "select_for_update", autospec=True,
+                                  side_effect=lambda queryset, **kwargs: queryset) as select_for_update:
+            self.assertEqual(len(queue.claim("worker")), 1)
+        self.assertEqual(select_for_update.call_args.kwargs, {"skip_locked": True})
+
+class WorkerHeartbeatTests(SimpleTestCase):
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.01)
+    def test_heartbeats_are_sent_while_a_job_runs(self):
+        job = Job(pk=1, task="test.add", status=Job.Status.SUCCEEDED)
+
+        def slow_run(claimed):
+            time.sleep(0.2)
+            return claimed
+
+        with mock.patch.object(queue, "run", side_effect=slow_run), \
+                mock.patch.object(queue, "heartbeat", return_value=True) as heartbeat:
+            worker._run_in_thread(job)
+            beats = heartbeat.call_count
+            time.sleep(0.05)
+        self.assertGreater(beats, 2)
+        self.assertEqual(heartbeat.call_count, beats)
+
+
+class JobAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(self.admin)
+
+    def test_changelist_shows_progress_and_cancels(self):
+        job = queue.enqueue("test.add", {"a": 1, "b": 2})
+        Job.objects.filter(pk=job.pk).update(progress=3, progress_total=4)
+        url = reverse("admin:jobs_job_changelist")
+        response = self.client.get(url)
+        self.assertContains(response, "3/4 (75%)")
+
+        response = self.client.post(url, {"action": "cancel_jobs", "_selected_action": [job.pk]}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.CANCELLED)
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_drains_the_queue(self):
+        jobs = [queue.enqueue("test.add", {"a": index, "b": 1}) for index in range(5)]
+        # One thread: the in-memory test database locks whole tables and has no busy timeout.
+        call_command("run_jobs", "--threads", "1", "--once", "--poll-interval", "0.01", stderr=io.StringIO())
+        self.assertEqual(sorted(calls), [(index, 1) for index in range(5)])
+        self.assertEqual(
+            set(Job.objects.filter(pk__in=[job.pk for job in jobs]).values_list("status", flat=True)),
+            {Job.Status.SUCCEEDED},
+        )
+
+    def test_rejects_unknown_task_filter(self):
+        with self.assertRaises(CommandError):
+            call_command("run_jobs", "--task", "test.missing", "--once")
@@ -0,0 +1,113 @@
+"""
+The ``run_jobs`` worker loop.
+
+One loop claims due jobs and hands them to a thread pool, claiming only as
+many as it has idle threads. While a job runs, a heartbeat thread refreshes
+its heartbeat every ``JOBS_HEARTBEAT_INTERVAL`` seconds, so a long task that
+reports progress rarely is not taken for abandoned and run a second time.
+``run_processes`` starts that loop in several processes for CPU-bound job
+types; each process has its own threads and database connections.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+from django.db import close_old_connections, connections
+
+from . import queue
+
+log = logging.getLogger("jobs.worker")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _send_heartbeats(job, stop: threading.Event, interval: float) -> None:
+    try:
+        while not stop.wait(interval):
+            if not queue.heartbeat(job):
+                return
+    except Exception:
+        log.exception("Heartbeat of job %s failed", job.pk)
+    finally:
+        connections.close_all()
+
+
+def _run_in_thread(job) -> None:
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_send_heartbeats, args=(job, stop, queue.heartbeat_interval()),
+                                 name=f"job-{job.pk}-heartbeat", daemon=True)
+    heartbeat.start()
+    try:
+        job = queue.run(job)
+        log.info("Job %s (%s) finished as %s", job.pk, job.task, job.status)
+    finally:
+        stop.set()
+        heartbeat.join()
+        connections.close_all()
+
+
+class Worker:
+    def __init__(self, threads: int = 1, poll_interval: float = 1.0, tasks: Optional[Sequence[str]] = None,
+                 name: Optional[str] = None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.tasks = tasks
+        self.name = name or worker_name()
+        self.stop_event = threading.Event()
+
+    def run(self, once: bool = False) -> int:
+        """Process jobs until stopped, or with ``once`` until the queue is drained; returns the jobs run."""
+        processed = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job") as pool:
+            while not self.stop_event.is_set():
+                running = {future for future in running if not future.done()}
+                close_old_connections()
+                queue.requeue_stale()
+                idle = self.threads - len(running)
+                jobs = queue.claim(self.name, limit=idle, tasks=self.tasks) if idle else []
+                for job in jobs:
+                    running.add(pool.submit(_run_in_thread, job))
+                processed += len(jobs)
+                if once and not jobs and not running:
+                    break
+                if not jobs:
+                    self.stop_event.wait(self.poll_interval)
+        return processed
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+
+def _process_main(threads: int, poll_interval: float, tasks: Optional[Sequence[str]], once: bool) -> None:
+    import django
+
+    django.setup()
+    Worker(threads=threads, poll_interval=poll_interval, tasks=tasks).run(once=once)
+
+
+def run_processes(processes: int, threads: int = 1, poll_interval: float = 1.0,
+                  tasks: Optional[Sequence[str]] = None, once: bool = False) -> None:
+    # Child processes must not inherit the parent's open connections.
+    connections.close_all()
+    children = [
+        multiprocessing.Process(target=_process_main, args=(threads, poll_interval, tasks, once), daemon=False)
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        raise
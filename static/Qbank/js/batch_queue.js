@@ -0,0 +1,105 @@
+/**
+ * Client-side queue that collects per-question edits and sends them to a
+ * batch endpoint in groups, instead of one request per question.
+ *
+ * Edits are keyed by question id, so editing the same question twice before a
+ * flush only sends the latest value. The queue flushes automatically once it
+ * holds `batchSize` edits or has been idle for `flushDelay` milliseconds.
+ */
+(() => {
+    function getCookie(name) {
+        let cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            const cookies = document.cookie.split(';');
+            for (let i = 0; i < cookies.length; i++) {
+                const cookie = cookies[i].trim();
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+
+    class BatchQueue {
+        constructor({ url, buildPayload, onResults, onChange, batchSize = 100, flushDelay = 3000 }) {
+            this.url = url;
+            this.buildPayload = buildPayload;
+            this.onResults = onResults || (() => {});
+            this.onChange = onChange || (() => {});
+            this.batchSize = batchSize;
+            this.flushDelay = flushDelay;
+            this.pending = new Map();
+            this.timer = null;
+            this.inFlight = Promise.resolve();
+        }
+
+        get size() {
+            return this.pending.size;
+        }
+
+        enqueue(id, value) {
+            this.pending.set(String(id), value);
+            this.onChange(this.size);
+            clearTimeout(this.timer);
+            if (this.size >= this.batchSize) {
+                this.flush();
+            } else {
+                this.timer = setTimeout(() => this.flush(), this.flushDelay);
+            }
+        }
+
+        flush() {
+            clearTimeout(this.timer);
+            if (!this.size) return this.inFlight;
+            const entries = Array.from(this.pending.entries());
+            this.pending.clear();
+            this.onChange(this.size);
+
+            const batches = [];
+            for (let i = 0; i < entries.length; i += this.batchSize) {
+                batches.push(entries.slice(i, i + this.batchSize));
+            }
+            // Batches are sent one after another so edits to the same question keep their order.
+            this.inFlight = batches.reduce((chain, batch) => chain.then(() => this.send(batch)), this.inFlight);
+            return this.inFlight;
+        }
+
+        send(batch) {
+            return fetch(this.url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify(this.buildPayload(batch))
+            })
+            .then((response) => response.json().then((data) => ({ response, data })))
+            .then(({ response, data }) => {
+                if (data.status === 'success') {
+                    this.onResults(data.results);
+                    return;
+                }
+                const error = new Error(data.message || 'Batch rejected');
+                // A 4xx means the batch itself is invalid; retrying it would fail again.
+                error.retry = response.status >= 500;
+                throw error;
+            })
+            .catch((error) => {
+                console.error('Batch failed:', error);
+                if (error.retry !== false) {
+                    // Put the edits back unless newer ones were queued meanwhile, and retry later.
+                    batch.forEach(([id, value]) => {
+                        if (!this.pending.has(id)) this.pending.set(id, value);
+                    });
+                    this.onChange(this.size);
+                    this.timer = setTimeout(() => this.flush(), this.flushDelay * 5);
+                }
+                this.onResults(batch.map(([id]) => ({ id: Number(id), status: 'error', message: error.message })));
+            });
+        }
+    }
+
+    window.BatchQueue = BatchQueue;
+})();
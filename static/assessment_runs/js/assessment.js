@@ -4,7 +4,8 @@ document.addEventListener('DOMContentLoaded', function () {
     const assessmentLocaleEl = document.getElementById('assessment-locale');
     const assessmentLocale = assessmentLocaleEl ? JSON.parse(assessmentLocaleEl.textContent) : {
         completedTitle: "Assessment Completed",
-        submitButton: "Submit"
+        submitButton: "Submit",
+        conflictMessage: "This assessment was changed by someone else. Reload to continue from the latest version."
     };
     let multiSelectStore = {};
 
@@ -176,8 +177,19 @@ document.addEventListener('DOMContentLoaded', function () {
             headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCookie('csrftoken') },
             body: JSON.stringify({ question_id: questionId, option_ids: optionIds }),
         })
-        .then(response => response.status === 204 ? null : response.text())
+        .then(response => {
+            if (response.status === 409) {
+                // Someone else saved this assessment meanwhile and the edits could not be merged.
+                return response.json().then(conflict => {
+                    alert(conflict.message || assessmentLocale.conflictMessage);
+                    window.location.href = conflict.reload_url || window.location.href;
+                    return undefined;
+                });
+            }
+            return response.status === 204 ? null : response.text();
+        })
         .then(html => {
+            if (html === undefined) return;
             if (html) {
                 const newQuestionContainer = document.createElement('div');
                 newQuestionContainer.innerHTML = html;
@@ -8,6 +8,8 @@
     const builderLocaleEl = document.getElementById('builder-locale');
     const builderLocale = builderLocaleEl ? JSON.parse(builderLocaleEl.textContent) : {};
     const untitledLabel = builderLocale.untitled || 'Untitled survey';
+    const similarFoundLabel = builderLocale.similar_found || 'A similar question exists in the question bank:';
+    const useSimilarLabel = builderLocale.use_similar || 'Use it instead of the manual question?';
 
     // Modal elements
     const confirmationModal = document.getElementById('confirmation-modal');
@@ -72,7 +74,7 @@
     window.addEventListener('beforeunload', saveState);
     // --- End State Persistence ---
 
-    function initializeTomSelect(el) {
+    function initializeTomSelect(el, extraOptions = {}) {
         if (typeof TomSelect === 'undefined') {
             if (el) {
                 el.dataset.tomselectFallback = 'true';
@@ -85,11 +87,46 @@
                 sortField: {
                     field: "text",
                     direction: "asc"
-                }
+                },
+                ...extraOptions
             });
         }
     }
 
+    // Only the first page of the bank is embedded; everything else comes from the search API.
+    function bankSearchOptions() {
+        const searchUrl = bankQuestionSelect?.dataset.searchUrl;
+        if (!searchUrl) return {};
+        return {
+            // Results are already ranked server-side; keep that order.
+            sortField: [{ field: '$score' }],
+            // The server matches on normalized Arabic, so trust its hits for the query that produced them.
+            score(search) {
+                const base = this.getScoreFunction(search);
+                return (item) => (item.query === search ? 1 : base(item));
+            },
+            shouldLoad: (query) => query.trim().length >= 2,
+            load: (query, callback) => {
+                const params = new URLSearchParams({ q: query, source: 'bank', limit: '30' });
+                fetch(`${searchUrl}?${params}`, { headers: { 'Accept': 'application/json' } })
+                    .then((response) => (response.ok ? response.json() : { results: [] }))
+                    .then((data) => {
+                        const queued = new Set(state.initialQueue.map((q) => q.id));
+                        const options = [];
+                        (data.results || []).forEach((hit) => {
+                            const id = String(hit.id);
+                            ensureToken({ id, label_ar: hit.label_ar, label_en: hit.label_en, label: hit.label_ar || hit.label_en, source: 'bank' });
+                            if (!queued.has(id)) {
+                                options.push({ value: id, text: getQuestionLabel(id), query });
+                            }
+                        });
+                        callback(options);
+                    })
+                    .catch(() => callback());
+            },
+        };
+    }
+
     function getQuestionLabel(questionId) {
         const token = paletteLookup.get(String(questionId));
         if (!token) return untitledLabel;
@@ -257,14 +294,35 @@
             e.preventDefault(); // Prevent form submission if inside a form
             const text = manualQuestionInput.value.trim();
             if (!text) return;
-            const token = { id: createManualId(), label: text, source: 'manual' };
-            ensureToken(token);
-            state.initialQueue.push(token);
-            renderInitialList();
-            manualQuestionInput.value = '';
+            findSimilarBankQuestion(text).then((match) => {
+                if (match && !state.initialQueue.some((q) => q.id === String(match.id))
+                    && window.confirm(`${similarFoundLabel}\n${match.label_ar || match.label_en}\n${useSimilarLabel}`)) {
+                    const id = String(match.id);
+                    ensureToken({ id, label_ar: match.label_ar, label_en: match.label_en, label: match.label_ar || match.label_en, source: 'bank' });
+                    state.initialQueue.push({ id, label: getQuestionLabel(id), source: 'bank' });
+                    filterAvailableQuestions();
+                } else {
+                    const token = { id: createManualId(), label: text, source: 'manual' };
+                    ensureToken(token);
+                    state.initialQueue.push(token);
+                }
+                renderInitialList();
+                manualQuestionInput.value = '';
+            });
         }
     });
 
+    // Near-duplicate check against the bank before a manual question is staged.
+    function findSimilarBankQuestion(text) {
+        const similarUrl = manualQuestionInput?.dataset.similarUrl;
+        if (!similarUrl) return Promise.resolve(null);
+        const params = new URLSearchParams({ text });
+        return fetch(`${similarUrl}?${params}`, { headers: { 'Accept': 'application/json' } })
+            .then((response) => (response.ok ? response.json() : { results: [] }))
+            .then((data) => (data.results || [])[0] || null)
+            .catch(() => null);
+    }
+
     // Modal Logic
     function showModal(modal) {
         modal.classList.add('active');
@@ -361,7 +419,7 @@
     // --- Initial Load ---
     restoreState();
     initializeTomSelect(surveyVersionSelect);
-    initializeTomSelect(bankQuestionSelect);
+    initializeTomSelect(bankQuestionSelect, bankSearchOptions());
     renderInitialList();
     filterAvailableQuestions(); // Ensure restored questions are removed from dropdown
     updateInputState();
@@ -1,12 +1,24 @@
 from django.contrib import admin
 from django.db import models
+from django.db.models import Max
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from QuestionsBank.admin_inlines import PaginatedInlineMixin
+
 from .models import Survey, SurveyVersion, SurveyQuestion, SurveyRoutingRule
 
 
+class SurveyVersionListFilter(admin.RelatedFieldListFilter):
+    """Filter by survey version; each option's label names its survey, so load the surveys with it."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        versions = SurveyVersion.objects.select_related("survey").order_by(*ordering)
+        return [(version.pk, str(version)) for version in versions]
+
+
 class SurveyVersionInline(admin.TabularInline):
     model = SurveyVersion
     verbose_name = _("إصدار الاستبيان")
@@ -39,13 +51,16 @@ class SurveyAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at", "updated_at")
     inlines = [SurveyVersionInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_last_version_created_at=Max("versions__created_at"))
+
     def last_version_created_at(self, obj):
-        last_version = obj.versions.order_by('-created_at').first()
-        return last_version.created_at if last_version else None
+        return obj._last_version_created_at
     last_version_created_at.short_description = _("تاريخ إنشاء آخر إصدار")
+    last_version_created_at.admin_order_field = "_last_version_created_at"
 
 
-class SurveyQuestionInline(admin.TabularInline):
+class SurveyQuestionInline(PaginatedInlineMixin, admin.TabularInline):
     model = SurveyQuestion
     extra = 0
     show_change_link = True
@@ -83,6 +98,7 @@ class SurveyVersionAdmin(admin.ModelAdmin):
         "lang_review_status",
         "translation_status"
     )
+    list_select_related = ("survey",)
     inlines = [SurveyQuestionInline]
 
     def has_add_permission(self, request):
@@ -140,6 +156,9 @@ class SurveyVersionAdmin(admin.ModelAdmin):
 class SurveyQuestionAdmin(admin.ModelAdmin):
     search_fields = ("text_ar", "text_en", "code")
     list_display = ("short_text", "survey_version", "code")
+    list_select_related = ("survey_version__survey",)
+    # Counting every question again for the "show all" link doubles the changelist's slowest query.
+    show_full_result_count = False
     autocomplete_fields = ("survey_version",)
 
     def has_add_permission(self, request):
@@ -161,5 +180,6 @@ class SurveyRoutingRuleAdmin(admin.ModelAdmin):
         "to_question__text_en",
         "to_question__code",
     )
-    list_filter = ("to_question__survey_version",)
+    list_filter = (("to_question__survey_version", SurveyVersionListFilter),)
+    list_select_related = ("to_question",)
     autocomplete_fields = ("to_question",)
@@ -4,4 +4,7 @@ from django.utils.translation import gettext_lazy as _
 class SurveysConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "surveys"
-    verbose_name = _("الاستبيانات")
\ No newline at end of file
+    verbose_name = _("الاستبيانات")
+
+    def ready(self):
+        import surveys.signals
@@ -23,6 +23,8 @@ class SurveyRoutingEngine(AssessmentRoutingEngine):
     against SurveyRoutingRule objects scoped to a SurveyVersion.
     """
 
+    engine_name = "survey_routing"
+
     def __init__(
         self,
         survey_version: SurveyVersion,
@@ -0,0 +1,86 @@
+"""
+Cached reference data for the survey builders.
+
+Response types, response groups and matrix item groups change rarely but
+were rebuilt from full-table queries on every builder page load. They are now
+serialized once per language and kept in the ``reference_data`` namespace of
+the tiered cache (``QuestionsBank.tiered_cache``). Saving or deleting any of
+the source models bumps the namespace's version stamp (see
+``surveys.signals``), which makes every cached language stale at once.
+
+Each cached payload carries a digest of its JSON so the reference-data
+endpoint can answer conditional requests with ``304 Not Modified``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Optional
+
+from django.conf import settings
+from django.utils.translation import get_language
+
+from Qbank.models import MatrixItemGroup
+from QuestionsBank.tiered_cache import TieredCache
+from Rbank.models import ResponseGroup, ResponseType
+
+
+def _timeout() -> int:
+    return getattr(settings, "REFERENCE_DATA_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+CACHE = TieredCache("reference_data", timeout=_timeout)
+
+
+def _language(language: Optional[str]) -> str:
+    return (language or get_language() or "ar")[:2]
+
+
+def current_version() -> int:
+    return CACHE.version()
+
+
+def invalidate() -> None:
+    """Make every cached language stale."""
+    CACHE.invalidate()
+
+
+def build_payload(language: str) -> dict:
+    """Serialize the reference lists for ``language`` straight from the database."""
+    name_field = "name_ar" if language == "ar" else "name_en"
+    return {
+        "response_types": [
+            {"value": pk, "label": label}
+            for pk, label in ResponseType.objects.order_by("id").values_list("id", name_field)
+        ],
+        "response_groups": [
+            {"value": pk, "label": name}
+            for pk, name in ResponseGroup.objects.order_by("id").values_list("id", "name")
+        ],
+        "matrix_item_groups": [
+            {"value": pk, "label": name}
+            for pk, name in MatrixItemGroup.objects.order_by("id").values_list("id", "name")
+        ],
+    }
+
+
+def get_cached(language: Optional[str] = None) -> dict:
+    """Return ``{"version", "etag", "data"}`` for ``language``, building it on a cache miss."""
+    language = _language(language)
+    version = current_version()
+
+    def build() -> dict:
+        data = build_payload(language)
+        body = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        return {
+            "version": version,
+            "etag": hashlib.sha256(body.encode("utf-8")).hexdigest()[:32],
+            "data": data,
+        }
+
+    return CACHE.get_or_set(language, build, version=version)
+
+
+def get_payload(language: Optional[str] = None) -> dict:
+    """The reference lists for ``language`` (the active language by default)."""
+    return get_cached(language)["data"]
@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from Qbank.models import MatrixItemGroup
+from Rbank.models import ResponseGroup, ResponseType
+from . import reference_data
+
+REFERENCE_MODELS = (ResponseType, ResponseGroup, MatrixItemGroup)
+
+
+def invalidate_reference_data(sender, using=None, **kwargs):
+    # After the commit: data rebuilt before it would cache the old rows again.
+    transaction.on_commit(reference_data.invalidate, using=using)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=f"reference_data_save_{model.__name__}")
+    post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=f"reference_data_delete_{model.__name__}")
@@ -1,6 +1,8 @@
 import json
+from unittest import mock
 
 from django.db import IntegrityError, transaction
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
@@ -9,6 +11,7 @@ from django.utils.translation import override
 from .models import Survey, SurveyQuestion, SurveyVersion, SurveySection, SurveyRoutingRule
 from Qbank.models import MatrixItemGroup, MatrixItem
 from Rbank.models import ResponseGroup, ResponseType
+from . import reference_data
 
 
 class SurveyBuilderViewTests(TestCase):
@@ -51,6 +54,19 @@ class SurveyBuilderViewTests(TestCase):
         self.assertNotContains(response, 'class="question-text"')
 
 
+    def test_initial_builder_locale_is_valid_json_whatever_the_translation(self):
+        with mock.patch("surveys.views._", side_effect=lambda text: f'{text} "quoted" \\ </script>'):
+            response = self.client.get(reverse("survey_builder_initial_root"))
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        start = content.index('<script id="builder-locale" type="application/json">')
+        raw = content[content.index(">", start) + 1:content.index("</script>", start)]
+        locale = json.loads(raw)
+        self.assertEqual(set(locale), {"similar_found", "use_similar"})
+        self.assertTrue(locale["use_similar"].endswith(' "quoted" \\ </script>'))
+
+
 class SurveyVersionStatusTranslationTests(TestCase):
     def test_status_labels_translate_between_languages(self):
         with override("en"):
@@ -282,3 +298,50 @@ class SurveyRoutingBuilderTests(TestCase):
         rule = rules.first()
         self.assertEqual(rule.priority, 2)
         self.assertEqual(json.loads(rule.condition), payload["rules"][0]["condition"])
+
+
+class ReferenceDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.response_type = ResponseType.objects.create(name_ar="اختيار", name_en="Choice")
+        self.response_group = ResponseGroup.objects.create(name="نعم/لا")
+
+    def test_second_lookup_is_served_from_cache(self):
+        reference_data.get_payload("en")
+        with self.assertNumQueries(0):
+            payload = reference_data.get_payload("en")
+        self.assertEqual(payload["response_types"], [{"value": self.response_type.id, "label": "Choice"}])
+
+    def test_labels_follow_language(self):
+        self.assertEqual(reference_data.get_payload("ar")["response_types"][0]["label"], "اختيار")
+        self.assertEqual(reference_data.get_payload("en")["response_types"][0]["label"], "Choice")
+
+    def test_saving_reference_model_invalidates_cache(self):
+        before = reference_data.get_cached("en")
+        with self.captureOnCommitCallbacks() as callbacks:
+            ResponseGroup.objects.create(name="متعدد")
+            # Not before the commit, or a concurrent rebuild could cache the old rows again.
+            self.assertEqual(reference_data.get_cached("en"), before)
+        for callback in callbacks:
+            callback()
+        after = reference_data.get_cached("en")
+        self.assertGreater(after["version"], before["version"])
+        self.assertNotEqual(after["etag"], before["etag"])
+        self.assertEqual(len(after["data"]["response_groups"]), 2)
+
+    def test_endpoint_answers_conditional_request_with_304(self):
+        url = reverse("builder_reference_data")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["response_groups"][0]["label"], "نعم/لا")
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.response_group.name = "نعم / لا"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response_group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
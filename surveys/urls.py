@@ -5,6 +5,7 @@ from . import views
 
 urlpatterns = [
     path('builder/', views.survey_builder, name='survey_builder'),
+    path('builder/reference-data/', views.builder_reference_data, name='builder_reference_data'),
     path('builder/initial/submit/', views.submit_initial_questions, name='submit_initial_questions'),
     path('builder/final/submit/', views.submit_final_questionnaire, name='submit_final_questionnaire'),
     path('builder/routing/', views.survey_builder_routing, name='survey_builder_routing'),
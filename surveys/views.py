@@ -3,17 +3,20 @@ import logging
 
 from django.db import transaction
 from django.db.models import Count
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
-from django.views.decorators.http import require_POST
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET, require_POST
 
 from .models import SurveyQuestion, SurveyVersion, SurveySection, SurveyRoutingRule
-from Rbank.models import ResponseGroup, ResponseType
-from Qbank.models import MatrixItemGroup, Questions, QuestionStaging
+from Qbank.models import Questions, QuestionStaging
+from Qbank.dedupe import similar_questions
+from QuestionsBank.routers import read_only
 from assessment_runs.models import AssessmentRun
+from . import reference_data
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,7 @@ def _active_language() -> str:
     return (get_language() or "ar")[:2]
 
 
+@read_only
 def survey_builder(request):
     available_questions_qs = (
         SurveyQuestion.objects.select_related("survey_version")
@@ -39,20 +43,7 @@ def survey_builder(request):
         for question in available_questions_qs
     ]
 
-    response_types = [
-        {"value": rt.id, "label": str(rt)}
-        for rt in ResponseType.objects.all()
-    ]
-
-    response_groups = [
-        {"value": rg.id, "label": rg.name}
-        for rg in ResponseGroup.objects.all()
-    ]
-
-    matrix_item_groups = [
-        {"value": mig.id, "label": mig.name}
-        for mig in MatrixItemGroup.objects.all()
-    ]
+    reference = reference_data.get_payload(_active_language())
 
     survey_versions = (
         SurveyVersion.objects.select_related('survey')
@@ -121,15 +112,32 @@ def survey_builder(request):
         "surveys/builder.html",
         {
             "available_questions": available_questions,
-            "response_types": response_types,
-            "response_groups": response_groups,
-            "matrix_item_groups": matrix_item_groups,
+            "response_types": reference["response_types"],
+            "response_groups": reference["response_groups"],
+            "matrix_item_groups": reference["matrix_item_groups"],
             "survey_versions": version_choices,
             "survey_structures": survey_structures,
         },
     )
 
 
+@require_GET
+@read_only
+def builder_reference_data(request):
+    """Response types and groups for the builders, answerable with 304 via ETag."""
+    entry = reference_data.get_cached(_active_language())
+    etag = f'"{entry["etag"]}"'
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({"version": entry["version"], **entry["data"]})
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    patch_vary_headers(response, ("Accept-Language", "Cookie"))
+    return response
+
+
 @require_POST
 def submit_final_questionnaire(request):
     try:
@@ -236,39 +244,10 @@ def submit_final_questionnaire(request):
         )
 
 
+@read_only
 def survey_builder_routing(request):
-    # Reuse logic from survey_builder but render the dedicated routing template
-    available_questions_qs = (
-        SurveyQuestion.objects.select_related("survey_version")
-        # .exclude(survey_version__status=SurveyVersion.Status.ARCHIVED) # Status field removed
-        # .only("id", "text_ar", "text_en", "code", "created_at") # Removed .only() to avoid FieldError
-        .order_by("-created_at")
-    )
-    available_questions = [
-        {
-            "id": question.id,
-            "label": question.display_text,
-            "code": question.code,
-            "created_at": question.created_at.isoformat(),
-        }
-        for question in available_questions_qs
-    ]
-
-    response_types = [
-        {"value": rt.id, "label": str(rt)}
-        for rt in ResponseType.objects.all()
-    ]
-
-    response_groups = [
-        {"value": rg.id, "label": rg.name}
-        for rg in ResponseGroup.objects.all()
-    ]
-
-    matrix_item_groups = [
-        {"value": mig.id, "label": mig.name}
-        for mig in MatrixItemGroup.objects.all()
-    ]
-
+    # Reuse logic from survey_builder but render the dedicated routing template.
+    # The canvas loads a version's questions from survey_routing_data, so no question list is embedded.
     survey_versions = SurveyVersion.objects.select_related('survey').prefetch_related('questions').all()
     version_choices = [
         {
@@ -296,15 +275,13 @@ def survey_builder_routing(request):
         request,
         "surveys/builder_routing.html",
         {
-            "available_questions": available_questions,
             "survey_versions": version_choices,
             "routing_locale": routing_locale,
-            "response_types": response_types,
-            "response_groups": response_groups,
         },
     )
 
 
+@read_only
 def survey_routing_data(request):
     version_id = request.GET.get("version_id")
     if not version_id:
@@ -436,9 +413,14 @@ def save_survey_routing(request):
 
     return JsonResponse({"status": "ok"})
 
+INITIAL_BANK_QUESTIONS = 50
+
+
+@read_only
 def survey_builder_initial(request):
-    # Fetch questions from Qbank.models.Questions instead of SurveyQuestion
-    available_questions_qs = Questions.objects.all().order_by("id")
+    # Fetch questions from Qbank.models.Questions instead of SurveyQuestion.
+    # Only the first page is embedded; the picker queries the search API for the rest.
+    available_questions_qs = Questions.objects.all().order_by("id")[:INITIAL_BANK_QUESTIONS]
     
     available_questions = [
         {
@@ -452,21 +434,6 @@ def survey_builder_initial(request):
         for question in available_questions_qs
     ]
 
-    response_types = [
-        {"value": rt.id, "label": str(rt)}
-        for rt in ResponseType.objects.all()
-    ]
-
-    response_groups = [
-        {"value": rg.id, "label": rg.name}
-        for rg in ResponseGroup.objects.all()
-    ]
-
-    matrix_item_groups = [
-        {"value": mig.id, "label": mig.name}
-        for mig in MatrixItemGroup.objects.all()
-    ]
-
     # Only fetch survey versions that have NO questions
     survey_versions = SurveyVersion.objects.select_related('survey').annotate(
         num_questions=Count('questions')
@@ -492,11 +459,12 @@ def survey_builder_initial(request):
         "surveys/builder_initial.html",
         {
             "available_questions": available_questions,
-            "response_types": response_types,
-            "response_groups": response_groups,
-            "matrix_item_groups": matrix_item_groups,
             "survey_versions": version_choices,
             "survey_structures": survey_structures,
+            "builder_locale": {
+                "similar_found": _("يوجد سؤال مشابه في بنك الأسئلة:"),
+                "use_similar": _("هل تريد استخدامه بدلاً من السؤال اليدوي؟"),
+            },
         },
     )
 
@@ -517,6 +485,7 @@ def submit_initial_questions(request):
              return JsonResponse({'status': 'error', 'message': 'This survey version already has questions and cannot be modified.'}, status=403)
 
         current_lang = _active_language()
+        possible_duplicates = []
         
         for q_data in questions:
             source = q_data.get('source')
@@ -537,19 +506,28 @@ def submit_initial_questions(request):
                     text_en = text if current_lang == 'en' else ''
                     
                     # Create SurveyQuestion
-                    SurveyQuestion.objects.create(
+                    survey_question = SurveyQuestion.objects.create(
                         survey_version=survey_version,
                         text_ar=text_ar,
                         text_en=text_en,
                     )
                     
-                    # Create QuestionStaging entry
+                    # Create QuestionStaging entry linked to it
                     QuestionStaging.objects.create(
                         text_ar=text_ar,
                         text_en=text_en,
                         survey=survey_version.survey,
-                        survey_version=survey_version
+                        survey_version=survey_version,
+                        survey_question=survey_question,
                     )
+
+                    # Flag wordings that already exist in the bank so reviewers can reuse them
+                    matches = similar_questions(text)
+                    if matches:
+                        possible_duplicates.append({
+                            'label': text,
+                            'matches': [match.as_dict() for match in matches],
+                        })
         
         # Create AssessmentRun for the survey version
         AssessmentRun.objects.get_or_create(survey_version=survey_version)
@@ -561,7 +539,7 @@ def submit_initial_questions(request):
             survey_version.initial_questionnaire_built_by = request.user
         survey_version.save()
 
-        return JsonResponse({'status': 'success'})
+        return JsonResponse({'status': 'success', 'possible_duplicates': possible_duplicates})
         
     except Exception as e:
         # Log the full exception for debugging